@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2022 CSIRO Space and Astronomy.
+#
+# Distributed under the terms of the CSIRO Open Source Software Licence
+# Agreement. See LICENSE for more info.
+
+"""
+SPS (LFAA) SPEAD packet stream generator for LFAADecode100G
+-----------------------------------------------------------
+Writes the SPS packets for a virtual channel table and a range of integrations
+as a pcap file (for 100G replay or wireshark) or as a raw file of concatenated
+ethernet frames (no FCS).
+
+Sample data uses the same encoding as the LFAA decode emulation in
+cornerturn1/ct1_tb.vhd, as checked by cornerturn1/test/ct1_test.py :
+  n = packet_count * 2048 + sample index in the packet (samples since the epoch)
+  Xre = n mod 256, Xim = (n/256) mod 256, Yre = (n/65536) mod 256, Yim = virtual channel
+or, with "rfi: true" (g_DATA_RFI), 0x80808080 (RFI) when bit 16 of n is set and 0 otherwise.
+Packets are sent in order of packet count and within a packet count in virtual
+channel table order, like ct1_tb.vhd. Integration k contains packet counts
+k*384 to k*384 + 383.
+
+Packet format (see LFAA_detect_100G.vhd and the test packets in tb_correlatorCore.vhd):
+  ethernet (14) + IPv4 (20) + UDP (8) + SPEAD header + 8192 bytes data (2048 dual-pol 8 bit samples)
+  SPEAD v1 : 72 byte header, 8 items, 8306 byte frame
+      0x8001 heap_counter      : logical channel (2 bytes), packet counter (4 bytes)
+      0x8004 pkt_len           : 8192
+      0x9027 sync_time         : seconds since the UNIX epoch
+      0x9600 timestamp         : ns after sync_time of the first sample, packet_count * 2048 * 1080
+      0x9011 center_freq       : frequency_id * 781250 Hz
+      0xb000 csp_channel_info  : reserved (2), beam_id (2), frequency_id (2)
+      0xb001 csp_antenna_info  : substation_id (1), subarray_id (1), station_id (2), nof_contributing_antennas (2)
+      0x3300 sample_offset     : 0
+  SPEAD v3 : 56 byte header, 6 items, 8290 byte frame
+      0x8001 heap_counter, 0x8004 pkt_len, 0xb010 scan_id, 0xb000 csp_channel_info,
+      0xb001 csp_antenna_info, 0x3300 sample_offset
+  SPEAD v2 has the v1 layout, but the decoder distinguishes v1 and v2 by header
+  values in spead_sps_pkg, which is not in this tree, so v2 is not supported.
+  The LFAAProcess100G in this tree only accepts the 8306 byte v1 frame, so only
+  a v1 stream is decoded by it. v3 streams are for the newer SPS decoders.
+
+Configuration (YAML):
+  spead_version : 1                # 1 or 3
+  integration_start : 0            # first integration (units of 384 packets = 0.849 s)
+  integrations : 1
+  rfi : false
+  sync_time : 0                    # v1 sync_time item
+  scan_id : 0                      # v3 scan_id item
+  nof_contributing_antennas : 256
+  vc_table :                       # one entry per virtual channel, in VC table order
+    - {virtual_channel: 0, station_id: 345, substation_id: 1, subarray_id: 1, beam_id: 1, frequency_id: 100}
+  or instead of vc_table, the table for all combinations, sorted as LFAADecode100G requires
+  (frequency_id, then station_id) :
+  stations : [345, 350]
+  frequency_ids : [100, 101]
+  subarray_id : 1
+  beam_id : 1
+  Optional : unmatched_stations : [999] adds packets for stations that are not in the VC table,
+  eth_dst, eth_src ("00:11:22:33:44:55"), ip_src, ip_dst ("10.0.0.1"), udp_src, udp_dst (4660).
+
+Usage:
+  > python3 sps_packet_gen.py config.yaml -o sps.pcap [--vc-table vc_table.txt] [--gbps 100]
+For SPEAD v1 the expected LFAADecode100G packet counters for the stream are printed at the end.
+"""
+
+import argparse
+import os
+import sys
+import time
+import typing
+
+import numpy as np
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', '..', 'tools', 'radiohdl', 'base'))
+from common import BitFields  # noqa: E402  (radiohdl common, vectorised bit field codec)
+
+SAMPLES_PER_PACKET = 2048
+DATA_BYTES = SAMPLES_PER_PACKET * 4
+PACKETS_PER_INTEGRATION = 384
+SAMPLE_PERIOD_NS = 1080
+CHANNEL_BW_HZ = 781250
+ETH_IP_UDP_BYTES = 14 + 20 + 8
+WIRE_OVERHEAD_BYTES = 4 + 8 + 12   # FCS, preamble, inter frame gap
+
+# LFAADecode100G VC_TABLE entry, 2 words per virtual channel (see LFAADecode100G.peripheral.yaml)
+VC_TABLE_FIELDS = BitFields([('substation_id',    7,  0),
+                             ('station_id',      19,  8),
+                             ('beam_id',         31, 20),
+                             ('frequency_id',    40, 32),
+                             ('subarray_id',     46, 41),
+                             ('valid',           47, 47),
+                             ('virtual_channel', 63, 48)], nof_words=2)
+
+# SPEAD items in header order : (name, SPEAD ID with immediate bit)
+SPEAD_ITEMS = {
+    1: [('heap_counter', 0x8001), ('pkt_len', 0x8004), ('sync_time', 0x9027), ('timestamp', 0x9600),
+        ('center_freq', 0x9011), ('csp_channel_info', 0xb000), ('csp_antenna_info', 0xb001), ('sample_offset', 0x3300)],
+    3: [('heap_counter', 0x8001), ('pkt_len', 0x8004), ('scan_id', 0xb010),
+        ('csp_channel_info', 0xb000), ('csp_antenna_info', 0xb001), ('sample_offset', 0x3300)],
+}
+
+PCAP_MAGIC_NS = 0xa1b23c4d   # pcap with nanosecond time stamps
+PCAP_LINKTYPE_ETHERNET = 1
+
+
+def spead_header_bytes(version):
+    return 8 + 8 * len(SPEAD_ITEMS[version])
+
+
+def frame_bytes(version):
+    return ETH_IP_UDP_BYTES + spead_header_bytes(version) + DATA_BYTES
+
+
+def item_offset(version, name):
+    """Byte offset in the frame of the 6 byte value of SPEAD item name."""
+    names = [n for n, _ in SPEAD_ITEMS[version]]
+    return ETH_IP_UDP_BYTES + 8 + 8 * names.index(name) + 2
+
+
+def parse_config(file: typing.IO) -> typing.Dict:
+    """
+    Reads configuration YAML file and completes it with the defaults.
+
+    :param file: The YAML file object
+    :return: Settings dict, with 'vc_table' as list of dicts
+    :raises AssertionError: if the spead version or the virtual channel table is missing or wrong
+    :raises ValueError: if unmatched_stations is given with an empty virtual channel table
+    """
+    config = yaml.safe_load(file)
+    config.setdefault('spead_version', 1)
+    assert config['spead_version'] in SPEAD_ITEMS, "spead_version must be 1 or 3 (v2 header values are not known)"
+    for key, value in (('integration_start', 0), ('integrations', 1), ('rfi', False), ('sync_time', 0), ('scan_id', 0),
+                       ('eth_dst', '00:11:22:33:44:55'), ('eth_src', '00:11:22:33:44:55'),
+                       ('ip_src', '10.0.0.1'), ('ip_dst', '10.0.0.2'), ('udp_src', 4660), ('udp_dst', 4660),
+                       ('nof_contributing_antennas', 256), ('unmatched_stations', []), ('subarray_id', 1), ('beam_id', 1), ('substation_id', 1)):
+        config.setdefault(key, value)
+    if 'vc_table' not in config:
+        assert 'stations' in config and 'frequency_ids' in config, "Configuration YAML needs vc_table or stations and frequency_ids"
+        config['vc_table'] = [{'station_id': s, 'frequency_id': f, 'substation_id': config['substation_id'],
+                               'subarray_id': config['subarray_id'], 'beam_id': config['beam_id']}
+                              for f in sorted(config['frequency_ids']) for s in sorted(config['stations'])]
+    for vc, entry in enumerate(config['vc_table']):
+        entry.setdefault('virtual_channel', vc)
+        for key in ('substation_id', 'subarray_id', 'beam_id'):
+            entry.setdefault(key, config[key])
+    if config['unmatched_stations'] and not config['vc_table']:
+        # the unmatched station packets copy the other fields of the first VC table entry
+        raise ValueError("unmatched_stations needs at least one vc_table entry (or stations and frequency_ids)")
+    return config
+
+
+def vc_table_words(vc_table):
+    """Return the uint32 words of the LFAADecode100G VC_TABLE for the list of vc_table entries."""
+    values = {name: np.array([e[name] for e in vc_table]) for name in VC_TABLE_FIELDS.names() if name != 'valid'}
+    values['valid'] = np.ones(len(vc_table), dtype=np.int64)
+    return VC_TABLE_FIELDS.encode(values).reshape(-1).astype(np.uint32)
+
+
+def put_be(frames, offset, nof_bytes, values):
+    """Write values big endian (network byte order) in nof_bytes at byte offset of each frame (row of frames)."""
+    values = np.asarray(values, dtype=np.uint64)
+    for i in range(nof_bytes):
+        frames[:, offset + i] = (values >> np.uint64(8 * (nof_bytes - 1 - i))) & np.uint64(0xFF)
+
+
+def parse_mac(mac):
+    return int(mac.replace(':', ''), 16)
+
+
+def parse_ip(ip):
+    a, b, c, d = (int(x) for x in ip.split('.'))
+    return (a << 24) | (b << 16) | (c << 8) | d
+
+
+def ip_checksum(headers):
+    """IPv4 header checksum of each row of the (n, 20) uint8 headers with zero checksum field."""
+    words = headers[:, 0::2].astype(np.uint32) * 256 + headers[:, 1::2]
+    total = words.sum(axis=1)
+    while np.any(total >> 16):
+        total = (total & 0xFFFF) + (total >> 16)
+    return (~total) & 0xFFFF
+
+
+class SPSPacketGenerator:
+    """Vectorised generator of the SPS packets of a configuration, in blocks of whole packet counts."""
+
+    def __init__(self, config):
+        self.config = config
+        self.version = config['spead_version']
+        self.frame_len = frame_bytes(self.version)
+        entries = list(config['vc_table'])
+        # packets for stations that are not in the VC table, to check No_Virtual_Channel_Count
+        for station in config['unmatched_stations']:
+            entries.append(dict(entries[0], station_id=station, virtual_channel=0xFF, unmatched=True))
+        self.entries = entries
+        self.template = self.make_template()
+
+    def make_template(self):
+        """Frame header bytes of one packet for each entry, the per packet fields are filled in by packets()."""
+        cfg = self.config
+        n = len(self.entries)
+        hdr_len = self.frame_len - DATA_BYTES
+        t = np.zeros((n, hdr_len), dtype=np.uint8)
+        col = lambda key: np.array([e[key] for e in self.entries], dtype=np.uint64)
+        # ethernet
+        put_be(t, 0, 6, parse_mac(cfg['eth_dst']))
+        put_be(t, 6, 6, parse_mac(cfg['eth_src']))
+        put_be(t, 12, 2, 0x0800)
+        # IPv4, the identification and checksum are set per packet
+        put_be(t, 14, 2, 0x4500)
+        put_be(t, 16, 2, self.frame_len - 14)
+        put_be(t, 20, 2, 0x4000)        # don't fragment
+        put_be(t, 22, 2, 0x4011)        # TTL 64, UDP
+        put_be(t, 26, 4, parse_ip(cfg['ip_src']))
+        put_be(t, 30, 4, parse_ip(cfg['ip_dst']))
+        # UDP, no checksum
+        put_be(t, 34, 2, cfg['udp_src'])
+        put_be(t, 36, 2, cfg['udp_dst'])
+        put_be(t, 38, 2, self.frame_len - 34)
+        # SPEAD
+        v = self.version
+        put_be(t, 42, 8, 0x5304020600000000 | len(SPEAD_ITEMS[v]))
+        for k, (name, spead_id) in enumerate(SPEAD_ITEMS[v]):
+            put_be(t, 50 + 8 * k, 2, spead_id)
+        put_be(t, item_offset(v, 'heap_counter'), 2, col('virtual_channel'))   # logical channel
+        put_be(t, item_offset(v, 'pkt_len'), 6, DATA_BYTES)
+        ci = item_offset(v, 'csp_channel_info')
+        put_be(t, ci + 2, 2, col('beam_id'))
+        put_be(t, ci + 4, 2, col('frequency_id'))
+        ai = item_offset(v, 'csp_antenna_info')
+        put_be(t, ai, 1, col('substation_id'))
+        put_be(t, ai + 1, 1, col('subarray_id'))
+        put_be(t, ai + 2, 2, col('station_id'))
+        put_be(t, ai + 4, 2, cfg['nof_contributing_antennas'])
+        if v == 3:
+            put_be(t, item_offset(v, 'scan_id'), 6, cfg['scan_id'])
+        else:
+            put_be(t, item_offset(v, 'sync_time'), 6, cfg['sync_time'])
+            put_be(t, item_offset(v, 'center_freq'), 6, col('frequency_id') * CHANNEL_BW_HZ)
+        return t
+
+    def packet_counts(self):
+        first = self.config['integration_start'] * PACKETS_PER_INTEGRATION
+        return first, first + self.config['integrations'] * PACKETS_PER_INTEGRATION
+
+    def nof_packets(self):
+        first, last = self.packet_counts()
+        return (last - first) * len(self.entries)
+
+    def packets(self, packet_counts, ip_id_start=0):
+        """Return the frames for the packet_counts as uint8 array (len(packet_counts) * nof entries, frame_len)."""
+        packet_counts = np.asarray(packet_counts, dtype=np.int64)
+        n_entries = len(self.entries)
+        n = len(packet_counts) * n_entries
+        hdr_len = self.frame_len - DATA_BYTES
+        frames = np.empty((n, self.frame_len), dtype=np.uint8)
+        frames[:, :hdr_len] = np.tile(self.template, (len(packet_counts), 1))
+        pc = np.repeat(packet_counts, n_entries)
+        vc = np.tile(np.array([e['virtual_channel'] for e in self.entries], dtype=np.int64), len(packet_counts))
+
+        put_be(frames, 18, 2, (ip_id_start + np.arange(n)) & 0xFFFF)
+        put_be(frames, 24, 2, 0)
+        put_be(frames, 24, 2, ip_checksum(frames[:, 14:34]))
+        put_be(frames, item_offset(self.version, 'heap_counter') + 2, 4, pc & 0xFFFFFFFF)
+        if self.version != 3:
+            put_be(frames, item_offset(self.version, 'timestamp'), 6, (pc * SAMPLES_PER_PACKET * SAMPLE_PERIOD_NS) & (2**48 - 1))
+
+        # sample data, 32 bit little endian words Xre, Xim, Yre, Yim
+        sample = pc[:, np.newaxis] * SAMPLES_PER_PACKET + np.arange(SAMPLES_PER_PACKET)
+        if self.config['rfi']:
+            words = np.where(sample & 0x10000, 0x80808080, 0).astype('<u4')
+        else:
+            words = ((sample & 0xFFFFFF) | ((vc[:, np.newaxis] & 0xFF) << 24)).astype('<u4')
+        frames[:, hdr_len:] = words.view(np.uint8).reshape(n, DATA_BYTES)
+        return frames
+
+    def blocks(self, packet_counts_per_block=16):
+        """Yield the frames of the configured integrations in blocks of packet_counts_per_block packet counts."""
+        first, last = self.packet_counts()
+        ip_id = 0
+        for start in range(first, last, packet_counts_per_block):
+            frames = self.packets(np.arange(start, min(start + packet_counts_per_block, last)), ip_id)
+            ip_id += len(frames)
+            yield frames
+
+    def expected_counters(self):
+        """Expected LFAADecode100G counters after receiving the stream, None for SPEAD v3.
+
+        Only counters that LFAAProcess100G drives in o_reg_count are listed. LFAAProcess100G only
+        accepts the 8306 byte v1 frame and matches the v1 header fields, so it does not decode a v3 stream.
+        """
+        if self.version != 1:
+            return None
+        n_pc = self.packet_counts()[1] - self.packet_counts()[0]
+        n_unmatched = sum(1 for e in self.entries if e.get('unmatched')) * n_pc
+        total = n_pc * len(self.entries)
+        counters = {'total_packet_count': total,
+                    'SPEAD_packet_count': total - n_unmatched,
+                    'NONSPEAD_packet_count': 0,
+                    'No_Virtual_Channel_Count': n_unmatched,
+                    'spead_v1_packet_found': total}
+        return counters
+
+
+def pcap_file_header():
+    return np.array([PCAP_MAGIC_NS, 0x00040002, 0, 0, 65535, PCAP_LINKTYPE_ETHERNET], dtype='<u4').tobytes()
+
+
+def pcap_records(frames, t_start_ns, gbps):
+    """Return the pcap records for frames sent back to back at gbps starting at t_start_ns, and the end time."""
+    n, frame_len = frames.shape
+    t_frame_ns = (frame_len + WIRE_OVERHEAD_BYTES) * 8 / gbps
+    t_ns = (t_start_ns + np.arange(n) * t_frame_ns).astype(np.int64)
+    rec = np.empty((n, 16 + frame_len), dtype=np.uint8)
+    hdr = np.stack([t_ns // 10**9, t_ns % 10**9, np.full(n, frame_len), np.full(n, frame_len)], axis=1).astype('<u4')
+    rec[:, :16] = hdr.view(np.uint8)
+    rec[:, 16:] = frames
+    return rec, t_start_ns + n * t_frame_ns
+
+
+def command_line_args():
+    parser = argparse.ArgumentParser(description="SPS SPEAD packet generator for LFAADecode100G")
+    parser.add_argument("configuration", help="Test Configuration (YAML)", type=argparse.FileType(mode="r"))
+    parser.add_argument("-o", "--output", required=True, help="Output file, .pcap for a pcap file, else raw ethernet frames")
+    parser.add_argument("--vc-table", help="Write the LFAADecode100G VC_TABLE words (hex, one per line) to this file")
+    parser.add_argument("--gbps", type=float, default=100.0, help="Line rate for the pcap time stamps (default %(default)s)")
+    parser.add_argument("--block", type=int, default=16, help="Packet counts per generated block (default %(default)s)")
+    return parser.parse_args()
+
+
+def main():
+    args = command_line_args()
+    config = parse_config(args.configuration)
+    gen = SPSPacketGenerator(config)
+
+    if args.vc_table:
+        with open(args.vc_table, 'w') as f:
+            for word in vc_table_words(config['vc_table']):
+                f.write('%08x\n' % word)
+
+    is_pcap = args.output.endswith('.pcap')
+    t_ns = 0.0
+    nof_packets = 0
+    t0 = time.time()
+    with open(args.output, 'wb') as f:
+        if is_pcap:
+            f.write(pcap_file_header())
+        for frames in gen.blocks(args.block):
+            if is_pcap:
+                records, t_ns = pcap_records(frames, t_ns, args.gbps)
+                f.write(records.data)
+            else:
+                f.write(frames.data)
+            nof_packets += len(frames)
+    elapsed = time.time() - t0
+    nof_bytes = nof_packets * gen.frame_len
+    print(f"Wrote {nof_packets} SPEAD v{gen.version} packets ({gen.frame_len} bytes) to {args.output} "
+          f"in {elapsed:.2f} s ({nof_bytes * 8 / max(elapsed, 1e-9) / 1e9:.1f} Gbit/s)")
+    counters = gen.expected_counters()
+    if counters is None:
+        print(f"No expected LFAADecode100G counters, it does not decode SPEAD v{gen.version}")
+        return
+    print("Expected LFAADecode100G counters :")
+    for name, value in counters.items():
+        print(f"  {name:26s} = {value}")
+
+
+if __name__ == "__main__":
+    main()
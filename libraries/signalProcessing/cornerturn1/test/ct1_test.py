@@ -66,8 +66,12 @@ import numpy as np
 import yaml
 import typing
 import sys
+import os
 import filterbank
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', '..', 'tools', 'radiohdl', 'base'))
+import golden_store  # noqa: E402  (radiohdl common, store of expected model data)
+
 # 31 FIR tap deripple filter, for the SPS 18-tap filter 
 c_deripple = np.array([5,-7,12,-21,31,169,-676,504,-833,1007,-1243,1442,-1620,1756,-1842,68166,-1842,1756,-1620,1442,-1243,1007,-833,504,-676,169,31,-21,12,-7,5])
 
@@ -123,6 +127,18 @@ def command_line_args():
         required=True,
     )
     
+    parser.add_argument(
+        "--golden-store",
+        help="Directory of the store of expected filterbank and fine delay output",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--no-golden-store",
+        help="Compute all expected output, do not read or write the store",
+        action="store_true",
+    )
+    
     #parser.add_argument("-H0", "--HBM0", help="HBM buffer 0 data from firmware to check",
     #                    type=argparse.FileType(mode="r"))
     #parser.add_argument("-f", "--filter", help="Interpolation filter taps", type=argparse.FileType(mode="r"))
@@ -362,16 +378,9 @@ def fix_8bit_rfi(din):
     # x=128 = 0x80 = RFI => 0
     # x>128 = negative => x-256
     # x<128 = positive => x
-    dout = din
-    flagged = np.zeros(din.shape)
-    for n1 in range(din.size):
-        if (din[n1] == 128):
-            dout[n1] = 0
-            flagged[n1] = 1
-        elif din[n1] > 128:
-            dout[n1] = din[n1] - 256
-        else:
-            dout[n1] = din[n1]
+    din = np.asarray(din)
+    flagged = (din == 128).astype(np.float64)
+    dout = np.where(din == 128, 0, np.where(din > 128, din - 256, din))
     return (dout, flagged)
 
 def rfi_diff(a,b):
@@ -385,6 +394,167 @@ def rfi_diff(a,b):
         b_test = b
     return np.abs(a_test - b_test)
 
+def rfi_diff_array(a, b):
+    # rfi_diff for numpy arrays
+    either_rfi = (a == -128) | (b == -128)
+    return np.where(either_rfi, np.abs(np.abs(a) - np.abs(b)), np.abs(a - b))
+
+def deripple_filter(din, deripple):
+    # CT1 output for any input : din = raw SPS bytes (0 to 255, 0x80 = RFI), (4 components, n + 48 samples),
+    # components = (Xre, Xim, Yre, Yim). The 49 tap deripple FIR filter needs 24 extra samples at each end.
+    # Returns (4 components, n samples), -32768 where any component of the (central) input sample is RFI.
+    din = np.asarray(din)
+    n = din.shape[1] - (c_fir_taps - 1)
+    components = [fix_8bit_rfi(d) for d in din]
+    any_flagged = sum(flagged for (_, flagged) in components)[c_fir_taps//2 : c_fir_taps//2 + n]
+    # Apply the deripple filter, then divide by 512, convergent round to even
+    filtered = np.array([np.correlate(d, deripple, 'valid') for (d, _) in components])
+    return np.where(any_flagged > 0, -32768, np.round(filtered / 512))
+
+def expected_ct1_packet(first_sample, vc, deripple):
+    # Expected CT1 output for one packet, (4 components, 4096 samples),
+    # components = (Xre, Xim, Yre, Yim).
+    # The testbench puts the sample number in the data, where the sample number
+    # is the number of samples since the epoch. first_sample is the first sample
+    # the deripple FIR filter is applied to, so the 49 tap FIR filter needs
+    # 24 extra samples at the front, 48 extra altogether.
+    packet_samples = np.arange(first_sample, first_sample + 4096 + (c_fir_taps - 1))
+    return deripple_filter(testbench_samples(packet_samples, vc), deripple)
+
+def testbench_samples(samples, vc):
+    # SPS data generated by the testbench for the sample numbers (samples since the epoch) of virtual channel vc,
+    # (4 components, len(samples)) raw bytes
+    samples = np.asarray(samples, dtype=np.int64)
+    return np.stack([samples % 256, (samples // 256) % 256, (samples // 65536) % 256,
+                     np.full(samples.shape, vc % 256)])   # Yim is fixed to the virtual channel in the testbench
+
+def select_polynomial(src_cfg, integration):
+    # Return the polynomial configuration used for the integration, as
+    # (poly, sky_freq, integration_validity, buf_offset, Ypol_offset, valid), valid = False if neither buffer is valid
+    cfg0_valid = (src_cfg["valid0"] == 1) and (integration >= src_cfg["integration0"])
+    cfg1_valid = (src_cfg["valid1"] == 1) and (integration >= src_cfg["integration1"])
+    if cfg1_valid and ((not cfg0_valid) or (src_cfg["integration1"] > src_cfg["integration0"])):
+        # select second configuration
+        # poly : delay polynomial, sky_freq : sky frequency in GHz
+        # integration_validity : 32 bit buf_integration, integration period at which the polynomial becomes valid.
+        # buf_offset : seconds from the polynomial epoch to the start of the integration period
+        # Ypol_offset : offset in ns for the second polarisation (relative to the first polarisation).
+        return (src_cfg["poly1"], src_cfg["sky_freq1"], src_cfg["integration1"], src_cfg["buf_offset1"],
+                src_cfg["Ypol_offset1"], True)
+    # select first configuration
+    return (src_cfg["poly0"], src_cfg["sky_freq0"], src_cfg["integration0"], src_cfg["buf_offset0"],
+            src_cfg["Ypol_offset0"], cfg0_valid)
+
+def packet_delays(src_cfg, integration, frame_in_integration):
+    # Coarse delay and fine delay meta data of the 75 packets produced by CT1 for one frame
+    # (11 preload packets, then 64 packets).
+    # Returns (coarse_delay, meta, valid), meta = (75, 4) int64 = (fine X, phase X, fine Y, phase Y)
+    (poly, sky_freq, integration_validity, buf_offset, Ypol_offset, valid) = select_polynomial(src_cfg, integration)
+    meta = np.zeros((75, 4), dtype=np.int64)
+    for packet in range(75):
+        # Time in seconds in the polynomial
+        t = buf_offset + frame_in_integration * 0.283115520 + (integration - integration_validity) * 0.849346560
+        # Each packet is 4.4ms
+        if packet > 10:
+            t = t + (packet-11) * 0.00442368
+        delay_Xpol = poly[0] + poly[1]*t + poly[2]*(t**2) + poly[3]*(t**3) + poly[4]*(t**4) + poly[5]*(t**5)
+        delay_Ypol = delay_Xpol + Ypol_offset
+        delay_samples_Xpol = delay_Xpol/1080.0
+        delay_samples_Ypol = delay_Ypol/1080.0
+        if packet == 0:
+            coarse_delay = np.int32(np.floor(delay_samples_Xpol))
+        fine_delay_Xpol = delay_samples_Xpol - coarse_delay
+        fine_delay_Ypol = delay_samples_Ypol - coarse_delay
+        if (fine_delay_Xpol >= 0):
+            fine_delay_Xpol = np.int64(np.floor(fine_delay_Xpol * 16384*65536))
+        else:
+            fine_delay_Xpol = 65536*65536 - np.int64(np.floor(-fine_delay_Xpol*16384*65536))
+        if (fine_delay_Ypol >= 0):
+            fine_delay_Ypol = np.int64(np.floor(fine_delay_Ypol * 16384*65536))
+        else:
+            fine_delay_Ypol = 65536*65536 - np.int64(np.floor(-fine_delay_Ypol*16384*65536))
+        phase_X = delay_Xpol * sky_freq
+        phase_Y = delay_Ypol * sky_freq
+        phase_X = np.int64(np.floor(65536*65536 * (phase_X - np.floor(phase_X))))
+        phase_Y = np.int64(np.floor(65536*65536 * (phase_Y - np.floor(phase_Y))))
+        meta[packet] = (fine_delay_Xpol, phase_X, fine_delay_Ypol, phase_Y)
+    return (coarse_delay, meta, valid)
+
+def ct1_first_sample(integration, frame_in_integration, coarse_delay):
+    # First sample number (samples since the epoch) of the first of the 75 CT1 packets of a frame,
+    # the 49 tap deripple filter input starts c_fir_taps//2 samples earlier.
+    return integration * 192 * 4096 + frame_in_integration * 64*4096 - 6*4096 - coarse_delay
+
+def filterbank_input(ct1_packets, pol):
+    # Filterbank input for one polarisation of the CT1 output (75 packets, 4 components, 4096 samples),
+    # returns (fb_in, fb_in_RFI) : complex samples with RFI samples set to 0, and 1 where the sample is RFI
+    Xre = ct1_packets[:, pol*2 + 0, :].reshape(-1)
+    Xim = ct1_packets[:, pol*2 + 1, :].reshape(-1)
+    fb_in_RFI = ((Xre == -32768) | (Xim == -32768)).astype(np.int32)
+    fb_in = np.where(fb_in_RFI == 1, 0, Xre + 1j * Xim)
+    return (fb_in, fb_in_RFI)
+
+def print_rfi_info(ct1_packets):
+    # Debug print of the RFI calculation for the first filterbank output packets.
+    # Computed from the CT1 output rather than in fine_delay_expected(), so it is
+    # printed whether or not the expected output comes from the golden store.
+    for pol in range(2):
+        (fb_in, fb_in_RFI) = filterbank_input(ct1_packets, pol)
+        for fb_pkt_out in range(1):
+            fb_out512x96_RFI = np.reshape(fb_in_RFI[fb_pkt_out * 4096 : (fb_pkt_out * 4096 + 12*4096)],(96,512)).T
+            RFI_sum = np.sum(fb_out512x96_RFI * RFI_analysis)
+            print('asdfasd')
+            print(fb_in[0:10])
+            print("rfi info : ")
+            print(f"{np.sum(fb_out512x96_RFI,0)}")
+            print(f"fb_pkt_out = {fb_pkt_out}, pol = {pol}, RFI_sum = {RFI_sum}")
+
+def filterbank_expected(fb, ct1_packets, RFI_threshold):
+    # Expected output of the filterbank for one virtual channel and frame.
+    #  ct1_packets : CT1 output, (75 packets, 4 components, 4096 samples)
+    # Returns (fb_out, RFI_mark) : fb_out = 64 time samples x 3456 fine channels x 2 polarisations,
+    #                              RFI_mark = (2 polarisations, 64 time samples), 1 = RFI
+    fb_out = np.zeros((64,3456,2), dtype = np.complex128)
+    RFI_mark = np.zeros((2,64), dtype = np.int32)
+    for pol in range(2):
+        (fb_in, fb_in_RFI) = filterbank_input(ct1_packets, pol)
+        fb_out[:,:,pol] = fb.filter(fb_in, time_steps=64, derotate=False, preload_zeros=0, saturate=False, fft_scale=8192)
+        # RFI calculation : each of the 64 output packets from the filterbank uses 12 input packets = 96 blocks of 512 samples,
+        # weighted by the alias power of the block.
+        block_RFI = fb_in_RFI.reshape(-1, 512).sum(axis=1).astype(np.int64)
+        RFI_sum = np.correlate(block_RFI, RFI_analysis, 'valid')[0:64*8:8]
+        if RFI_threshold < 4294967295:
+            RFI_mark[pol] = RFI_sum > RFI_threshold
+    return (fb_out, RFI_mark)
+
+def apply_fine_delay(fb_out, fine_delay_meta, RFI_mark):
+    # Expected output of the fine delay for the filterbank output of one virtual channel and frame,
+    # see filterbank_expected().
+    #  fine_delay_meta : meta data of the 64 output packets, (64, 4) = (fine X, phase X, fine Y, phase Y)
+    # Returns fdelay_out : 64 time samples x 3456 fine channels x 2 polarisations
+    fine_freq = np.arange(3456)
+    fdelay_out = np.zeros((64,3456,2), dtype = np.complex128)
+    for pol in range(2):
+        fine_delay = fine_delay_meta[:, pol*2 + 0, np.newaxis]
+        phase = fine_delay_meta[:, pol*2 + 1, np.newaxis]
+        p = (1/128) * fb_out[:, :, pol] * np.exp(-1j * 2 * np.pi * (1/(2**32)) * (phase + 2*fine_delay * (fine_freq-1728)/2048))
+        # Mark out of range values as RFI
+        p_re = np.where((np.real(p) > 127) | (np.real(p) < -127), -128, np.real(p))
+        p_im = np.where((np.imag(p) > 127) | (np.imag(p) < -127), -128, np.imag(p))
+        fdelay_out[:, :, pol] = p_re + 1j * p_im
+    # Replace RFI marked values with -128
+    fdelay_out[(RFI_mark[0] == 1) | (RFI_mark[1] == 1)] = -128 - 1j * 128
+    return fdelay_out
+
+def fine_delay_expected(fb, ct1_packets, fine_delay_meta, RFI_threshold):
+    # Expected output of the filterbank and fine delay for one virtual channel and frame.
+    #  ct1_packets : CT1 output, (75 packets, 4 components, 4096 samples)
+    #  fine_delay_meta : firmware meta data of the 64 output packets, (64, 4) = (fine X, phase X, fine Y, phase Y)
+    #                    Note the meta data has been checked against the python version already
+    # Returns fdelay_out : 64 time samples x 3456 fine channels x 2 polarisations
+    (fb_out, RFI_mark) = filterbank_expected(fb, ct1_packets, RFI_threshold)
+    return apply_fine_delay(fb_out, fine_delay_meta, RFI_mark)
+
 def main():
     # Read command-line arguments
     args = command_line_args()
@@ -424,6 +594,7 @@ def main():
         (sim_fb_meta, sim_fb_data, sim_fb_packet_count) = get_tb_fb_data(args.fbdata, total_blocks)
         filterbank_fir_taps = open(f"{args.filterbank_taps}", "rt")
         fb = filterbank.PolyphaseFilterBank(filterbank_fir_taps)
+        taps_version = golden_store.source_version(args.filterbank_taps)
         sim_fb_valid = True
         # sim_fb_data[integration_offset, frame_in_integration, fb_pkt_out, vc, 0, fine_freq]
         print("first fine frequency for first 4 virtual channels")
@@ -434,6 +605,10 @@ def main():
     else:
         sim_fb_valid = False
     
+    # Expected filterbank and fine delay output, computed once for each input
+    store = golden_store.GoldenStore(args.golden_store, enabled=not args.no_golden_store)
+    model_version = golden_store.source_version(__file__, filterbank.__file__)
+
     # Calculate the expected delays for each virtual channel
     integration_start = config["integration_start"]
     sim_frames = config["sim_frames"]
@@ -471,64 +646,14 @@ def main():
                 print(f"!!! frame {frame}, No specification for virtual channel {vc}")
             else:
                 src_cfg = config["polynomials"][vc]
-                if (src_cfg["valid0"]==1) and (integration >= src_cfg["integration0"]):
-                    cfg0_valid = True
-                else:
-                    cfg0_valid = False
-                if (src_cfg["valid1"]==1) and (integration >= src_cfg["integration1"]):
-                    cfg1_valid = True
-                else:
-                    cfg1_valid = False
-               
-                if cfg1_valid and ((not cfg0_valid) or (src_cfg["integration1"] > src_cfg["integration0"])):
-                    # select second configuration
-                    poly = src_cfg["poly1"]
-                    # sky frequency in GHz
-                    sky_freq = src_cfg["sky_freq1"]
-                    # Validity time : 32 bit buf_integration: Integration period at which the polynomial becomes valid.
-                    integration_validity = src_cfg["integration1"]
-                    # seconds from the polynomial epoch to the start of the integration period, as a double precision value
-                    buf_offset = src_cfg["buf_offset1"]
-                    # Double precision offset in ns for the second polarisation (relative to the first polarisation). 
-                    Ypol_offset = src_cfg["Ypol_offset1"]
-                else:
-                    if (not cfg0_valid) and (not cfg1_valid):
-                        print(f"No valid polynomials, ")
-                    # select first configuration
-                    poly = src_cfg["poly0"]
-                    sky_freq = src_cfg["sky_freq0"]
-                    integration_validity = src_cfg["integration0"]
-                    buf_offset = src_cfg["buf_offset0"]
-                    Ypol_offset = src_cfg["Ypol_offset0"]
+                (coarse_delay, delays, poly_valid) = packet_delays(src_cfg, integration, frame_in_integration)
+                if not poly_valid:
+                    print(f"No valid polynomials, ")
                 
                 for packet in range(75):
                     # 75 packets produced by CT1 for each frame
                     # 11 preload packets, then 64 packets.
-                    # Time in seconds in the polynomial
-                    t = buf_offset + frame_in_integration * 0.283115520 + (integration - integration_validity) * 0.849346560
-                    # Each packet is 4.4ms
-                    if packet > 10:
-                        t = t + (packet-11) * 0.00442368
-                    delay_Xpol = poly[0] + poly[1]*t + poly[2]*(t**2) + poly[3]*(t**3) + poly[4]*(t**4) + poly[5]*(t**5)
-                    delay_Ypol = delay_Xpol + Ypol_offset
-                    delay_samples_Xpol = delay_Xpol/1080.0
-                    delay_samples_Ypol = delay_Ypol/1080.0
-                    if packet == 0:
-                        coarse_delay = np.int32(np.floor(delay_samples_Xpol))
-                    fine_delay_Xpol = delay_samples_Xpol - coarse_delay
-                    fine_delay_Ypol = delay_samples_Ypol - coarse_delay
-                    if (fine_delay_Xpol >= 0):
-                        fine_delay_Xpol = np.int64(np.floor(fine_delay_Xpol * 16384*65536))
-                    else:
-                        fine_delay_Xpol = 65536*65536 - np.int64(np.floor(-fine_delay_Xpol*16384*65536))
-                    if (fine_delay_Ypol >= 0):
-                        fine_delay_Ypol = np.int64(np.floor(fine_delay_Ypol * 16384*65536))
-                    else:
-                        fine_delay_Ypol = 65536*65536 - np.int64(np.floor(-fine_delay_Ypol*16384*65536))
-                    phase_X = delay_Xpol * sky_freq
-                    phase_Y = delay_Ypol * sky_freq
-                    phase_X = np.int64(np.floor(65536*65536 * (phase_X - np.floor(phase_X))))
-                    phase_Y = np.int64(np.floor(65536*65536 * (phase_Y - np.floor(phase_Y))))
+                    (fine_delay_Xpol, phase_X, fine_delay_Ypol, phase_Y) = delays[packet]
                     
                     # print(f"VC = {vc}, (int,frame,packet) = ({integration},{frame_in_integration},{packet}) coarse = {coarse_delay}, fine X = {fine_delay_Xpol}, fine Y = {fine_delay_Ypol}, phase X = {phase_X}, phase_Y = {phase_Y}")
                     if tb_valid:
@@ -536,66 +661,19 @@ def main():
                         # Calculate which sample this packet should start at
                         # Simulation puts the sample number in the data, where the 
                         # sample number is the number of samples since the epoch
-                        first_sample = integration * 192 * 4096 + frame_in_integration * 64*4096 + packet*4096 - 6*4096 - coarse_delay
-                        
-                        # create the expected value
-                        # Apply the deripple FIR filter = c_deripple = [5,-7,12,-21,31,169,-676,504,-833,1007,-1243,1442,-1620,1756,-1842,68166,-1842,1756,-1620,1442,-1243,1007,-833,504,-676,169,31,-21,12,-7,5]
-                        # to the expected data
-                        # 
-                        # Get the expected samples that the deripple filter is applied to. Initialisation of the FIR 31 tap filter needs:
-                        #  - 15 samples extra at the front
-                        #  - total 30 samples extra
-                        # Likewise 49 tap FIR filter needs 24 extra sample at the front, 48 extra altogether.
-                        first_sample = integration * 192 * 4096 + frame_in_integration * 64*4096 + packet*4096 - 6*4096 - coarse_delay - c_fir_taps//2
-                        packet_samples = np.arange(first_sample,first_sample+4096+(c_fir_taps - 1))
-                        (expected_packet_Xre, Xre_flagged) = fix_8bit_rfi(packet_samples % 256)
-                        (expected_packet_Xim, Xim_flagged) = fix_8bit_rfi((packet_samples // 256) % 256)
-                        (expected_packet_Yre, Yre_flagged) = fix_8bit_rfi((packet_samples // 65536) % 256)
-                        (expected_packet_Yim, Yim_flagged) = fix_8bit_rfi(vc * np.ones(4096+c_fir_taps - 1))   # Yim is fixed to the virtual channel in the testbench
-                        any_flagged = Xre_flagged + Xim_flagged + Yre_flagged + Yim_flagged
-                        #if (packet == 14) and (vc == 5):
-                        #    print(f"dbg check : VC = {vc}, (int,frame,packet) = ({integration},{frame_in_integration},{packet}) coarse = {coarse_delay}")
-                        #    print(f"First 8 packet samples = {packet_samples[24:32]}")
-                        #    print(f"{expected_packet_Xre[24]},{expected_packet_Xim[24]},{expected_packet_Yre[24]},{expected_packet_Yim[24]}")
-                        #    print(f"{Xre_flagged[24:32]},{Xim_flagged[24:32]},{Yre_flagged[24:32]},{Yim_flagged[24:32]}")
+                        first_sample = ct1_first_sample(integration, frame_in_integration, coarse_delay) + packet*4096
                         
-                        for sample in range(4096):
-                            Xre = data_data[integration_offset,frame_in_integration,packet,vc,0,sample]
-                            Xim = data_data[integration_offset,frame_in_integration,packet,vc,1,sample]
-                            Yre = data_data[integration_offset,frame_in_integration,packet,vc,2,sample]
-                            Yim = data_data[integration_offset,frame_in_integration,packet,vc,3,sample]
-                            
-                            # Apply the deripple filter to the expected values
-                            expected_Xre = 0
-                            expected_Xim = 0
-                            expected_Yre = 0
-                            expected_Yim = 0
-                            for FIR_tap in range(c_fir_taps):
-                                expected_Xre = expected_Xre + deripple[FIR_tap] * expected_packet_Xre[sample + FIR_tap]
-                                expected_Xim = expected_Xim + deripple[FIR_tap] * expected_packet_Xim[sample + FIR_tap]
-                                expected_Yre = expected_Yre + deripple[FIR_tap] * expected_packet_Yre[sample + FIR_tap]
-                                expected_Yim = expected_Yim + deripple[FIR_tap] * expected_packet_Yim[sample + FIR_tap]
-                                #if (sample == 0) and (packet == 0) and (vc == 0):
-                                #    print(f"FIR {FIR_tap}, FIR tap = {c_deripple[FIR_tap]}, data = {expected_packet_Xre[sample + FIR_tap]}, cumulative sum = {expected_Xre}")
-                            
-                            if any_flagged[sample + c_fir_taps//2]:
-                                expected_Xre = -32768
-                                expected_Xim = -32768
-                                expected_Yre = -32768
-                                expected_Yim = -32768
-                            else:
-                                # divide by 512, convergent round to even
-                                expected_Xre = np.round(expected_Xre / 512)
-                                expected_Xim = np.round(expected_Xim / 512)
-                                expected_Yre = np.round(expected_Yre / 512)
-                                expected_Yim = np.round(expected_Yim / 512)
-                            if (expected_Xre != Xre) or (expected_Xim != Xim) or (expected_Yre != Yre) or (expected_Yim != Yim):
-                                if data_mismatch < 20:
-                                    print(f"Bad sample : VC = {vc}, (int,frame,packet) = ({integration},{frame_in_integration},{packet}) coarse = {coarse_delay}")
-                                    print(f"   At sample {sample}, expected ({expected_Xre},{expected_Xim},{expected_Yre},{expected_Yim}), testbench = ({Xre},{Xim},{Yre},{Yim})")
-                                data_mismatch += 1
-                            else:
-                                data_match += 1 
+                        # create the expected value, see expected_ct1_packet()
+                        first_sample = first_sample - c_fir_taps//2
+                        expected = expected_ct1_packet(first_sample, vc, deripple)
+                        actual = data_data[integration_offset,frame_in_integration,packet,vc]
+                        bad_samples = np.nonzero(np.any(expected != actual, axis=0))[0]
+                        for sample in bad_samples:
+                            if data_mismatch < 20:
+                                print(f"Bad sample : VC = {vc}, (int,frame,packet) = ({integration},{frame_in_integration},{packet}) coarse = {coarse_delay}")
+                                print(f"   At sample {sample}, expected ({expected[0,sample]},{expected[1,sample]},{expected[2,sample]},{expected[3,sample]}), testbench = ({actual[0,sample]},{actual[1,sample]},{actual[2,sample]},{actual[3,sample]})")
+                            data_mismatch += 1
+                        data_match += 4096 - len(bad_samples)
                         # Compare fine delays
                         fine_delay_Xpol_tb = meta_data[integration_offset,frame_in_integration,packet,vc,0]
                         phase_X_tb = meta_data[integration_offset,frame_in_integration,packet,vc,1]
@@ -614,120 +692,44 @@ def main():
                 
                 if sim_fb_valid:
                     # Get the data from the CT1 output from the testbench, and calculate the expected output
-                    # from the filterbank
-                    fb_in = np.zeros(75*4096, dtype = np.complex128)
-                    fb_in_RFI = np.zeros(75*4096, dtype = np.int32)
-                    # filterbank output : 64 time samples x 3456 fine channels x 2 polarisations
-                    fb_out = np.zeros((64,3456,2), dtype = np.complex128)
-                    # Fine delay module output, same shape as the filterbank output
-                    fdelay_out = np.zeros((64,3456,2), dtype = np.complex128)
-                    # RFI marking : 2 polarisations x 64 time samples
-                    RFI_sum = np.zeros((2,64), dtype = np.int64)
-                    RFI_mark = np.zeros((2,64), dtype = np.int32) 
-                    for pol in range(2):
-                        for packet in range(75):
-                            for sample in range(4096):
-                                Xre = data_data[integration_offset,frame_in_integration,packet,vc,pol*2 + 0,sample]
-                                Xim = data_data[integration_offset,frame_in_integration,packet,vc,pol*2 + 1,sample]
-                                if ((Xre == -32768) or (Xim == -32768)):
-                                    fb_in[packet*4096 + sample] = 0
-                                    fb_in_RFI[packet*4096 + sample] = 1
-                                else:
-                                    fb_in[packet*4096 + sample] = Xre + 1j * Xim
-                                    fb_in_RFI[packet*4096 + sample] = 0
-                        
-                        fb_out[:,:,pol] = fb.filter(fb_in, time_steps=64, derotate=False, preload_zeros=0, saturate=False, fft_scale=8192)
-                        
-                        #print(f"Sim filterbank input vc = {vc}")
-                        #print(fb_in[0:20])
-                        #print(f"Sim filterbank output vc = {vc}")
-                        #print(fb_out[0,0:20,0])
-                        
-                        # RFI calculation
-                        for fb_pkt_out in range(64): # 64 output packets from the filterbank
-                            fb_out96x512 = np.reshape(fb_in_RFI[fb_pkt_out * 4096 : (fb_pkt_out * 4096 + 12*4096)],(96,512))
-                            fb_out512x96_RFI = fb_out96x512.T
-                            RFI_sum[pol,fb_pkt_out] = np.sum(fb_out512x96_RFI * RFI_analysis)
-                            
-                            if (vc == 0) and (fb_pkt_out == 0):
-                                print('asdfasd')
-                                print(fb_in[0:10])
-                                print("rfi info : ")
-                                print(f"{np.sum(fb_out512x96_RFI,0)}")
-                                print(f"fb_pkt_out = {fb_pkt_out}, pol = {pol}, RFI_sum = {RFI_sum[pol,fb_pkt_out]}")
-                            
-                            if ((RFI_thresholds[vc] < 4294967295) and (RFI_sum[pol, fb_pkt_out] > RFI_thresholds[vc])):
-                                RFI_mark[pol, fb_pkt_out] = 1
-                    for fb_pkt_out in range(64):                        
-                        # Apply the fine delay
-                        # Get the fine delay from the firmware meta data 
-                        # Note the meta data has been checked against the python version already
-                        meta_pkt = fb_pkt_out + 11  # +11 to drop meta data for the preload packets
-                        fine_delay_Xpol_tb = meta_data[integration_offset, frame_in_integration, meta_pkt, vc, 0]
-                        phase_X_tb = meta_data[integration_offset, frame_in_integration, meta_pkt, vc, 1]
-                        fine_delay_Ypol_tb = meta_data[integration_offset, frame_in_integration, meta_pkt, vc, 2]
-                        phase_Y_tb = meta_data[integration_offset, frame_in_integration, meta_pkt, vc, 3]
-                        
-                        # Apply the fine delay to the filterbank output
-                        for fine_freq in range(3456):
-                            xpol = (1/128) * fb_out[fb_pkt_out, fine_freq, 0] * np.exp(-1j * 2 * np.pi * (1/(2**32)) * (phase_X_tb + 2*fine_delay_Xpol_tb * (fine_freq-1728)/2048))
-                            ypol = (1/128) * fb_out[fb_pkt_out, fine_freq, 1] * np.exp(-1j * 2 * np.pi * (1/(2**32)) * (phase_Y_tb + 2*fine_delay_Ypol_tb * (fine_freq-1728)/2048))
-                            # Mark out of range values as RFI
-                            if (np.real(xpol) > 127) or (np.real(xpol) < -127):
-                                xpol_re = -128
-                            else:
-                                xpol_re = np.real(xpol)
-                            if (np.imag(xpol) > 127) or (np.imag(xpol) < -127):
-                                xpol_im = -128
-                            else:
-                                xpol_im = np.imag(xpol)
-                                
-                            if (np.real(ypol) > 127) or (np.real(ypol) < -127):
-                                ypol_re = -128
-                            else:
-                                ypol_re = np.real(ypol)
-                            if (np.imag(ypol) > 127) or (np.imag(ypol) < -127):
-                                ypol_im = -128
-                            else:
-                                ypol_im = np.imag(ypol)
-                            
-                            fdelay_out[fb_pkt_out, fine_freq, 0] = xpol_re + 1j * xpol_im
-                            fdelay_out[fb_pkt_out, fine_freq, 1] = ypol_re + 1j * ypol_im
-                        
-                        # Replace RFI marked values with -128
-                        if ((RFI_mark[0, fb_pkt_out] == 1) or (RFI_mark[1, fb_pkt_out] == 1)):
-                            for fine_freq in range(3456):
-                                fdelay_out[fb_pkt_out, fine_freq, 0] = -128 - 1j * 128
-                                fdelay_out[fb_pkt_out, fine_freq, 1] = -128 - 1j * 128
-                    
-                        # Compare with the simulation output
-                        # sim_fb_data has dimensions (integration, frame, packet, virtual_channel, component, fine_channel)
-                        #  Note 4 "components" : (H pol re, H pol im, V pol re, V pol im)
-                        
-                        for fine_freq in range(3456):
-                            Xre = sim_fb_data[integration_offset, frame_in_integration, fb_pkt_out, vc, 0, fine_freq]
-                            Xim = sim_fb_data[integration_offset, frame_in_integration, fb_pkt_out, vc, 1, fine_freq]
-                            Yre = sim_fb_data[integration_offset, frame_in_integration, fb_pkt_out, vc, 2, fine_freq]
-                            Yim = sim_fb_data[integration_offset, frame_in_integration, fb_pkt_out, vc, 3, fine_freq]
-                            p_Xre = np.real(fdelay_out[fb_pkt_out, fine_freq, 0])
-                            p_Xim = np.imag(fdelay_out[fb_pkt_out, fine_freq, 0])
-                            p_Yre = np.real(fdelay_out[fb_pkt_out, fine_freq, 1])
-                            p_Yim = np.imag(fdelay_out[fb_pkt_out, fine_freq, 1])
-                            
-                            Emax = np.max([rfi_diff(Xre,p_Xre), rfi_diff(Xim,p_Xim), rfi_diff(Yre,p_Yre), rfi_diff(Yim,p_Yim)])
-                            if (Emax > 2):
-                                fd_mismatch += 1
-                                if (fd_mismatch < 20):
-                                    print(f"fine delay output mismatch at integration {integration}, frame {frame_in_integration}, packet {fb_pkt_out}, vc {vc}, fine frequency {fine_freq}")
-                                    print(f"  Expected ({p_Xre} + 1i * {p_Xim}, {p_Yre} + 1i * {p_Yim}), Simulation ({Xre} + 1i * {Xim}, {Yre} + 1i * {Yim})")
-                            else:
-                                fd_match += 1
+                    # from the filterbank and the fine delay, see fine_delay_expected().
+                    # The expected output only depends on the inputs below, so it is kept in the golden store.
+                    ct1_packets = data_data[integration_offset, frame_in_integration, :, vc]
+                    # Fine delay from the firmware meta data, drop meta data for the 11 preload packets
+                    fine_delay_meta = meta_data[integration_offset, frame_in_integration, 11:75, vc]
+                    if vc == 0:
+                        print_rfi_info(ct1_packets)
+                    fdelay_out = store.cached(
+                        'ct1_fine_delay', model_version,
+                        lambda: {'fdelay_out': fine_delay_expected(fb, ct1_packets, fine_delay_meta, RFI_thresholds[vc])},
+                        ct1_output=golden_store.array_digest(ct1_packets, fine_delay_meta),
+                        RFI_threshold=RFI_thresholds[vc],
+                        filterbank_taps=taps_version)['fdelay_out']
+
+                    # Compare with the simulation output
+                    # sim_fb_data has dimensions (integration, frame, packet, virtual_channel, component, fine_channel)
+                    #  Note 4 "components" : (H pol re, H pol im, V pol re, V pol im)
+                    sim = sim_fb_data[integration_offset, frame_in_integration, 0:64, vc]
+                    expected = np.stack([np.real(fdelay_out[:,:,0]), np.imag(fdelay_out[:,:,0]),
+                                         np.real(fdelay_out[:,:,1]), np.imag(fdelay_out[:,:,1])], axis=1)
+                    Emax = np.max(rfi_diff_array(sim, expected), axis=1)
+                    bad = Emax > 2
+                    bad_index = np.argwhere(bad)
+                    for (fb_pkt_out, fine_freq) in bad_index:
+                        fd_mismatch += 1
+                        if (fd_mismatch < 20):
+                            p_Xre, p_Xim, p_Yre, p_Yim = expected[fb_pkt_out, :, fine_freq]
+                            Xre, Xim, Yre, Yim = sim[fb_pkt_out, :, fine_freq]
+                            print(f"fine delay output mismatch at integration {integration}, frame {frame_in_integration}, packet {fb_pkt_out}, vc {vc}, fine frequency {fine_freq}")
+                            print(f"  Expected ({p_Xre} + 1i * {p_Xim}, {p_Yre} + 1i * {p_Yim}), Simulation ({Xre} + 1i * {Xim}, {Yre} + 1i * {Yim})")
+                    fd_match += bad.size - len(bad_index)
                                                         
     if tb_valid:
         print(f"checked {sim_frames} frames against simulation")
         print(f"    data sample mismatch = {data_mismatch}, data samples matched = {data_match} ")
         print(f"    meta data mismatch = {meta_mismatch}, meta data matched = {meta_match}")
     if sim_fb_valid:
+        print(f"    {store.summary()}")
         print(f"    fine delay output mismatch = {fd_mismatch}, match count = {fd_match}")
 
 if __name__ == "__main__":
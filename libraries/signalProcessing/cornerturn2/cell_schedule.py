@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+cell_schedule.py  --  Correlator cell schedule and visibility HBM throughput
+                      estimate of the subarray-beam tables.
+
+Usage:
+    python3 cell_schedule.py <top_vhdl_file | sb_list_file> [options]
+    python3 cell_schedule.py --sweep-stations 16 4096 --n-fine 3456 --fine-per-int 24
+
+For each correlator core (SB table) and each SB, per 849 ms frame:
+  cells          : vis_check.cells_per_integration(), a triangle of
+                   ceil(stations/16) cells per output channel and output time
+  HBM write      : cells * (8192 + 512) bytes (visibilities + TCI/DV,
+                   correlator_HBM.vhd)
+  wrap time      : time to fill the circular buffer of cor0_HBM_size cells
+                   (default 32768 = 256 MBytes, correlator_HBM.vhd)
+  readout        : SPEAD data item bytes sent to SDP, 34 bytes per baseline
+                   per output channel and output time (vis_spead_decode.py)
+  compute        : 64 clocks per cell per 64 time samples and fine channel
+                   (correlator_top_v80.vhd), at --clock-mhz
+
+A configuration fails when the compute time of a correlator core is more
+than the 849 ms frame.  A circular buffer that wraps within one frame is
+reported as a warning: the readout must then keep up with the writes within
+the frame, the cells are not all held until the end of the integration.
+
+All estimates are numpy expressions that broadcast over the SB parameters,
+so a sweep over stations and fine channels is a single call.
+The SB list file format is that of ct2_hbm_plan.py; the SBs are assigned to
+the correlators by the planner.
+"""
+
+import os
+import sys
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import ct2_config  # noqa: E402  (sibling module, shared test configuration)
+import ct2_hbm_plan  # noqa: E402  (SB list file and correlator assignment)
+import vis_check  # noqa: E402  (cell production order)
+import vis_spead_decode  # noqa: E402  (output baseline format)
+
+FRAME_SECONDS = 192 * 4.42368e-3             # 849.34656 ms, 192 x 4.42368 ms samples
+CELL_BYTES = vis_check.CELL_VIS_BYTES + vis_check.CELL_TCI_BYTES
+HBM_CELLS = 32768                           # 256 MBytes / 8192 bytes, correlator_HBM.vhd
+CLOCK_MHZ = 412.5                           # minimum correlator clock, correlator_top_v80.vhd
+TIMES_PER_FRAME = 192
+
+
+# ---------------------------------------------------------------------------
+# Vectorised estimates
+# ---------------------------------------------------------------------------
+
+def estimate(n_stations, n_fine, n_fine_integrate, n_time_integrate,
+             hbm_cells=HBM_CELLS, clock_mhz=CLOCK_MHZ):
+    """
+    Estimate the load of SBs, numpy arrays broadcast against each other.
+    Returns a dict of arrays, rates are per second:
+      cells         : cells per 849 ms frame
+      hbm_write_bps : visibility HBM write bandwidth (bytes/s)
+      wrap_seconds  : circular buffer wrap time if only this SB is active
+      readout_bps   : SPEAD data item bandwidth to SDP (bytes/s)
+      compute_seconds : correlator time per frame
+    """
+    n_stations = np.asarray(n_stations, dtype=np.int64)
+    cells = vis_check.cells_per_integration(n_stations, n_fine, n_fine_integrate, n_time_integrate)
+    g = (n_stations + 15) // 16
+    spatial_cells = g * (g + 1) // 2
+    n_output = cells // np.maximum(spatial_cells, 1)   # output channels x output times
+    hbm_write_bps = cells * CELL_BYTES / FRAME_SECONDS
+    with np.errstate(divide='ignore'):
+        wrap_seconds = np.where(cells > 0, hbm_cells * FRAME_SECONDS / np.maximum(cells, 1), np.inf)
+    readout = n_output * vis_spead_decode.baseline_count(n_stations) * vis_spead_decode.VIS_DTYPE.itemsize
+    clocks = spatial_cells * np.asarray(n_fine, dtype=np.int64) * TIMES_PER_FRAME   # 1 clock per cell and time sample
+    return {'cells': cells, 'hbm_write_bps': hbm_write_bps, 'wrap_seconds': wrap_seconds,
+            'readout_bps': readout / FRAME_SECONDS, 'compute_seconds': clocks / (clock_mhz * 1e6)}
+
+
+def sb_arrays(sbs):
+    """(n_stations, n_fine, n_fine_integrate, n_time_integrate) arrays of enabled vis_check SB dicts."""
+    sbs = [sb for sb in sbs if sb['n_stations'] > 0 and not sb['output_disable']]
+    return tuple(np.array([sb[k] for sb in sbs], dtype=np.int64)
+                 for k in ('n_stations', 'n_fine', 'n_fine_integrate', 'n_time_integrate'))
+
+
+def table_estimate(sbs, hbm_cells=HBM_CELLS, clock_mhz=CLOCK_MHZ):
+    """
+    Estimate of one SB table (correlator core), vis_check SB dicts.
+    Returns (per SB dict of arrays, totals dict) with the totals flags
+    'compute_over' (frame does not fit the budget) and 'wraps' (the
+    circular buffer wraps within one frame).
+    """
+    per_sb = estimate(*sb_arrays(sbs), hbm_cells=hbm_cells, clock_mhz=clock_mhz)
+    total = {k: per_sb[k].sum() for k in ('cells', 'hbm_write_bps', 'readout_bps', 'compute_seconds')}
+    total['wrap_seconds'] = hbm_cells * FRAME_SECONDS / total['cells'] if total['cells'] else np.inf
+    total['compute_over'] = total['compute_seconds'] > FRAME_SECONDS
+    total['wraps'] = total['wrap_seconds'] < FRAME_SECONDS
+    return per_sb, total
+
+
+# ---------------------------------------------------------------------------
+# Configuration input
+# ---------------------------------------------------------------------------
+
+def read_tables(filename):
+    """Return [sbs of correlator 0, sbs of correlator 1] as vis_check SB dicts."""
+    if filename.endswith(('.vhd', '.yaml', '.yml')):
+        cfg = ct2_config.load_config(filename)
+        return [cfg.sbs_full(c, in_use=True) for c in range(ct2_hbm_plan.N_CORRELATORS)]
+    planned = ct2_hbm_plan.plan(ct2_hbm_plan.read_sb_list(filename))
+    return [vis_check.decode_sb_table_full(ct2_hbm_plan.sb_table_words(planned, c))
+            [:sum(sb['correlator'] == c for sb in planned)] for c in range(ct2_hbm_plan.N_CORRELATORS)]
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def _rate(bps):
+    return f"{8 * bps / 1e9:8.3f} Gb/s"
+
+
+def print_table(corr, sbs, hbm_cells, clock_mhz):
+    per_sb, total = table_estimate(sbs, hbm_cells, clock_mhz)
+    enabled = [i for i, sb in enumerate(sbs) if sb['n_stations'] > 0 and not sb['output_disable']]
+    print(f"  --- correlator {corr}: {len(enabled)} enabled SB(s) ---")
+    for k, i in enumerate(enabled):
+        sb = sbs[i]
+        print(f"    SB {i:3d}: stations={sb['n_stations']:4d} n_fine={sb['n_fine']:6d} "
+              f"fine_per_int={sb['n_fine_integrate']:3d} n_time={sb['n_time_integrate']:3d} "
+              f"cells={per_sb['cells'][k]:8d} HBM write {_rate(per_sb['hbm_write_bps'][k])} "
+              f"readout {_rate(per_sb['readout_bps'][k])} compute {1e3 * per_sb['compute_seconds'][k]:8.2f} ms")
+    print(f"    total : cells/frame={total['cells']} HBM write {_rate(total['hbm_write_bps'])} "
+          f"readout {_rate(total['readout_bps'])}")
+    print(f"            compute {1e3 * total['compute_seconds']:.2f} ms of {1e3 * FRAME_SECONDS:.2f} ms"
+          f"{'  ** OVER BUDGET **' if total['compute_over'] else ''}")
+    print(f"            HBM buffer of {hbm_cells} cells wraps every {total['wrap_seconds'] * 1e3:.2f} ms"
+          f"{'  (WARNING: wraps within one frame)' if total['wraps'] else ''}")
+    return total['compute_over']
+
+
+def print_sweep(args):
+    stations = np.arange(args.sweep_stations[0], args.sweep_stations[1] + 1, args.step)
+    e = estimate(stations, args.n_fine, args.fine_per_int, 192 if args.int_ms == 849 else 64,
+                 args.hbm_cells, args.clock_mhz)
+    print(" stations      cells  HBM write (Gb/s)  readout (Gb/s)  wrap (ms)  compute (ms)")
+    for i, n in enumerate(stations):
+        over = e['compute_seconds'][i] > FRAME_SECONDS
+        print(f" {n:8d} {e['cells'][i]:10d} {8e-9 * e['hbm_write_bps'][i]:17.3f} {8e-9 * e['readout_bps'][i]:15.3f}"
+              f" {1e3 * e['wrap_seconds'][i]:10.2f} {1e3 * e['compute_seconds'][i]:13.2f}{'  **' if over else ''}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Estimate correlator cell schedule and visibility HBM throughput")
+    ap.add_argument('config', nargs='?', help="Top-level VHDL wrapper or ct2_hbm_plan.py SB list file")
+    ap.add_argument('--hbm-cells', type=int, default=HBM_CELLS,
+                    help=f"visibility circular buffer size in cells (cor0_HBM_size), default {HBM_CELLS}")
+    ap.add_argument('--clock-mhz', type=float, default=CLOCK_MHZ,
+                    help=f"correlator processing clock, default {CLOCK_MHZ}")
+    ap.add_argument('--sweep-stations', type=int, nargs=2, metavar=('FIRST', 'LAST'),
+                    help="print the estimate of a single SB for a range of station counts")
+    ap.add_argument('--step', type=int, default=16, help="station step of the sweep, default 16")
+    ap.add_argument('--n-fine', type=int, default=3456, help="fine channels of the sweep SB, default 3456")
+    ap.add_argument('--fine-per-int', type=int, default=24, help="fine channels per integration, default 24")
+    ap.add_argument('--int-ms', type=int, default=849, choices=[849, 283], help="integration time, default 849")
+    args = ap.parse_args()
+
+    if args.sweep_stations:
+        print_sweep(args)
+        sys.exit(0)
+    if args.config is None:
+        ap.error("a configuration file or --sweep-stations is required")
+    try:
+        tables = read_tables(args.config)
+    except ValueError as e:
+        print(f"FAIL: {e}")
+        sys.exit(2)
+    over = [print_table(c, sbs, args.hbm_cells, args.clock_mhz) for c, sbs in enumerate(tables)]
+    if any(over):
+        print("FAIL: configuration exceeds the 849 ms budget")
+        sys.exit(1)
+    print("PASS: configuration fits the 849 ms budget")
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,7 +3,12 @@
 ct2_check.py  --  Verify CT2 HBM contents against expected values.
 
 Usage:
-    python3 ct2_check.py <top_vhdl_file> <hbm_dump_file>
+    python3 ct2_check.py <top_vhdl_file> <hbm_dump_file> [--follow [--max-fail N]]
+
+With --follow the dump file (or a named pipe the testbench writes the dump
+lines into) is read while the simulation runs, and each 256 byte block is
+checked as soon as all its words are written, so a long simulation can be
+stopped at the first failures.
 
 The top-level VHDL wrapper (e.g. ct2_test5_top.vhd) instantiates ct2_v80_tb
 with a generic map containing the full test configuration.  This script parses
@@ -26,12 +31,13 @@ Data encoding in the testbench (ct2_v80_tb.vhd):
     Vpol.re  = (t_within_frame & 0x3F) | ((f & 0x03) << 6)
     Vpol.im  = vc & 0xFF
 
-HBM address formula (from get_ct2_HBM_addr_v80.vhd, 4-buffer split):
+HBM address formula (from get_ct2_HBM_addr_v80.vhd, 4-buffer split, see ct2_hbm_addr.py):
   fc_group     = fc % 4   (= i_fine_channel[1:0], selects the 4 GB HBM region)
-  within_region = SB_base + 256 * ((fine_ch_rel // 4) * 12 * n_sg  +  tb * n_sg  +  sg)
+  within_region = SB_base + 256 * (fine_slot * 12 * n_sg  +  tb * n_sg  +  sg)
   physical_addr = (fc_group << 32) | within_region
   where:
-    fine_ch_rel = (coarse_channel*3456 + fc) - (SB_coarseStart*3456 + SB_fineStart)
+    fine_slot   = (coarse_channel*3456 + fc)//4 - (SB_coarseStart*3456 + SB_fineStart)//4
+    SB_base     = 4 * hbm_base of the SB table (units of 4 bytes)
     n_sg        = ceil(SB_stations / 4)
     tb          = time_block (0..11, each covering 16 consecutive time samples)
     sg          = station_group = station // 4
@@ -47,131 +53,20 @@ Within-block layout (256 bytes = 8 AXI beats of 32 bytes each):
     bytes s*4+3: Vpol.im
 """
 
-import re
+import os
 import sys
-import math
+import stat
+import time
+import select
 import argparse
-from pathlib import Path
-
-
-# ---------------------------------------------------------------------------
-# VHDL generic-map parser
-# ---------------------------------------------------------------------------
-
-def _strip_comments(text):
-    """Remove VHDL single-line comments."""
-    return re.sub(r'--[^\n]*', '', text)
-
-
-def _find_generic_map(text):
-    """Return the content between the outermost generic map ( ... )."""
-    m = re.search(r'\bgeneric\s+map\s*\(', text, re.IGNORECASE)
-    if not m:
-        raise ValueError("No 'generic map' found in file")
-    start = m.end()
-    depth = 1
-    i = start
-    while i < len(text) and depth:
-        if text[i] == '(':
-            depth += 1
-        elif text[i] == ')':
-            depth -= 1
-        i += 1
-    return text[start:i - 1]
-
-
-def _parse_hex_array(s):
-    """Parse a VHDL array aggregate like (x"AABB", x"1122", ...) -> list[int]."""
-    items = re.findall(r'x"([0-9A-Fa-f]+)"', s)
-    return [int(h, 16) for h in items]
-
-
-def parse_generic_map(vhdl_file):
-    """
-    Parse a ct2_*_top.vhd wrapper and return a dict of generic values.
-    Keys match the generic names in ct2_v80_tb (lower-case, without g_ prefix).
-    """
-    text = _strip_comments(Path(vhdl_file).read_text())
-    gm   = _find_generic_map(text)
 
-    result = {}
+import numpy as np
 
-    def _int(name):
-        m = re.search(rf'\b{name}\s*=>\s*(\d+)', gm, re.IGNORECASE)
-        if m:
-            result[name.lower().lstrip('g_')] = int(m.group(1))
+from ct2_config import (DEMAP_FIELDS, SB_FIELDS, decode_demap, decode_sb_table,  # noqa: E402,F401  (re-exported)
+                        load_config, parse_generic_map, N_CORRELATORS, SB_ID_PER_CORRELATOR)
+from ct2_hbm_addr import BLOCK_BYTES, ct2_block_addr, ct2_hbm_locate, physical_addr, block_byte_offset  # noqa: E402
 
-    def _hex16(name):
-        m = re.search(rf'\b{name}\s*=>\s*x"([0-9A-Fa-f]+)"', gm, re.IGNORECASE)
-        if m:
-            result[name.lower().lstrip('g_')] = int(m.group(1), 16)
-
-    def _string(name):
-        m = re.search(rf'\b{name}\s*=>\s*"([^"]*)"', gm, re.IGNORECASE)
-        if m:
-            result[name.lower().lstrip('g_')] = m.group(1)
-
-    def _array(name):
-        m = re.search(rf'\b{name}\s*=>\s*(\(.*?\))', gm, re.IGNORECASE | re.DOTALL)
-        if m:
-            result[name.lower().lstrip('g_')] = _parse_hex_array(m.group(1))
-
-    _int('g_VIRTUAL_CHANNELS')
-    _int('g_CORRELATOR_CORES')
-    _int('g_BAD_POLY_PACKETS')
-    _int('g_SIM_DURATION_US')
-    _hex16('g_BAD_POLY_VC')
-    _string('g_HBM_DUMP_FILE')
-    _array('g_SB_COUNTS')
-    _array('g_DEMAP_TABLE')
-    _array('g_SB_C0_TABLE')
-    _array('g_SB_C1_TABLE')
-
-    return result
-
-
-# ---------------------------------------------------------------------------
-# Configuration decoding
-# ---------------------------------------------------------------------------
-
-def decode_demap(demap_words, virtual_channels):
-    """
-    Return a list indexed by VC (0..virtual_channels-1) of dicts:
-      {'valid', 'sky_freq_idx', 'station', 'sb_id'}
-    Demap table has 2 words per group of 4 VCs.
-    """
-    result = []
-    for vc in range(virtual_channels):
-        group  = vc // 4
-        word0  = demap_words[group * 2] if group * 2 < len(demap_words) else 0
-        valid       = (word0 >> 31) & 1
-        sky_freq    = (word0 >> 20) & 0x1FF
-        station     = (word0 >>  8) & 0xFFF
-        sb_id       = (word0 >>  0) & 0xFF
-        result.append({'valid': valid, 'sky_freq_idx': sky_freq,
-                       'station': station + (vc % 4), 'sb_id': sb_id})
-    return result
-
-
-def decode_sb_table(sb_words, correlator_id=0):
-    """
-    Return a list of SB dicts from a flat 4-words-per-SB array.
-    """
-    sbs = []
-    n = len(sb_words) // 4
-    for i in range(n):
-        w0, w1, w2, w3 = sb_words[i*4:(i+1)*4]
-        sbs.append({
-            'stations':     w0 & 0xFFFF,
-            'coarse_start': (w0 >> 16) & 0xFFFF,
-            'fine_start':   w1 & 0xFFFF,
-            'num_fine':     w2 & 0xFFFFFF,
-            'fine_per_int': (w2 >> 24) & 0x7F,
-            'int_mode_849': (w2 >> 31) & 1,
-            'hbm_base':     w3,
-            'correlator':   correlator_id,
-        })
-    return sbs
+MAX_DETAIL = 20   # default number of bad samples that are printed
 
 
 # ---------------------------------------------------------------------------
@@ -213,6 +108,53 @@ def dump_read_byte(dump, byte_addr):
     return (word >> (byte_in_word * 8)) & 0xFF
 
 
+def follow_dump(filename, interval=1.0, idle_timeout=60.0):
+    """
+    Follow a dump file that is still being written, or a named pipe the
+    testbench writes the dump lines into, in the load_dump() format.
+
+    Yields a dict byte-address -> 32-bit word of the complete lines added
+    since the previous yield (an empty dict while nothing changes, every
+    interval seconds).  Stops when a pipe is closed by the writer, or when a
+    file has not grown for idle_timeout seconds (simulation finished).
+    """
+    is_fifo = stat.S_ISFIFO(os.stat(filename).st_mode)
+    fd = os.open(filename, os.O_RDONLY)
+    partial = b''
+    pos = 0
+    last_change = time.monotonic()
+    try:
+        while True:
+            if is_fifo:
+                ready, _, _ = select.select([fd], [], [], interval)
+                data = os.read(fd, 1 << 22) if ready else b''
+                if ready and not data:
+                    return
+            else:
+                if os.fstat(fd).st_size < pos:
+                    print(f"  WARNING: {filename} was truncated, reading from the start")
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    partial, pos = b'', 0
+                data = os.read(fd, 1 << 24)
+                pos += len(data)
+            words = {}
+            if data:
+                last_change = time.monotonic()
+                lines = (partial + data).split(b'\n')
+                partial = lines.pop()
+                for line in lines:
+                    parts = line.split()
+                    if len(parts) == 2:
+                        words[int(parts[0], 16)] = int(parts[1], 16)
+            elif not is_fifo:
+                if time.monotonic() - last_change > idle_timeout:
+                    return
+                time.sleep(interval)
+            yield words
+    finally:
+        os.close(fd)
+
+
 # ---------------------------------------------------------------------------
 # Expected-value computation
 # ---------------------------------------------------------------------------
@@ -231,61 +173,77 @@ def expected_sample(vc, fine_ch, time_sample_849ms, integration=0):
     return hpol_re, hpol_im, vpol_re, vpol_im
 
 
-def block_byte_offset(time_within_block, station_within_group):
+def check_block(dump, phys_addr, vc, fc, time_block, station, n_bad_before=0, max_detail=20):
     """
-    Byte offset within a 256-byte HBM block for a given
-    time-sample-within-block (0..15) and station-within-group (0..3).
-
-    Layout (from corr_ct2_din_v80.vhd bufWrData packing):
-      Beat k (32 bytes) covers time samples 2k and 2k+1.
-        Lower 16 bytes: time 2k,   stations 0-3 each with {Hpol.re,Hpol.im,Vpol.re,Vpol.im}
-        Upper 16 bytes: time 2k+1, stations 0-3
+    Check the 16 samples of one station in the 256-byte block at phys_addr,
+    return the number of bad samples.  Details are printed while the total
+    number of bad samples (n_bad_before + this block) is at most max_detail.
     """
-    beat     = time_within_block // 2   # 0..7
-    parity   = time_within_block %  2   # 0=even, 1=odd
-    return beat * 32 + parity * 16 + station_within_group * 4
+    fc_group      = fc & 3
+    station_group = station // 4
+    s_in_group    = station %  4
+    n_bad = 0
+    for t_in_block in range(16):
+        time_849ms = time_block * 16 + t_in_block
+        exp = expected_sample(vc, fc, time_849ms, integration=0)
+        off = int(block_byte_offset(t_in_block, s_in_group))
+
+        act = tuple(
+            dump_read_byte(dump, phys_addr + off + b)
+            for b in range(4)
+        )
+        if None in act:
+            # Word containing this sample was not written
+            n_bad += 1
+            if n_bad_before + n_bad <= max_detail:
+                print(f"  MISSING   addr=0x{phys_addr:010X}+0x{off:02X}"
+                      f" vc={vc} fc={fc} tb={time_block} t={t_in_block}"
+                      f" fc_grp={fc_group} st_grp={station_group} s_in={s_in_group}")
+            continue
+
+        if act != exp:
+            n_bad += 1
+            if n_bad_before + n_bad <= max_detail:
+                print(f"  MISMATCH  addr=0x{phys_addr:010X}+0x{off:02X}"
+                      f" vc={vc} fc={fc} tb={time_block} t={t_in_block}"
+                      f" fc_grp={fc_group} st_grp={station_group} s_in={s_in_group}"
+                      f"  expected=({exp[0]:02X},{exp[1]:02X},"
+                      f"{exp[2]:02X},{exp[3]:02X})"
+                      f"  actual=({act[0]:02X},{act[1]:02X},"
+                      f"{act[2]:02X},{act[3]:02X})")
+    return n_bad
 
 
 # ---------------------------------------------------------------------------
 # Main checker
 # ---------------------------------------------------------------------------
 
-def check(cfg, dump):
+def check(cfg, dump, max_detail=MAX_DETAIL):
     """
     Returns (n_blocks_checked, n_blocks_bad, n_samples_bad, n_unwritten).
-    Prints details of the first few mismatches.
+    Prints details of the first max_detail mismatches.
 
+    cfg is the ct2_config.Ct2Config of the test top.
     dump is a dict mapping byte_address (int) -> 32-bit word (int),
     as returned by load_dump().  Missing addresses were never written.
-    Physical address layout (4-buffer split):
+    Physical address layout (4-buffer split, ct2_hbm_addr.physical_addr()):
       bits 33:32 = fc_group = fc % 4  (selects the 4 GB HBM region)
-      bits 31:0  = SB_base + 256 * (fine_ch_rel*12*n_sg + tb*n_sg + sg)
+      bits 31:0  = SB_base + 256 * (fine_slot*12*n_sg + tb*n_sg + sg)
     """
-    demap_words  = cfg.get('demap_table', [0])
-    sb_c0_words  = cfg.get('sb_c0_table', [0])
-    sb_c1_words  = cfg.get('sb_c1_table', [0])
-    sb_counts    = cfg.get('sb_counts',   [1, 0, 0, 0])
-    virt_chs     = cfg.get('virtual_channels', 12)
-
-    demap = decode_demap(demap_words, virt_chs)
+    demap = cfg.demap_list()
 
     # Build mapping: sb_id -> sb_config
     sb_by_id = {}
-    for corr in range(2):
-        sb_arr = sb_c0_words if corr == 0 else sb_c1_words
-        sbs    = decode_sb_table(sb_arr, corr)
-        id_base = 128 * corr
-        for idx, sb in enumerate(sbs):
-            sb_by_id[id_base + idx] = sb
+    for corr in range(N_CORRELATORS):
+        for idx, sb in enumerate(cfg.sbs(corr)):
+            sb_by_id[SB_ID_PER_CORRELATOR * corr + idx] = sb
 
     n_blocks_checked = 0
     n_blocks_bad     = 0
     n_samples_bad    = 0
     n_unwritten      = 0
-    MAX_DETAIL       = 20
 
-    for vc in range(virt_chs):
-        dm = demap[vc]
+    for vc, dm in enumerate(demap):
         if not dm['valid']:
             continue
         sb_id = dm['sb_id']
@@ -296,108 +254,152 @@ def check(cfg, dump):
 
         station        = dm['station']   # station index within SB (vc-specific)
         sky_freq_idx   = dm['sky_freq_idx']
-        coarse_start   = sb['coarse_start']
-        fine_start     = sb['fine_start']
-        num_fine       = sb['num_fine']
-        stations_total = sb['stations']
-        hbm_base       = sb['hbm_base']
-        n_sg           = math.ceil(stations_total / 4)
-
-        station_group  = station // 4
-        s_in_group     = station %  4
-
-        for fc in range(3456):
-            # Compute relative fine_channel index within the SB
-            fine_ch_abs = sky_freq_idx * 3456 + fc
-            fine_ch_sb  = (coarse_start * 3456 + fine_start)
-            fine_ch_rel = fine_ch_abs - fine_ch_sb
-            if fine_ch_rel < 0 or fine_ch_rel >= num_fine:
-                continue
-
-            # fc_group selects the 4 GB HBM region (= i_fine_channel[1:0])
-            # i_fine_channel is the per-coarse fine channel index (0..3455), i.e. fc.
-            fc_group = fc & 3
-
-            for time_block in range(12):
-                within_region = (hbm_base +
-                                 256 * ((fine_ch_rel // 4) * 12 * n_sg
-                                        + time_block * n_sg
-                                        + station_group))
-                # Physical address: fc_group occupies bits 33:32
-                phys_addr = (fc_group << 32) | (within_region & 0xFFFFFFFF)
 
+        # Fine channels of this coarse channel that belong to the SB, and the
+        # address of all their blocks (fine channel x time block) in one go
+        fcs = np.arange(3456)
+        fine_ch_rel = sky_freq_idx * 3456 + fcs - (sb['coarse_start'] * 3456 + sb['fine_start'])
+        in_sb = (fine_ch_rel >= 0) & (fine_ch_rel < sb['num_fine'])
+        fcs, fine_ch_rel = fcs[in_sb], fine_ch_rel[in_sb]
+        fc_groups, addrs = ct2_block_addr(sb, fine_ch_rel[:, None], np.arange(12)[None, :], station)
+        phys_addrs = physical_addr(fc_groups, addrs)
+
+        for fc, phys_row in zip(fcs.tolist(), phys_addrs.tolist()):
+            for time_block, phys_addr in enumerate(phys_row):
                 # Check whether any byte of this block was written
                 if dump.get(phys_addr & ~3) is None:
                     n_unwritten += 1
                     continue
 
                 n_blocks_checked += 1
-                block_bad = False
-
-                for t_in_block in range(16):
-                    time_849ms = time_block * 16 + t_in_block
-                    exp = expected_sample(vc, fc, time_849ms, integration=0)
-                    off = block_byte_offset(t_in_block, s_in_group)
-
-                    act = tuple(
-                        dump_read_byte(dump, phys_addr + off + b)
-                        for b in range(4)
-                    )
-                    if None in act:
-                        # Word containing this sample was not written
-                        n_samples_bad += 1
-                        block_bad = True
-                        if n_samples_bad <= MAX_DETAIL:
-                            print(f"  MISSING   addr=0x{phys_addr:010X}+0x{off:02X}"
-                                  f" vc={vc} fc={fc} tb={time_block} t={t_in_block}"
-                                  f" fc_grp={fc_group} st_grp={station_group} s_in={s_in_group}")
-                        continue
-
-                    if act != exp:
-                        n_samples_bad += 1
-                        block_bad = True
-                        if n_samples_bad <= MAX_DETAIL:
-                            print(f"  MISMATCH  addr=0x{phys_addr:010X}+0x{off:02X}"
-                                  f" vc={vc} fc={fc} tb={time_block} t={t_in_block}"
-                                  f" fc_grp={fc_group} st_grp={station_group} s_in={s_in_group}"
-                                  f"  expected=({exp[0]:02X},{exp[1]:02X},"
-                                  f"{exp[2]:02X},{exp[3]:02X})"
-                                  f"  actual=({act[0]:02X},{act[1]:02X},"
-                                  f"{act[2]:02X},{act[3]:02X})")
-
-                if block_bad:
+                n_bad = check_block(dump, phys_addr, vc, fc, time_block, station, n_samples_bad, max_detail)
+                n_samples_bad += n_bad
+                if n_bad:
                     n_blocks_bad += 1
 
     return n_blocks_checked, n_blocks_bad, n_samples_bad, n_unwritten
 
 
+def follow_check(cfg, dump_file, max_fail=10, interval=1.0, idle_timeout=60.0, max_detail=MAX_DETAIL):
+    """
+    Check the CT2 blocks of a running simulation as they are completed in the
+    dump (follow_dump()), printing running counters.  A block is checked
+    once, when all 64 words of the 256 byte block have been written, for the
+    stations of the SB that it holds.  The SBs of the correlators share the
+    HBM and their address ranges can overlap, so the block is located in the
+    SB table of each correlator and checked for every SB that holds it.
+    Stops after max_fail bad blocks (0 = never).
+    Returns (n_blocks_checked, n_blocks_bad, n_samples_bad, n_ignored), where
+    n_ignored counts the completed blocks of the second buffer half, outside
+    of the SBs or without a VC mapped to any of their stations.
+    """
+    demap = cfg.demap_list()
+    sb_tables = [cfg.sbs(corr) for corr in range(N_CORRELATORS)]
+    # (sb, station, coarse channel) -> VC
+    vc_of = {(dm['sb_id'], dm['station'], dm['sky_freq_idx']): vc
+             for vc, dm in enumerate(demap) if dm['valid']}
+
+    dump = {}
+    words_in_block = {}
+    n_blocks_checked = n_blocks_bad = n_samples_bad = n_ignored = 0
+    start = last_print = time.monotonic()
+    for words in follow_dump(dump_file, interval, idle_timeout):
+        complete = []
+        for addr, word in words.items():
+            if addr not in dump:
+                block = addr & ~(BLOCK_BYTES - 1)
+                words_in_block[block] = words_in_block.get(block, 0) + 1
+                if words_in_block[block] == BLOCK_BYTES // 4:
+                    complete.append(block)
+            dump[addr] = word
+        if not complete:
+            continue
+
+        locs = [ct2_hbm_locate(complete, sbs) if sbs else None for sbs in sb_tables]
+        for k, phys_addr in enumerate(complete):
+            n_compared = 0
+            block_bad = False
+            for corr, loc in enumerate(locs):
+                if loc is None:
+                    continue
+                sb_index, fine_ch_rel = int(loc['sb'][k]), int(loc['fine_ch_rel'][k])
+                if sb_index < 0 or loc['buffer'][k] != 0 or fine_ch_rel < 0:
+                    continue
+                sb = sb_tables[corr][sb_index]
+                fine_abs = (sb['coarse_start'] & 0x1FF) * 3456 + sb['fine_start'] + fine_ch_rel
+                station_group = int(loc['station'][k]) // 4
+                for station in range(4 * station_group, min(4 * station_group + 4, sb['stations'])):
+                    vc = vc_of.get((SB_ID_PER_CORRELATOR * corr + sb_index, station, fine_abs // 3456))
+                    if vc is None:
+                        continue
+                    n_bad = check_block(dump, phys_addr, vc, fine_abs % 3456, int(loc['time_block'][k]),
+                                        station, n_samples_bad, max_detail)
+                    n_samples_bad += n_bad
+                    block_bad |= n_bad > 0
+                    n_compared += 1
+            if not n_compared:
+                n_ignored += 1
+                continue
+            n_blocks_checked += 1
+            n_blocks_bad += block_bad
+            if max_fail and n_blocks_bad >= max_fail:
+                break
+        if time.monotonic() - last_print >= interval:
+            last_print = time.monotonic()
+            print(f"  [{last_print - start:8.1f} s] blocks checked {n_blocks_checked}, "
+                  f"bad {n_blocks_bad}, bad samples {n_samples_bad}, ignored {n_ignored}", flush=True)
+        if max_fail and n_blocks_bad >= max_fail:
+            print(f"  stopping after {n_blocks_bad} bad blocks")
+            break
+    return n_blocks_checked, n_blocks_bad, n_samples_bad, n_ignored
+
+
 # ---------------------------------------------------------------------------
 # Entry point
 # ---------------------------------------------------------------------------
 
 def main():
     ap = argparse.ArgumentParser(description="Verify CT2 HBM dump against expected values")
-    ap.add_argument('vhdl_top',  help="Top-level VHDL wrapper file (e.g. ct2_test5_top.vhd)")
+    ap.add_argument('vhdl_top',  help="Top-level VHDL wrapper file (e.g. ct2_test5_top.vhd) or YAML configuration, see ct2_config.py")
     ap.add_argument('hbm_dump',  help="HBM dump file produced by simulation")
+    ap.add_argument('--max-detail', type=int, default=MAX_DETAIL,
+                    help=f"Maximum number of bad samples to print, default {MAX_DETAIL}")
+    ap.add_argument('--follow', action='store_true',
+                    help="Check blocks as they are written to a growing dump file or named pipe")
+    ap.add_argument('--max-fail', type=int, default=10,
+                    help="With --follow, stop after this many bad blocks (0 = never), default 10")
+    ap.add_argument('--interval', type=float, default=1.0,
+                    help="With --follow, poll interval in seconds, default 1")
+    ap.add_argument('--idle-timeout', type=float, default=60.0,
+                    help="With --follow, stop when the dump file has not grown for this many seconds, default 60")
     args = ap.parse_args()
 
     print(f"Parsing configuration from: {args.vhdl_top}")
-    cfg = parse_generic_map(args.vhdl_top)
+    cfg = load_config(args.vhdl_top)
 
     print(f"  virtual_channels = {cfg.get('virtual_channels', '?')}")
     print(f"  hbm_dump_file    = {cfg.get('hbm_dump_file', '?')}")
 
-    print(f"\nLoading HBM dump: {args.hbm_dump}")
-    dump = load_dump(args.hbm_dump)
-    print(f"  {len(dump)} 32-bit words loaded ({len(dump)*4} bytes)")
+    if args.follow:
+        print(f"\nFollowing HBM dump: {args.hbm_dump}")
+        checked, bad_blocks, bad_samples, ignored = follow_check(
+            cfg, args.hbm_dump, args.max_fail, args.interval, args.idle_timeout, args.max_detail)
+        unwritten = None
+    else:
+        print(f"\nLoading HBM dump: {args.hbm_dump}")
+        dump = load_dump(args.hbm_dump)
+        print(f"  {len(dump)} 32-bit words loaded ({len(dump)*4} bytes)")
 
-    print("Checking ...\n")
-    checked, bad_blocks, bad_samples, unwritten = check(cfg, dump)
+        print("Checking ...\n")
+        checked, bad_blocks, bad_samples, unwritten = check(cfg, dump, args.max_detail)
 
     print()
     print("=== ct2_check result ===")
     print(f"  Blocks checked   : {checked}")
-    print(f"  Unwritten blocks : {unwritten}")
+    if unwritten is None:
+        print(f"  Ignored blocks   : {ignored}")
+    else:
+        print(f"  Unwritten blocks : {unwritten}")
     print(f"  Bad blocks       : {bad_blocks}")
     print(f"  Bad samples      : {bad_samples}")
     if bad_blocks == 0 and bad_samples == 0:
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+ct2_config.py  --  Test configuration of the CT2 / correlator testbench,
+                   shared by ct2_check.py, vis_check.py, ct2_hbm_plot.py and
+                   the other tools in this directory.
+
+Usage:
+    python3 ct2_config.py <top_vhdl_file | yaml_file>
+
+load_config() returns a Ct2Config holding:
+  generics        : the generic values of the ct2_v80_tb generic map, keys
+                    lower-case without the g_ prefix (parse_generic_map())
+  demap           : numpy structured array indexed by VC, DEMAP_DTYPE
+  sb_tables       : numpy structured array per correlator, SB_DTYPE
+  station maps    : {sb_index: {station: {'vc', 'sky_freq_idx'}}} of the
+                    demap table, built once for all SBs
+
+The configuration is read from a ct2_*_top.vhd wrapper (generic map parsed
+with regular expressions) or from a YAML file with the same generic names,
+e.g.
+    virtual_channels: 12
+    sb_counts: [1, 0, 0, 0]
+    demap_table: [0x80000000, 0, ...]
+    sb_c0_table: [0x00000010, ...]
+
+The Ct2Config is cached in memory per file (path, size and modification
+time), so the tools of one process that load the same file parse it once.
+
+The SB dicts of the tools are views of the SB table array:
+  sbs()       : SB_FIELDS names (stations, num_fine, fine_per_int, ...),
+                as decode_sb_table()
+  sbs_full()  : reference model names (n_stations, n_fine, ...), the
+                output disable bit split from coarse_start, as
+                decode_sb_table_full()
+"""
+
+import os
+import re
+import sys
+import argparse
+import functools
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'tools', 'radiohdl', 'base'))
+from common import BitFields  # noqa: E402  (radiohdl common, vectorised bit field codec)
+
+N_CORRELATORS = 2
+SB_ID_PER_CORRELATOR = 128   # demap sb_id = 128 * correlator + SB table index
+
+
+# ---------------------------------------------------------------------------
+# VHDL generic-map parser
+# ---------------------------------------------------------------------------
+
+def _strip_comments(text):
+    """Remove VHDL single-line comments."""
+    return re.sub(r'--[^\n]*', '', text)
+
+
+def _find_generic_map(text):
+    """Return the content between the outermost generic map ( ... )."""
+    m = re.search(r'\bgeneric\s+map\s*\(', text, re.IGNORECASE)
+    if not m:
+        raise ValueError("No 'generic map' found in file")
+    start = m.end()
+    depth = 1
+    i = start
+    while i < len(text) and depth:
+        if text[i] == '(':
+            depth += 1
+        elif text[i] == ')':
+            depth -= 1
+        i += 1
+    return text[start:i - 1]
+
+
+def _parse_hex_array(s):
+    """Parse a VHDL array aggregate like (x"AABB", x"1122", ...) -> list[int]."""
+    items = re.findall(r'x"([0-9A-Fa-f]+)"', s)
+    return [int(h, 16) for h in items]
+
+
+def parse_generic_map(vhdl_file):
+    """
+    Parse a ct2_*_top.vhd wrapper and return a dict of generic values.
+    Keys match the generic names in ct2_v80_tb (lower-case, without g_ prefix).
+    """
+    text = _strip_comments(Path(vhdl_file).read_text())
+    gm   = _find_generic_map(text)
+
+    result = {}
+
+    def _int(name):
+        m = re.search(rf'\b{name}\s*=>\s*(\d+)', gm, re.IGNORECASE)
+        if m:
+            result[name.lower().lstrip('g_')] = int(m.group(1))
+
+    def _hex16(name):
+        m = re.search(rf'\b{name}\s*=>\s*x"([0-9A-Fa-f]+)"', gm, re.IGNORECASE)
+        if m:
+            result[name.lower().lstrip('g_')] = int(m.group(1), 16)
+
+    def _string(name):
+        m = re.search(rf'\b{name}\s*=>\s*"([^"]*)"', gm, re.IGNORECASE)
+        if m:
+            result[name.lower().lstrip('g_')] = m.group(1)
+
+    def _array(name):
+        m = re.search(rf'\b{name}\s*=>\s*(\(.*?\))', gm, re.IGNORECASE | re.DOTALL)
+        if m:
+            result[name.lower().lstrip('g_')] = _parse_hex_array(m.group(1))
+
+    _int('g_VIRTUAL_CHANNELS')
+    _int('g_CORRELATOR_CORES')
+    _int('g_BAD_POLY_PACKETS')
+    _int('g_SIM_DURATION_US')
+    _hex16('g_BAD_POLY_VC')
+    _string('g_HBM_DUMP_FILE')
+    _array('g_SB_COUNTS')
+    _array('g_DEMAP_TABLE')
+    _array('g_SB_C0_TABLE')
+    _array('g_SB_C1_TABLE')
+
+    return result
+
+
+def parse_yaml(yaml_file):
+    """Return the generic values of a YAML configuration, keys as parse_generic_map()."""
+    import yaml  # only needed for YAML configurations
+    with open(yaml_file) as f:
+        data = yaml.safe_load(f) or {}
+    result = {}
+    for name, value in data.items():
+        name = name.lower()
+        result[name[2:] if name.startswith('g_') else name] = value
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Configuration decoding
+# ---------------------------------------------------------------------------
+
+# Demap table word 0 of each group of 4 VCs
+DEMAP_FIELDS = BitFields([('valid',        31, 31),
+                          ('sky_freq_idx', 28, 20),
+                          ('station',      19,  8),
+                          ('sb_id',         7,  0)])
+
+# SB table entry of 4 words, in bits of the 128 bit entry
+SB_FIELDS = BitFields([('stations',      15,   0),
+                       ('coarse_start',  31,  16),
+                       ('fine_start',    47,  32),
+                       ('num_fine',      87,  64),
+                       ('fine_per_int',  94,  88),
+                       ('int_mode_849',  95,  95),
+                       ('hbm_base',     127,  96)], nof_words=4)
+
+OUTPUT_DISABLE = 0x8000      # coarse_start bit 15
+
+DEMAP_DTYPE = np.dtype([('valid', np.int64), ('sky_freq_idx', np.int64), ('station', np.int64), ('sb_id', np.int64)])
+SB_DTYPE = np.dtype([('stations', np.int64), ('coarse_start', np.int64), ('fine_start', np.int64),
+                     ('num_fine', np.int64), ('fine_per_int', np.int64), ('int_mode_849', np.int64),
+                     ('hbm_base', np.int64), ('correlator', np.int64),
+                     ('output_disable', np.int64), ('n_time_integrate', np.int64)])
+
+
+def decode_demap_arrays(demap_words, virtual_channels):
+    """
+    Return a dict of arrays indexed by VC (0..virtual_channels-1):
+      {'valid', 'sky_freq_idx', 'station', 'sb_id'}
+    Demap table has 2 words per group of 4 VCs.
+    """
+    vc    = np.arange(virtual_channels)
+    words = np.append(np.asarray(demap_words, dtype=np.uint64), np.uint64(0))
+    idx   = np.minimum((vc // 4) * 2, len(words) - 1)   # missing words decode as 0
+    result = DEMAP_FIELDS.decode(words[idx])
+    result['station'] = result['station'] + (vc % 4)
+    return result
+
+
+def decode_demap_array(demap_words, virtual_channels):
+    """decode_demap_arrays() as a DEMAP_DTYPE structured array."""
+    fields = decode_demap_arrays(demap_words, virtual_channels)
+    demap = np.zeros(virtual_channels, dtype=DEMAP_DTYPE)
+    for name in DEMAP_DTYPE.names:
+        demap[name] = fields[name]
+    return demap
+
+
+def decode_demap(demap_words, virtual_channels):
+    """
+    Return a list indexed by VC (0..virtual_channels-1) of dicts:
+      {'valid', 'sky_freq_idx', 'station', 'sb_id'}
+    Demap table has 2 words per group of 4 VCs.
+    """
+    return demap_dicts(decode_demap_array(demap_words, virtual_channels))
+
+
+def demap_dicts(demap):
+    """List of dicts of a DEMAP_DTYPE array, as decode_demap()."""
+    names = DEMAP_DTYPE.names
+    return [dict(zip(names, values)) for values in demap.tolist()]
+
+
+def decode_sb_array(sb_words, correlator_id=0):
+    """SB_DTYPE structured array of a flat 4-words-per-SB table."""
+    n = len(sb_words) // 4
+    fields = SB_FIELDS.decode(np.asarray(sb_words[:n * 4], dtype=np.uint64))
+    sbs = np.zeros(n, dtype=SB_DTYPE)
+    for name in SB_FIELDS.fields:
+        sbs[name] = fields[name]
+    sbs['correlator'] = correlator_id
+    sbs['output_disable'] = sbs['coarse_start'] >= OUTPUT_DISABLE
+    sbs['n_time_integrate'] = np.where(sbs['int_mode_849'] == 1, 192, 64)
+    return sbs
+
+
+def sb_dicts(sbs):
+    """List of SB dicts of an SB_DTYPE array with the SB_FIELDS names, as decode_sb_table()."""
+    names = list(SB_FIELDS.fields) + ['correlator']
+    return [dict(zip(names, values)) for values in sbs[names].tolist()]
+
+
+def sb_dicts_full(sbs):
+    """List of SB dicts of an SB_DTYPE array with the reference model names, as decode_sb_table_full()."""
+    return [{'n_stations':       int(sb['stations']),
+             'coarse_start':     int(sb['coarse_start'] & (OUTPUT_DISABLE - 1)),
+             'output_disable':   int(sb['output_disable']),
+             'fine_start':       int(sb['fine_start']),
+             'n_fine':           int(sb['num_fine']),
+             'n_fine_integrate': int(sb['fine_per_int']),
+             'n_time_integrate': int(sb['n_time_integrate']),
+             'hbm_base':         int(sb['hbm_base'])} for sb in sbs]
+
+
+def decode_sb_table(sb_words, correlator_id=0):
+    """
+    Return a list of SB dicts from a flat 4-words-per-SB array.
+    """
+    return sb_dicts(decode_sb_array(sb_words, correlator_id))
+
+
+def decode_sb_table_full(sb_words):
+    """
+    Decode the subarray-beam table (4 words per entry) into a list of dicts,
+    matching ska_low_cbf_model.correlator_model.subarray_beam_unpack.
+    """
+    return sb_dicts_full(decode_sb_array(sb_words))
+
+
+def build_station_map(demap, sb_index):
+    """
+    Return {station_index_within_sb: {'vc', 'sky_freq_idx'}} for the given SB.
+    demap is the per-VC list from decode_demap.
+    For correlator 0 the demap sb_id equals the SB table index directly.
+    """
+    station_map = {}
+    for vc, dm in enumerate(demap):
+        if not dm['valid']:
+            continue
+        if dm['sb_id'] != sb_index:
+            continue
+        station_map[dm['station']] = {'vc': vc, 'sky_freq_idx': dm['sky_freq_idx']}
+    return station_map
+
+
+# ---------------------------------------------------------------------------
+# Configuration object
+# ---------------------------------------------------------------------------
+
+class Ct2Config:
+    """
+    Decoded test configuration, see the module docstring.  get() returns the
+    generic values like the parse_generic_map() dict.
+    """
+
+    def __init__(self, generics, source=None):
+        self.source = source
+        self.generics = generics
+        self.virtual_channels = int(generics.get('virtual_channels', 12))
+        self.sb_counts = list(generics.get('sb_counts', [1, 0, 0, 0]))
+        self.demap = decode_demap_array(generics.get('demap_table', [0]), self.virtual_channels)
+        self.sb_tables = [decode_sb_array(generics.get(f'sb_c{c}_table', [0]), c) for c in range(N_CORRELATORS)]
+        # Station maps of all SB ids in one pass over the VCs; a later VC of
+        # the same station replaces an earlier one, as build_station_map()
+        self._station_maps = {}
+        for vc in np.nonzero(self.demap['valid'])[0].tolist():
+            dm = self.demap[vc]
+            self._station_maps.setdefault(int(dm['sb_id']), {})[int(dm['station'])] = \
+                {'vc': vc, 'sky_freq_idx': int(dm['sky_freq_idx'])}
+        self._demap_dicts = None
+
+    def get(self, name, default=None):
+        return self.generics.get(name, default)
+
+    def n_sbs(self, correlator=0):
+        """Number of SBs in use in the table of the correlator, from g_SB_COUNTS."""
+        return max(self.sb_counts[2 * correlator:2 * correlator + 2] or [0])
+
+    def sbs(self, correlator=0, in_use=False):
+        """SB dicts of the correlator table with the SB_FIELDS names, in_use = only the first n_sbs()."""
+        table = self.sb_tables[correlator]
+        return sb_dicts(table[:self.n_sbs(correlator)] if in_use else table)
+
+    def sbs_full(self, correlator=0, in_use=False):
+        """SB dicts of the correlator table with the reference model names."""
+        table = self.sb_tables[correlator]
+        return sb_dicts_full(table[:self.n_sbs(correlator)] if in_use else table)
+
+    def demap_list(self):
+        """Demap table as the decode_demap() list of dicts."""
+        if self._demap_dicts is None:
+            self._demap_dicts = demap_dicts(self.demap)
+        return self._demap_dicts
+
+    def station_map(self, sb_index, correlator=0):
+        """build_station_map() of the SB, {} if no VC is mapped to it."""
+        return self._station_maps.get(SB_ID_PER_CORRELATOR * correlator + sb_index, {})
+
+
+def _parse(filename):
+    if filename.endswith(('.yaml', '.yml')):
+        return parse_yaml(filename)
+    return parse_generic_map(filename)
+
+
+@functools.lru_cache(maxsize=None)
+def _load(path, size, mtime_ns):
+    return Ct2Config(_parse(path), path)
+
+
+def load_config(filename):
+    """Ct2Config of a ct2_*_top.vhd or YAML file, cached per file version."""
+    path = os.path.realpath(filename)
+    st = os.stat(path)
+    return _load(path, st.st_size, st.st_mtime_ns)
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def main():
+    ap = argparse.ArgumentParser(description="Print the decoded CT2 test configuration")
+    ap.add_argument('config', help="Top-level VHDL wrapper (e.g. ct2_test5_top.vhd) or YAML file")
+    args = ap.parse_args()
+
+    try:
+        cfg = load_config(args.config)
+    except (OSError, ValueError) as e:
+        print(f"FAIL: {e}")
+        sys.exit(2)
+    print(f"Configuration: {cfg.source}")
+    for name in ('virtual_channels', 'correlator_cores', 'sim_duration_us', 'hbm_dump_file'):
+        if cfg.get(name) is not None:
+            print(f"  {name:16s} = {cfg.get(name)}")
+    print(f"  sb_counts        = {cfg.sb_counts}")
+    for c in range(N_CORRELATORS):
+        print(f"  --- correlator {c}: {cfg.n_sbs(c)} SB(s) in use ---")
+        for i, sb in enumerate(cfg.sbs_full(c, in_use=True)):
+            station_map = cfg.station_map(i, c)
+            print(f"    SB {i:3d}: stations={sb['n_stations']:4d} coarse_start={sb['coarse_start']:3d} "
+                  f"fine_start={sb['fine_start']:4d} n_fine={sb['n_fine']:6d} "
+                  f"fine_per_int={sb['n_fine_integrate']:3d} n_time={sb['n_time_integrate']:3d} "
+                  f"hbm_base=0x{sb['hbm_base']:08x}{' output disabled' if sb['output_disable'] else ''} "
+                  f"VCs mapped={len(station_map)}")
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+ct2_hbm_addr.py  --  Vectorised model of the CT2 HBM address map
+                     (get_ct2_HBM_addr_v80.vhd) and its inverse.
+
+All functions take numpy arrays (or scalars) that broadcast against each
+other, so millions of blocks can be translated in one call.
+
+Forward map (get_ct2_HBM_addr_v80.vhd, bit accurate):
+  fine_abs     = coarse_channel*3456 + fine_channel
+  sb_fine_abs  = SB_coarseStart*3456 + SB_fineStart
+  fc_group     = fine_channel mod 4   (= i_fine_channel(1:0), selects the HBM memory)
+  fine_slot    = fine_abs//4 - sb_fine_abs//4
+  n_sg         = ceil(SB_stations/4)
+  addr         = SB_base + buffer*g_BUFFER_OFFSET
+                 + 256 * (fine_slot*12*n_sg + time_block*n_sg + station//4)
+  with SB_base = 4 * hbm_base of the SB table (the table is in units of 4
+  bytes, corr_ct2_din_v80.vhd).  In the testbench HBM dump the memory of
+  fc_group is at (fc_group << 32), see physical_addr().
+
+Note the fine slot is not (fine_abs - sb_fine_abs)//4: when SB_fineStart is
+not a multiple of 4 the fine channels of an SB use one slot more per memory
+than ceil(n_fine/4), see fine_slots().  The planner must keep that space free.
+
+Within a 256 byte block (corr_ct2_din_v80.vhd), time t (0..15) and station
+s (0..3) of the block:
+  byte = (t//2)*32 + (t%2)*16 + s*4 + component, component 0..3 = Hre, Him, Vre, Vim
+
+Usage:
+    python3 ct2_hbm_addr.py <top_vhdl_file> <physical_addr> [...]
+prints the SB, buffer, fine channel, time sample and station of each address.
+"""
+
+import os
+import sys
+import argparse
+
+import numpy as np
+
+FINE_PER_COARSE = 3456
+TIME_BLOCKS = 12             # 12 x 16 time samples = 849 ms
+TIMES_PER_BLOCK = 16
+STATIONS_PER_BLOCK = 4
+BLOCK_BYTES = 256
+N_FC_GROUPS = 4              # fine channels are spread over 4 HBM memories, fine mod 4
+BUFFER_OFFSET = 0x080000000  # g_BUFFER_OFFSET, second half of the double buffer (2 Gbytes)
+REGION_SHIFT = 32            # fc_group position in the testbench HBM dump address
+ADDR_MASK = 2**36 - 1        # o_HBM_addr is 36 bit
+
+
+def sb_params(sb):
+    """
+    Return (sb_base, stations, coarse_start, fine_start, n_fine) of an SB dict
+    from ct2_check.decode_sb_table() or vis_check.decode_sb_table_full(),
+    sb_base in bytes.
+    """
+    stations = sb['stations'] if 'stations' in sb else sb['n_stations']
+    n_fine = sb['num_fine'] if 'num_fine' in sb else sb['n_fine']
+    return 4 * sb['hbm_base'], stations, sb['coarse_start'] & 0x1FF, sb['fine_start'], n_fine
+
+
+def sb_table_params(sbs):
+    """sb_params() of a list of SB dicts, as a tuple of int64 arrays indexed by SB."""
+    params = [sb_params(sb) for sb in sbs] or [(0, 0, 0, 0, 0)]
+    return tuple(np.array(p, dtype=np.int64) for p in zip(*params))
+
+
+def station_groups(stations):
+    """ceil(stations/4), the number of 4 station groups of an SB."""
+    return (np.asarray(stations, dtype=np.int64) + STATIONS_PER_BLOCK - 1) // STATIONS_PER_BLOCK
+
+
+def fine_slots(coarse_start, fine_start, n_fine):
+    """Number of fine channel slots used in each of the 4 memories by n_fine channels from the SB start."""
+    start = np.asarray(coarse_start, dtype=np.int64) * FINE_PER_COARSE + np.asarray(fine_start, dtype=np.int64)
+    n_fine = np.asarray(n_fine, dtype=np.int64)
+    return np.where(n_fine > 0, (start + n_fine - 1) // N_FC_GROUPS - start // N_FC_GROUPS + 1, 0)
+
+
+def sb_footprint(stations, coarse_start, fine_start, n_fine):
+    """Bytes used by an SB in each memory, for one half of the double buffer."""
+    return fine_slots(coarse_start, fine_start, n_fine) * TIME_BLOCKS * station_groups(stations) * BLOCK_BYTES
+
+
+def ct2_hbm_addr(sb_base, stations, coarse_start, fine_start, n_fine,
+                 coarse_channel, fine_channel, station, time_block, buffer=0, buffer_offset=BUFFER_OFFSET):
+    """
+    Evaluate get_ct2_HBM_addr_v80.vhd, sb_base in bytes.
+
+    Returns a dict of int64 / bool arrays:
+      addr           : o_HBM_addr, byte address within the memory of fc_group
+      fc_group       : o_fc_group, the memory (fine_channel mod 4)
+      out_of_range   : o_out_of_range (before the SB start, station or time block too high)
+      fine_high      : o_fine_high (fine channel at or beyond the SB end)
+      fine_remaining : o_fine_remaining, fine channels left to send, at most 3456
+    """
+    coarse_start = np.asarray(coarse_start, dtype=np.int64) & 0x1FF
+    fine_start = np.asarray(fine_start, dtype=np.int64) & 0xFFF
+    stations = np.asarray(stations, dtype=np.int64) & 0xFFFF
+    n_fine = np.asarray(n_fine, dtype=np.int64) & 0xFFFFFF
+    coarse_channel = np.asarray(coarse_channel, dtype=np.int64) & 0x1FF
+    fine_channel = np.asarray(fine_channel, dtype=np.int64) & 0xFFFFFF
+    station = np.asarray(station, dtype=np.int64) & 0xFFF
+    time_block = np.asarray(time_block, dtype=np.int64) & 0xF
+
+    out_of_range = ((coarse_channel < coarse_start) |
+                    ((coarse_channel == coarse_start) & (fine_channel < fine_start)) |
+                    (station >= stations) | (time_block > TIME_BLOCKS - 1))
+
+    coarse_diff_x_3456 = ((coarse_channel - coarse_start) & 0x1FF) * FINE_PER_COARSE
+    fine_rel = (coarse_diff_x_3456 + (fine_channel & 0x7FFFFF) - fine_start) & 0x7FFFFF
+    fine_slot = (((coarse_diff_x_3456 + (fine_channel & 0x7FFFFF)) & 0x7FFFFF) >> 2) - (fine_start >> 2)
+    fine_slot &= 0x7FFFFF
+    fine_high = fine_rel >= n_fine
+    fine_remaining = np.minimum((n_fine - fine_rel) & 0x1FFFFFF, FINE_PER_COARSE)
+
+    n_sg = station_groups(stations)
+    addr = (np.asarray(sb_base, dtype=np.int64) + (station >> 2) * BLOCK_BYTES +
+            np.where(np.asarray(buffer) != 0, buffer_offset, 0) +
+            time_block * n_sg * BLOCK_BYTES +
+            ((fine_slot * TIME_BLOCKS * n_sg) & (2**28 - 1)) * BLOCK_BYTES) & ADDR_MASK
+    return {'addr': addr, 'fc_group': fine_channel & (N_FC_GROUPS - 1), 'out_of_range': out_of_range,
+            'fine_high': fine_high, 'fine_remaining': fine_remaining}
+
+
+def ct2_block_addr(sb, fine_ch_rel, time_block, station, buffer=0, buffer_offset=BUFFER_OFFSET):
+    """
+    Return (fc_group, addr) of the 256 byte blocks of SB dict sb, for fine
+    channels relative to the SB start (0 = SB_coarseStart*3456 + SB_fineStart).
+    """
+    sb_base, stations, coarse_start, fine_start, n_fine = sb_params(sb)
+    fine_abs = coarse_start * FINE_PER_COARSE + fine_start + np.asarray(fine_ch_rel, dtype=np.int64)
+    r = ct2_hbm_addr(sb_base, stations, coarse_start, fine_start, n_fine, fine_abs // FINE_PER_COARSE,
+                     fine_abs % FINE_PER_COARSE, station, time_block, buffer, buffer_offset)
+    return r['fc_group'], r['addr']
+
+
+def physical_addr(fc_group, addr):
+    """Address in the testbench HBM dump: memory fc_group at (fc_group << 32)."""
+    return (np.asarray(fc_group, dtype=np.int64) << REGION_SHIFT) | (np.asarray(addr, dtype=np.int64) & (2**REGION_SHIFT - 1))
+
+
+def block_byte_offset(time_within_block, station_within_group):
+    """Byte offset within a 256 byte block of time sample 0..15 and station 0..3 of the block."""
+    t = np.asarray(time_within_block, dtype=np.int64)
+    return (t // 2) * 32 + (t % 2) * 16 + np.asarray(station_within_group, dtype=np.int64) * 4
+
+
+def block_byte_locate(byte_offset):
+    """Inverse of block_byte_offset(): return (time_within_block, station_within_group, component)."""
+    b = np.asarray(byte_offset, dtype=np.int64) & (BLOCK_BYTES - 1)
+    return (b // 32) * 2 + (b // 16) % 2, (b % 16) // 4, b % 4
+
+
+def ct2_hbm_locate(phys_addr, sbs, buffer_offset=BUFFER_OFFSET):
+    """
+    Inverse map of physical_addr(ct2_hbm_addr(...)) + byte offset for the SB
+    dicts sbs, all arrays broadcast with phys_addr.  Returns a dict of int64 arrays:
+      sb          : index in sbs of the SB that owns the address, -1 if none
+      buffer      : half of the double buffer, 0 or 1
+      fc_group    : memory
+      fine_ch_rel : fine channel relative to the SB start, -1 for the unused
+                    slot positions at the start and end of the SB range
+      time_block, time_sample (0..191), station (0..stations-1)
+      component   : byte within the sample, 0..3 = Hre, Him, Vre, Vim
+    When SB address ranges overlap, the SB with the highest base that is
+    at or below the address wins.
+    """
+    phys_addr = np.asarray(phys_addr, dtype=np.int64)
+    fc_group = phys_addr >> REGION_SHIFT
+    addr = phys_addr & (2**REGION_SHIFT - 1)
+    base, stations, coarse_start, fine_start, n_fine = sb_table_params(sbs)
+    size = sb_footprint(stations, coarse_start, fine_start, n_fine)
+    n_sg = np.maximum(station_groups(stations), 1)
+
+    buffer = np.zeros_like(addr)
+    sb = np.full(addr.shape, -1, dtype=np.int64)
+    rel = np.zeros_like(addr)
+    order = np.argsort(base, kind='stable')
+    for half in (0, 1):
+        a = addr - half * buffer_offset
+        k = np.searchsorted(base[order], a, side='right') - 1
+        cand = order[np.maximum(k, 0)]
+        hit = (sb < 0) & (k >= 0) & (a < base[cand] + size[cand])
+        sb = np.where(hit, cand, sb)
+        buffer = np.where(hit, half, buffer)
+        rel = np.where(hit, a - base[cand], rel)
+
+    s = np.maximum(sb, 0)
+    block, byte = rel // BLOCK_BYTES, rel % BLOCK_BYTES
+    fine_slot = block // (TIME_BLOCKS * n_sg[s])
+    time_block = (block // n_sg[s]) % TIME_BLOCKS
+    t_in_block, s_in_group, component = block_byte_locate(byte)
+    start = coarse_start[s] * FINE_PER_COARSE + fine_start[s]
+    fine_ch_rel = (start // N_FC_GROUPS + fine_slot) * N_FC_GROUPS + fc_group - start
+    used = (sb >= 0) & (fine_ch_rel >= 0) & (fine_ch_rel < n_fine[s]) & (fc_group < N_FC_GROUPS)
+    return {'sb': sb, 'buffer': buffer, 'fc_group': fc_group,
+            'fine_ch_rel': np.where(used, fine_ch_rel, -1),
+            'time_block': time_block, 'time_sample': time_block * TIMES_PER_BLOCK + t_in_block,
+            'station': (block % n_sg[s]) * STATIONS_PER_BLOCK + s_in_group, 'component': component}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Translate CT2 HBM dump addresses to SB, fine channel, time and station')
+    parser.add_argument('vhdl_top', help='Top-level VHDL wrapper (e.g. ct2_test5_top.vhd)')
+    parser.add_argument('addr', nargs='+', help='physical byte address(es), e.g. 0x100000400')
+    parser.add_argument('--correlator', type=int, default=0, choices=[0, 1], help='SB table of correlator 0 or 1')
+    args = parser.parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import ct2_config  # sibling module, shared test configuration
+    sbs = ct2_config.load_config(args.vhdl_top).sbs(args.correlator)
+    loc = ct2_hbm_locate([int(a, 0) for a in args.addr], sbs)
+    for i, a in enumerate(args.addr):
+        if loc['sb'][i] < 0:
+            print('%-14s not in any SB' % a)
+            continue
+        print('%-14s SB %d buffer %d fc_group %d fine_ch_rel %d time %d (block %d) station %d component %d' %
+              (a, loc['sb'][i], loc['buffer'][i], loc['fc_group'][i], loc['fine_ch_rel'][i], loc['time_sample'][i],
+               loc['time_block'][i], loc['station'][i], loc['component'][i]))
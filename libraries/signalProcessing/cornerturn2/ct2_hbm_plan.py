@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+ct2_hbm_plan.py  --  Plan the CT2 HBM base addresses of the subarray-beams
+                     and generate the SB table words.
+
+Usage:
+    python3 ct2_hbm_plan.py <sb_list_file | top_vhdl_file> [options]
+
+Each subarray-beam (SB) uses the same address range in each of the 4 HBM
+memories of its correlator (one memory per fine channel mod 4, see
+ct2_hbm_addr.py), in both halves of the double buffer.  So the planning is a
+one dimensional allocation per correlator of
+
+  footprint = fine_slots * 12 * ceil(stations/4) * 256 bytes
+
+within the g_BUFFER_OFFSET (2 Gbytes) half buffer, where fine_slots includes
+the extra slot of a fine channel range that is not aligned to 4
+(get_ct2_HBM_addr_v80.vhd, "Note on memory allocation by the software").
+
+The planner:
+  - assigns the SBs to correlator 0 or 1, largest footprint first onto the
+    correlator with the least memory used (unless pinned with 'correlator'),
+    at most 128 SBs per correlator (SB id = 128*correlator + table index),
+  - keeps the input order within each correlator and packs the SBs back to
+    back from address 0, so there is no fragmentation: all free memory of a
+    correlator is one block at the end,
+  - reports the utilisation and headroom, and the SB table words for
+    g_SB_C0_TABLE / g_SB_C1_TABLE and g_SB_COUNTS.
+
+The SB list file has one SB per line, '#' starts a comment:
+    stations coarse_start fine_start n_fine int_ms [fine_per_int [correlator]]
+int_ms is the integration time, 849 or 283.  fine_per_int defaults to 24.
+With a top VHDL file (e.g. ct2_test5_top.vhd) or a YAML configuration the
+SB tables of its generic map are checked for overlap and re-planned, each SB
+stays on its correlator.  With --rebalance the SBs are assigned to the
+correlators again, which changes their demap sb_id, so the g_DEMAP_TABLE with
+the new sb_ids is printed as well.
+"""
+
+import os
+import sys
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import ct2_config  # noqa: E402  (sibling module, SB table fields and shared test configuration)
+from ct2_hbm_addr import BUFFER_OFFSET, BLOCK_BYTES, TIME_BLOCKS, STATIONS_PER_BLOCK, N_FC_GROUPS  # noqa: E402
+from ct2_hbm_addr import sb_table_params, fine_slots, sb_footprint  # noqa: E402
+
+N_CORRELATORS = 2
+MAX_SBS = 128                 # SB table entries per correlator
+# Bytes per station x fine channel in each memory, the unit of the headroom
+BYTES_PER_STATION_CHANNEL = TIME_BLOCKS * BLOCK_BYTES // (STATIONS_PER_BLOCK * N_FC_GROUPS)
+
+
+# ---------------------------------------------------------------------------
+# SB list
+# ---------------------------------------------------------------------------
+
+def make_sb(stations, coarse_start, fine_start, n_fine, int_ms=849, fine_per_int=24, correlator=None):
+    """Return an SB dict with the ct2_config.SB_FIELDS names, correlator None = let the planner choose."""
+    if int_ms not in (849, 283):
+        raise ValueError(f"integration time must be 849 or 283 ms, not {int_ms}")
+    return {'stations': stations, 'coarse_start': coarse_start, 'fine_start': fine_start, 'num_fine': n_fine,
+            'fine_per_int': fine_per_int, 'int_mode_849': int(int_ms == 849), 'hbm_base': 0,
+            'correlator': correlator}
+
+
+def read_sb_list(filename):
+    """Read the SB list file, see module docstring."""
+    sbs = []
+    with open(filename) as f:
+        for line_no, line in enumerate(f, 1):
+            fields = line.split('#')[0].split()
+            if not fields:
+                continue
+            if not 5 <= len(fields) <= 7:
+                raise ValueError(f"{filename}:{line_no}: expected 5 to 7 values, got {len(fields)}")
+            values = [int(v, 0) for v in fields]
+            sbs.append(make_sb(*values))
+    return sbs
+
+
+def read_top_sbs(vhdl_file):
+    """
+    Return (sbs, demap_words) of a ct2_*_top.vhd or YAML configuration: the SB
+    dicts of both correlator tables, pinned to their correlator and with their
+    demap sb_id in 'top_sb_id', and the g_DEMAP_TABLE words.
+    """
+    cfg = ct2_config.load_config(vhdl_file)
+    sbs = []
+    for corr in range(N_CORRELATORS):
+        sbs += [dict(sb, top_sb_id=MAX_SBS * corr + index) for index, sb in enumerate(cfg.sbs(corr, in_use=True))]
+    return sbs, cfg.get('demap_table') or []
+
+
+# ---------------------------------------------------------------------------
+# Planning
+# ---------------------------------------------------------------------------
+
+def footprints(sbs):
+    """Bytes used by each SB in each memory of its correlator, for one half of the double buffer."""
+    _, stations, coarse_start, fine_start, n_fine = sb_table_params(sbs)
+    return sb_footprint(stations, coarse_start, fine_start, n_fine)[:len(sbs)]
+
+
+def overlaps(sbs):
+    """
+    Return the list of (i, j) index pairs of SBs of the same correlator
+    whose HBM address ranges overlap, for SB dicts with hbm_base set.
+    """
+    if not sbs:
+        return []
+    base = sb_table_params(sbs)[0]
+    end = base + footprints(sbs)
+    corr = np.array([sb.get('correlator') or 0 for sb in sbs])
+    same = corr[:, None] == corr[None, :]
+    hit = same & (base[:, None] < end[None, :]) & (base[None, :] < end[:, None]) & (end > base)[:, None]
+    return [(int(i), int(j)) for i, j in zip(*np.nonzero(np.triu(hit, 1)))]
+
+
+def plan(sbs, capacity=BUFFER_OFFSET):
+    """
+    Assign a correlator and HBM base to every SB dict in sbs.
+
+    Returns a list of new SB dicts in input order with 'correlator', 'index'
+    (SB table index), 'sb_id' (for the demap table) and 'hbm_base' (SB table
+    units of 4 bytes) set.  Raises ValueError when the SBs do not fit.
+    """
+    size = footprints(sbs)
+    used = np.zeros(N_CORRELATORS, dtype=np.int64)
+    count = np.zeros(N_CORRELATORS, dtype=np.int64)
+    corr = np.array([-1 if sb.get('correlator') is None else sb['correlator'] for sb in sbs], dtype=np.int64)
+    for c in range(N_CORRELATORS):
+        used[c] = size[corr == c].sum()
+        count[c] = np.count_nonzero(corr == c)
+
+    # Largest first onto the correlator with the least memory used that has room
+    for i in sorted(np.nonzero(corr < 0)[0], key=lambda i: -size[i]):
+        room = (used + size[i] <= capacity) & (count < MAX_SBS)
+        if not room.any():
+            raise ValueError(f"SB {i} ({size[i]} bytes) does not fit, free bytes per correlator: {capacity - used}")
+        c = int(np.argmin(np.where(room, used, np.iinfo(np.int64).max)))
+        corr[i] = c
+        used[c] += size[i]
+        count[c] += 1
+
+    for c in range(N_CORRELATORS):
+        if used[c] > capacity or count[c] > MAX_SBS:
+            raise ValueError(f"correlator {c}: {count[c]} SBs use {used[c]} bytes, "
+                             f"more than {MAX_SBS} SBs or {capacity} bytes")
+
+    # Back to back in input order within each correlator
+    planned = []
+    for i, sb in enumerate(sbs):
+        planned.append(dict(sb, correlator=int(corr[i])))
+    for c in range(N_CORRELATORS):
+        members = np.nonzero(corr == c)[0]
+        bases = np.concatenate(([0], np.cumsum(size[members])[:-1]))
+        for index, (i, base) in enumerate(zip(members, bases)):
+            planned[i].update(index=index, sb_id=MAX_SBS * c + index, hbm_base=int(base) // 4)
+    return planned
+
+
+def summary(planned, capacity=BUFFER_OFFSET):
+    """
+    Return per correlator dicts: n_sbs, used, free (after the last SB), fragmented
+    (unused bytes between SBs), utilisation and headroom (free station x fine channels).
+    """
+    size = footprints(planned)
+    corr = np.array([sb['correlator'] for sb in planned], dtype=np.int64)
+    result = []
+    for c in range(N_CORRELATORS):
+        used = int(size[corr == c].sum()) if len(planned) else 0
+        end = max([4 * sb['hbm_base'] + int(s) for sb, s in zip(planned, size) if sb['correlator'] == c], default=0)
+        result.append({'n_sbs': int(np.count_nonzero(corr == c)), 'used': used, 'free': capacity - end,
+                       'fragmented': end - used, 'utilisation': used / capacity,
+                       'headroom': (capacity - end) // BYTES_PER_STATION_CHANNEL})
+    return result
+
+
+def sb_table_words(planned, correlator):
+    """Return the SB table words (4 per SB, table index order) of one correlator."""
+    table = sorted((sb for sb in planned if sb['correlator'] == correlator), key=lambda sb: sb['index'])
+    if not table:
+        return np.zeros(4, dtype=np.uint64)
+    values = {name: np.array([sb[name] for sb in table]) for name in ct2_config.SB_FIELDS.names()}
+    values['coarse_start'] = values['coarse_start'] | np.array([ct2_config.OUTPUT_DISABLE * bool(sb.get('output_disable'))
+                                                                for sb in table])
+    return ct2_config.SB_FIELDS.encode(values).ravel()
+
+
+def demap_table_words(planned, demap_words):
+    """
+    Return the g_DEMAP_TABLE words with the sb_id of the SBs read by
+    read_top_sbs() changed to their planned sb_id.
+    """
+    words = np.array(demap_words, dtype=np.uint64)
+    new_id = {sb['top_sb_id']: sb['sb_id'] for sb in planned if 'top_sb_id' in sb}
+    old_id = ct2_config.DEMAP_FIELDS.decode(words[0::2])['sb_id']
+    sb_id = np.array([new_id.get(int(i), int(i)) for i in old_id], dtype=np.int64)
+    words[0::2] = ct2_config.DEMAP_FIELDS.encode({'sb_id': sb_id}, words[0::2])
+    return words
+
+
+def vhdl_generics(planned, demap_words=None):
+    """
+    Return the g_SB_COUNTS, g_SB_C0_TABLE and g_SB_C1_TABLE generic map lines,
+    and the g_DEMAP_TABLE line when demap_words is given, see demap_table_words().
+    """
+    counts = [sum(sb['correlator'] == c for sb in planned) for c in range(N_CORRELATORS)]
+    lines = ['g_SB_COUNTS => (%s),' % ', '.join('x"%08X"' % n for n in (counts[0], counts[0], counts[1], counts[1]))]
+    for c in range(N_CORRELATORS):
+        words = ['x"%08X"' % w for w in sb_table_words(planned, c).tolist()]
+        if counts[c] == 0:
+            lines.append(f'g_SB_C{c}_TABLE => (0 => x"00000000"),')
+            continue
+        rows = [', '.join(words[k:k + 4]) for k in range(0, len(words), 4)]
+        lines.append(f'g_SB_C{c}_TABLE => (\n    ' + ',\n    '.join(rows) + '\n),')
+    if demap_words is not None and len(demap_words):
+        words = ['x"%08X"' % w for w in demap_table_words(planned, demap_words).tolist()]
+        rows = [', '.join(words[k:k + 2]) for k in range(0, len(words), 2)]
+        lines.append('g_DEMAP_TABLE => (\n    ' + ',\n    '.join(rows) + '\n),')
+    return lines
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def print_plan(planned, capacity):
+    size = footprints(planned)
+    _, stations, coarse_start, fine_start, n_fine = sb_table_params(planned)
+    slots = fine_slots(coarse_start, fine_start, n_fine)
+    print("   SB  corr index sb_id stations coarse  fine  n_fine int_ms slots   hbm_base(bytes)       size")
+    for i, sb in enumerate(planned):
+        print(f"  {i:3d}  {sb['correlator']:4d} {sb['index']:5d} {sb['sb_id']:5d} {stations[i]:8d} {coarse_start[i]:6d}"
+              f" {fine_start[i]:5d} {n_fine[i]:7d} {849 if sb['int_mode_849'] else 283:6d} {slots[i]:5d}"
+              f"   0x{4 * sb['hbm_base']:010X} {size[i]:10d}")
+    for c, s in enumerate(summary(planned, capacity)):
+        print(f"  correlator {c}: {s['n_sbs']:3d} SBs, {s['used'] / 2**20:9.1f} MB used of {capacity / 2**20:.0f} MB"
+              f" ({100 * s['utilisation']:5.1f}%), free {s['free'] / 2**20:9.1f} MB"
+              f" = {s['headroom']} station x fine channels")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Plan the CT2 HBM base addresses of the subarray-beams")
+    ap.add_argument('sb_list', help="SB list file, top-level VHDL wrapper (e.g. ct2_test5_top.vhd) or YAML configuration")
+    ap.add_argument('--capacity', type=lambda s: int(s, 0), default=BUFFER_OFFSET,
+                    help="bytes per memory for one half of the double buffer (default 0x%X)" % BUFFER_OFFSET)
+    ap.add_argument('--rebalance', action='store_true',
+                    help="assign the SBs of a top VHDL or YAML file to the correlators again, "
+                         "and print the g_DEMAP_TABLE with the new sb_ids")
+    args = ap.parse_args()
+
+    demap_words = None
+    if args.sb_list.endswith(('.vhd', '.yaml', '.yml')):
+        sbs, demap_words = read_top_sbs(args.sb_list)
+        clash = overlaps(sbs)
+        for i, j in clash:
+            print(f"  OVERLAP: correlator {sbs[i]['correlator']} SB table entries of SB {i} and SB {j}")
+        print(f"{len(sbs)} SBs in {args.sb_list}, {len(clash)} overlapping address ranges")
+        if args.rebalance:
+            sbs = [dict(sb, correlator=None) for sb in sbs]
+        else:
+            demap_words = None
+    else:
+        if args.rebalance:
+            ap.error("--rebalance needs a top VHDL or YAML file")
+        sbs = read_sb_list(args.sb_list)
+
+    try:
+        planned = plan(sbs, args.capacity)
+    except ValueError as e:
+        print(f"FAIL: {e}")
+        sys.exit(1)
+    print_plan(planned, args.capacity)
+    print()
+    print('\n'.join(vhdl_generics(planned, demap_words)))
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
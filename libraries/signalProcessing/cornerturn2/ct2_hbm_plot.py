@@ -52,13 +52,21 @@ import struct
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'tools', 'radiohdl', 'base'))
+from common import BitFields  # noqa: E402  (radiohdl common, vectorised bit field codec)
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ct2_hbm_addr import ct2_block_addr, block_byte_offset  # noqa: E402  (get_ct2_HBM_addr_v80 model)
+import ct2_config  # noqa: E402  (sibling module, shared test configuration)
+
 # ---------------------------------------------------------------------------
 # Constants - adjust these for your simulation / hardware run
 # ---------------------------------------------------------------------------
 
 N_WORDS_TO_READ = 679477248      # max 32-bit words to read per file
 
-# Subarray-beam parameters (must match the generic map in your *_top.vhd)
+# Subarray-beam parameters (must match the generic map in your *_top.vhd),
+# or taken from the SB table of the test top with --vhdl-top / --sb
 SB_HBM_BASE_ADDR = 0x00000000    # within-region byte address of the SB
 SB_COARSE_START  = 0             # first coarse channel for this SB (0-511)
 SB_FINE_START    = 0             # first fine channel within that coarse ch (0-3455)
@@ -107,30 +115,22 @@ def load_buffers(path: str, n_words: int):
 # Addressing
 # ---------------------------------------------------------------------------
 
-def block_byte_offset(t_in_block: int, s_in_group: int) -> int:
-    """Byte offset within a 256-byte block for time t_in_block (0-15), station s_in_group (0-3)."""
-    beat   = t_in_block // 2
-    parity = t_in_block %  2
-    return beat * 32 + parity * 16 + s_in_group * 4
-
-
 def hbm_block_locate(fine_ch_rel, time_block, station_group, n_sg, sb_base, split):
     """
     Return (fc_group, byte_addr) for one 256-byte block.
 
     split=True : new V80 layout, fine channels spread across 4 memories.
-                 fc_group selects the memory; within_idx = fine//4 indexes it.
+                 fc_group selects the memory; within_idx = fine//4 indexes it
+                 (ct2_hbm_addr.ct2_block_addr, sb_base in bytes).
     split=False: legacy single-memory layout (fine_ch_rel used directly).
     """
     if split:
-        abs_fine   = SB_FINE_START + fine_ch_rel       # per-coarse fine channel
-        fc_group   = abs_fine % N_FC_GROUPS
-        within_idx = (abs_fine // N_FC_GROUPS) - (SB_FINE_START // N_FC_GROUPS)
-    else:
-        fc_group   = 0
-        within_idx = fine_ch_rel
-    addr = sb_base + 256 * (within_idx * 12 * n_sg + time_block * n_sg + station_group)
-    return fc_group, addr
+        sb = {'hbm_base': sb_base // 4, 'stations': 4 * n_sg, 'coarse_start': SB_COARSE_START,
+              'fine_start': SB_FINE_START, 'num_fine': SB_N_FINE}
+        fc_group, addr = ct2_block_addr(sb, fine_ch_rel, time_block, 4 * station_group)
+        return int(fc_group), int(addr)
+    addr = sb_base + 256 * (fine_ch_rel * 12 * n_sg + time_block * n_sg + station_group)
+    return 0, addr
 
 
 # ---------------------------------------------------------------------------
@@ -182,21 +182,20 @@ def decode(buffers, split, station, fine_ch_rel):
 # Debug field decode / check
 # ---------------------------------------------------------------------------
 
+# Debug sample word {V.im, V.re, H.im, H.re} fields, see module docstring
+DEBUG_FIELDS = {
+    True:  BitFields([('vc', 9, 0),  ('fine', 21, 10), ('time_step', 27, 22), ('frame_mod3', 29, 28), ('frame_849ms', 31, 30)]),
+    False: BitFields([('vc', 11, 0), ('fine', 21, 12), ('time_step', 27, 22), ('frame_mod3', 29, 28), ('frame_849ms', 31, 30)]),
+}
+
+
 def decode_debug_fields(h_re, h_im, v_re, v_im, s_in_group: int) -> tuple:
-    b0 = int(h_re) & 0xFF
-    b1 = int(h_im) & 0xFF
-    b2 = int(v_re) & 0xFF
-    b3 = int(v_im) & 0xFF
-    if s_in_group == 0:
-        vc   = b0 | ((b1 & 0x03) << 8)
-        fine = ((b1 >> 2) & 0x3F) | ((b2 & 0x3F) << 6)
-    else:
-        vc   = b0 | ((b1 & 0x0F) << 8)
-        fine = ((b1 >> 4) & 0x0F) | ((b2 & 0x3F) << 4)
-    time_step   = ((b2 >> 6) & 0x03) | ((b3 & 0x0F) << 2)
-    frame_mod3  = (b3 >> 4) & 0x03
-    frame_849ms = (b3 >> 6) & 0x03
-    return vc, fine, time_step, frame_mod3, frame_849ms
+    """Decode the debug fields of one sample or of arrays of samples, returns (vc, fine, time_step, frame_mod3, frame_849ms)."""
+    word = ((np.asarray(h_re, dtype=np.uint64) & 0xFF)
+            | (np.asarray(h_im, dtype=np.uint64) & 0xFF) << np.uint64(8)
+            | (np.asarray(v_re, dtype=np.uint64) & 0xFF) << np.uint64(16)
+            | (np.asarray(v_im, dtype=np.uint64) & 0xFF) << np.uint64(24))
+    return tuple(DEBUG_FIELDS[s_in_group == 0].decode(word).values())
 
 
 def check_debug(h_re, h_im, v_re, v_im, station, fine_ch_rel) -> dict:
@@ -207,15 +206,8 @@ def check_debug(h_re, h_im, v_re, v_im, station, fine_ch_rel) -> dict:
     fine_mask  = (1 << fine_bits) - 1
 
     n = len(h_re)
-    vc_arr   = np.zeros(n, dtype=np.int32)
-    fine_arr = np.zeros(n, dtype=np.int32)
-    time_arr = np.zeros(n, dtype=np.int32)
-    mod3_arr = np.zeros(n, dtype=np.int32)
-    f849_arr = np.zeros(n, dtype=np.int32)
-
-    for i in range(n):
-        vc_arr[i], fine_arr[i], time_arr[i], mod3_arr[i], f849_arr[i] = \
-            decode_debug_fields(h_re[i], h_im[i], v_re[i], v_im[i], s_in_group)
+    vc_arr, fine_arr, time_arr, mod3_arr, f849_arr = \
+        [a.astype(np.int32) for a in decode_debug_fields(h_re, h_im, v_re, v_im, s_in_group)]
 
     t        = np.arange(n)
     vc_exp   = np.full(n, station, dtype=np.int32)
@@ -416,6 +408,7 @@ def plot(h_re, h_im, v_re, v_im, station, fine_ch_rel, src: str) -> None:
 
 def main():
     global PLOT_STATION, PLOT_FINE_CH
+    global SB_HBM_BASE_ADDR, SB_COARSE_START, SB_FINE_START, SB_N_STATIONS, SB_N_FINE
 
     ap = argparse.ArgumentParser(
         description="Decode/plot/check a CT2 HBM dump (V80 4-memory fine-channel split)")
@@ -432,8 +425,26 @@ def main():
                     help="check-debug: sweep every station (default: just --station)")
     ap.add_argument("--max-detail", type=int, default=20,
                     help="Max failing series to print in detail (default 20)")
+    ap.add_argument("--vhdl-top", default=None,
+                    help="Take the SB parameters from this test top (e.g. ct2_test5_top.vhd) "
+                         "or YAML configuration instead of the SB_* constants")
+    ap.add_argument("--sb", type=int, default=0,
+                    help="With --vhdl-top, SB table index (default 0)")
+    ap.add_argument("--correlator", type=int, default=0, choices=[0, 1],
+                    help="With --vhdl-top, SB table of correlator 0 or 1 (default 0)")
     args = ap.parse_args()
 
+    if args.vhdl_top is not None:
+        sbs = ct2_config.load_config(args.vhdl_top).sbs(args.correlator)
+        if not 0 <= args.sb < len(sbs):
+            ap.error(f"--sb {args.sb}: the SB table has {len(sbs)} entries")
+        sb = sbs[args.sb]
+        SB_HBM_BASE_ADDR = sb['hbm_base'] * 4
+        SB_COARSE_START = sb['coarse_start'] & 0x1FF
+        SB_FINE_START = sb['fine_start']
+        SB_N_STATIONS = sb['stations']
+        SB_N_FINE = sb['num_fine']
+
     if args.station is not None:
         PLOT_STATION = args.station
     if args.fine_ch is not None:
@@ -442,6 +453,8 @@ def main():
     n_sg = math.ceil(SB_N_STATIONS / 4)
     print("Configuration:")
     print(f"  Input           : {args.hbm_path}")
+    if args.vhdl_top is not None:
+        print(f"  SB table        : {args.vhdl_top}, correlator {args.correlator}, SB {args.sb}")
     print(f"  SB base addr    : 0x{SB_HBM_BASE_ADDR:08X}")
     print(f"  SB stations     : {SB_N_STATIONS}  (n_sg = {n_sg})")
     print(f"  SB fine channels: {SB_N_FINE}  (fine_start = {SB_FINE_START})")
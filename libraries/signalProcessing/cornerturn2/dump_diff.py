@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+dump_diff.py  --  Compare two HBM dumps word by word, e.g. of the same test
+                  on the last good and the current firmware build.
+
+Usage:
+    python3 dump_diff.py <dump_a> <dump_b> [options]
+    python3 dump_diff.py good/ct2_hbm.txt new/ct2_hbm.txt --layout ct2 --vhdl-top ct2_test5_top.vhd
+    python3 dump_diff.py good/vis_hbm.txt new/vis_hbm.txt --layout vis --vhdl-top ct2_test5_top.vhd
+
+A dump is one of:
+  text file      : <byte-addr-hex> <data-hex> lines, ct2_check.load_dump()
+                   format, parsed with numpy in blocks of PARSE_MB and
+                   spilled to a temporary file per --chunk-mb window (12
+                   bytes per word), the last write of an address wins
+  hbm<g>.bin     : raw memory image, read in --chunk-mb chunks, words equal
+                   to UNWRITTEN (0xFEEDCAFE) are not written
+  directory      : hbm0.bin .. hbm3.bin, memory g at address g << 32, the
+                   ct2_hbm_plot.py split layout
+
+The dumps are aligned by address in windows of --chunk-mb bytes, only one
+window of each dump is in memory at a time.  Per window
+the differences are found with numpy set operations on the written
+addresses:
+  changed  : written in both dumps, different value
+  only A   : written in dump A only
+  only B   : written in dump B only
+and compressed into intervals of contiguous words.  With --layout the
+differing words are mapped back through the address map of the test
+configuration:
+  ct2 : (SB, buffer) -> fine channels, time blocks, stations
+        (ct2_hbm_addr.ct2_hbm_locate)
+  vis : (SB, vis or TCI/DV) -> integrations, output channels and times,
+        row and column stations, polarisation products
+        (vis_check.locate_cells)
+Each coordinate is summarised as an interval list, e.g. 0-15,40.
+
+Exit code 0 if the dumps are identical, 1 if they differ, 2 on errors.
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import ct2_config  # noqa: E402  (sibling module, shared test configuration)
+import ct2_hbm_addr  # noqa: E402  (CT2 address map inverse)
+import vis_check  # noqa: E402  (visibility cell layout)
+
+UNWRITTEN = 0xFEEDCAFE       # sentinel of the unwritten words in .bin images, ct2_hbm_plot.py
+WORD_BYTES = 4
+CHUNK_MB = 64
+PARSE_MB = 8                 # text dump bytes parsed at once
+DIFF_KINDS = ('changed', 'only_a', 'only_b')
+POL_NAMES = ('00', '01', '10', '11')
+
+
+# ---------------------------------------------------------------------------
+# Dump input
+# ---------------------------------------------------------------------------
+
+# Hex digit value of each byte, -1 for the other characters
+_HEX_VALUE = np.full(256, -1, dtype=np.int64)
+for _digits, _first in (('0123456789', 0), ('abcdef', 10), ('ABCDEF', 10)):
+    _HEX_VALUE[np.frombuffer(_digits.encode(), dtype=np.uint8)] = _first + np.arange(len(_digits))
+_IS_SPACE = np.zeros(256, dtype=bool)
+_IS_SPACE[np.frombuffer(b' \t\r\n\v\f', dtype=np.uint8)] = True
+
+
+def parse_hex_lines(data):
+    """
+    Return (addr int64, word uint32) of the lines of whole lines of text
+    data with two hex values, in file order.  Other lines are skipped, as in
+    load_dump().  The tokens (runs of non space bytes) are converted at once,
+    right aligned in a (tokens, longest token) array of hex digits.
+    """
+    b = np.frombuffer(data, dtype=np.uint8)
+    edge = np.diff(np.concatenate(([0], (~_IS_SPACE[b]).view(np.int8), [0])))
+    starts = np.flatnonzero(edge == 1)
+    ends = np.flatnonzero(edge == -1)
+    # only the tokens of the lines with exactly 2 tokens
+    token_line = np.searchsorted(np.flatnonzero(b == ord('\n')), starts)
+    on_pair_line = np.bincount(token_line)[token_line] == 2
+    starts, ends = starts[on_pair_line], ends[on_pair_line]
+    if starts.size == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint32)
+    width = int((ends - starts).max())
+    if width > 15:
+        raise ValueError(f"hex value of {width} digits in a dump line")
+    pos = ends[:, None] - width + np.arange(width)
+    in_token = pos >= starts[:, None]
+    digits = np.where(in_token, _HEX_VALUE[b[np.maximum(pos, 0)]], 0)
+    if np.any(digits < 0):
+        k = int(pos[digits < 0][0])
+        text = data[data.rfind(b'\n', 0, k) + 1:data.find(b'\n', k)].decode(errors='replace')
+        raise ValueError(f"invalid hex value in line {text!r}")
+    values = (digits << (4 * np.arange(width - 1, -1, -1))).sum(axis=1)
+    return values[0::2], values[1::2].astype(np.uint32)
+
+
+def text_blocks(filename, block_bytes=PARSE_MB * 2**20):
+    """Yield the (addr, word) of parse_hex_lines() of blocks of whole lines of the text dump."""
+    rest = b''
+    with open(filename, 'rb') as f:
+        while True:
+            data = f.read(block_bytes)
+            if not data:
+                break
+            data = rest + data
+            cut = data.rfind(b'\n') + 1
+            rest = data[cut:]
+            if cut:
+                yield parse_hex_lines(data[:cut])
+    if rest.strip():
+        yield parse_hex_lines(rest + b'\n')
+
+
+SPILL_DTYPE = np.dtype([('addr', '<i8'), ('word', '<u4')])
+
+
+def spill_text_dump(filename, spill_dir, chunk_bytes=CHUNK_MB * 2**20):
+    """
+    Parse the text dump in blocks and append the words of each window of
+    chunk_bytes to <spill_dir>/<region>_<window>.npy, in file order.
+    Returns {region: address extent in bytes}.
+    """
+    regions = {}
+    for addr, word in text_blocks(filename):
+        if addr.size == 0:
+            continue
+        region = addr >> ct2_hbm_addr.REGION_SHIFT
+        window = (addr & (2**ct2_hbm_addr.REGION_SHIFT - 1)) // chunk_bytes
+        # stable sort by window keeps the file order within a window
+        order = np.lexsort((window, region))
+        key = np.stack([region[order], window[order]], axis=1)
+        bounds = np.flatnonzero(np.any(np.diff(key, axis=0) != 0, axis=1)) + 1
+        for lo, hi in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(order)]))):
+            r, w = key[lo].tolist()
+            records = np.empty(hi - lo, dtype=SPILL_DTYPE)
+            records['addr'] = addr[order[lo:hi]]
+            records['word'] = word[order[lo:hi]]
+            with open(os.path.join(spill_dir, f"{r}_{w}.npy"), 'ab') as f:
+                records.tofile(f)
+            extent = int(records['addr'].max() % 2**ct2_hbm_addr.REGION_SHIFT) + WORD_BYTES
+            regions[r] = max(regions.get(r, 0), extent)
+    return regions
+
+
+def open_dump(path, chunk_bytes=CHUNK_MB * 2**20):
+    """
+    Return a dump dict: files ({region: .bin file} or None for text), spill
+    (text dumps, temporary directory of spill_text_dump()), regions ({region:
+    address extent in bytes}).  The region is the memory, address bits 33:32.
+    The spill directory is removed when the dump dict is freed.
+    """
+    chunk_bytes = max(WORD_BYTES, chunk_bytes // WORD_BYTES * WORD_BYTES)   # as diff_dumps()
+    if os.path.isdir(path):
+        files = {g: os.path.join(path, f"hbm{g}.bin") for g in range(ct2_hbm_addr.N_FC_GROUPS)
+                 if os.path.isfile(os.path.join(path, f"hbm{g}.bin"))}
+        if not files:
+            raise ValueError(f"no hbm<g>.bin files in directory {path}")
+    elif path.endswith('.bin'):
+        files = {0: path}
+    else:
+        spill = tempfile.TemporaryDirectory(prefix='dump_diff_')
+        regions = spill_text_dump(path, spill.name, chunk_bytes)
+        return {'path': path, 'files': None, 'spill': spill, 'chunk_bytes': chunk_bytes, 'regions': regions}
+    return {'path': path, 'files': files, 'spill': None,
+            'regions': {g: os.path.getsize(f) // WORD_BYTES * WORD_BYTES for g, f in files.items()}}
+
+
+def read_raw(dump, region, start, stop):
+    """Words of a .bin dump at region byte addresses [start, stop), UNWRITTEN past the end of the file."""
+    raw = np.full((stop - start) // WORD_BYTES, UNWRITTEN, dtype=np.uint32)
+    path = dump['files'].get(region)
+    if path is not None:
+        with open(path, 'rb') as fh:
+            fh.seek(start)
+            data = fh.read(stop - start)
+        n = len(data) // WORD_BYTES
+        raw[:n] = np.frombuffer(data[:n * WORD_BYTES], dtype='<u4')
+    return raw
+
+
+def read_window(dump, region, start, stop):
+    """(addr, word) of the written words of the dump at region byte addresses [start, stop), sorted."""
+    base = region << ct2_hbm_addr.REGION_SHIFT
+    if dump['files'] is not None:
+        raw = read_raw(dump, region, start, stop)
+        written = np.nonzero(raw != UNWRITTEN)[0]
+        return base + start + WORD_BYTES * written.astype(np.int64), raw[written]
+    spill_file = os.path.join(dump['spill'].name, f"{region}_{start // dump['chunk_bytes']}.npy")
+    if not os.path.exists(spill_file):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint32)
+    records = np.fromfile(spill_file, dtype=SPILL_DTYPE)
+    # np.unique keeps the first occurrence, so search the reversed file order
+    addr, last = np.unique(records['addr'][::-1], return_index=True)
+    return addr, records['word'][::-1][last]
+
+
+# ---------------------------------------------------------------------------
+# Differences
+# ---------------------------------------------------------------------------
+
+def diff_window(a_addr, a_word, b_addr, b_word):
+    """Return {kind: sorted differing word addresses} of two sorted (addr, word) sets."""
+    common, ia, ib = np.intersect1d(a_addr, b_addr, assume_unique=True, return_indices=True)
+    return {'changed': common[a_word[ia] != b_word[ib]],
+            'only_a': np.setdiff1d(a_addr, b_addr, assume_unique=True),
+            'only_b': np.setdiff1d(b_addr, a_addr, assume_unique=True)}
+
+
+def diff_aligned(raw_a, raw_b, base):
+    """diff_window() of two word arrays of the same address range starting at byte address base."""
+    wa = raw_a != UNWRITTEN
+    wb = raw_b != UNWRITTEN
+    addr = lambda sel: base + WORD_BYTES * np.nonzero(sel)[0].astype(np.int64)
+    return {'changed': addr(wa & wb & (raw_a != raw_b)),
+            'only_a': addr(wa & ~wb),
+            'only_b': addr(wb & ~wa)}
+
+
+def diff_dumps(dump_a, dump_b, chunk_bytes=CHUNK_MB * 2**20):
+    """
+    Yield {kind: differing word addresses} per window of chunk_bytes, in
+    address order, for all regions of either dump.
+    """
+    chunk_bytes = max(WORD_BYTES, chunk_bytes // WORD_BYTES * WORD_BYTES)
+    both_binary = dump_a['files'] is not None and dump_b['files'] is not None
+    for region in sorted(set(dump_a['regions']) | set(dump_b['regions'])):
+        extent = max(dump_a['regions'].get(region, 0), dump_b['regions'].get(region, 0))
+        base = region << ct2_hbm_addr.REGION_SHIFT
+        for start in range(0, extent, chunk_bytes):
+            stop = min(start + chunk_bytes, extent)
+            if both_binary:
+                yield diff_aligned(read_raw(dump_a, region, start, stop),
+                                   read_raw(dump_b, region, start, stop), base + start)
+            else:
+                yield diff_window(*read_window(dump_a, region, start, stop),
+                                  *read_window(dump_b, region, start, stop))
+
+
+def word_intervals(addr):
+    """Compress sorted word addresses into an (n, 2) array of [first, last] of contiguous words."""
+    addr = np.asarray(addr, dtype=np.int64)
+    if addr.size == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    breaks = np.nonzero(np.diff(addr) != WORD_BYTES)[0]
+    first = np.concatenate((addr[:1], addr[breaks + 1]))
+    last = np.concatenate((addr[breaks], addr[-1:]))
+    return np.stack([first, last], axis=1)
+
+
+def int_list(values):
+    """Interval list text of sorted unique integers, e.g. '0-15,40,42-43'."""
+    values = np.asarray(values, dtype=np.int64)
+    if values.size == 0:
+        return '-'
+    breaks = np.nonzero(np.diff(values) != 1)[0]
+    first = np.concatenate((values[:1], values[breaks + 1]))
+    last = np.concatenate((values[breaks], values[-1:]))
+    return ','.join(f"{f}" if f == l else f"{f}-{l}" for f, l in zip(first.tolist(), last.tolist()))
+
+
+# ---------------------------------------------------------------------------
+# Layout mapping
+# ---------------------------------------------------------------------------
+
+def read_layout(layout, vhdl_top, correlator=0):
+    """Return the SB dicts of the test configuration for ct2_locations() or vis_locations()."""
+    cfg = ct2_config.load_config(vhdl_top)
+    if layout == 'ct2':
+        return cfg.sbs(correlator, in_use=True)
+    sbs = cfg.sbs_full(correlator)
+    return {'sbs': sbs, 'cells': vis_check.cell_layout(sbs)}
+
+
+def ct2_locations(addr, sbs):
+    """Group key (SB, buffer) and coordinates of CT2 dump word addresses, one station sample per word."""
+    loc = ct2_hbm_addr.ct2_hbm_locate(addr, sbs)
+    keys = [f"SB {sb:3d} buffer {buf}" if sb >= 0 else "outside the SBs"
+            for sb, buf in zip(loc['sb'].tolist(), loc['buffer'].tolist())]
+    coords = {'fine': loc['fine_ch_rel'], 'time_block': loc['time_block'], 'station': loc['station']}
+    return keys, coords
+
+
+def vis_locations(addr, layout):
+    """Group key (SB, vis or TCI/DV) and coordinates of visibility dump word addresses."""
+    addr = np.asarray(addr, dtype=np.int64)
+    is_vis = addr < vis_check.TCI_REGION_BASE
+    offset = np.where(is_vis, addr - vis_check.VIS_REGION_BASE, addr - vis_check.TCI_REGION_BASE)
+    cell_bytes = np.where(is_vis, vis_check.CELL_VIS_BYTES, vis_check.CELL_TCI_BYTES)
+    cell, byte = offset // cell_bytes, offset % cell_bytes
+    # vis: 32 bytes per element, 8 per polarisation product; TCI/DV: 2 bytes per element,
+    # a word holds 2 elements, reported by the first
+    element = np.where(is_vis, byte // 32, byte // 2)
+    loc = vis_check.locate_cells(layout['sbs'], layout['cells'], cell)
+    keys = [f"SB {sb:3d} {'vis' if v else 'TCI/DV'}" if sb >= 0 else "outside the SBs"
+            for sb, v in zip(loc['sb'].tolist(), is_vis.tolist())]
+    coords = {'integration': loc['integration'], 'output_channel': loc['output_channel'],
+              'output_time': loc['output_time'],
+              'row_station': loc['row_first_station'] + element // 16,
+              'col_station': loc['col_first_station'] + element % 16,
+              'pol': np.where(is_vis, (byte % 32) // 8, -1)}
+    return keys, coords
+
+
+# ---------------------------------------------------------------------------
+# Summary
+# ---------------------------------------------------------------------------
+
+def summarise(windows, locate=None, max_intervals=40):
+    """
+    Consume diff_dumps() windows.  Returns a dict per kind of DIFF_KINDS:
+      words          : number of differing words
+      n_intervals    : number of intervals of contiguous differing words
+      intervals      : the first max_intervals intervals [first, last]
+      groups         : {group key: {'words': n, coordinate: sorted unique values}}
+    locate(addr) -> (keys, coords) maps the addresses to the layout, None = no mapping.
+    """
+    summary = {kind: {'words': 0, 'n_intervals': 0, 'intervals': [], 'last': None, 'groups': {}}
+               for kind in DIFF_KINDS}
+    for window in windows:
+        for kind, addr in window.items():
+            if addr.size == 0:
+                continue
+            s = summary[kind]
+            s['words'] += addr.size
+            iv = word_intervals(addr)
+            if s['last'] is not None and iv[0, 0] == s['last'][1] + WORD_BYTES:
+                # continues the last interval of the previous window
+                if len(s['intervals']) and s['intervals'][-1][0] == s['last'][0]:
+                    s['intervals'][-1][1] = int(iv[0, 1])
+                s['last'] = [s['last'][0], int(iv[0, 1])]
+                iv = iv[1:]
+            if len(iv):
+                s['n_intervals'] += len(iv)
+                room = max_intervals - len(s['intervals'])
+                s['intervals'].extend([int(f), int(l)] for f, l in iv[:room])
+                s['last'] = [int(iv[-1, 0]), int(iv[-1, 1])]
+            if locate is None:
+                continue
+            keys, coords = locate(addr)
+            keys = np.array(keys)
+            for key in np.unique(keys):
+                sel = keys == key
+                g = s['groups'].setdefault(str(key), {'words': 0})
+                g['words'] += int(sel.sum())
+                for name, values in coords.items():
+                    g[name] = np.union1d(g.get(name, np.zeros(0, dtype=np.int64)), values[sel])
+    return summary
+
+
+def print_summary(summary, max_intervals=40):
+    labels = {'changed': 'changed value', 'only_a': 'written in A only', 'only_b': 'written in B only'}
+    for kind in DIFF_KINDS:
+        s = summary[kind]
+        if s['words'] == 0:
+            continue
+        print(f"\n  --- {labels[kind]}: {s['words']} words in {s['n_intervals']} interval(s) ---")
+        for first, last in s['intervals']:
+            n = (last - first) // WORD_BYTES + 1
+            print(f"    0x{first:09x} - 0x{last + WORD_BYTES - 1:09x}  {n:10d} words")
+        if s['n_intervals'] > len(s['intervals']):
+            print(f"    ... {s['n_intervals'] - len(s['intervals'])} more interval(s)")
+        for key in sorted(s['groups']):
+            g = s['groups'][key]
+            fields = []
+            for name, values in g.items():
+                if name == 'words':
+                    continue
+                if name == 'pol':
+                    # polarisation products of the visibility words, none for TCI/DV
+                    if values.max(initial=-1) >= 0:
+                        fields.append('pol ' + ','.join(POL_NAMES[p] for p in values if p >= 0))
+                    continue
+                fields.append(f"{name} {int_list(values)}")
+            print(f"    {key}: {g['words']} words  {'  '.join(fields)}")
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare two HBM dumps and map the differences to the layout")
+    ap.add_argument('dump_a', help="Reference dump: text file, .bin image or directory of hbm<g>.bin")
+    ap.add_argument('dump_b', help="Dump to compare, same formats")
+    ap.add_argument('--layout', choices=['none', 'ct2', 'vis'], default='none',
+                    help="Map the differences through the CT2 or visibility address map, default none")
+    ap.add_argument('--vhdl-top', help="Top-level VHDL wrapper with the test configuration, for --layout")
+    ap.add_argument('--correlator', type=int, default=0, choices=[0, 1],
+                    help="SB table of this correlator for --layout, default 0")
+    ap.add_argument('--chunk-mb', type=float, default=CHUNK_MB,
+                    help=f"Address window compared at once, MBytes, default {CHUNK_MB}")
+    ap.add_argument('--max-intervals', type=int, default=40,
+                    help="Maximum number of address intervals to print per kind, default 40")
+    args = ap.parse_args()
+
+    chunk_bytes = int(args.chunk_mb * 2**20)
+    try:
+        locate = None
+        if args.layout != 'none':
+            if args.vhdl_top is None:
+                ap.error("--layout needs --vhdl-top")
+            print(f"Parsing configuration from: {args.vhdl_top}")
+            layout = read_layout(args.layout, args.vhdl_top, args.correlator)
+            if args.layout == 'ct2':
+                locate = lambda addr: ct2_locations(addr, layout)
+            else:
+                locate = lambda addr: vis_locations(addr, layout)
+        dump_a = open_dump(args.dump_a, chunk_bytes)
+        dump_b = open_dump(args.dump_b, chunk_bytes)
+    except (OSError, ValueError) as e:
+        print(f"FAIL: {e}")
+        sys.exit(2)
+
+    print(f"Comparing A: {args.dump_a}")
+    print(f"     with B: {args.dump_b}")
+    summary = summarise(diff_dumps(dump_a, dump_b, chunk_bytes), locate, args.max_intervals)
+    print_summary(summary, args.max_intervals)
+
+    n_diff = sum(summary[kind]['words'] for kind in DIFF_KINDS)
+    print()
+    print("=== dump_diff result ===")
+    print(f"  Changed words      : {summary['changed']['words']}")
+    print(f"  Written in A only  : {summary['only_a']['words']}")
+    print(f"  Written in B only  : {summary['only_b']['words']}")
+    if n_diff == 0:
+        print("  IDENTICAL")
+        sys.exit(0)
+    print("  DIFFERENT")
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
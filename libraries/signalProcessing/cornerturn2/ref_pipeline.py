@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+ref_pipeline.py  --  End-to-end reference model of the correlator signal
+                     chain: CT1 -> filterbank -> fine delay -> CT2 ->
+                     correlator, on any SPS input.
+
+Usage:
+    python3 ref_pipeline.py <ct2_config> --ct1-config <yaml> -g <taps> [options]
+    python3 ref_pipeline.py ct2_test5_top.vhd --ct1-config ../cornerturn1/test/test13.yaml \\
+        -g ../filterbanks/src/matlab/correlatorTaps.txt --source noise --checkpoint-dir run1
+    python3 ref_pipeline.py ct2_test5_top.vhd --source ct2-pattern --integrations 2
+
+The stages reuse the models of the stage checkers:
+  ct1        : coarse delay and deripple filter, fine delay meta data
+               (ct1_test.packet_delays, ct1_test.deripple_filter)
+  filterbank : polyphase filterbank and RFI marking
+               (filterbank.PolyphaseFilterBank, ct1_test.filterbank_expected)
+  fine_delay : fine delay and phase, 8 bit samples
+               (ct1_test.apply_fine_delay)
+  ct2        : corner turn of the VCs into the station x fine channel x time
+               blocks of the SBs of the demap and SB tables (ct2_config)
+  correlator : visibilities, TCI and DV of each output channel and time
+               (vis_check.correlate)
+
+Each stage is a generator of (integration, block) pairs, a block is a dict
+of numpy arrays of one integration (3 CT1 frames, 192 fine time samples):
+  ct1        : vcs, packets (vc, frame, 75 packet, 4 component, 4096) int16,
+               meta (vc, frame, 75 packet, 4) int64
+  filterbank : vcs, fb_out (vc, frame, 64, 3456, 2 pol) complex64,
+               rfi_mark (vc, frame, 2 pol, 64) int32, meta
+  fine_delay : vcs, samples (vc, 192 time, 3456 fine, 4 component) int8
+  ct2        : c<corr>_sb<index> (station, 4 component, fine, 192 time) int8
+  correlator : c<corr>_sb<index>_vis (output channel, output time, n16, n16,
+               2, 2) complex64, _tci and _fd (output channel, output time,
+               n16, n16)
+The components are (Hpol.re, Hpol.im, Vpol.re, Vpol.im); -32768 (CT1) and
+-128 (fine delay and CT2) mark RFI, as in the firmware.
+
+The SPS input (--source) is read through a source object, read(vc, first,
+n) returns the raw bytes (4 components, n samples) of samples first ..
+first+n-1 since the epoch, 0x80 = RFI:
+  testbench   : the CT1 testbench data (sample number in the data)
+  noise       : Gaussian noise, reproducible per --seed
+  file        : a .npy array (VC, 4 components, samples) of SPS bytes,
+                int8 or uint8, --input-first-sample is the sample number of
+                the first sample; samples outside the file are RFI
+  ct2-pattern : no SPS input, the pipeline starts at CT2 with the CT2
+                testbench data (ct2_check.expected_sample()), for
+                comparison with vis_check.py
+
+With --checkpoint-dir each block is saved as <dir>/<stage>/integration_<n>.npz
+and a re-run loads the blocks instead of computing them.  A stage only
+runs for an integration when no later stage has a checkpoint of it, so an
+interrupted run resumes at the last saved stage, and the npz files can be
+inspected with numpy.load().  <dir>/pipeline.json holds the hashes of the
+configuration, the input and the model sources; a run with other values is
+refused, --restart removes the old checkpoints.
+
+Exit code 0 on success, 2 on errors.
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import ct2_config  # noqa: E402  (sibling module, shared test configuration)
+import vis_check  # noqa: E402  (correlator model)
+
+# CT1, filterbank and fine delay models (ct1_test.py, filterbank.py), they need scipy and are
+# only imported by the CT1 stages, so --source ct2-pattern runs without them
+_CT1_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cornerturn1', 'test')
+sys.path.insert(0, _CT1_DIR)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'tools', 'radiohdl', 'base'))
+import golden_store  # noqa: E402  (radiohdl common, source hashes)
+
+STAGES = ('ct1', 'filterbank', 'fine_delay', 'ct2', 'correlator')
+SOURCES = ('testbench', 'noise', 'file', 'ct2-pattern')
+FRAMES_PER_INTEGRATION = 3
+PACKETS_PER_FRAME = 75           # 11 preload packets, then 64 packets
+SAMPLES_PER_PACKET = 4096
+FINE_PER_COARSE = 3456
+TIMES_PER_INTEGRATION = 192
+
+# The correlator stage is vis_check, so its MODEL_VERSION (with the TCI, vis2fp
+# and ROM models) is part of the pipeline model version
+MODEL_VERSION = golden_store.entry_key(
+    'ref_pipeline', vis_check.MODEL_VERSION,
+    sources=golden_store.source_version(os.path.abspath(__file__), os.path.join(_CT1_DIR, 'ct1_test.py'),
+                                        os.path.join(_CT1_DIR, 'filterbank.py'), ct2_config.__file__))[:16]
+
+
+# ---------------------------------------------------------------------------
+# SPS input
+# ---------------------------------------------------------------------------
+
+class TestbenchSource:
+    """The CT1 testbench data, ct1_test.testbench_samples()."""
+
+    def read(self, vc, first, n):
+        import ct1_test  # CT1 model, see _CT1_DIR
+        return ct1_test.testbench_samples(np.arange(first, first + n), vc)
+
+
+class NoiseSource:
+    """Gaussian noise of rms sigma, clipped to +-127, drawn per 4096 samples so any range can be read."""
+
+    def __init__(self, seed=0, sigma=16.0):
+        self.seed = seed
+        self.sigma = sigma
+
+    def read(self, vc, first, n):
+        first_block = first // SAMPLES_PER_PACKET
+        n_blocks = (first + n - 1) // SAMPLES_PER_PACKET - first_block + 1
+        blocks = []
+        for block in range(first_block, first_block + n_blocks):
+            rng = np.random.default_rng([self.seed, vc, block & 0xFFFFFFFFFFFF])
+            blocks.append(rng.normal(0, self.sigma, (4, SAMPLES_PER_PACKET)))
+        data = np.concatenate(blocks, axis=1)[:, first - first_block * SAMPLES_PER_PACKET:][:, :n]
+        return np.clip(np.round(data), -127, 127).astype(np.int64) & 0xFF
+
+
+class FileSource:
+    """SPS bytes from a .npy array (VC, 4 components, samples), memory mapped."""
+
+    def __init__(self, filename, first_sample=0):
+        self.data = np.load(filename, mmap_mode='r')
+        if self.data.ndim != 3 or self.data.shape[1] != 4 or self.data.dtype.itemsize != 1:
+            raise ValueError(f"{filename}: expected an int8 or uint8 array (VC, 4, samples), "
+                             f"got {self.data.dtype} {self.data.shape}")
+        self.first_sample = first_sample
+
+    def read(self, vc, first, n):
+        out = np.full((4, n), 0x80, dtype=np.int64)      # no data = RFI
+        if vc >= self.data.shape[0]:
+            return out
+        lo = max(first, self.first_sample)
+        hi = min(first + n, self.first_sample + self.data.shape[2])
+        if lo < hi:
+            out[:, lo - first:hi - first] = self.data[vc, :, lo - self.first_sample:hi - self.first_sample].view(np.uint8)
+        return out
+
+
+# ---------------------------------------------------------------------------
+# Stages
+# ---------------------------------------------------------------------------
+
+def ct1_stage(source, polynomials, deripple):
+    """CT1 output and fine delay meta data of the VCs of the polynomials ({vc: ct1_test YAML entry})."""
+    import ct1_test  # CT1 model, see _CT1_DIR
+    vcs = sorted(polynomials)
+    n_in = PACKETS_PER_FRAME * SAMPLES_PER_PACKET + ct1_test.c_fir_taps - 1
+
+    def process(integration, _):
+        packets = np.zeros((len(vcs), FRAMES_PER_INTEGRATION, PACKETS_PER_FRAME, 4, SAMPLES_PER_PACKET), dtype=np.int16)
+        meta = np.zeros((len(vcs), FRAMES_PER_INTEGRATION, PACKETS_PER_FRAME, 4), dtype=np.int64)
+        for i, vc in enumerate(vcs):
+            for frame in range(FRAMES_PER_INTEGRATION):
+                coarse_delay, meta[i, frame], _ = ct1_test.packet_delays(polynomials[vc], integration, frame)
+                first = ct1_test.ct1_first_sample(integration, frame, coarse_delay) - ct1_test.c_fir_taps // 2
+                out = ct1_test.deripple_filter(source.read(vc, first, n_in), deripple)
+                packets[i, frame] = out.reshape(4, PACKETS_PER_FRAME, SAMPLES_PER_PACKET).transpose(1, 0, 2)
+        return {'vcs': np.array(vcs), 'packets': packets, 'meta': meta}
+    return process
+
+
+def filterbank_stage(fb, rfi_thresholds):
+    """Filterbank output and RFI marks, rfi_thresholds = {vc: threshold}."""
+    import ct1_test  # filterbank model, see _CT1_DIR
+
+    def process(integration, block):
+        vcs = block['vcs'].tolist()
+        shape = (len(vcs), FRAMES_PER_INTEGRATION)
+        fb_out = np.zeros(shape + (64, FINE_PER_COARSE, 2), dtype=np.complex64)
+        rfi_mark = np.zeros(shape + (2, 64), dtype=np.int32)
+        for i, vc in enumerate(vcs):
+            for frame in range(FRAMES_PER_INTEGRATION):
+                fb_out[i, frame], rfi_mark[i, frame] = ct1_test.filterbank_expected(
+                    fb, block['packets'][i, frame], rfi_thresholds[vc])
+        return {'vcs': block['vcs'], 'fb_out': fb_out, 'rfi_mark': rfi_mark, 'meta': block['meta']}
+    return process
+
+
+def fine_delay_stage():
+    """Fine delay output as 8 bit samples, the meta data of the 11 preload packets is not used."""
+    import ct1_test  # fine delay model, see _CT1_DIR
+
+    def process(integration, block):
+        n_vc = len(block['vcs'])
+        samples = np.zeros((n_vc, TIMES_PER_INTEGRATION, FINE_PER_COARSE, 4), dtype=np.int8)
+        for i in range(n_vc):
+            for frame in range(FRAMES_PER_INTEGRATION):
+                fd = ct1_test.apply_fine_delay(block['fb_out'][i, frame], block['meta'][i, frame, 11:],
+                                               block['rfi_mark'][i, frame])
+                # Out of range values are -128 already, the others round into -127 .. 127
+                samples[i, frame * 64:(frame + 1) * 64] = np.round(
+                    np.stack([fd[..., 0].real, fd[..., 0].imag, fd[..., 1].real, fd[..., 1].imag], axis=-1))
+        return {'vcs': block['vcs'], 'samples': samples}
+    return process
+
+
+def ct2_pattern_stage(vcs):
+    """The CT2 testbench data of the VCs at the fine delay output, ct2_check.expected_sample()."""
+    vcs = np.asarray(vcs, dtype=np.int64)
+
+    def process(integration, _):
+        t = np.arange(TIMES_PER_INTEGRATION)[:, None]
+        fc = np.arange(FINE_PER_COARSE)[None, :]
+        samples = np.zeros((len(vcs), TIMES_PER_INTEGRATION, FINE_PER_COARSE, 4), dtype=np.uint8)
+        samples[..., 0] = fc & 0xFF
+        samples[..., 1] = ((fc >> 8) & 0x0F) | ((integration & 0x0F) << 4)
+        samples[..., 2] = (t % 64) | (((t // 64) & 0x03) << 6)
+        samples[..., 3] = (vcs & 0xFF)[:, None, None]
+        return {'vcs': vcs, 'samples': samples.view(np.int8)}
+    return process
+
+
+def enabled_sbs(cfg):
+    """(correlator, SB index, SB dict) of the SBs in use with output enabled, vis_check SB dicts."""
+    return [(corr, index, sb)
+            for corr in range(ct2_config.N_CORRELATORS)
+            for index, sb in enumerate(cfg.sbs_full(corr, in_use=True))
+            if sb['n_stations'] > 0 and not sb['output_disable']]
+
+
+def ct2_stage(cfg):
+    """Station x fine channel x time samples of each SB, stations without a VC are RFI (no data)."""
+    vc_of = {(dm['sb_id'], dm['station'], dm['sky_freq_idx']): vc
+             for vc, dm in enumerate(cfg.demap_list()) if dm['valid']}
+
+    def process(integration, block):
+        row = {vc: i for i, vc in enumerate(block['vcs'].tolist())}
+        out = {}
+        for corr, index, sb in enabled_sbs(cfg):
+            fine_abs = sb['coarse_start'] * FINE_PER_COARSE + sb['fine_start'] + np.arange(sb['n_fine'])
+            sky, fc = np.divmod(fine_abs, FINE_PER_COARSE)
+            sb_samples = np.full((sb['n_stations'], 4, sb['n_fine'], TIMES_PER_INTEGRATION), -128, dtype=np.int8)
+            for station in range(sb['n_stations']):
+                for k in np.unique(sky).tolist():
+                    vc = vc_of.get((ct2_config.SB_ID_PER_CORRELATOR * corr + index, station, k))
+                    if vc not in row:
+                        continue
+                    sel = np.nonzero(sky == k)[0]
+                    sb_samples[station][:, sel, :] = block['samples'][row[vc]][:, fc[sel], :].transpose(2, 1, 0)
+            out[f'c{corr}_sb{index}'] = sb_samples
+        return out
+    return process
+
+
+def correlator_stage(cfg):
+    """Visibilities, TCI and DV of every output channel and output time of each SB."""
+    def process(integration, block):
+        out = {}
+        for corr, index, sb in enabled_sbs(cfg):
+            name = f'c{corr}_sb{index}'
+            x = block[name]
+            valid = np.all(x != -128, axis=1).astype(np.int64)
+            samp = np.stack([x[:, 0] + 1j * x[:, 1], x[:, 2] + 1j * x[:, 3]], axis=1)
+            n_fpi = sb['n_fine_integrate']
+            time_groups = 1 if sb['n_time_integrate'] == 192 else 3
+            n_time = TIMES_PER_INTEGRATION // time_groups
+            n16 = (sb['n_stations'] + 15) // 16 * 16
+            shape = (sb['n_fine'] // n_fpi, time_groups, n16, n16)
+            vis = np.zeros(shape + (2, 2), dtype=np.complex64)
+            tci = np.zeros(shape, dtype=np.int64)
+            fd = np.zeros(shape, dtype=np.int64)
+            for oc in range(shape[0]):
+                f = slice(oc * n_fpi, (oc + 1) * n_fpi)
+                for ot in range(time_groups):
+                    t = slice(ot * n_time, (ot + 1) * n_time)
+                    vis[oc, ot], tci[oc, ot], fd[oc, ot], _ = vis_check.correlate(
+                        samp[:, :, f, t], valid[:, f, t], sb['n_time_integrate'], n_fpi)
+            out[name + '_vis'], out[name + '_tci'], out[name + '_fd'] = vis, tci, fd
+        return out
+    return process
+
+
+# ---------------------------------------------------------------------------
+# Checkpoints and stage chaining
+# ---------------------------------------------------------------------------
+
+class Checkpoint:
+    """Stage blocks saved as <directory>/<stage>/integration_<n>.npz, for the run params."""
+
+    def __init__(self, directory, params, restart=False):
+        self.directory = directory
+        params_file = os.path.join(directory, 'pipeline.json')
+        if restart:
+            for stage in STAGES:
+                shutil.rmtree(os.path.join(directory, stage), ignore_errors=True)
+        elif os.path.exists(params_file):
+            with open(params_file) as f:
+                old = json.load(f)
+            if old != params:
+                changed = sorted(k for k in set(old) | set(params) if old.get(k) != params.get(k))
+                raise ValueError(f"{directory} holds a run with other {', '.join(changed)}, use --restart")
+        os.makedirs(directory, exist_ok=True)
+        with open(params_file, 'w') as f:
+            json.dump(params, f, indent=1, sort_keys=True)
+
+    def path(self, stage, key):
+        return os.path.join(self.directory, stage, f'integration_{key:06d}.npz')
+
+    def has(self, stage, key):
+        return os.path.exists(self.path(stage, key))
+
+    def load(self, stage, key):
+        with np.load(self.path(stage, key)) as npz:
+            return {name: npz[name] for name in npz.files}
+
+    def save(self, stage, key, block):
+        path = self.path(stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file and rename, so an interrupted run never leaves a partial block
+        fd, tmp = tempfile.mkstemp(suffix='.npz', dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **block)
+        os.replace(tmp, path)
+
+
+def run_stage(name, process, upstream, checkpoint, needed, stats):
+    """
+    Generator of the (key, block) pairs of a stage: None when a later stage
+    has the block of the key, else loaded from the checkpoint or computed by
+    process(key, upstream block).
+    """
+    for key, block in upstream:
+        if not needed(key):
+            stats[name]['skipped'] += 1
+            yield key, None
+        elif checkpoint is not None and checkpoint.has(name, key):
+            stats[name]['loaded'] += 1
+            yield key, checkpoint.load(name, key)
+        else:
+            out = process(key, block)
+            if checkpoint is not None:
+                checkpoint.save(name, key, out)
+            stats[name]['computed'] += 1
+            yield key, out
+
+
+def pipeline(stages, keys, checkpoint=None, stats=None):
+    """Chain the (name, process) stages over the keys, return the generator of the last stage."""
+    names = [name for name, _ in stages]
+
+    def needed_by(i):
+        return lambda key: checkpoint is None or not any(checkpoint.has(name, key) for name in names[i + 1:])
+
+    if stats is None:
+        stats = {}
+    blocks = ((key, None) for key in keys)
+    for i, (name, process) in enumerate(stages):
+        stats[name] = {'computed': 0, 'loaded': 0, 'skipped': 0}
+        blocks = run_stage(name, process, blocks, checkpoint, needed_by(i), stats)
+    return blocks
+
+
+def describe(name, block):
+    """One line summary of a block of stage name."""
+    if name == 'ct1':
+        return f"{len(block['vcs'])} VCs, RFI samples {int(np.sum(block['packets'][:, :, :, 0] == -32768))}"
+    if name == 'filterbank':
+        return f"{len(block['vcs'])} VCs, RFI marked times {int(block['rfi_mark'].sum())}"
+    if name == 'fine_delay':
+        return f"{len(block['vcs'])} VCs, RFI samples {int(np.sum(block['samples'][..., 0] == -128))}"
+    if name == 'ct2':
+        return ', '.join(f"{k} {v.shape[0]} stations x {v.shape[2]} fine" for k, v in block.items())
+    return ', '.join(f"{k[:-4]} max |vis| {np.abs(v).max():.4g}" for k, v in block.items() if k.endswith('_vis'))
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def main():
+    ap = argparse.ArgumentParser(description="End-to-end reference model CT1 -> filterbank -> fine delay -> CT2 -> correlator")
+    ap.add_argument('config', help="CT2 test configuration: top-level VHDL wrapper (e.g. ct2_test5_top.vhd) or YAML, "
+                                   "see ct2_config.py")
+    ap.add_argument('--ct1-config', help="CT1 test configuration YAML with the polynomials (ct1_test.py format)")
+    ap.add_argument('-g', '--filterbank-taps', help="Text file with the filterbank taps")
+    ap.add_argument('--source', choices=SOURCES, default='testbench', help="SPS input, default testbench")
+    ap.add_argument('--input', help="With --source file, .npy array (VC, 4, samples) of SPS bytes")
+    ap.add_argument('--input-first-sample', type=int, default=0,
+                    help="With --source file, sample number (since the epoch) of the first sample, default 0")
+    ap.add_argument('--seed', type=int, default=0, help="With --source noise, random seed, default 0")
+    ap.add_argument('--sigma', type=float, default=16.0, help="With --source noise, rms of the noise, default 16")
+    ap.add_argument('--integration-start', type=int, default=None,
+                    help="First integration, default integration_start of the CT1 configuration or 0")
+    ap.add_argument('--integrations', type=int, default=1, help="Number of integrations, default 1")
+    ap.add_argument('--until', choices=STAGES, default='correlator', help="Last stage to run, default correlator")
+    ap.add_argument('--checkpoint-dir', help="Save the block of each stage and integration here, and resume from it")
+    ap.add_argument('--restart', action='store_true', help="Remove the checkpoints of an earlier run first")
+    args = ap.parse_args()
+
+    try:
+        print(f"Parsing configuration from: {args.config}")
+        cfg = ct2_config.load_config(args.config)
+        params = {'model': MODEL_VERSION, 'source': args.source,
+                  'config': golden_store.source_version(args.config)}
+        ct1_cfg = {}
+        if args.source == 'ct2-pattern':
+            vcs = [vc for vc, dm in enumerate(cfg.demap_list()) if dm['valid']]
+            stages = [('fine_delay', ct2_pattern_stage(vcs))]
+        else:
+            if args.ct1_config is None or args.filterbank_taps is None:
+                ap.error(f"--source {args.source} needs --ct1-config and --filterbank-taps")
+            import ct1_test  # CT1 model, see _CT1_DIR
+            import filterbank  # polyphase filterbank model
+            with open(args.ct1_config) as f:
+                ct1_cfg = ct1_test.parse_config(f)
+            polynomials = {src['virtual_channel']: src for src in ct1_cfg['polynomials'].values()}
+            if args.source == 'testbench':
+                source = TestbenchSource()
+            elif args.source == 'noise':
+                source = NoiseSource(args.seed, args.sigma)
+                params.update(seed=args.seed, sigma=args.sigma)
+            else:
+                if args.input is None:
+                    ap.error("--source file needs --input")
+                source = FileSource(args.input, args.input_first_sample)
+                st = os.stat(args.input)
+                params.update(input=os.path.realpath(args.input), input_size=st.st_size,
+                              input_mtime_ns=st.st_mtime_ns, input_first_sample=args.input_first_sample)
+            params.update(ct1_config=golden_store.source_version(args.ct1_config),
+                          filterbank_taps=golden_store.source_version(args.filterbank_taps))
+            fb = filterbank.PolyphaseFilterBank(args.filterbank_taps)
+            deripple = {0: ct1_test.c_deripple0, 1: ct1_test.c_deripple1, 2: ct1_test.c_deripple2}[ct1_cfg.get('ripple', 0)]
+            stages = [('ct1', ct1_stage(source, polynomials, deripple)),
+                      ('filterbank', filterbank_stage(fb, {vc: src['RFI_threshold'] for vc, src in polynomials.items()})),
+                      ('fine_delay', fine_delay_stage())]
+        stages += [('ct2', ct2_stage(cfg)), ('correlator', correlator_stage(cfg))]
+        names = [name for name, _ in stages]
+        if args.until not in names:
+            ap.error(f"--source {args.source} starts at the {names[0]} stage")
+        stages = stages[:names.index(args.until) + 1]
+        checkpoint = None
+        if args.checkpoint_dir is not None:
+            checkpoint = Checkpoint(args.checkpoint_dir, params, args.restart)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"FAIL: {e}")
+        sys.exit(2)
+
+    first = args.integration_start
+    if first is None:
+        first = ct1_cfg.get('integration_start', 0)
+    keys = range(first, first + args.integrations)
+    print(f"Running {' -> '.join(name for name, _ in stages)} for integrations {first} .. {keys[-1]}")
+    stats = {}
+    for key, block in pipeline(stages, keys, checkpoint, stats):
+        print(f"  integration {key}: {args.until}: {describe(args.until, block)}", flush=True)
+
+    print()
+    print("=== ref_pipeline result ===")
+    for name, _ in stages:
+        s = stats[name]
+        print(f"  {name:11s}: {s['computed']} computed, {s['loaded']} loaded, {s['skipped']} skipped")
+    if checkpoint is not None:
+        print(f"  Checkpoints in {checkpoint.directory}")
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,10 +5,20 @@ vis_check.py  --  Verify correlator visibility HBM contents against an
 
 Usage:
     python3 vis_check.py <top_vhdl_file> <vis_dump_file> [options]
+    python3 vis_check.py <top_vhdl_file> <vis_dump_file> --follow [--max-fail N]
+
+--follow checks each cell as soon as it is complete in a dump file that is
+still growing, or a named pipe, see ct2_check.follow_dump().
+
+The expected data of each (integration, output channel, output time) is
+computed once per run and kept in the golden store
+(tools/radiohdl/base/golden_store.py), keyed by the SB parameters, the
+station map and the hash of the model source, so a re-run of the same test
+only reads it.  --no-golden-store computes everything.
 
 The top-level VHDL wrapper (e.g. ct2_test5_top.vhd) instantiates ct2_v80_tb
 with a generic map containing the full test configuration.  This script parses
-that file (reusing ct2_check.py's parser), reconstructs the correlator input
+that file (ct2_config.load_config(), shared with ct2_check.py), reconstructs the correlator input
 analytically from the testbench's deterministic data encoding, computes the
 expected visibilities + TCI/DV exactly as the firmware does, lays them out in
 the visibility-HBM byte layout, and compares against the dump produced by the
@@ -36,13 +46,20 @@ where p1 = row-station polarisation, p2 = col-station polarisation, and
 (matching ska_low_cbf_model.correlator_model.run_correlation).  The stored
 value is the integer accumulation converted to fp32 and scaled by
 total_samples/valid_samples (vis2fp.vhd).  We accumulate exactly in integer
-arithmetic and convert to fp32 once, matching the hardware accumulator.
-
-TCI/DV (centroid_divider.vhd / correlator_model):
-  byte offset 2*e + 0 : DV (FD)  = round(255 * sqrt(valid_count/total_samples))
-  byte offset 2*e + 1 : TCI       = round((256/t_i_max)*valid_weight/valid_count
-                                          - 128 + tci_correction)
+arithmetic and convert to fp32 once, matching the hardware accumulator, and
+apply the scaling with the inv_rom / fp32_x_Uint arithmetic of the firmware
+(../correlator/vis2fp_model.py), so --vis-rtol 0 --vis-atol 0 --tci-tol 0
+gives a bit exact compare.  The defaults keep the earlier tolerances
+(rtol 1e-3, atol 1, 1 LSB).
+
+TCI/DV (centroid_divider.vhd, bit accurate in ../correlator/dv_tci_model.py):
+  byte offset 2*e + 0 : DV (FD)  = sqrt_rom(min(4095, 4096*valid_count//total_samples))
+                                 ~ round(255 * sqrt(valid_count/total_samples))
+  byte offset 2*e + 1 : TCI       = floor(256*valid_weight/(t_i_max*valid_count))
+                                    - 128 + tci_correction
   t_i_max = 192 (long, tci_correction=1) or 64 (short, tci_correction=2).
+  Both are exact; --tci-tol 0 compares them exactly, the default of 1 LSB
+  keeps the earlier tolerance (TCI differences are taken modulo 256).
 
 Cell production order (replicated from run_correlation), per subarray-beam:
   for output_channel in range(N_fine // N_fine_integrate):
@@ -54,68 +71,40 @@ Cell production order (replicated from run_correlation), per subarray-beam:
               emit one cell
 The integration counter advances once per 849 ms frame; visibility values
 depend on it through the Hpol.im encoding, so each integration differs.
+The tiles cover the lower triangle of ceil(N_stations/16) cells, so the cell
+index maps to its descriptor in closed form (locate_cells, cell_indices) and
+only the cells present in the dump are visited.
 """
 
 import os
 import sys
 import math
+import time
 import struct
 import argparse
 
 import numpy as np
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-import ct2_check  # noqa: E402  (sibling module, parser reuse)
+import ct2_check  # noqa: E402  (sibling module, dump loader reuse)
+import ct2_config  # noqa: E402  (sibling module, shared test configuration)
+from ct2_config import decode_sb_table_full, build_station_map  # noqa: E402,F401  (re-exported)
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'correlator'))
+import dv_tci_model  # noqa: E402  (bit accurate centroid_divider / sqrt_rom model)
+import vis2fp_model  # noqa: E402  (bit accurate vis2fp / fp32_x_Uint model)
+import rom_gen  # noqa: E402  (golden sqrt_rom / inv_rom tables of the models)
 
-# ---------------------------------------------------------------------------
-# Configuration decoding
-# ---------------------------------------------------------------------------
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'tools', 'radiohdl', 'base'))
+import golden_store  # noqa: E402  (radiohdl common, store of expected model data)
 
-def decode_sb_table_full(sb_words):
-    """
-    Decode the subarray-beam table (4 words per entry) into a list of dicts,
-    matching ska_low_cbf_model.correlator_model.subarray_beam_unpack.
-    """
-    sbs = []
-    n = len(sb_words) // 4
-    for i in range(n):
-        w0, w1, w2, w3 = sb_words[i * 4:(i + 1) * 4]
-        coarse_start = (w0 >> 16) & 0xFFFF
-        if coarse_start > 32767:
-            coarse_start -= 32768
-            output_disable = 1
-        else:
-            output_disable = 0
-        n_time_bit = (w2 >> 31) & 1
-        n_time_integrate = 192 if n_time_bit == 1 else 64
-        sbs.append({
-            'n_stations':       w0 & 0xFFFF,
-            'coarse_start':     coarse_start,
-            'output_disable':   output_disable,
-            'fine_start':       w1 & 0xFFFF,
-            'n_fine':           w2 & 0xFFFFFF,
-            'n_fine_integrate': (w2 >> 24) & 0x7F,
-            'n_time_integrate': n_time_integrate,
-            'hbm_base':         w3,
-        })
-    return sbs
-
-
-def build_station_map(demap, sb_index):
-    """
-    Return {station_index_within_sb: {'vc', 'sky_freq_idx'}} for the given SB.
-    demap is the per-VC list from ct2_check.decode_demap.
-    For correlator 0 the demap sb_id equals the SB table index directly.
-    """
-    station_map = {}
-    for vc, dm in enumerate(demap):
-        if not dm['valid']:
-            continue
-        if dm['sb_id'] != sb_index:
-            continue
-        station_map[dm['station']] = {'vc': vc, 'sky_freq_idx': dm['sky_freq_idx']}
-    return station_map
+_MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_VERSION = golden_store.source_version(
+    os.path.join(_MODEL_DIR, 'vis_check.py'),
+    os.path.join(_MODEL_DIR, '..', 'correlator', 'dv_tci_model.py'),
+    os.path.join(_MODEL_DIR, '..', 'correlator', 'vis2fp_model.py'),
+    rom_gen.__file__,
+    *[os.path.join(rom_gen.ROM_DIR, rom_name + '.npy') for rom_name in sorted(rom_gen.ROMS)])
 
 
 # ---------------------------------------------------------------------------
@@ -123,23 +112,66 @@ def build_station_map(demap, sb_index):
 # ---------------------------------------------------------------------------
 
 def _s8(x):
-    """Interpret the low 8 bits of x as a signed byte."""
-    x &= 0xFF
-    return x - 256 if x >= 128 else x
+    """Interpret the low 8 bits of x (int array) as signed bytes, int8 array."""
+    return (np.asarray(x) & 0xFF).astype(np.uint8).view(np.int8)
 
 
-def station_samples(station_info, sb, fine_rel_range, time_indices, integration):
+class StationSamples:
+    """
+    Correlator input of all stations of an SB for several integrations, from
+    station_samples_batch(), in factored form.  The testbench Hpol depends
+    only on (fine channel, integration) and Vpol only on (time, VC), so
+
+      hpol    : int8 (n_integrations, n_stations, n_fine, 2)  re, im
+      vpol    : int8 (n_stations, n_time, 2)                   re, im
+      h_valid : bool (n_integrations, n_stations, n_fine)  no Hpol RFI and
+                the station has a VC
+      v_valid : bool (n_stations, n_time)                  no Vpol RFI
+
+    sample (s, fine, time) of integration i = (hpol[i, s, fine], vpol[s, time]),
+    valid = h_valid[i, s, fine] & v_valid[s, time].  The arrays broadcast
+    against each other, samples() materialises one integration.
     """
-    Build the complex sample array for one station over the requested fine
-    channels and time samples.
 
-    Returns (samp, valid) where:
-      samp  : complex128 array (2 pol, n_fine, n_time), pol 0 = Hpol, 1 = Vpol.
-      valid : int array (n_fine, n_time), 1 = usable sample, 0 = RFI.
+    def __init__(self, integrations, hpol, vpol, h_valid, v_valid):
+        self.integrations = integrations
+        self.hpol = hpol
+        self.vpol = vpol
+        self.h_valid = h_valid
+        self.v_valid = v_valid
+
+    @property
+    def nbytes(self):
+        return self.hpol.nbytes + self.vpol.nbytes + self.h_valid.nbytes + self.v_valid.nbytes
+
+    def samples(self, i):
+        """Return (samp, valid) of integration index i, complex128 (n_stations, 2, n_fine, n_time) and int."""
+        h = self.hpol[i, ..., 0] + 1j * self.hpol[i, ..., 1].astype(np.float64)
+        v = self.vpol[..., 0] + 1j * self.vpol[..., 1].astype(np.float64)
+        n_stations, n_fine, n_time = h.shape[0], h.shape[1], v.shape[1]
+        samp = np.empty((n_stations, 2, n_fine, n_time), dtype=np.complex128)
+        samp[:, 0] = h[:, :, np.newaxis]
+        samp[:, 1] = v[:, np.newaxis, :]
+        valid = (self.h_valid[i][:, :, np.newaxis] & self.v_valid[:, np.newaxis, :]).astype(np.int64)
+        return samp, valid
+
+
+def station_samples_batch(station_map, sb, integrations, fine_rel_range=None, time_indices=None):
+    """
+    Build the correlator input of all the stations of the SB (station_map from
+    build_station_map()) for all the integrations at once, as StationSamples.
+    fine_rel_range defaults to all the fine channels of the SB and
+    time_indices to the 192 time samples of the integration.
 
     The values are exactly those generated by the testbench filterbank emulator
     (see ct2_check.expected_sample), reconstructed for the (vc, fine, time) that
-    the corner turn would have stored for this station.
+    the corner turn would have stored for each station:
+      Hpol = (fc & 0xFF, ((fc >> 8) & 0x0F) | ((integration & 0x0F) << 4))
+      Vpol = ((t % 64) | (((t // 64) & 0x03) << 6), vc & 0xFF)
+    with fc = coarse_start*3456 + fine_start + fine_rel - sky_freq_idx*3456
+    the fine channel within the coarse channel of the station.  No data was
+    generated for fc outside 0..3455, Hpol is zero there.  Stations without
+    a VC are zero and not valid.
 
     RFI flagging (matches the firmware): a sample is flagged as RFI if ANY of
     its four data bytes (Hpol.re, Hpol.im, Vpol.re, Vpol.im) equals 0x80, the
@@ -147,39 +179,53 @@ def station_samples(station_info, sb, fine_rel_range, time_indices, integration)
     sum and from the valid-sample / centroid counts.  (This is independent of
     the bad_poly flag, which only propagates to the output packets.)
     """
-    vc = station_info['vc']
-    sky = station_info['sky_freq_idx']
-    n_fine = len(fine_rel_range)
-    n_time = len(time_indices)
-    out = np.zeros((2, n_fine, n_time), dtype=np.complex128)
-
-    # Per-fine-channel Hpol bytes, and whether Hpol contributes an RFI marker.
-    h_rfi = np.zeros(n_fine, dtype=bool)
-    # Per-coarse fine-channel index for each relative fine channel:
-    #   fc = coarse_start*3456 + fine_start + fine_rel - sky*3456
-    for fi, fine_rel in enumerate(fine_rel_range):
-        fc = sb['coarse_start'] * 3456 + sb['fine_start'] + fine_rel - sky * 3456
-        if fc < 0 or fc > 3455:
-            # No data was generated for this fine channel; leave as zero.
-            continue
-        hpol_re_b = fc & 0xFF
-        hpol_im_b = ((fc >> 8) & 0x0F) | ((integration & 0x0F) << 4)
-        out[0, fi, :] = complex(_s8(hpol_re_b), _s8(hpol_im_b))
-        if hpol_re_b == 0x80 or hpol_im_b == 0x80:
-            h_rfi[fi] = True
-
-    # Per-time-sample Vpol bytes, and whether Vpol contributes an RFI marker.
-    v_rfi = np.zeros(n_time, dtype=bool)
-    vpol_im_b = vc & 0xFF
-    for ti, t in enumerate(time_indices):
-        vpol_re_b = (t % 64) | (((t // 64) & 0x03) << 6)
-        out[1, :, ti] = complex(_s8(vpol_re_b), _s8(vpol_im_b))
-        if vpol_re_b == 0x80 or vpol_im_b == 0x80:
-            v_rfi[ti] = True
-
-    # A sample is valid unless either polarisation contributes an RFI marker.
-    valid = (~(h_rfi[:, np.newaxis] | v_rfi[np.newaxis, :])).astype(np.int64)
-    return out, valid
+    n_stations = int(sb['n_stations'])
+    fine_rel = np.arange(sb['n_fine']) if fine_rel_range is None else np.asarray(fine_rel_range, dtype=np.int64)
+    t = np.arange(192) if time_indices is None else np.asarray(time_indices, dtype=np.int64)
+    integrations = np.atleast_1d(np.asarray(integrations, dtype=np.int64))
+
+    present = np.zeros(n_stations, dtype=bool)
+    vc = np.zeros(n_stations, dtype=np.int64)
+    sky = np.zeros(n_stations, dtype=np.int64)
+    for s, info in station_map.items():
+        if s < n_stations:
+            present[s], vc[s], sky[s] = True, info['vc'], info['sky_freq_idx']
+
+    # Hpol bytes per (integration, station, fine channel); fc depends on the
+    # station only through its coarse channel.
+    fc = sb['coarse_start'] * 3456 + sb['fine_start'] + fine_rel[np.newaxis, :] - sky[:, np.newaxis] * 3456
+    in_range = (fc >= 0) & (fc <= 3455) & present[:, np.newaxis]
+    hpol_re_b = np.where(in_range, fc & 0xFF, 0)
+    hpol_im_b = np.where(in_range, ((fc >> 8) & 0x0F)[np.newaxis] | ((integrations & 0x0F) << 4)[:, np.newaxis, np.newaxis], 0)
+    hpol = np.empty(hpol_im_b.shape + (2,), dtype=np.int8)
+    hpol[..., 0] = _s8(hpol_re_b)
+    hpol[..., 1] = _s8(hpol_im_b)
+    h_valid = present[:, np.newaxis] & ~(in_range & ((hpol_re_b == 0x80) | (hpol_im_b == 0x80)))
+
+    # Vpol bytes per (station, time sample).
+    vpol_re_b = (t % 64) | (((t // 64) & 0x03) << 6)
+    vpol_im_b = np.where(present, vc & 0xFF, 0)
+    vpol = np.zeros((n_stations, len(t), 2), dtype=np.int8)
+    vpol[present, :, 0] = _s8(vpol_re_b)
+    vpol[..., 1] = _s8(vpol_im_b)[:, np.newaxis]
+    v_valid = ~((vpol_re_b == 0x80)[np.newaxis, :] | (vpol_im_b == 0x80)[:, np.newaxis])
+
+    return StationSamples(integrations, hpol, vpol, h_valid, v_valid)
+
+
+def station_samples(station_info, sb, fine_rel_range, time_indices, integration):
+    """
+    Build the complex sample array for one station over the requested fine
+    channels and time samples, see station_samples_batch().
+
+    Returns (samp, valid) where:
+      samp  : complex128 array (2 pol, n_fine, n_time), pol 0 = Hpol, 1 = Vpol.
+      valid : int array (n_fine, n_time), 1 = usable sample, 0 = RFI.
+    """
+    batch = station_samples_batch({0: station_info}, dict(sb, n_stations=1),
+                                  [integration], fine_rel_range, time_indices)
+    samp, valid = batch.samples(0)
+    return samp[0], valid[0]
 
 
 # ---------------------------------------------------------------------------
@@ -192,16 +238,16 @@ def compute_integration(sb, station_map, output_channel, output_time,
     Compute the visibility matrix and TCI/DV for one (output_channel,
     output_time) of one integration.
 
-    Returns (vis, tci, fd) where:
-      vis : complex128 array (n16, n16, 2, 2)   -- normalised visibilities
-      tci : int array      (n16, n16)
-      fd  : int array      (n16, n16)
+    Returns (vis, tci, fd, inexact) where:
+      vis     : complex128 array (n16, n16, 2, 2)   -- normalised visibilities
+      tci     : int array      (n16, n16)
+      fd      : int array      (n16, n16)
+      inexact : bool array     (n16, n16, 2, 2)   -- accumulator value is not
+                exactly representable as int32 / fp32 at the vis2fp input
     n16 = ceil(N_stations/16)*16 (firmware pads cells to 16 stations).
     """
     n_stations = int(sb['n_stations'])
-    n16 = int(math.ceil(n_stations / 16) * 16)
     n_fpi = int(sb['n_fine_integrate'])
-    n_time_integrate = int(sb['n_time_integrate'])
 
     # Fine channels (relative to SB) integrated for this output channel.
     fine_rel_range = range(output_channel * n_fpi, (output_channel + 1) * n_fpi)
@@ -209,96 +255,252 @@ def compute_integration(sb, station_map, output_channel, output_time,
     # Time samples integrated for this output time group.
     if time_groups == 1:
         time_start, n_time_group = 0, 192
-        t_i_max, tci_correction = 192, 1
     else:
         time_start, n_time_group = output_time * 64, 64
-        t_i_max, tci_correction = 64, 2
     time_indices = list(range(time_start, time_start + n_time_group))
+
+    # All stations in factored form, the correlation sums separate into a sum
+    # over the fine channels times a sum over the time samples.
+    batch = station_samples_batch(station_map, sb, [integration], fine_rel_range, time_indices)
+    return correlate_batch(batch, 0, int(sb['n_time_integrate']), n_fpi)
+
+
+def correlate(samp, valid, n_time_integrate, n_fpi):
+    """
+    Correlator model of one (output_channel, output_time) of an SB, for any
+    input samples.
+
+      samp  : complex array (n_stations, 2 pol, n_fine, n_time) of the int8
+              sample values
+      valid : int array (n_stations, n_fine, n_time), 1 = usable sample,
+              0 = RFI (or no data for the station)
+
+    n_time is the number of samples of the output time group, the time index
+    within the group is the centroid weight.  Returns (vis, tci, fd, inexact)
+    as compute_integration().
+    """
+    n_stations = samp.shape[0]
+    n16 = int(math.ceil(n_stations / 16) * 16)
+    n_fine, n_time_group = samp.shape[2], samp.shape[3]
     # Index within the integration window (0 .. n_time_group-1) for the centroid.
     time_weight = np.arange(n_time_group, dtype=np.int64)
 
-    total_samples = n_time_integrate * n_fpi
+    # Valid sample count and centroid weight of every station pair at once:
+    # valid_count[s1, s2] = sum over (fine, time) of valid[s1]*valid[s2].
+    valid_all = np.zeros((n16, n_fine, n_time_group), dtype=np.int64)
+    valid_all[:n_stations] = valid
+    valid_count = np.einsum('aft,bft->ab', valid_all, valid_all)
+    valid_weight = np.einsum('aft,bft->ab', valid_all, valid_all * time_weight)
 
-    # Build sample arrays for every station present: shape (2, n_fine, n_time).
-    samp = {}
-    valid = {}
-    for s in range(n_stations):
-        if s in station_map:
-            samp[s], valid[s] = station_samples(station_map[s], sb,
-                                                fine_rel_range, time_indices,
-                                                integration)
-        else:
-            samp[s] = np.zeros((2, len(fine_rel_range), n_time_group),
-                               dtype=np.complex128)
-            valid[s] = np.zeros((len(fine_rel_range), n_time_group), dtype=np.int64)
-
-    vis = np.zeros((n16, n16, 2, 2), dtype=np.complex128)
-    tci = np.zeros((n16, n16), dtype=np.int64)
-    fd = np.zeros((n16, n16), dtype=np.int64)
-
-    for s1 in range(n_stations):
-        # The firmware fills full 16x16 cells, so station2 runs to the cell
-        # boundary above station1 (capped at N_stations).
-        s2_max = min(int(math.ceil((s1 + 1) / 16) * 16), n_stations)
-        for s2 in range(s2_max):
-            v1 = valid[s1]
-            v2 = valid[s2]
-            vmask = v1 * v2  # (n_fine, n_time)
-            valid_count = int(vmask.sum())
-            if valid_count == 0:
-                continue
-            valid_weight = int((vmask * time_weight[np.newaxis, :]).sum())
+    # Correlation: sum over (fine, time) of samp(s1,p1)*conj(samp(s2,p2)) for
+    # the samples that are valid in both stations, as one matrix product over
+    # rows (station, pol).  The products of int8 values and their sums are
+    # integers well below 2**53, so the float64 accumulation is exact.
+    samp_all = np.zeros((n16, 2, n_fine, n_time_group), dtype=np.complex128)
+    samp_all[:n_stations] = samp * valid[:, np.newaxis]
+    rows = samp_all.reshape(n16 * 2, -1)
+    acc = (rows @ rows.conj().T).reshape(n16, 2, n16, 2).transpose(0, 2, 1, 3)
 
-            # Correlation: sum over (fine, time) of samp(s1,p1)*conj(samp(s2,p2)).
-            # Accumulate exactly: int8 products fit comfortably in int64.
-            for p1 in range(2):
-                for p2 in range(2):
-                    prod = samp[s1][p1] * np.conj(samp[s2][p2]) * vmask
-                    acc = prod.sum()
-                    re = int(round(acc.real))
-                    im = int(round(acc.imag))
-                    # int -> fp32, then scale by total/valid (vis2fp).
-                    scale = total_samples / valid_count
-                    vis[s1, s2, p1, p2] = complex(
-                        np.float32(np.float32(re) * np.float32(scale)),
-                        np.float32(np.float32(im) * np.float32(scale)))
+    return _integration_output(acc, valid_count, valid_weight, n_stations, n_time_integrate, n_fpi)
 
-            tci[s1, s2] = int(round((256.0 / t_i_max) * valid_weight / valid_count
-                                    - 128 + tci_correction))
-            fd[s1, s2] = int(round(255.0 * math.sqrt(valid_count / total_samples)))
 
-    return vis, tci, fd
+def correlate_batch(batch, i, n_time_integrate, n_fpi):
+    """
+    correlate() of integration index i of a StationSamples, without
+    materialising the samples.  valid(s, f, t) = h_valid(s, f) * v_valid(s, t)
+    and each polarisation depends on either f or t, so every sum over
+    (fine, time) is the product of a sum over fine and a sum over time:
+      HH = sum_f H1 H2* hv1 hv2 * sum_t vv1 vv2,   HV = sum_f H1 hv1 hv2 * sum_t V2* vv1 vv2
+      VH = sum_f H2* hv1 hv2 * sum_t V1 vv1 vv2,   VV = sum_f hv1 hv2 * sum_t V1 V2* vv1 vv2
+    All sums are integers well below 2**53, so the result is exact and equal
+    to correlate() of batch.samples(i).
+    """
+    n_stations, n_time_group = batch.v_valid.shape
+    n16 = int(math.ceil(n_stations / 16) * 16)
+    hv = np.zeros((n16, batch.h_valid.shape[2]))
+    vv = np.zeros((n16, n_time_group))
+    hv[:n_stations] = batch.h_valid[i]
+    vv[:n_stations] = batch.v_valid
+    h = np.zeros(hv.shape, dtype=np.complex128)
+    v = np.zeros(vv.shape, dtype=np.complex128)
+    h[:n_stations] = batch.hpol[i, ..., 0] + 1j * batch.hpol[i, ..., 1].astype(np.float64)
+    v[:n_stations] = batch.vpol[..., 0] + 1j * batch.vpol[..., 1].astype(np.float64)
+    h *= hv
+    v *= vv
+
+    f_count = hv @ hv.T
+    t_count = vv @ vv.T
+    valid_count = np.round(f_count * t_count).astype(np.int64)
+    valid_weight = np.round(f_count * (vv @ (vv * np.arange(n_time_group)).T)).astype(np.int64)
+
+    acc = np.empty((n16, n16, 2, 2), dtype=np.complex128)
+    acc[:, :, 0, 0] = (h @ h.conj().T) * t_count
+    acc[:, :, 0, 1] = (h @ hv.T) * (vv @ v.conj().T)
+    acc[:, :, 1, 0] = (hv @ h.conj().T) * (v @ vv.T)
+    acc[:, :, 1, 1] = f_count * (v @ v.conj().T)
+
+    return _integration_output(acc, valid_count, valid_weight, n_stations, n_time_integrate, n_fpi)
+
+
+def _integration_output(acc, valid_count, valid_weight, n_stations, n_time_integrate, n_fpi):
+    """(vis, tci, fd, inexact) from the accumulators, valid counts and centroid weights of all station pairs."""
+    n16 = acc.shape[0]
+    # The firmware fills full 16x16 cells, so station2 runs to the cell
+    # boundary above station1 (capped at N_stations); other pairs stay zero.
+    s1_idx, s2_idx = np.indices((n16, n16))
+    computed = (s1_idx < n_stations) & (s2_idx < np.minimum((s1_idx // 16 + 1) * 16, n_stations))
+    valid_count = np.where(computed, valid_count, 0)
+    tci, fd = dv_tci_model.centroid_divider(valid_weight, valid_count, n_time_integrate, n_fpi)
+
+    # int -> fp32, then scale by total/valid, bit accurate as vis2fp.vhd.
+    vis = vis2fp_model.vis2fp(acc, valid_count[:, :, np.newaxis, np.newaxis],
+                              n_time_integrate, n_fpi).astype(np.complex128)
+    used = (valid_count > 0)[:, :, np.newaxis, np.newaxis]
+    vis = np.where(used, vis, 0)
+    inexact = used & vis2fp_model.not_exact(acc)
+
+    return vis, tci, fd, inexact
+
+
+# The store of the expected integrations, None = compute only.  All the
+# cells of one (integration, output_channel, output_time) share the result of
+# compute_integration(), so the most recent results are also kept in memory.
+store = None
+_integration_memo = {}
+_MEMO_SIZE = 8
+_SB_KEY_FIELDS = ('n_stations', 'coarse_start', 'fine_start', 'n_fine_integrate', 'n_time_integrate')
+
+
+def expected_integration(sb, station_map, output_channel, output_time,
+                         time_groups, integration):
+    """compute_integration(), from memory or the golden store if present."""
+    memo_key = (tuple(sb[k] for k in _SB_KEY_FIELDS),
+                tuple((s, m['vc'], m['sky_freq_idx']) for s, m in sorted(station_map.items())),
+                output_channel, output_time, time_groups, integration)
+    if memo_key in _integration_memo:
+        return _integration_memo[memo_key]
+
+    def compute():
+        vis, tci, fd, inexact = compute_integration(sb, station_map, output_channel, output_time,
+                                                    time_groups, integration)
+        return {'vis': vis, 'tci': tci, 'fd': fd, 'inexact': inexact}
+
+    if store is not None:
+        arrays = store.cached('vis', MODEL_VERSION, compute,
+                              sb={k: sb[k] for k in _SB_KEY_FIELDS}, station_map=station_map,
+                              output_channel=output_channel, output_time=output_time,
+                              time_groups=time_groups, integration=integration)
+    else:
+        arrays = compute()
+    if len(_integration_memo) >= _MEMO_SIZE:
+        _integration_memo.pop(next(iter(_integration_memo)))
+    result = (arrays['vis'], arrays['tci'], arrays['fd'], arrays['inexact'])
+    _integration_memo[memo_key] = result
+    return result
 
 
 # ---------------------------------------------------------------------------
 # Cell production sequence
 # ---------------------------------------------------------------------------
 
+def cells_per_integration(n_stations, n_fine, n_fine_integrate, n_time_integrate):
+    """
+    Closed form of the number of cells produced in one integration, numpy
+    arrays broadcast against each other.  The tiles of the production order
+    cover the lower triangle of the ceil(n_stations/16) x ceil(n_stations/16)
+    cell matrix exactly once, so a triangle of g = ceil(n_stations/16) cells
+    for each output channel and output time.
+    """
+    n_stations = np.asarray(n_stations, dtype=np.int64)
+    n_fine_integrate = np.asarray(n_fine_integrate, dtype=np.int64)
+    g = (n_stations + 15) // 16
+    n_output_channels = np.where(n_fine_integrate > 0,
+                                 np.asarray(n_fine, dtype=np.int64) // np.maximum(n_fine_integrate, 1), 0)
+    time_groups = np.where(np.asarray(n_time_integrate) == 192, 1, 3)
+    return g * (g + 1) // 2 * n_output_channels * time_groups
+
+
 def count_cells_per_integration(sb):
     """Count cells produced in one integration for a single SB."""
-    n_stations = int(sb['n_stations'])
-    if n_stations == 0:
-        return 0
-    n_fpi = int(sb['n_fine_integrate'])
-    n_fine = int(sb['n_fine'])
-    n_output_channels = n_fine // n_fpi if n_fpi else 0
-    if n_output_channels == 0:
-        return 0
+    return int(cells_per_integration(sb['n_stations'], sb['n_fine'], sb['n_fine_integrate'],
+                                     sb['n_time_integrate']))
+
+
+def _triangular_root(n):
+    """Largest m with m*(m+1)/2 <= n, exact for int64 arrays."""
+    n = np.asarray(n, dtype=np.int64)
+    m = ((np.sqrt(8.0 * n + 1) - 1) // 2).astype(np.int64)
+    m -= (m * (m + 1) // 2 > n)
+    m += ((m + 1) * (m + 2) // 2 <= n)
+    return m
+
+
+def spatial_cell(spatial_index, n_stations):
+    """
+    Return (row_first_station, col_first_station) of the cell at position
+    spatial_index (0 .. g*(g+1)/2 - 1) of the tile_row, tile_col, cell_row,
+    cell_col production order, numpy arrays.
+
+    The tile rows before tile_row hold the triangle of 16*tile_row cell rows,
+    within tile_row the off-diagonal tiles hold 16 cells per cell row and the
+    diagonal tile a triangle.
+    """
+    s = np.asarray(spatial_index, dtype=np.int64)
+    n_stations = np.asarray(n_stations, dtype=np.int64)
+    tile_row = _triangular_root(s) // 16
+    g = (n_stations + 15) // 16
+    cell_rows = np.minimum(g - 16 * tile_row, 16)
+    rem = s - 16 * tile_row * (16 * tile_row + 1) // 2
+    off_diag = rem < 16 * cell_rows * tile_row
+    q = rem - 16 * cell_rows * tile_row
+    diag_row = _triangular_root(np.maximum(q, 0))
+    tile_col = np.where(off_diag, rem // np.maximum(16 * cell_rows, 1), tile_row)
+    cell_row = np.where(off_diag, (rem // 16) % np.maximum(cell_rows, 1), diag_row)
+    cell_col = np.where(off_diag, rem % 16, q - diag_row * (diag_row + 1) // 2)
+    return tile_row * 256 + cell_row * 16, tile_col * 256 + cell_col * 16
+
+
+def spatial_index(row_first_station, col_first_station, n_stations):
+    """Inverse of spatial_cell(), numpy arrays."""
+    row = np.asarray(row_first_station, dtype=np.int64) // 16
+    col = np.asarray(col_first_station, dtype=np.int64) // 16
+    g = (np.asarray(n_stations, dtype=np.int64) + 15) // 16
+    tile_row, tile_col = row // 16, col // 16
+    cell_rows = np.minimum(g - 16 * tile_row, 16)
+    before = 16 * tile_row * (16 * tile_row + 1) // 2
+    off_diag = before + tile_col * 16 * cell_rows + (row % 16) * 16 + col % 16
+    diag = before + tile_row * 16 * cell_rows + (row % 16) * (row % 16 + 1) // 2 + col % 16
+    return np.where(tile_col < tile_row, off_diag, diag)
+
+
+def sb_cell_descriptor(sb, position):
+    """
+    Descriptor of the cell(s) at position (numpy array) in the cell sequence
+    of one SB over all integrations, see cell_descriptors().  Returns a dict
+    of int64 arrays with the cell_descriptors() keys.
+    """
+    position = np.asarray(position, dtype=np.int64)
+    n_per_int = max(count_cells_per_integration(sb), 1)
+    g = (int(sb['n_stations']) + 15) // 16
+    spatial = max(g * (g + 1) // 2, 1)
     time_groups = 1 if sb['n_time_integrate'] == 192 else 3
-    tile_rows = int(math.ceil(n_stations / 256))
-    spatial = 0
-    for tile_row in range(tile_rows):
-        if tile_row < tile_rows - 1:
-            cell_rows = 16
-        else:
-            rem = n_stations % 256
-            if rem == 0:
-                rem = 256
-            cell_rows = int(math.ceil(rem / 16))
-        for tile_col in range(tile_row + 1):
-            for cell_row in range(cell_rows):
-                spatial += (cell_row + 1) if tile_row == tile_col else 16
-    return spatial * n_output_channels * time_groups
+    p = position % n_per_int
+    row, col = spatial_cell(p % spatial, sb['n_stations'])
+    return {'integration': position // n_per_int,
+            'output_channel': p // (spatial * time_groups),
+            'output_time': (p // spatial) % time_groups,
+            'row_first_station': row,
+            'col_first_station': col}
+
+
+def sb_cell_position(sb, integration, output_channel, output_time, row_first_station, col_first_station):
+    """Inverse of sb_cell_descriptor(), numpy arrays."""
+    g = (int(sb['n_stations']) + 15) // 16
+    spatial = g * (g + 1) // 2
+    time_groups = 1 if sb['n_time_integrate'] == 192 else 3
+    return (np.asarray(integration, dtype=np.int64) * count_cells_per_integration(sb) +
+            (np.asarray(output_channel, dtype=np.int64) * time_groups + np.asarray(output_time)) * spatial +
+            spatial_index(row_first_station, col_first_station, sb['n_stations']))
 
 
 def cell_descriptors(sb, max_cells):
@@ -308,46 +510,64 @@ def cell_descriptors(sb, max_cells):
       integration, output_channel, output_time,
       row_first_station, col_first_station
     """
-    n_stations = int(sb['n_stations'])
-    n_fpi = int(sb['n_fine_integrate'])
-    n_fine = int(sb['n_fine'])
-    n_output_channels = n_fine // n_fpi if n_fpi else 0
-    time_groups = 1 if sb['n_time_integrate'] == 192 else 3
-    tile_rows = int(math.ceil(n_stations / 256)) if n_stations else 0
-
-    count = 0
-    integration = 0
-    while count < max_cells:
-        for oc in range(n_output_channels):
-            for ot in range(time_groups):
-                for tile_row in range(tile_rows):
-                    for tile_col in range(tile_row + 1):
-                        if tile_row < (tile_rows - 1):
-                            cell_rows = 16
-                        else:
-                            rem = n_stations % 256
-                            if rem == 0:
-                                rem = 256
-                            cell_rows = int(math.ceil(rem / 16))
-                        for cell_row in range(cell_rows):
-                            if tile_row == tile_col:
-                                cell_columns = cell_row + 1
-                            else:
-                                cell_columns = 16
-                            for cell_col in range(cell_columns):
-                                yield {
-                                    'integration': integration,
-                                    'output_channel': oc,
-                                    'output_time': ot,
-                                    'row_first_station': tile_row * 256 + cell_row * 16,
-                                    'col_first_station': tile_col * 256 + cell_col * 16,
-                                }
-                                count += 1
-                                if count >= max_cells:
-                                    return
-        integration += 1
-        if n_output_channels == 0 or tile_rows == 0:
-            return  # nothing to produce; avoid infinite loop
+    if count_cells_per_integration(sb) == 0:
+        return  # nothing to produce
+    for position in range(max_cells):
+        yield {k: int(v) for k, v in sb_cell_descriptor(sb, position).items()}
+
+
+def cell_layout(sbs):
+    """
+    Layout of the cells of the enabled SBs in the visibility HBM: each
+    integration is one block of cells per enabled SB in SB index order.
+    Returns a dict: enabled (SB indices), offset (first cell of each enabled
+    SB within the integration), count (cells per integration) and cycle
+    (cells per integration of all SBs).
+    """
+    enabled = [i for i, sb in enumerate(sbs) if sb['n_stations'] > 0 and not sb['output_disable']]
+    count = np.array([count_cells_per_integration(sbs[i]) for i in enabled], dtype=np.int64)
+    offset = np.concatenate(([0], np.cumsum(count)[:-1])).astype(np.int64)
+    return {'enabled': np.array(enabled, dtype=np.int64), 'offset': offset, 'count': count,
+            'cycle': int(count.sum())}
+
+
+def locate_cells(sbs, layout, cell_index):
+    """
+    Descriptor of physical cell index(es) of the visibility HBM in O(1) per
+    cell.  Returns a dict of int64 arrays: sb (SB table index), position
+    (in the cell sequence of that SB) and the cell_descriptors() keys.
+    """
+    cell_index = np.asarray(cell_index, dtype=np.int64)
+    integration = cell_index // max(layout['cycle'], 1)
+    within = cell_index % max(layout['cycle'], 1)
+    k = np.searchsorted(layout['offset'], within, side='right') - 1
+    k = np.clip(k, 0, max(len(layout['enabled']) - 1, 0))
+    result = {name: np.zeros(cell_index.shape, dtype=np.int64) for name in
+              ('sb', 'position', 'integration', 'output_channel', 'output_time',
+               'row_first_station', 'col_first_station')}
+    if layout['cycle'] == 0:
+        result['sb'][...] = -1
+        return result
+    result['sb'] = layout['enabled'][k]
+    result['position'] = integration * layout['count'][k] + within - layout['offset'][k]
+    for n, sb_index in enumerate(layout['enabled']):
+        sel = k == n
+        if not sel.any():
+            continue
+        desc = sb_cell_descriptor(sbs[sb_index], result['position'][sel])
+        for name, value in desc.items():
+            result[name][sel] = value
+    return result
+
+
+def cell_indices(sbs, layout, sb_index, integration, output_channel, output_time,
+                 row_first_station, col_first_station):
+    """Inverse of locate_cells(): physical cell index(es) of cells of SB sb_index, numpy arrays."""
+    n = int(np.nonzero(layout['enabled'] == sb_index)[0][0])
+    integration = np.asarray(integration, dtype=np.int64)
+    position = sb_cell_position(sbs[sb_index], 0, output_channel, output_time,
+                                row_first_station, col_first_station)
+    return integration * layout['cycle'] + layout['offset'][n] + position
 
 
 # ---------------------------------------------------------------------------
@@ -420,7 +640,7 @@ def read_actual_cell(dump, cell_index):
 
 def expected_cell_block(desc, sb, station_map, time_groups):
     """Expected vis[16,16,2,2], fd[16,16], tci[16,16] for one cell descriptor."""
-    vis, tci, fd = compute_integration(
+    vis, tci, fd, _ = expected_integration(
         sb, station_map, desc['output_channel'], desc['output_time'],
         time_groups, desc['integration'])
     n16 = vis.shape[0]
@@ -550,10 +770,12 @@ def check_cell(dump, desc, sb, station_map, time_groups,
                vis_rtol, vis_atol, tci_tol, max_detail, detail_count, worst):
     """
     Check one cell.  Returns (n_re_bad, n_im_bad, n_meta_bad, n_missing,
-                               n_re_good, n_im_good, n_meta_good).
+                               n_re_good, n_im_good, n_meta_good, n_inexact).
     `worst` is updated in place with the largest residual seen.
+    n_inexact counts the checked products whose accumulator value is not
+    exactly representable at the vis2fp input (informational).
     """
-    vis, tci, fd = compute_integration(
+    vis, tci, fd, inexact = expected_integration(
         sb, station_map, desc['output_channel'], desc['output_time'],
         time_groups, desc['integration'])
 
@@ -572,6 +794,7 @@ def check_cell(dump, desc, sb, station_map, time_groups,
     n_re_good = 0
     n_im_good = 0
     n_meta_good = 0
+    n_inexact = 0
 
     for row in range(16):
         for col in range(16):
@@ -581,8 +804,10 @@ def check_cell(dump, desc, sb, station_map, time_groups,
             # Expected visibility (zero if station out of range).
             if srow < n16 and scol < n16:
                 exp_vis = vis[srow, scol]
+                exp_inexact = inexact[srow, scol]
             else:
                 exp_vis = np.zeros((2, 2), dtype=np.complex128)
+                exp_inexact = np.zeros((2, 2), dtype=bool)
 
             for p1 in range(2):
                 for p2 in range(2):
@@ -594,6 +819,8 @@ def check_cell(dump, desc, sb, station_map, time_groups,
                     if act_re is None or act_im is None:
                         n_missing += 1
                         continue
+                    if exp_inexact[p1, p2]:
+                        n_inexact += 1
                     loc = f"cell={cell_index} e={e} row_st={srow} col_st={scol} p={p1}{p2}"
                     _update_worst(worst, 're', abs(act_re - exp_re), loc, exp_re, act_re)
                     _update_worst(worst, 'im', abs(act_im - exp_im), loc, exp_im, act_im)
@@ -614,7 +841,8 @@ def check_cell(dump, desc, sb, station_map, time_groups,
                         print(f"  VIS[{tag:>5}] cell={cell_index} e={e} "
                               f"row_st={srow} col_st={scol} p={p1}{p2}"
                               f"  exp=({exp_re:.3f},{exp_im:.3f})"
-                              f"  act=({act_re:.3f},{act_im:.3f})")
+                              f"  act=({act_re:.3f},{act_im:.3f})"
+                              + ("  (accumulator not exact in fp32)" if exp_inexact[p1, p2] else ""))
 
             # Meta: byte 2e = FD/DV, byte 2e+1 = TCI.
             if srow < n16 and scol < n16:
@@ -644,24 +872,16 @@ def check_cell(dump, desc, sb, station_map, time_groups,
                 else:
                     n_meta_good += 1
 
-    return n_re_bad, n_im_bad, n_meta_bad, n_missing, n_re_good, n_im_good, n_meta_good
+    return n_re_bad, n_im_bad, n_meta_bad, n_missing, n_re_good, n_im_good, n_meta_good, n_inexact
 
 
 def _wrap_diff(a, b):
-    """Smallest difference between two 8-bit values treating them as signed."""
-    d = (a - b) & 0xFF
-    if d > 128:
-        d -= 256
-    return abs(d)
+    """Smallest difference between two 8-bit values treating them as signed (ints or numpy arrays)."""
+    return abs(((a - b + 128) & 0xFF) - 128)
 
 
 def check(cfg, dump, vis_rtol, vis_atol, tci_tol, max_detail, diagnose=False):
-    demap_words = cfg.get('demap_table', [0])
-    sb_c0_words = cfg.get('sb_c0_table', [0])
-    virt_chs = cfg.get('virtual_channels', 12)
-
-    demap = ct2_check.decode_demap(demap_words, virt_chs)
-    sbs = decode_sb_table_full(sb_c0_words)
+    sbs = cfg.sbs_full(0)
 
     empty_worst = {k: {'res': -1.0, 'loc': '', 'exp': 0.0, 'act': 0.0}
                    for k in ('re', 'im', 'tci', 'fd')}
@@ -670,7 +890,7 @@ def check(cfg, dump, vis_rtol, vis_atol, tci_tol, max_detail, diagnose=False):
     if not cells:
         print("  WARNING: no visibility cells written (simulation may not have "
               "run long enough)")
-        return 0, 0, 0, 0, 0, 0, 0, 0, empty_worst
+        return 0, 0, 0, 0, 0, 0, 0, 0, 0, empty_worst
     max_cell = cells[-1]
     print(f"  {len(cells)} visibility cells present (max cell index {max_cell})")
 
@@ -678,17 +898,17 @@ def check(cfg, dump, vis_rtol, vis_atol, tci_tol, max_detail, diagnose=False):
                if sb['n_stations'] > 0 and not sb['output_disable']]
     if len(enabled) == 0:
         print("  WARNING: no enabled subarray-beams in the SB table")
-        return 0, 0, 0, 0, len(cells), 0, 0, 0, empty_worst
+        return 0, 0, 0, 0, len(cells), 0, 0, 0, 0, empty_worst
 
-    # Compute per-SB cell counts so we can map each SB's cells to physical
-    # HBM indices.  The HBM is filled sequentially: each integration cycle
+    # Map the physical HBM index of each cell present to its SB and
+    # descriptor.  The HBM is filled sequentially: each integration cycle
     # contains one block of cells per enabled SB in index order.
-    cells_per_sb_int = {i: count_cells_per_integration(sbs[i]) for i in enabled}
-    total_cells_per_cycle = sum(cells_per_sb_int.values())
-    n_integrations = (max_cell // total_cells_per_cycle + 1
-                      if total_cells_per_cycle > 0 else 1)
+    layout = cell_layout(sbs)
+    total_cells_per_cycle = layout['cycle']
     print(f"  {len(enabled)} enabled subarray-beam(s); "
           f"cycle={total_cells_per_cycle} cells/integration")
+    present = np.array(cells, dtype=np.int64)
+    located = locate_cells(sbs, layout, present)
 
     n_checked = 0
     n_re_bad = 0
@@ -698,17 +918,17 @@ def check(cfg, dump, vis_rtol, vis_atol, tci_tol, max_detail, diagnose=False):
     n_re_good = 0
     n_im_good = 0
     n_meta_good = 0
+    n_inexact = 0
     detail_count = [0]
     worst = {k: {'res': -1.0, 'loc': '', 'exp': 0.0, 'act': 0.0}
              for k in ('re', 'im', 'tci', 'fd')}
-    cell_set = set(cells)
 
-    for sb_index in enabled:
+    for n, sb_index in enumerate(enabled):
         sb = sbs[sb_index]
-        station_map = build_station_map(demap, sb_index)
+        station_map = cfg.station_map(sb_index)
         time_groups = 1 if sb['n_time_integrate'] == 192 else 3
-        cells_before = sum(cells_per_sb_int[i] for i in enabled if i < sb_index)
-        n_per_int = cells_per_sb_int[sb_index]
+        cells_before = int(layout['offset'][n])
+        n_per_int = int(layout['count'][n])
 
         print(f"\n  --- subarray-beam {sb_index}: stations={sb['n_stations']} "
               f"n_fine={sb['n_fine']} fine_per_int={sb['n_fine_integrate']} "
@@ -716,19 +936,22 @@ def check(cfg, dump, vis_rtol, vis_atol, tci_tol, max_detail, diagnose=False):
               f"stations_mapped={len(station_map)} "
               f"cells/int={n_per_int} offset={cells_before} ---")
 
-        descs = list(cell_descriptors(sb, n_per_int * n_integrations))
-        for idx, d in enumerate(descs):
-            pos_in_int = idx - d['integration'] * n_per_int
-            d['cell_index'] = (d['integration'] * total_cells_per_cycle
-                               + cells_before + pos_in_int)
+        # Descriptors of the cells of this SB in the dump, built on demand
+        sb_cells = np.nonzero(located['sb'] == sb_index)[0]
+        descs = ({'cell_index': int(present[k]),
+                  **{name: int(located[name][k]) for name in
+                     ('integration', 'output_channel', 'output_time',
+                      'row_first_station', 'col_first_station')}}
+                 for k in sb_cells)
 
         sb_re_bad = 0
         sb_im_bad = 0
         sb_meta_bad = 0
+        first_desc = None
         for d in descs:
-            if d['cell_index'] not in cell_set:
-                continue
-            rb, ib, mb, ms, rg, ig, mg = check_cell(dump, d, sb, station_map, time_groups,
+            if first_desc is None:
+                first_desc = d
+            rb, ib, mb, ms, rg, ig, mg, ne = check_cell(dump, d, sb, station_map, time_groups,
                                                      vis_rtol, vis_atol, tci_tol, max_detail,
                                                      detail_count, worst)
             n_checked += 1
@@ -739,10 +962,10 @@ def check(cfg, dump, vis_rtol, vis_atol, tci_tol, max_detail, diagnose=False):
             n_re_good += rg
             n_im_good += ig
             n_meta_good += mg
+            n_inexact += ne
 
         # Diagnose the first cell of this SB on mismatch (or when forced).
         if diagnose or sb_re_bad > 0 or sb_im_bad > 0 or sb_meta_bad > 0:
-            first_desc = next((d for d in descs if d['cell_index'] in cell_set), None)
             if first_desc is not None:
                 ci = first_desc['cell_index']
                 av, afd, atci = read_actual_cell(dump, ci)
@@ -757,7 +980,76 @@ def check(cfg, dump, vis_rtol, vis_atol, tci_tol, max_detail, diagnose=False):
                 diagnose_cell(av, ev, vis_rtol, vis_atol)
                 diagnose_meta(afd, atci, efd, etci, tci_tol)
 
-    return n_checked, n_re_bad, n_im_bad, n_meta_bad, n_missing, n_re_good, n_im_good, n_meta_good, worst
+    return n_checked, n_re_bad, n_im_bad, n_meta_bad, n_missing, n_re_good, n_im_good, n_meta_good, n_inexact, worst
+
+
+def follow_check(cfg, dump_file, vis_rtol, vis_atol, tci_tol, max_detail,
+                 max_fail=10, interval=1.0, idle_timeout=60.0):
+    """
+    Check the cells of a running simulation as they are completed in the
+    visibility dump (ct2_check.follow_dump()), printing running counters.
+    A cell is checked once, when all its 2048 visibility words and 128 TCI/DV
+    words have been written.  Stops after max_fail bad cells (0 = never).
+    Returns the same tuple as check().
+    """
+    sbs = cfg.sbs_full(0)
+    layout = cell_layout(sbs)
+    if layout['cycle'] == 0:
+        print("  WARNING: no enabled subarray-beams in the SB table")
+
+    totals = np.zeros(8, dtype=np.int64)   # check_cell() counters
+    n_checked = 0
+    n_bad_cells = 0
+    detail_count = [0]
+    worst = {k: {'res': -1.0, 'loc': '', 'exp': 0.0, 'act': 0.0}
+             for k in ('re', 'im', 'tci', 'fd')}
+    dump = {}
+    vis_words = {}
+    tci_words = {}
+    start = last_print = time.monotonic()
+    for words in ct2_check.follow_dump(dump_file, interval, idle_timeout):
+        complete = []
+        for addr, word in words.items():
+            if addr not in dump:
+                if addr < TCI_REGION_BASE:
+                    cell = addr // CELL_VIS_BYTES
+                    vis_words[cell] = vis_words.get(cell, 0) + 1
+                else:
+                    cell = (addr - TCI_REGION_BASE) // CELL_TCI_BYTES
+                    tci_words[cell] = tci_words.get(cell, 0) + 1
+                if (vis_words.get(cell, 0) == CELL_VIS_BYTES // 4 and
+                        tci_words.get(cell, 0) == CELL_TCI_BYTES // 4):
+                    complete.append(cell)
+            dump[addr] = word
+        if not complete or layout['cycle'] == 0:
+            continue
+
+        located = locate_cells(sbs, layout, sorted(complete))
+        for k, cell in enumerate(sorted(complete)):
+            sb_index = int(located['sb'][k])
+            sb = sbs[sb_index]
+            desc = {'cell_index': cell}
+            desc.update({name: int(located[name][k]) for name in
+                         ('integration', 'output_channel', 'output_time',
+                          'row_first_station', 'col_first_station')})
+            res = check_cell(dump, desc, sb, cfg.station_map(sb_index),
+                             1 if sb['n_time_integrate'] == 192 else 3,
+                             vis_rtol, vis_atol, tci_tol, max_detail, detail_count, worst)
+            totals += res
+            n_checked += 1
+            # res[3] counts the words that are not written yet, they are reported as missing, not as bad
+            n_bad_cells += any(res[:3])
+            if max_fail and n_bad_cells >= max_fail:
+                break
+        if time.monotonic() - last_print >= interval:
+            last_print = time.monotonic()
+            print(f"  [{last_print - start:8.1f} s] cells checked {n_checked}, bad {n_bad_cells}, "
+                  f"bad vis {totals[0] + totals[1]}, bad TCI/DV {totals[2]}", flush=True)
+        if max_fail and n_bad_cells >= max_fail:
+            print(f"  stopping after {n_bad_cells} bad cells")
+            break
+
+    return (n_checked, *[int(t) for t in totals], worst)
 
 
 # ---------------------------------------------------------------------------
@@ -767,34 +1059,65 @@ def check(cfg, dump, vis_rtol, vis_atol, tci_tol, max_detail, diagnose=False):
 def main():
     ap = argparse.ArgumentParser(
         description="Verify correlator visibility HBM dump against the model")
-    ap.add_argument('vhdl_top', help="Top-level VHDL wrapper (e.g. ct2_test5_top.vhd)")
+    ap.add_argument('vhdl_top', help="Top-level VHDL wrapper (e.g. ct2_test5_top.vhd) or YAML configuration, see ct2_config.py")
     ap.add_argument('vis_dump', help="Visibility HBM dump produced by simulation")
     ap.add_argument('--vis-rtol', type=float, default=1e-3,
-                    help="Relative tolerance for visibility fp32 compare")
+                    help="Relative tolerance for visibility fp32 compare, default "
+                         "1e-3, use 0 for a bit exact compare")
     ap.add_argument('--vis-atol', type=float, default=1.0,
-                    help="Absolute tolerance for visibility fp32 compare")
+                    help="Absolute tolerance for visibility fp32 compare, "
+                         "default 1, use 0 for a bit exact compare")
     ap.add_argument('--tci-tol', type=int, default=1,
-                    help="Tolerance (LSBs) for TCI/DV byte compare")
+                    help="Tolerance (LSBs) for TCI/DV byte compare, default 1, "
+                         "use 0 for a bit exact compare")
     ap.add_argument('--max-detail', type=int, default=40,
                     help="Maximum number of mismatch lines to print")
     ap.add_argument('--diagnose', action='store_true',
                     help="Always run convention diagnosis on the first cell, "
                          "even if the check passes")
+    ap.add_argument('--follow', action='store_true',
+                    help="Check cells as they are written to a growing dump "
+                         "file or named pipe")
+    ap.add_argument('--max-fail', type=int, default=10,
+                    help="With --follow, stop after this many bad cells "
+                         "(0 = never), default 10")
+    ap.add_argument('--interval', type=float, default=1.0,
+                    help="With --follow, poll interval in seconds, default 1")
+    ap.add_argument('--idle-timeout', type=float, default=60.0,
+                    help="With --follow, stop when the dump file has not grown "
+                         "for this many seconds, default 60")
+    ap.add_argument('--golden-store', default=None,
+                    help="Directory of the store of expected data, default "
+                         f"{golden_store.default_dir()}")
+    ap.add_argument('--no-golden-store', action='store_true',
+                    help="Compute all expected data, do not read or write the store")
     args = ap.parse_args()
 
+    global store
+    if not args.no_golden_store:
+        store = golden_store.GoldenStore(args.golden_store)
+
     print(f"Parsing configuration from: {args.vhdl_top}")
-    cfg = ct2_check.parse_generic_map(args.vhdl_top)
+    cfg = ct2_config.load_config(args.vhdl_top)
     print(f"  virtual_channels = {cfg.get('virtual_channels', '?')}")
 
-    print(f"\nLoading visibility dump: {args.vis_dump}")
-    dump = ct2_check.load_dump(args.vis_dump)
-    print(f"  {len(dump)} 32-bit words loaded ({len(dump) * 4} bytes)")
+    if args.follow:
+        print(f"\nFollowing visibility dump: {args.vis_dump}")
+        checked, re_bad, im_bad, meta_bad, missing, re_good, im_good, meta_good, inexact, worst = follow_check(
+            cfg, args.vis_dump, args.vis_rtol, args.vis_atol, args.tci_tol, args.max_detail,
+            args.max_fail, args.interval, args.idle_timeout)
+    else:
+        print(f"\nLoading visibility dump: {args.vis_dump}")
+        dump = ct2_check.load_dump(args.vis_dump)
+        print(f"  {len(dump)} 32-bit words loaded ({len(dump) * 4} bytes)")
 
-    print("Checking ...\n")
-    checked, re_bad, im_bad, meta_bad, missing, re_good, im_good, meta_good, worst = check(
-        cfg, dump, args.vis_rtol, args.vis_atol, args.tci_tol, args.max_detail,
-        diagnose=args.diagnose)
+        print("Checking ...\n")
+        checked, re_bad, im_bad, meta_bad, missing, re_good, im_good, meta_good, inexact, worst = check(
+            cfg, dump, args.vis_rtol, args.vis_atol, args.tci_tol, args.max_detail,
+            diagnose=args.diagnose)
 
+    if store is not None:
+        print(f"  {store.summary()}")
     print()
     print("=== vis_check result ===")
     print(f"  Cells checked      : {checked}")
@@ -805,6 +1128,7 @@ def main():
     print(f"  Good TCI/DV        : {meta_good}")
     print(f"  Bad TCI/DV         : {meta_bad}")
     print(f"  Missing words      : {missing}")
+    print(f"  Inexact vis (info) : {inexact}")
 
     # Always report the worst mismatch seen, pass or fail.
     if checked > 0:
@@ -0,0 +1,661 @@
+#!/usr/bin/env python3
+"""
+vis_spead_decode.py  --  Decode the correlator visibility SPEAD stream
+                         (Packetiser / spead_top output to SDP) from a capture.
+
+Usage:
+    python3 vis_spead_decode.py <capture> [-o OUT] [--format npz|hdf5]
+                                [--processes N] [--verify VHDL_TOP] [options]
+
+The capture is a pcap file (micro or nanosecond timestamps, as written by
+tcpdump or by LFAADecode100G/test/sps_packet_gen.py) or a raw file of
+concatenated ethernet frames.  It is memory mapped, all packet headers are
+decoded at once with numpy, the packets are grouped into heaps per
+destination stream (one stream per subarray in the packetiser tables) and
+reassembled with the SPEAD heap offset.  A heap that fits in one packet is
+returned as a view of the capture, so the payload is not copied.
+
+------------------------------------------------------------------------------
+Packet format
+------------------------------------------------------------------------------
+  ethernet (14 bytes) + IPv4 without options (20) + UDP (8), then SPEAD-64-48:
+    header  : 0x53 0x04 0x02 0x06 0x0000 n_items(16 bit)          (big endian)
+    items   : n_items x 64 bit, bit 63 = immediate, bits 62:48 = item id,
+              bits 47:0 = value (immediate) or heap address
+    payload : heap bytes [heap_offset, heap_offset + payload_length)
+  SPEAD protocol items : 0x0001 heap counter, 0x0002 heap size,
+                         0x0003 heap offset, 0x0004 payload length
+  CBF-SDP items        : see VIS_ITEMS.  Other immediate items are kept by id.
+
+The correlator output data item (0x600A, or the first address item when
+there is no 0x600A) is the visibility matrix of one frequency channel as
+produced by correlator_data_reader.vhd: a row major lower triangle, for
+station row r = 0 .. N-1 the columns c = 0 .. r, N*(N+1)/2 baselines of
+  full precision (34 bytes) : 4 x complex64 vis[p1*2 + p2], TCI (int8), FD (uint8)
+  half precision (18 bytes) : 4 x 2 x float16 vis[p1*2 + p2], TCI (int8), FD (uint8)
+with p1 the row station and p2 the column station polarisation, the same
+order as a cell element in the visibility HBM (see vis_check.py).  The
+precision follows from the data length.
+
+Output (-o OUT):
+  npz  : OUT/<stream>_ch<channel>_<chunk>.npz with --chunk heaps each,
+         arrays heap_counter, timestamp, vis (heaps, baselines, 2, 2),
+         tci and fd (heaps, baselines)
+  hdf5 : OUT/<stream>.h5 with group ch<channel> and chunked datasets of the
+         same names, extended per heap (needs h5py)
+With --processes N the streams are shared out over N worker processes, each
+worker maps the capture itself and writes its own streams.
+
+--verify VHDL_TOP compares every heap with the vis_check.py reference model
+of the ct2 testbench configuration in VHDL_TOP.  The heaps of a stream are
+taken in arrival order, which is the order the correlator produces them:
+per integration, per output channel, per time group (see
+vis_check.cell_descriptors).  Streams are matched to the enabled
+subarray-beams of the --correlator (default 0, repeatable) in order of
+their first packet, or with --sb-map PORT=SB (correlator 0) or
+PORT=CORR:SB.  TCI is compared modulo 256 like vis_check.py.
+"""
+
+import os
+import sys
+import mmap
+import struct
+import argparse
+import multiprocessing
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'tools', 'radiohdl', 'base'))
+from common import BitFields  # noqa: E402  (radiohdl common, vectorised bit field codec)
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import ct2_config  # noqa: E402  (sibling module, shared test configuration)
+import vis_check  # noqa: E402  (reference model)
+
+
+# ---------------------------------------------------------------------------
+# Packet format
+# ---------------------------------------------------------------------------
+
+ETH_HEADER_BYTES = 14
+UDP_PAYLOAD_OFFSET = 42                 # ethernet + IPv4 (no options) + UDP
+SPEAD_MAGIC = b'\x53\x04\x02\x06'       # SPEAD-64-48
+SPEAD_HEADER_BYTES = 8
+SPEAD_ITEM_BYTES = 8
+
+ITEM_FIELDS = BitFields([('immediate', 63, 63), ('id', 62, 48), ('value', 47, 0)], word_w=64)
+
+HEAP_COUNTER = 0x0001
+HEAP_SIZE = 0x0002
+HEAP_OFFSET = 0x0003
+PAYLOAD_LENGTH = 0x0004
+VIS_DATA = 0x600A
+
+VIS_ITEMS = {0x6000: 'timestamp_count',
+             0x6001: 'timestamp_fraction',
+             0x6002: 'channel_id',
+             0x6003: 'channel_count',
+             0x6004: 'polarisation_id',
+             0x6005: 'baseline_count',
+             0x6008: 'scan_id',
+             0x6009: 'hardware_id',
+             VIS_DATA: 'correlator_output_data'}
+VIS_ITEM_IDS = {name: item_id for item_id, name in VIS_ITEMS.items()}
+
+VIS_DTYPE = np.dtype([('vis', '<c8', (2, 2)), ('tci', 'i1'), ('fd', 'u1')])          # 34 bytes
+VIS_DTYPE_HALF = np.dtype([('vis', '<f2', (2, 2, 2)), ('tci', 'i1'), ('fd', 'u1')])  # 18 bytes
+
+PCAP_MAGIC = {b'\xd4\xc3\xb2\xa1': '<', b'\xa1\xb2\xc3\xd4': '>',      # microsecond
+              b'\x4d\x3c\xb2\xa1': '<', b'\xa1\xb2\x3c\x4d': '>'}      # nanosecond
+PCAP_FILE_HEADER_BYTES = 24
+PCAP_RECORD_HEADER_BYTES = 16
+
+
+def baseline_count(n_stations):
+    """Number of baselines (including autocorrelations) of n_stations."""
+    return n_stations * (n_stations + 1) // 2
+
+
+def baseline_stations(n_stations):
+    """Return (row, col) station index arrays of the baselines in correlator output order."""
+    return np.tril_indices(n_stations)
+
+
+def stations_from_baselines(n_baselines):
+    """Return N for n_baselines = N*(N+1)/2, or None if n_baselines is not a triangular number."""
+    n = int((np.sqrt(8 * n_baselines + 1) - 1) // 2)
+    for n_stations in (n, n + 1):
+        if baseline_count(n_stations) == n_baselines:
+            return n_stations
+    return None
+
+
+def data_dtype(n_bytes, n_baselines=None):
+    """Return the baseline dtype (full or half precision) of a correlator output data item of n_bytes."""
+    for dtype in (VIS_DTYPE, VIS_DTYPE_HALF):
+        if n_baselines is not None:
+            if n_bytes == n_baselines * dtype.itemsize:
+                return dtype
+        elif n_bytes % dtype.itemsize == 0 and stations_from_baselines(n_bytes // dtype.itemsize) is not None:
+            return dtype
+    raise ValueError('Correlator output data of %d bytes is not a whole triangle of baselines' % n_bytes)
+
+
+def stream_name(stream):
+    """File name friendly name of the stream id (destination IP << 16 | UDP port)."""
+    ip = int(stream) >> 16
+    return '%d.%d.%d.%d_%d' % (ip >> 24, (ip >> 16) & 0xFF, (ip >> 8) & 0xFF, ip & 0xFF, int(stream) & 0xFFFF)
+
+
+# ---------------------------------------------------------------------------
+# Capture access and packet index
+# ---------------------------------------------------------------------------
+
+def open_capture(file_name):
+    """Memory map the capture file, return it as read only uint8 array."""
+    with open(file_name, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return np.zeros(0, dtype=np.uint8)
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return np.frombuffer(buf, dtype=np.uint8)
+
+
+def frame_offsets(data):
+    """Return (offsets, lengths) int64 arrays of the ethernet frames in a pcap or raw capture."""
+    buf = data.data
+    offsets = []
+    lengths = []
+    endian = PCAP_MAGIC.get(bytes(data[:4]))
+    if endian is not None:
+        record = struct.Struct(endian + 'IIII')
+        pos = PCAP_FILE_HEADER_BYTES
+        while pos + PCAP_RECORD_HEADER_BYTES <= len(data):
+            _, _, incl_len, _ = record.unpack_from(buf, pos)
+            pos += PCAP_RECORD_HEADER_BYTES
+            if pos + incl_len > len(data):
+                break
+            offsets.append(pos)
+            lengths.append(incl_len)
+            pos += incl_len
+    else:
+        # Raw frames, the length follows from the IPv4 total length.
+        ip_len = struct.Struct('>H')
+        pos = 0
+        while pos + UDP_PAYLOAD_OFFSET <= len(data):
+            frame_len = ETH_HEADER_BYTES + ip_len.unpack_from(buf, pos + 16)[0]
+            if frame_len <= UDP_PAYLOAD_OFFSET or pos + frame_len > len(data):
+                break
+            offsets.append(pos)
+            lengths.append(frame_len)
+            pos += frame_len
+    return np.array(offsets, dtype=np.int64), np.array(lengths, dtype=np.int64)
+
+
+def _gather_be(data, offsets, nof_bytes):
+    """Big endian unsigned values of nof_bytes at each of the offsets, as int64."""
+    value = np.zeros(len(offsets), dtype=np.int64)
+    for k in range(nof_bytes):
+        value = (value << 8) | data[offsets + k]
+    return value
+
+
+def packet_index(data, offsets=None, lengths=None):
+    """
+    Decode the headers of all SPEAD packets in the capture at once.
+
+    Returns (index, items):
+      index : numpy record array, one entry per SPEAD packet in capture order,
+              fields position (frame number), stream, heap_counter, heap_size,
+              heap_offset, payload_start, payload_length, n_items
+      items : int64 array (packets, max n_items) of the raw item pointers,
+              0 beyond n_items
+    Frames that are not IPv4/UDP/SPEAD-64-48 are skipped.
+    """
+    if offsets is None:
+        offsets, lengths = frame_offsets(data)
+    ok = lengths >= UDP_PAYLOAD_OFFSET + SPEAD_HEADER_BYTES
+    pos = np.flatnonzero(ok)
+    off, length = offsets[ok], lengths[ok]
+    ok = ((_gather_be(data, off + 12, 2) == 0x0800) & (data[off + 14] == 0x45) & (data[off + 23] == 17) &
+          (_gather_be(data, off + UDP_PAYLOAD_OFFSET, 4) == int.from_bytes(SPEAD_MAGIC, 'big')))
+    pos, off, length = pos[ok], off[ok], length[ok]
+
+    n_items = _gather_be(data, off + UDP_PAYLOAD_OFFSET + 6, 2)
+    items_start = off + UDP_PAYLOAD_OFFSET + SPEAD_HEADER_BYTES
+    payload_start = items_start + SPEAD_ITEM_BYTES * n_items
+    ok = payload_start <= off + length
+    pos, off, length, n_items, items_start, payload_start = (
+        pos[ok], off[ok], length[ok], n_items[ok], items_start[ok], payload_start[ok])
+
+    max_items = int(n_items.max()) if len(n_items) else 0
+    slot = np.arange(max_items)
+    item_offsets = items_start[:, np.newaxis] + SPEAD_ITEM_BYTES * slot[np.newaxis, :]
+    in_use = slot[np.newaxis, :] < n_items[:, np.newaxis]
+    item_offsets = np.where(in_use, item_offsets, 0)
+    items = np.stack([data[item_offsets + k] for k in range(SPEAD_ITEM_BYTES)], axis=-1).copy()
+    items = np.where(in_use, items.view('>u8')[..., 0].astype(np.int64), 0)
+
+    f = ITEM_FIELDS.decode(items)
+
+    def immediate(item_id, default):
+        match = (f['immediate'] == 1) & (f['id'] == item_id) & in_use
+        return np.where(match.any(axis=1), np.max(np.where(match, f['value'], 0), axis=1), default)
+
+    payload_length = immediate(PAYLOAD_LENGTH, off + length - payload_start)
+    stream = (_gather_be(data, off + 30, 4) << 16) | _gather_be(data, off + 36, 2)
+    index = np.rec.fromarrays(
+        [pos, stream, immediate(HEAP_COUNTER, -1), immediate(HEAP_SIZE, -1), immediate(HEAP_OFFSET, 0),
+         payload_start, np.minimum(payload_length, off + length - payload_start), n_items],
+        names=['position', 'stream', 'heap_counter', 'heap_size', 'heap_offset',
+               'payload_start', 'payload_length', 'n_items'])
+    return index, items
+
+
+# ---------------------------------------------------------------------------
+# Heap reassembly
+# ---------------------------------------------------------------------------
+
+class VisHeap:
+    """One reassembled heap of a visibility stream."""
+
+    def __init__(self, stream, heap_counter, items, addresses, payload, received):
+        self.stream = int(stream)
+        self.heap_counter = int(heap_counter)
+        self.items = items              # item id : immediate value
+        self.addresses = addresses      # item id : heap address
+        self.payload = payload          # uint8 array of the heap
+        self.received = int(received)   # payload bytes received
+
+    @property
+    def complete(self):
+        return self.received >= len(self.payload)
+
+    def item(self, name, default=None):
+        return self.items.get(VIS_ITEM_IDS.get(name, name), default)
+
+    @property
+    def channel_id(self):
+        return self.item('channel_id')
+
+    @property
+    def timestamp(self):
+        """Timestamp count and fraction as one 64 bit value, the heap counter if the heap has no timestamp."""
+        if 'timestamp_count' not in (VIS_ITEMS.get(i) for i in self.items):
+            return self.heap_counter
+        return (self.item('timestamp_count') << 32) | (self.item('timestamp_fraction', 0) & 0xFFFFFFFF)
+
+    def data(self):
+        """Return the correlator output data as structured array view (vis, tci, fd) per baseline, None if absent."""
+        if not self.addresses:
+            return None
+        item_id = VIS_DATA if VIS_DATA in self.addresses else min(self.addresses)
+        start = self.addresses[item_id]
+        ends = [a for a in self.addresses.values() if a > start]
+        raw = self.payload[start:min(ends) if ends else len(self.payload)]
+        dtype = data_dtype(len(raw), self.item('baseline_count'))
+        return np.frombuffer(raw, dtype=dtype)
+
+    def visibilities(self):
+        """Return (vis, tci, fd): complex64 (baselines, 2, 2), int8 and uint8 (baselines), None if no data."""
+        data = self.data()
+        if data is None:
+            return None
+        vis = data['vis']
+        if data.dtype == VIS_DTYPE_HALF:
+            vis = vis.astype(np.float32).view(np.complex64)[..., 0]
+        return vis, data['tci'], data['fd']
+
+
+def heaps(data, index, items):
+    """
+    Reassemble the packets of index (from packet_index) into heaps, yield a
+    VisHeap per heap in order of the first packet of each heap.  Duplicate
+    packets are ignored, missing packets leave the heap incomplete.
+    """
+    if len(index) == 0:
+        return
+    fields = ITEM_FIELDS.decode(items)
+    in_use = np.arange(items.shape[1])[np.newaxis, :] < index.n_items[:, np.newaxis]
+    order = np.lexsort((index.heap_offset, index.heap_counter, index.stream))
+    key_change = np.flatnonzero((np.diff(index.stream[order]) != 0) | (np.diff(index.heap_counter[order]) != 0)) + 1
+    starts = np.concatenate(([0], key_change))
+    ends = np.concatenate((key_change, [len(order)]))
+    first = np.minimum.reduceat(order, starts)
+    for g in np.argsort(first, kind='stable'):
+        pkts = order[starts[g]:ends[g]]
+        heap_size = int(index.heap_size[pkts].max())
+        sel = in_use[pkts]
+        ids, values, imm = fields['id'][pkts][sel], fields['value'][pkts][sel], fields['immediate'][pkts][sel]
+        standard = ids <= PAYLOAD_LENGTH
+        heap_items = dict(zip(ids[(imm == 1) & ~standard].tolist(), values[(imm == 1) & ~standard].tolist()))
+        addresses = dict(zip(ids[imm == 0].tolist(), values[imm == 0].tolist()))
+
+        start, length, offset = index.payload_start[pkts], index.payload_length[pkts], index.heap_offset[pkts]
+        if heap_size < 0:
+            heap_size = int((offset + length).max())
+        if len(pkts) == 1 and offset[0] == 0 and length[0] == heap_size:
+            payload = data[start[0]:start[0] + heap_size]       # view of the capture
+            received = heap_size
+        else:
+            payload = np.zeros(heap_size, dtype=np.uint8)
+            received = 0
+            previous = -1
+            for s, n, o in zip(start.tolist(), length.tolist(), offset.tolist()):
+                if o == previous:
+                    continue            # duplicate packet
+                n = min(n, heap_size - o)
+                payload[o:o + n] = data[s:s + n]
+                received += n
+                previous = o
+        yield VisHeap(index.stream[pkts[0]], index.heap_counter[pkts[0]], heap_items, addresses, payload, received)
+
+
+# ---------------------------------------------------------------------------
+# Reference stream encoding
+# ---------------------------------------------------------------------------
+
+def heap_frames(vis, tci, fd, heap_counter, items=None, stream=(0x0A000002 << 16) | 9000, max_payload=8192):
+    """
+    Return the ethernet frames (list of bytes) of one full precision visibility
+    heap, in the packet format above.  items is a dict of immediate items
+    (id or VIS_ITEMS name : value) that are sent in every packet.
+    """
+    data = np.zeros(len(tci), dtype=VIS_DTYPE)
+    data['vis'], data['tci'], data['fd'] = vis, tci, fd
+    payload = data.tobytes()
+    fixed = [(1, VIS_ITEM_IDS.get(k, k), v) for k, v in (items or {}).items()] + [(0, VIS_DATA, 0)]
+    frames = []
+    for offset in range(0, len(payload), max_payload):
+        chunk = payload[offset:offset + max_payload]
+        spead = [(1, HEAP_COUNTER, heap_counter), (1, HEAP_SIZE, len(payload)), (1, HEAP_OFFSET, offset),
+                 (1, PAYLOAD_LENGTH, len(chunk))] + fixed
+        words = ITEM_FIELDS.encode({'immediate': [i[0] for i in spead], 'id': [i[1] for i in spead],
+                                    'value': [i[2] for i in spead]})
+        udp = (SPEAD_MAGIC + struct.pack('>HH', 0, len(spead)) + words.astype('>u8').tobytes() + chunk)
+        ip = bytearray(struct.pack('>BBHHHBBHII', 0x45, 0, 28 + len(udp), 0, 0x4000, 64, 17, 0,
+                                   0x0A000001, int(stream) >> 16))
+        s = sum(struct.unpack('>10H', bytes(ip)))
+        s = (s & 0xFFFF) + (s >> 16)
+        ip[10:12] = struct.pack('>H', ~((s & 0xFFFF) + (s >> 16)) & 0xFFFF)
+        frames.append(bytes(12) + b'\x08\x00' + bytes(ip) +
+                      struct.pack('>HHHH', int(stream) & 0xFFFF, int(stream) & 0xFFFF, 8 + len(udp), 0) + udp)
+    return frames
+
+
+# ---------------------------------------------------------------------------
+# Output writers
+# ---------------------------------------------------------------------------
+
+class NpzWriter:
+    """Write the heaps per (stream, channel) to .npz files of chunk heaps each."""
+
+    def __init__(self, out_dir, chunk=16):
+        self.out_dir = out_dir
+        self.chunk = chunk
+        self.pending = {}
+        self.chunks = {}
+        os.makedirs(out_dir, exist_ok=True)
+
+    def add(self, heap, vis, tci, fd):
+        key = (heap.stream, heap.channel_id)
+        self.pending.setdefault(key, []).append((heap.heap_counter, heap.timestamp, vis, tci, fd))
+        if len(self.pending[key]) >= self.chunk:
+            self._flush(key)
+
+    def _flush(self, key):
+        rows = self.pending.pop(key, [])
+        if not rows:
+            return
+        n = self.chunks.get(key, 0)
+        self.chunks[key] = n + 1
+        file_name = os.path.join(self.out_dir, '%s_ch%s_%04d.npz' % (stream_name(key[0]), key[1], n))
+        heap_counter, timestamp, vis, tci, fd = zip(*rows)
+        np.savez(file_name, heap_counter=np.array(heap_counter, dtype=np.int64),
+                 timestamp=np.array(timestamp, dtype=np.uint64), vis=np.stack(vis), tci=np.stack(tci), fd=np.stack(fd))
+
+    def close(self):
+        for key in list(self.pending):
+            self._flush(key)
+
+
+class Hdf5Writer:
+    """Write the heaps to one HDF5 file per stream, a group per channel with datasets extended per heap."""
+
+    def __init__(self, out_dir, chunk=16):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError('HDF5 output needs h5py, use --format npz or install h5py')
+        self.h5py = h5py
+        self.out_dir = out_dir
+        self.chunk = chunk
+        self.files = {}
+        os.makedirs(out_dir, exist_ok=True)
+
+    def _dataset(self, group, name, value, dtype):
+        if name not in group:
+            group.create_dataset(name, shape=(0,) + value.shape, maxshape=(None,) + value.shape,
+                                 chunks=(self.chunk,) + value.shape, dtype=dtype)
+        dataset = group[name]
+        dataset.resize(dataset.shape[0] + 1, axis=0)
+        dataset[-1] = value
+
+    def add(self, heap, vis, tci, fd):
+        if heap.stream not in self.files:
+            self.files[heap.stream] = self.h5py.File(os.path.join(self.out_dir, stream_name(heap.stream) + '.h5'), 'w')
+        group = self.files[heap.stream].require_group('ch%s' % heap.channel_id)
+        self._dataset(group, 'heap_counter', np.int64(heap.heap_counter), np.int64)
+        self._dataset(group, 'timestamp', np.uint64(heap.timestamp), np.uint64)
+        self._dataset(group, 'vis', np.asarray(vis), np.complex64)
+        self._dataset(group, 'tci', np.asarray(tci), np.int8)
+        self._dataset(group, 'fd', np.asarray(fd), np.uint8)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+WRITERS = {'npz': NpzWriter, 'hdf5': Hdf5Writer}
+
+
+# ---------------------------------------------------------------------------
+# Decoding, single and multi process
+# ---------------------------------------------------------------------------
+
+def decode(data, index, items, writer=None):
+    """Reassemble and write the heaps, return {(stream, channel): [n_heaps, n_incomplete, n_without_data]}."""
+    summary = {}
+    for heap in heaps(data, index, items):
+        counts = summary.setdefault((heap.stream, heap.channel_id), [0, 0, 0])
+        counts[0] += 1
+        if not heap.complete:
+            counts[1] += 1
+            continue
+        result = heap.visibilities()
+        if result is None:
+            counts[2] += 1
+        elif writer is not None:
+            writer.add(heap, *result)
+    return summary
+
+
+def _decode_worker(args):
+    file_name, index, items, out_dir, fmt, chunk = args
+    writer = WRITERS[fmt](out_dir, chunk) if out_dir else None
+    summary = decode(open_capture(file_name), index, items, writer)
+    if writer is not None:
+        writer.close()
+    return summary
+
+
+def decode_capture(file_name, out_dir=None, fmt='npz', chunk=16, processes=1):
+    """Decode the capture file, with the streams shared out over processes workers. Return the decode summary."""
+    data = open_capture(file_name)
+    index, items = packet_index(data)
+    streams = np.unique(index.stream)
+    processes = max(1, min(processes, len(streams)))
+    if processes == 1:
+        return _decode_worker((file_name, index, items, out_dir, fmt, chunk))
+    share = np.searchsorted(streams, index.stream) % processes
+    jobs = [(file_name, index[share == w], items[share == w], out_dir, fmt, chunk) for w in range(processes)]
+    summary = {}
+    with multiprocessing.Pool(processes) as pool:
+        for result in pool.map(_decode_worker, jobs):
+            summary.update(result)
+    return summary
+
+
+# ---------------------------------------------------------------------------
+# Verification against the vis_check reference model
+# ---------------------------------------------------------------------------
+
+def expected_heap(sb, station_map, integration, output_channel, output_time, time_groups):
+    """Return the expected (vis, tci, fd) of one heap in correlator output baseline order."""
+    vis, tci, fd, _ = vis_check.compute_integration(sb, station_map, output_channel, output_time,
+                                                    time_groups, integration)
+    rows, cols = baseline_stations(int(sb['n_stations']))
+    return vis[rows, cols], tci[rows, cols], fd[rows, cols]
+
+
+def verify(cfg, data, index, items, sb_map, vis_rtol, vis_atol, tci_tol, max_detail, correlators=(0,)):
+    """
+    Compare every complete heap with the reference model.  sb_map maps the
+    stream id to (correlator, subarray-beam index), unmapped streams get the
+    enabled subarray-beams of correlators in order of first packet.
+    Returns (n_heaps, n_bad_heaps, n_vis_bad, n_meta_bad, n_incomplete).
+    """
+    sbs = {corr: cfg.sbs_full(corr) for corr in set(correlators) | set(c for c, _ in sb_map.values())}
+    enabled = [(corr, i) for corr in correlators for i, sb in enumerate(sbs[corr])
+               if sb['n_stations'] > 0 and not sb['output_disable']]
+    free = [key for key in enabled if key not in sb_map.values()]
+    seen = {}
+    n_heaps = n_bad_heaps = n_vis_bad = n_meta_bad = n_incomplete = 0
+    details = 0
+    for heap in heaps(data, index, items):
+        if heap.stream not in sb_map:
+            if not free:
+                print(f"  stream {stream_name(heap.stream)}: no subarray-beam left to match, skipped")
+                sb_map[heap.stream] = None
+            else:
+                sb_map[heap.stream] = free.pop(0)
+                print(f"  stream {stream_name(heap.stream)} -> correlator {sb_map[heap.stream][0]} "
+                      f"subarray-beam {sb_map[heap.stream][1]}")
+        if sb_map[heap.stream] is None:
+            continue
+        corr, sb_index = sb_map[heap.stream]
+        if not heap.complete:
+            n_incomplete += 1
+            continue
+        result = heap.visibilities()
+        if result is None:
+            continue
+        sb = sbs[corr][sb_index]
+        time_groups = 1 if sb['n_time_integrate'] == 192 else 3
+        n_output_channels = sb['n_fine'] // sb['n_fine_integrate']
+        k = seen.get(heap.stream, 0)
+        seen[heap.stream] = k + 1
+        integration, rem = divmod(k, n_output_channels * time_groups)
+        output_channel, output_time = divmod(rem, time_groups)
+
+        av, atci, afd = result
+        ev, etci, efd = expected_heap(sb, cfg.station_map(sb_index, corr),
+                                      integration, output_channel, output_time, time_groups)
+        if av.shape != ev.shape:
+            print(f"  heap {heap.heap_counter}: {av.shape[0]} baselines, expected {ev.shape[0]}")
+            n_heaps += 1
+            n_bad_heaps += 1
+            continue
+        vis_bad = ((np.abs(av.real - ev.real) > vis_atol + vis_rtol * np.abs(ev.real)) |
+                   (np.abs(av.imag - ev.imag) > vis_atol + vis_rtol * np.abs(ev.imag)))
+        meta_bad = ((vis_check._wrap_diff(atci.astype(np.int64) & 0xFF, etci & 0xFF) > tci_tol) |
+                    (np.abs((afd.astype(np.int64) & 0xFF) - (efd & 0xFF)) > tci_tol))
+        n_heaps += 1
+        n_vis_bad += int(np.count_nonzero(vis_bad))
+        n_meta_bad += int(np.count_nonzero(meta_bad))
+        if vis_bad.any() or meta_bad.any():
+            n_bad_heaps += 1
+            rows, cols = baseline_stations(int(sb['n_stations']))
+            for b in np.flatnonzero(vis_bad.any(axis=(1, 2)) | meta_bad):
+                if details >= max_detail:
+                    break
+                details += 1
+                print(f"  MISMATCH heap {heap.heap_counter} ch {heap.channel_id} (integration={integration}, "
+                      f"oc={output_channel}, ot={output_time}) baseline ({rows[b]},{cols[b]}): "
+                      f"vis exp={ev[b].ravel()} act={av[b].ravel()}  "
+                      f"tci exp={int(etci[b]) & 0xFF} act={int(atci[b]) & 0xFF}  fd exp={efd[b]} act={afd[b]}")
+    return n_heaps, n_bad_heaps, n_vis_bad, n_meta_bad, n_incomplete
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def main():
+    ap = argparse.ArgumentParser(description="Decode the correlator visibility SPEAD stream from a pcap or raw capture")
+    ap.add_argument('capture', help="pcap file or raw concatenated ethernet frames")
+    ap.add_argument('-o', '--out', help="Output directory for the decoded arrays")
+    ap.add_argument('--format', choices=sorted(WRITERS), default='npz', help="Output format, default npz")
+    ap.add_argument('--chunk', type=int, default=16, help="Heaps per npz file / HDF5 chunk, default 16")
+    ap.add_argument('--processes', type=int, default=1, help="Number of decoder processes, default 1")
+    ap.add_argument('--verify', metavar='VHDL_TOP', help="Compare with the vis_check model of this ct2 test top")
+    ap.add_argument('--correlator', type=int, action='append', default=None, metavar='CORR',
+                    help="Match streams to the subarray-beams of correlator CORR (repeatable), default 0")
+    ap.add_argument('--sb-map', action='append', default=[], metavar='PORT=[CORR:]SB',
+                    help="Match the stream with UDP destination PORT to subarray-beam SB of correlator CORR "
+                         "(default 0), repeatable")
+    ap.add_argument('--vis-rtol', type=float, default=1e-3,
+                    help="Relative tolerance for visibility compare, default 1e-3 as vis_check.py, 0 = bit exact")
+    ap.add_argument('--vis-atol', type=float, default=1.0,
+                    help="Absolute tolerance for visibility compare, default 1 as vis_check.py, 0 = bit exact")
+    ap.add_argument('--tci-tol', type=int, default=1,
+                    help="Tolerance (LSBs) for TCI/FD compare, default 1 as vis_check.py, 0 = bit exact")
+    ap.add_argument('--max-detail', type=int, default=40, help="Maximum number of mismatch lines to print")
+    args = ap.parse_args()
+
+    data = open_capture(args.capture)
+    index, items = packet_index(data)
+    print(f"{args.capture}: {len(index)} SPEAD packets in {len(np.unique(index.stream))} stream(s)")
+
+    if args.out or not args.verify:
+        summary = decode_capture(args.capture, args.out, args.format, args.chunk, args.processes)
+        for (stream, channel), (n, incomplete, no_data) in sorted(summary.items(), key=lambda kv: (kv[0][0], str(kv[0][1]))):
+            print(f"  {stream_name(stream):24s} channel {channel}: {n} heaps, {incomplete} incomplete, "
+                  f"{no_data} without data")
+        if args.out:
+            print(f"Wrote {args.format} output to {args.out}")
+
+    if args.verify:
+        cfg = ct2_config.load_config(args.verify)
+        ports = {}
+        for s in np.unique(index.stream).tolist():
+            ports.setdefault(s & 0xFFFF, []).append(s)
+        sb_map = {}
+        for m in args.sb_map:
+            port, sb = m.split('=')
+            corr, _, sb = sb.rpartition(':')
+            for s in ports.get(int(port, 0), []):
+                sb_map[s] = (int(corr or '0', 0), int(sb, 0))
+        print(f"\nVerifying against {args.verify} ...")
+        n_heaps, n_bad, vis_bad, meta_bad, incomplete = verify(
+            cfg, data, index, items, sb_map, args.vis_rtol, args.vis_atol, args.tci_tol, args.max_detail,
+            args.correlator or [0])
+        print()
+        print("=== vis_spead_decode result ===")
+        print(f"  Heaps checked      : {n_heaps}")
+        print(f"  Bad heaps          : {n_bad}")
+        print(f"  Bad visibilities   : {vis_bad}")
+        print(f"  Bad TCI/FD         : {meta_bad}")
+        print(f"  Incomplete heaps   : {incomplete}")
+        if n_heaps == 0:
+            print("  WARNING: nothing checked")
+            sys.exit(2)
+        elif n_bad == 0 and incomplete == 0:
+            print("  PASS")
+            sys.exit(0)
+        else:
+            print("  FAIL")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bit accurate numpy model of the correlator data valid (DV) and time centroid
+(TCI) path: centroid_divider.vhd -> sqrt_rom -> dv_tci_mem.vhd.
+
+All functions work element wise on numpy arrays of any (broadcastable)
+shape, e.g. the (n16, n16) valid count and valid weight arrays of a whole
+integration, or a grid of every (time_sum, n_samples) combination that the
+hardware can see:
+
+    n_samples, time_sum = np.meshgrid(np.arange(64*24 + 1), np.arange(64*64*24), indexing='ij')
+    tci, dv = centroid_divider(time_sum, n_samples, 64, 24)
+
+centroid_divider.vhd:
+  - weight   : 13 stages restoring division n_samples / (total_times*total_channels)
+               gives a 12 bit fraction (saturated at 4095), which addresses sqrt_rom
+  - centroid : 9 stages restoring division time_sum / (total_times*n_samples)
+               gives floor(256*time_sum/(total_times*n_samples)), minus 128,
+               plus 2 for short (total_times < 128) or 1 for long integrations
+  - both outputs are 0 when n_samples = 0
+dv_tci_mem.vhd stores element e of a cell as 16 bit word TCI & DV, so in the
+TCI/DV HBM region byte 2*e is DV and byte 2*e+1 is TCI.
+
+Usage:
+    python3 dv_tci_model.py <total_times> <total_channels>
+prints the DV for every n_samples and checks it against 255*sqrt(fraction).
+"""
+
+import argparse
+import numpy as np
+
+import rom_gen
+
+SQRT_ROM = rom_gen.load_table('sqrt_rom')
+
+
+def restoring_divide(numerator, denominator, nof_stages, numerator_w, result_w):
+    """Shift and subtract divider stages of centroid_divider.vhd.
+
+    Each stage appends one quotient bit to the result (result_w bits wide) and
+    shifts the remainder left within numerator_w bits, as in the VHDL.
+    """
+    num = np.asarray(numerator, dtype=np.int64)
+    den = np.asarray(denominator, dtype=np.int64)
+    result = np.zeros(np.broadcast(num, den).shape, dtype=np.int64)
+    for _ in range(nof_stages):
+        ge = num >= den
+        num = np.where(ge, num - den, num)
+        result = ((result << 1) | ge) & (2**result_w - 1)
+        num = (num << 1) & (2**numerator_w - 1)
+    return result
+
+
+def centroid_divider(time_sum, n_samples, total_times, total_channels):
+    """Return (centroid, weight) as int64 arrays, equal to o_centroid and o_weight of centroid_divider.vhd.
+
+    time_sum       : sum of the time indices (0..total_times-1) of the samples used, 24 bit
+    n_samples      : number of samples used, 16 bit
+    total_times    : time samples per integration (64 or 192), 8 bit
+    total_channels : fine channels per integration, 7 bit
+    """
+    time_sum = np.asarray(time_sum, dtype=np.int64) & 0xFFFFFF
+    n_samples = np.asarray(n_samples, dtype=np.int64) & 0xFFFF
+    total_times = np.asarray(total_times, dtype=np.int64) & 0xFF
+    total_channels = np.asarray(total_channels, dtype=np.int64) & 0x7F
+    # Nsamples is used as a 16 bit signed value in the multiplier
+    n_samples_signed = np.where(n_samples >= 2**15, n_samples - 2**16, n_samples)
+
+    centroid_denominator = (total_times * n_samples_signed) & 0xFFFFFF
+    weight_denominator = (total_times * total_channels) & 0xFFFF
+
+    weight_result = restoring_divide(n_samples, weight_denominator, 13, 16, 13)
+    sqrt_input = np.where(weight_result >= 2**12, 2**12 - 1, weight_result)
+    weight = SQRT_ROM[sqrt_input].astype(np.int64)
+
+    centroid_result = restoring_divide(time_sum, centroid_denominator, 9, 24, 9)
+    correction = np.where(total_times < 128, 2, 1)
+    centroid = ((centroid_result & 0xFF) - 128 + correction) & 0xFF
+
+    force_zero = n_samples == 0
+    return np.where(force_zero, 0, centroid), np.where(force_zero, 0, weight)
+
+
+def dv_tci_words(dv, tci):
+    """Pack DV and TCI into the 16 bit dv_tci_mem words (TCI in bits 15:8, DV in bits 7:0)."""
+    return ((np.asarray(tci, dtype=np.uint16) & 0xFF) << 8) | (np.asarray(dv, dtype=np.uint16) & 0xFF)
+
+
+def dv_tci_cell_bytes(dv, tci):
+    """Return the 512 bytes of the TCI/DV HBM region for one 16x16 cell, element e = row*16 + col."""
+    words = dv_tci_words(dv, tci).reshape(256)
+    return words.astype('<u2').tobytes()
+
+
+def dv_tci_unpack(data):
+    """Inverse of dv_tci_cell_bytes(), return (dv, tci) int64 arrays of shape (16, 16) from 512 bytes."""
+    words = np.frombuffer(bytes(data), dtype='<u2').astype(np.int64).reshape(16, 16)
+    return words & 0xFF, words >> 8
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Sweep the centroid_divider DV weight over all number of samples')
+    parser.add_argument('total_times', type=int, help='time samples per integration, 64 or 192')
+    parser.add_argument('total_channels', type=int, help='fine channels per integration')
+    args = parser.parse_args()
+    n_samples = np.arange(args.total_times * args.total_channels + 1)
+    _, weight = centroid_divider(0, n_samples, args.total_times, args.total_channels)
+    ideal = np.round(255.0 * np.sqrt(n_samples / float(args.total_times * args.total_channels))).astype(np.int64)
+    for n, w, i in zip(n_samples, weight, ideal):
+        print('%6d  %3d%s' % (n, w, '' if w == i else '  (255*sqrt = %d)' % i))
+    print('%d of %d weights differ from round(255*sqrt(fraction)), max difference %d' %
+          (np.count_nonzero(weight != ideal), len(n_samples), np.max(np.abs(weight - ideal))))
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Generic ROM generator for the correlator lookup tables.
+
+The ROM contents are computed with numpy as a table indexed by ROM address,
+and then written as:
+  - <rom_name>.vhd : VHDL ROM entity with the table as initial value of a
+                     block RAM (same format as the original create_*_rom.py
+                     scripts)
+  - <rom_name>.coe : Xilinx COE memory initialisation file
+  - <rom_name>.mem : hex memory file, one word per line in address order
+                     ($readmemh / Vivado .mem)
+  - <rom_name>.npy : golden copy of the table, for Python models such as
+                     vis_check.py, so they use the exact ROM contents
+Files whose contents did not change are not rewritten, so their timestamps
+(and therefore the Vivado/Modelsim compile state) are kept.
+
+Usage:
+    python3 rom_gen.py [--formats vhd,coe,mem,npy] [--out DIR] [rom ...]
+e.g. python3 rom_gen.py sqrt_rom inv_rom
+"""
+
+import os
+import io
+import argparse
+import numpy as np
+
+ROM_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FORMATS = ('vhd', 'npy')
+ALL_FORMATS = ('vhd', 'coe', 'mem', 'npy')
+
+
+# ---------------------------------------------------------------------------
+# Table definitions
+# ---------------------------------------------------------------------------
+
+def sqrt_rom_table(addr_w=12, data_w=8):
+    """sqrt of the address in the range 0..2**addr_w-1, scaled to 0..2**data_w-1 (DV weight in centroid_divider)."""
+    top = 2**addr_w - 1
+    return np.round((2**data_w - 1) * np.sqrt(np.arange(2**addr_w) / float(top))).astype(np.uint64)
+
+
+def inv_rom_table(rom, addr_w=9):
+    """fp32 bit pattern of 1/n for n = rom*2**addr_w + address, 0 for n = 0 (inv_rom<rom> in inv_rom_top)."""
+    n = (rom * 2**addr_w + np.arange(2**addr_w)).astype(np.float32)
+    with np.errstate(divide='ignore'):
+        inv = np.float32(1) / n
+    inv[n == 0] = 0
+    return inv.view(np.uint32).astype(np.uint64)
+
+
+# name : (table function, data width, address width, VHDL array direction is ascending, script)
+ROMS = {'sqrt_rom': (sqrt_rom_table, 8, 12, True, 'create_sqrt_rom.py')}
+for _rom in range(9):
+    ROMS['inv_rom%d' % _rom] = ((lambda rom=_rom: inv_rom_table(rom)), 32, 9, False, 'create_inv_roms.py')
+
+
+# ---------------------------------------------------------------------------
+# File writers
+# ---------------------------------------------------------------------------
+
+def hex_words(table, data_w):
+    """Return the table values as list of zero padded lower case hex strings."""
+    fmt = '%0' + str((data_w + 3) // 4) + 'x'
+    return [fmt % v for v in np.asarray(table, dtype=np.uint64).tolist()]
+
+
+def vhdl_text(rom_name, table, data_w, addr_w, ascending=True, script='rom_gen.py'):
+    """VHDL ROM entity with 2 cycles read latency, the table is indexed by address."""
+    depth = len(table)
+    words = hex_words(table, data_w)
+    if ascending:
+        range_str = '0 to %d' % (depth - 1)
+    else:
+        # array (depth-1 downto 0), so the first entry is for the highest address
+        range_str = '%d downto 0' % (depth - 1)
+        words = words[::-1]
+    lines = ['-- Created by python script %s \n' % script,
+             'library ieee;\n',
+             'use ieee.std_logic_1164.all;\n',
+             'use ieee.std_logic_unsigned.all;\n\n',
+             'entity ' + rom_name + ' is \n',
+             'port( \n',
+             '    i_clk  : in  std_logic; \n',
+             '    i_addr : in  std_logic_vector(%d downto 0); \n' % (addr_w - 1),
+             '    o_data : out std_logic_vector(%d downto 0) \n' % (data_w - 1),
+             '    ); \n',
+             'end ' + rom_name + '; \n',
+             ' \n',
+             'architecture behavioral of ' + rom_name + ' is \n',
+             '    type rom_type is array(%s) of std_logic_vector(%d downto 0); \n' % (range_str, data_w - 1),
+             '    signal rom : rom_type := (\n',
+             ', \n'.join('    x"' + w + '"' for w in words) + '); \n',
+             '    attribute rom_style : string;\n',
+             '    attribute rom_style of ROM : signal is "block";\n',
+             '    signal data : std_logic_vector(%d downto 0);\n' % (data_w - 1),
+             '    \n',
+             'begin \n',
+             '    process(i_clk) \n',
+             '    begin \n',
+             '        if rising_edge(i_clk) then \n',
+             '            data <= ROM(conv_integer(i_addr)); \n',
+             '            o_data <= data;\n',
+             '        end if;\n',
+             '    end process;\n',
+             'end behavioral; \n']
+    return ''.join(lines)
+
+
+def coe_text(table, data_w):
+    return ('memory_initialization_radix=16;\nmemory_initialization_vector=\n' +
+            ',\n'.join(hex_words(table, data_w)) + ';\n')
+
+
+def mem_text(table, data_w):
+    return '\n'.join(hex_words(table, data_w)) + '\n'
+
+
+def npy_bytes(table):
+    buf = io.BytesIO()
+    np.save(buf, np.asarray(table))
+    return buf.getvalue()
+
+
+def write_if_changed(file_name, data):
+    """Write data (str or bytes) to file_name, unless the file already has exactly this content. Return True when written."""
+    if isinstance(data, str):
+        data = data.encode()
+    try:
+        with open(file_name, 'rb') as f:
+            if f.read() == data:
+                return False
+    except IOError:
+        pass
+    with open(file_name, 'wb') as f:
+        f.write(data)
+    return True
+
+
+def rom_dtype(data_w):
+    return np.uint8 if data_w <= 8 else np.uint16 if data_w <= 16 else np.uint32 if data_w <= 32 else np.uint64
+
+
+def generate_rom(rom_name, table, data_w, addr_w, ascending=True, script='rom_gen.py', out_dir=ROM_DIR, formats=DEFAULT_FORMATS):
+    """Write the table in the requested formats, return the list of files that were (re)written."""
+    table = np.asarray(table, dtype=np.uint64)
+    if len(table) != 2**addr_w:
+        raise ValueError('%s: table length %d does not match address width %d' % (rom_name, len(table), addr_w))
+    if np.any(table >= 2**data_w):
+        raise ValueError('%s: table values do not fit in %d bits' % (rom_name, data_w))
+    writers = {'vhd': lambda: vhdl_text(rom_name, table, data_w, addr_w, ascending, script),
+               'coe': lambda: coe_text(table, data_w),
+               'mem': lambda: mem_text(table, data_w),
+               'npy': lambda: npy_bytes(table.astype(rom_dtype(data_w)))}
+    written = []
+    for fmt in formats:
+        file_name = os.path.join(out_dir, rom_name + '.' + fmt)
+        if write_if_changed(file_name, writers[fmt]()):
+            written.append(file_name)
+    return written
+
+
+def generate(rom_names, out_dir=ROM_DIR, formats=DEFAULT_FORMATS):
+    """Generate the ROMs from ROMS, a name that is not in ROMS selects all ROMs that start with it (e.g. inv_rom)."""
+    written = []
+    for rom_name in sorted(ROMS):
+        if any(rom_name == n or (n not in ROMS and rom_name.startswith(n)) for n in rom_names):
+            table_fn, data_w, addr_w, ascending, script = ROMS[rom_name]
+            written += generate_rom(rom_name, table_fn(), data_w, addr_w, ascending, script, out_dir, formats)
+    return written
+
+
+def load_table(rom_name, rom_dir=ROM_DIR):
+    """Load the golden .npy table of rom_name, indexed by ROM address."""
+    return np.load(os.path.join(rom_dir, rom_name + '.npy'))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate correlator ROM files')
+    parser.add_argument('roms', nargs='*', default=list(ROMS), help='ROM names, or name prefix (default: all)')
+    parser.add_argument('--formats', default=','.join(DEFAULT_FORMATS), help='comma separated from %s' % ','.join(ALL_FORMATS))
+    parser.add_argument('--out', default=ROM_DIR, help='output directory (default: this directory)')
+    args = parser.parse_args()
+    for file_name in generate(args.roms, args.out, args.formats.split(',')):
+        print('Wrote ' + file_name)
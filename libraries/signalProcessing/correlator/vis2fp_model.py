@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bit accurate numpy model of the visibility scaling of the correlator output,
+vis2fp.vhd = inv_rom_top.vhd + fp32_x_Uint.vhd + int_to_fp32 + mult_fp32:
+
+    vis_fp32 = fp32(vis_int32) * fp32_x_Uint(inv_rom_top(valid_samples), n_times*n_channels)
+
+  - inv_rom_top : 1/valid_samples from the inv_rom0..8 golden tables, values
+                  above 4608 are shifted into 2048..4095 and the shift is
+                  returned as exponent adjust
+  - fp32_x_Uint : multiply the fp32 mantissa by the 16 bit unsigned total
+                  samples, normalise with truncation (no rounding)
+  - int_to_fp32, mult_fp32 : Xilinx floating point IP, round to nearest even,
+                  denormal results are flushed to zero
+
+All functions work on numpy arrays of any (broadcastable) shape, e.g. the
+(n16, n16, 2, 2) accumulator array of a whole integration with the
+(n16, n16, 1, 1) valid sample counts.  Values are passed as uint32 fp32 bit
+patterns where the VHDL has std_logic_vector(31 downto 0).
+
+Usage:
+    python3 vis2fp_model.py <n_times> <n_channels>
+prints the scale factor for every valid_samples and compares it with the
+fp32 of n_times*n_channels/valid_samples.
+"""
+
+import argparse
+import numpy as np
+
+import rom_gen
+
+INV_ROMS = np.stack([rom_gen.load_table('inv_rom%d' % rom) for rom in range(9)]).astype(np.uint32)
+INV_4608 = np.uint32(0x39638e39)  # inv_rom_top output for rom select values above 8
+
+FP32_MIN_NORMAL = np.float32(2.0**-126)
+
+
+def fp32_bits(value):
+    """Return the uint32 bit pattern of the fp32 value(s)."""
+    return np.asarray(value, dtype=np.float32).view(np.uint32)
+
+
+def fp32_value(bits):
+    """Return the fp32 value(s) of the uint32 bit pattern(s)."""
+    return np.asarray(bits, dtype=np.uint32).view(np.float32)
+
+
+def flush_denormal(value):
+    """Flush denormal fp32 results to (signed) zero, like the Xilinx floating point IP."""
+    value = np.asarray(value, dtype=np.float32)
+    return np.where(np.abs(value) < FP32_MIN_NORMAL, np.copysign(np.float32(0), value), value).astype(np.float32)
+
+
+def inv_rom_top(din):
+    """Return (dout, exp_adjust) of inv_rom_top.vhd for the 16 bit unsigned valid sample count(s) din.
+
+    dout is the uint32 fp32 bit pattern of 1/din (0 for din = 0), exact for
+    din <= 4608, exp_adjust is the amount to subtract from its exponent.
+    """
+    din = np.asarray(din, dtype=np.int64) & 0xFFFF
+    use_unshifted = din <= 4608
+    top = (din >> 12) & 0x7         # din(14 downto 12)
+    shift = np.where(top == 1, 1, np.where((top >> 1) == 1, 2, 3))
+    din_shifted = (din >> shift) & 0x7FF
+    lookup_addr = np.where(use_unshifted, din, din_shifted) & 0x1FF
+    rom_select = np.where(use_unshifted, (din >> 9) & 0xF, 4 | ((din_shifted >> 9) & 0x3))
+    exp_adjust = np.where(use_unshifted, 0, shift)
+    dout = np.where(rom_select <= 8, INV_ROMS[np.minimum(rom_select, 8), lookup_addr], INV_4608)
+    return dout.astype(np.uint32), exp_adjust
+
+
+def fp32_x_uint(fp32, exp_adjust, uint):
+    """Return the uint32 fp32 bit pattern of fp32_x_Uint.vhd: fp32 * 2**-exp_adjust * uint, truncated."""
+    fp32 = np.asarray(fp32, dtype=np.int64) & 0xFFFFFFFF
+    uint = np.asarray(uint, dtype=np.int64) & 0xFFFF
+    sign = fp32 >> 31
+    exp = (fp32 >> 23) & 0xFF
+    frac = (fp32 & 0x7FFFFF) | (1 << 23)
+    uint_signed = np.where(uint >= 2**15, uint - 2**16, uint)   # i_uint is used as signed in the multiplier
+    frac_x_uint = (frac * uint_signed) & (2**40 - 1)
+    exp = (exp - (np.asarray(exp_adjust, dtype=np.int64) & 0xF)) & 0xFF
+
+    # Coarse normalisation in steps of 4 bits to a 27 bit value
+    nibble = np.select([frac_x_uint >> 36 != 0, frac_x_uint >> 32 != 0, frac_x_uint >> 28 != 0, frac_x_uint >> 24 != 0],
+                       [4, 3, 2, 1], 0)
+    exp = exp + 4 * nibble
+    shifted = np.where(nibble > 0, frac_x_uint >> np.maximum(4 * nibble - 3, 0), (frac_x_uint & 0xFFFFFF) << 3) & (2**27 - 1)
+
+    # Fine normalisation on the leading one in shifted(26 downto 24), drop the lower bits
+    lead = np.select([shifted >> 26 != 0, shifted >> 25 != 0, shifted >> 24 != 0], [3, 2, 1], 0)
+    exp_out = (exp - 3 + lead) & 0xFF
+    frac_out = (shifted >> lead) & 0x7FFFFF
+    return ((sign << 31) | (exp_out << 23) | frac_out).astype(np.uint32)
+
+
+def int_to_fp32(vis_int):
+    """Convert the 32 bit signed accumulator value(s) to fp32 (int_to_fp32 IP), values wrap to 32 bit first."""
+    vis_int = np.asarray(vis_int, dtype=np.int64) & 0xFFFFFFFF
+    return np.where(vis_int >= 2**31, vis_int - 2**32, vis_int).astype(np.float32)
+
+
+def mult_fp32(a, b):
+    """fp32 multiply (mult_fp32 IP)."""
+    with np.errstate(over='ignore', under='ignore'):
+        return flush_denormal(np.asarray(a, dtype=np.float32) * np.asarray(b, dtype=np.float32))
+
+
+def vis_scale(valid_samples, n_times, n_channels):
+    """Return the fp32 scale factor(s) (n_times*n_channels)/valid_samples as computed by vis2fp.vhd."""
+    total_samples = (np.asarray(n_times, dtype=np.int64) & 0xFF) * (np.asarray(n_channels, dtype=np.int64) & 0x7F)
+    inv, exp_adjust = inv_rom_top(valid_samples)
+    return fp32_value(fp32_x_uint(inv, exp_adjust, total_samples & 0xFFFF))
+
+
+def vis2fp(vis_int, valid_samples, n_times, n_channels):
+    """Return the fp32 visibilities of vis2fp.vhd for the integer accumulator value(s) vis_int.
+
+    vis_int may be complex, then the real and imaginary parts are converted
+    separately and a complex64 array is returned.
+    """
+    scale = vis_scale(valid_samples, n_times, n_channels)
+    vis_int = np.asarray(vis_int)
+    if np.iscomplexobj(vis_int):
+        re = mult_fp32(int_to_fp32(np.round(vis_int.real).astype(np.int64)), scale)
+        im = mult_fp32(int_to_fp32(np.round(vis_int.imag).astype(np.int64)), scale)
+        return re + np.complex64(1j) * im
+    return mult_fp32(int_to_fp32(vis_int), scale)
+
+
+def not_exact(vis_int):
+    """Return boolean mask of the accumulator value(s) that are not exactly representable at the vis2fp input,
+    because they do not fit in 32 bit or lose bits in the conversion to fp32."""
+    vis_int = np.asarray(vis_int)
+    if np.iscomplexobj(vis_int):
+        return not_exact(np.round(vis_int.real).astype(np.int64)) | not_exact(np.round(vis_int.imag).astype(np.int64))
+    vis_int = vis_int.astype(np.int64)
+    return int_to_fp32(vis_int).astype(np.int64) != vis_int
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Sweep the vis2fp scale factor over all valid sample counts')
+    parser.add_argument('n_times', type=int, help='time samples per integration, 64 or 192')
+    parser.add_argument('n_channels', type=int, help='fine channels per integration')
+    args = parser.parse_args()
+    total = args.n_times * args.n_channels
+    valid_samples = np.arange(1, total + 1)
+    scale = vis_scale(valid_samples, args.n_times, args.n_channels)
+    ideal = (np.float64(total) / valid_samples).astype(np.float32)
+    ulps = np.abs(fp32_bits(scale).astype(np.int64) - fp32_bits(ideal).astype(np.int64))
+    for n, s, u in zip(valid_samples, scale, ulps):
+        print('%6d  %.9g%s' % (n, s, '' if u == 0 else '  (%d ulp from fp32(%d/%d))' % (u, total, n)))
+    print('%d of %d scale factors differ from fp32(total/valid), max %d ulp' %
+          (np.count_nonzero(ulps), len(valid_samples), np.max(ulps)))
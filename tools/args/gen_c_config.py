@@ -31,6 +31,7 @@
 
 import sys
 import os
+import re
 #import logging
 from argparse import ArgumentParser
 #from py_args_lib import FPGA, RAM, FIFO, Register, PeripheralLibrary, FPGALibrary
@@ -49,6 +50,7 @@ def gen_c_config(fpga, fpga_name, out_dir):
         out_dir: the directory in which output should be written
     """
     out = [] # list to hold text lines to be written to output .ccfg file
+    records = [] # same entries as 'out', kept for the C header (see gen_c_header)
     out.append("# Peripherals for {}:\n".format(fpga_name))
     field_count = 0 # count of number of fields found in FPGA address map
 #    for periph_name, periph_info in fpga['fpga'].address_map.items():
@@ -135,6 +137,8 @@ def gen_c_config(fpga, fpga_name, out_dir):
                     out.append(txt+'\n')
                 else:
                     out.append(txt + ' {}[{}] {}\n'.format(slave_name, i, ram_name))
+                records.append(('BlockRAM', ram_base + i*ram_len, int(slave.number_of_fields()), 31, 0, access,
+                                pname, p_num, count, slave_name, i, num_slaves, ram_name))
                 field_count += 1
         elif isinstance(slave, FIFO):
             out.append('#   FIFO-SLAVE={:20}\n'.format(slave.name()))
@@ -155,6 +159,8 @@ def gen_c_config(fpga, fpga_name, out_dir):
                     out.append(txt + '\n')
                 else:
                     out.append(txt + ' {}[{}] {}\n'.format(slave_name, i, fifo_name))
+                records.append(('FIFO', fifo_base + i*fifo_len, fifo_len, 31, 0, access,
+                                pname, p_num, count, slave_name, i, num_slaves, fifo_name))
                 field_count += 1
         elif isinstance(slave, Register):
             out.append('#   REG-SLAVE={} no.slaves={} len={} (base=0x{:X})\n'.format(
@@ -185,6 +191,8 @@ def gen_c_config(fpga, fpga_name, out_dir):
                         out.append(txt + '\n')
                     else:
                         out.append(txt + ' {}[{}] {}\n'.format(slave_name, i, ram_name))
+                    records.append(('DistrRAM', ram_base + i*ram_len, ram_len, 31, 0, access,
+                                    pname, p_num, count, slave_name, i, num_slaves, ram_name))
                     field_count += 1
 #                if num_slaves == 1:
 #                    out.append('      DistrRAM   0x{:08X} len={} {} {} {} {}'.format(
@@ -230,6 +238,8 @@ def gen_c_config(fpga, fpga_name, out_dir):
                     else:
                         txt += ' {}[{}] {}'.format(slave_name, i, field_name)
                     out.append(txt+'\n')
+                    records.append(('BitField', field_offset+field_base+i*slave_length, 1, bit_hi, bit_lo, access,
+                                    pname, p_num, count, slave_name, i, num_slaves, field_name))
                     field_count += 1
 
     # Write all text lines held in list 'out' to file
@@ -246,6 +256,103 @@ def gen_c_config(fpga, fpga_name, out_dir):
     print("Found {} fields in FPGA '{}'".format(field_count, fpga_name))
     print('Wrote: {}'.format(output_filename))
 
+    gen_c_header(records, fpga_name, out_dir, _build if '_build' in locals() else None)
+
+
+def c_ident(*parts):
+    """ join name parts into a valid C identifier """
+    return re.sub(r'\W', '_', '_'.join(str(p) for p in parts if p != ''))
+
+def gen_c_header(records, fpga_name, out_dir, build=None):
+    """
+    Generate <fpga_name>_regs.h with static inline register accessors.
+        records: (kind, address, length, bit_hi, bit_lo, access, peripheral, periph_num, periph_count,
+                  slave, slave_num, slave_count, field) tuples collected by gen_c_config
+        fpga_name: the particular fpga we're interested in
+        out_dir: the directory in which output should be written
+    All addresses are 32 bit register addresses (as in the .ccfg file), i.e. index into a
+    'volatile uint32_t *' pointing at the start of the ARGS address space.
+    For every field the header has _ADDR, _SHIFT and _MASK constants and _get/_set functions,
+    RAM slaves have _WORDS/_BYTES constants and _read/_write bulk copy functions.
+    There is also one struct of offsets per peripheral, with a table entry for each instance.
+    """
+    prefix = c_ident(fpga_name).lower()
+    guard = prefix.upper() + '_REGS_H'
+    out = []
+    out.append('/* Register access for {} FPGA, generated by ARGS gen_c_config.py. Do not edit. */\n'.format(fpga_name))
+    out.append('/* Addresses are 32 bit register (not AXI byte) addresses, relative to the start of ARGS space */\n')
+    out.append('#ifndef {0}\n#define {0}\n\n'.format(guard))
+    out.append('#include <stddef.h>\n#include <stdint.h>\n\n')
+    if build is not None:
+        out.append('#define {}_ARGS_MAP_BUILD 0x{:08x}u\n\n'.format(prefix.upper(), build))
+
+    # Generic helpers, used by the per field functions and with the offset tables
+    out.append('static inline uint32_t {0}_get_field(const volatile uint32_t *regs, uint32_t addr, uint32_t shift, uint32_t mask)\n'
+               '{{\n    return (regs[addr] & mask) >> shift;\n}}\n\n'.format(prefix))
+    out.append('static inline void {0}_set_field(volatile uint32_t *regs, uint32_t addr, uint32_t shift, uint32_t mask, uint32_t value)\n'
+               '{{\n    if (mask == 0xFFFFFFFFu)\n        regs[addr] = value;\n'
+               '    else\n        regs[addr] = (regs[addr] & ~mask) | ((value << shift) & mask);\n}}\n\n'.format(prefix))
+    out.append('static inline void {0}_write_block(volatile uint32_t *regs, uint32_t addr, const uint32_t *src, size_t words)\n'
+               '{{\n    volatile uint32_t *p = regs + addr;\n    for (size_t i = 0; i < words; i++)\n        p[i] = src[i];\n}}\n\n'.format(prefix))
+    out.append('static inline void {0}_read_block(const volatile uint32_t *regs, uint32_t addr, uint32_t *dst, size_t words)\n'
+               '{{\n    const volatile uint32_t *p = regs + addr;\n    for (size_t i = 0; i < words; i++)\n        dst[i] = p[i];\n}}\n\n'.format(prefix))
+
+    # Per field constants and accessors
+    periphs = {} # peripheral name -> {periph_num: {member: address}}
+    for (kind, addr, length, bit_hi, bit_lo, access, pname, p_num, p_count,
+         slave, s_num, s_count, field) in records:
+        name = c_ident(prefix, pname, p_num if p_count > 1 else '', slave, s_num if s_count > 1 else '', field)
+        NAME = name.upper()
+        width = bit_hi - bit_lo + 1
+        mask = ((1 << width) - 1) << bit_lo
+        member = c_ident(slave, s_num if s_count > 1 else '', field).lower()
+        periphs.setdefault(pname, {}).setdefault(p_num, {})[member] = addr
+        out.append('/* {} {} {}[{}:{}] */\n'.format(kind, access, name, bit_hi, bit_lo))
+        out.append('#define {}_ADDR 0x{:08X}u\n'.format(NAME, addr))
+        if kind in ('BlockRAM', 'DistrRAM'):
+            out.append('#define {}_WORDS {}u\n'.format(NAME, length))
+            out.append('#define {0}_BYTES ({0}_WORDS * 4u)\n'.format(NAME))
+            if access != 'WO':
+                out.append('static inline void {0}_read(const volatile uint32_t *regs, uint32_t first, uint32_t *dst, size_t words)\n'
+                           '{{ {1}_read_block(regs, {2}_ADDR + first, dst, words); }}\n'.format(name, prefix, NAME))
+            if access != 'RO':
+                out.append('static inline void {0}_write(volatile uint32_t *regs, uint32_t first, const uint32_t *src, size_t words)\n'
+                           '{{ {1}_write_block(regs, {2}_ADDR + first, src, words); }}\n'.format(name, prefix, NAME))
+        elif kind == 'FIFO':
+            out.append('#define {}_DEPTH {}u\n'.format(NAME, length))
+        else:
+            out.append('#define {}_SHIFT {}u\n'.format(NAME, bit_lo))
+            out.append('#define {}_MASK 0x{:08X}u\n'.format(NAME, mask))
+            if access != 'WO':
+                out.append('static inline uint32_t {0}_get(const volatile uint32_t *regs)\n'
+                           '{{ return {1}_get_field(regs, {2}_ADDR, {2}_SHIFT, {2}_MASK); }}\n'.format(name, prefix, NAME))
+            if access not in ('RO', 'SP'):
+                out.append('static inline void {0}_set(volatile uint32_t *regs, uint32_t value)\n'
+                           '{{ {1}_set_field(regs, {2}_ADDR, {2}_SHIFT, {2}_MASK, value); }}\n'.format(name, prefix, NAME))
+        out.append('\n')
+
+    # One struct of offsets (relative to the peripheral base) per peripheral, one table entry per instance
+    for pname, instances in periphs.items():
+        sname = c_ident(prefix, pname).lower()
+        members = list(instances[min(instances)].keys())
+        out.append('struct {}_offsets {{\n    uint32_t base;\n'.format(sname))
+        for member in members:
+            out.append('    uint32_t {};\n'.format(member))
+        out.append('};\n')
+        out.append('static const struct {0}_offsets {1}[{2}] = {{\n'.format(sname, sname.upper(), len(instances)))
+        for p_num in sorted(instances):
+            base = min(instances[p_num].values())
+            values = ', '.join('.{} = 0x{:X}u'.format(m, instances[p_num][m] - base) for m in members if m in instances[p_num])
+            out.append('    {{ .base = 0x{:08X}u, {} }},\n'.format(base, values))
+        out.append('};\n\n')
+
+    out.append('#endif /* {} */\n'.format(guard))
+
+    output_filename = out_dir + fpga_name + '_regs.h'
+    with open(output_filename, 'w') as out_file:
+        for line in out:
+            out_file.write(line)
+    print('Wrote: {}'.format(output_filename))
 
 
 if __name__ == '__main__':
@@ -32,6 +32,7 @@ import os
 import logging
 from argparse import ArgumentParser
 from py_args_lib import FPGA, RAM, FIFO, Register, PeripheralLibrary, FPGALibrary
+from py_args_lib import VALID_ACCESS_MODES as ACCESS_MODES
 from common import ceil_pow2
 import pprint
 import code
@@ -39,7 +40,10 @@ import code
 #logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 logger = logging.getLogger('main.fpgamap')
 
-def genPython(fpga, fpgaName, readable):
+def buildMap(fpga, fpgaName):
+    """ Build the FPGAMAP dictionary for an fpga
+        returns (map, _build) where _build is the 'args_map_build' reset value (or None)
+    """
     _build = None # args build timestamp, from 'args_map_build' field.
     slavePorts={}
     slaveTypeOffset = {}
@@ -69,7 +73,7 @@ def genPython(fpga, fpgaName, readable):
             print(' {} at 0x{:X}'.format(slavePortName,base))
             # Note py_args_lib quirk. RAM slaves include a single named field. There doesn't seem to be any way to recover this
             # from py_args_lib at present. I shall assume that this field is always called "data"
-            slaves[slave.name()] = { 'type':'RAM', 'start':slaveOffset, 'step':slave.number_of_fields(), 'stop':slaveOffset+slave.number_of_fields()*slave.number_of_slaves(), 'fields':{ 'data':{ 'start':0, 'step':1, 'stop':slave.number_of_fields(), 'access_mode':slave.access_mode(), 'width':slave.width(), 'default':slave.reset_value(), 'description':slave.field_description(), 'bit_offset':slave.bit_offset() } } }
+            slaves[slave.name()] = { 'type':'RAM', 'start':slaveOffset, 'step':slave.number_of_fields(), 'stop':slaveOffset+slave.number_of_fields()*slave.number_of_slaves(), 'fields':{ 'data':{ 'start':0, 'step':1, 'stop':slave.number_of_fields(), 'access_mode':slave.access_mode(), 'width':slave.width(), 'default':slave.reset_value(), 'description':slave.field_description(), 'bit_offset':slave.bit_offset(), 'double_buffered':slave.double_buffered() } } }
             #code.interact(local=locals())
         elif isinstance(slave,FIFO):
             print(' {} at 0x{:X}'.format(slavePortName,base))
@@ -84,7 +88,7 @@ def genPython(fpga, fpgaName, readable):
             for r in slave.rams:
                 offset = int(r.base_address()/4) - slaveOffset
                 stop_address = offset + (slave.number_of_slaves()-1)*ceil_pow2(r.number_of_fields())+r.number_of_fields()
-                fields[r.name()] = {'start':offset, 'step':1, 'stop':stop_address, 'access_mode': r.access_mode(), 'width' : r.width(), 'default':r.reset_value(), 'description':r.field_description(), 'bit_offset':0}
+                fields[r.name()] = {'start':offset, 'step':1, 'stop':stop_address, 'access_mode': r.access_mode(), 'width' : r.width(), 'default':r.reset_value(), 'description':r.field_description(), 'bit_offset':0, 'double_buffered':r.double_buffered()}
                 maxOffset = max(maxOffset, stop_address)
             for f in slave.fields:
                 offset = int(f.address_offset()/4) + int(slave.base_address()/4) - slaveOffset
@@ -98,10 +102,10 @@ def genPython(fpga, fpgaName, readable):
     map={}
     for k, v in slavePorts.items():
         map[k] = { 'start':v['start'], 'step':v['span'], 'stop':v['start']+v['count']*v['span'], 'slaves':v['slaves'] }
+    return map, _build
 
-    pp = pprint.PrettyPrinter(width=300)
-    mapStr = pp.pformat(map) if readable else str(map)
-
+def outputDir(fpgaName):
+    """ Create (if needed) and return the $HDL_BUILD_DIR/ARGS/py/<fpgaName> directory """
     args_dir = os.path.expandvars('$HDL_BUILD_DIR/ARGS')
     try: os.stat(args_dir)
     except: os.mkdir(args_dir)
@@ -111,6 +115,15 @@ def genPython(fpga, fpgaName, readable):
     out_dir = os.path.join(out_dir, fpgaName)
     try: os.stat(out_dir)
     except: os.mkdir(out_dir)
+    return out_dir
+
+def genPython(fpga, fpgaName, readable):
+    map, _build = buildMap(fpga, fpgaName)
+
+    pp = pprint.PrettyPrinter(width=300)
+    mapStr = pp.pformat(map) if readable else str(map)
+
+    out_dir = outputDir(fpgaName)
 
     fname = 'fpgamap.py'
     if _build:
@@ -123,13 +136,120 @@ def genPython(fpga, fpgaName, readable):
         file.write("# Note that this file uses register (not AXI byte) addresses and offsets\n".format(fpgaName))
         file.write("FPGAMAP = " + mapStr + "\n")
 
+# Lookup helpers appended to every compact map file. Kept as plain text so the
+# generated module only needs numpy at import time.
+COMPACT_HELPERS = '''
+INDEX = {name: k for k, name in enumerate(NAMES)}
+
+def field_index(name):
+    """ Index of 'peripheral.slave.field' into the per-field arrays """
+    return INDEX[name]
+
+def address(name, element=0, peripheral=0, slave=0):
+    """ Register address of one word of a field """
+    k = INDEX[name]
+    p = PERIPH[k]
+    return int(ADDRESS[k] + peripheral*PERIPH_STEP[p] + slave*SLAVE_STEP[k] + element)
+
+def span(name, peripheral=0, slave=0):
+    """ (first register address, number of words) of a field, for bulk transfers """
+    return address(name, 0, peripheral, slave), int(LENGTH[INDEX[name]])
+
+def addresses(names, peripheral=0, slave=0):
+    """ Vector of register addresses for a list of field names """
+    idx = np.fromiter((INDEX[n] for n in names), dtype=np.int64, count=len(names))
+    return ADDRESS[idx] + peripheral*PERIPH_STEP[PERIPH[idx]] + slave*SLAVE_STEP[idx]
+
+def decode(name, words):
+    """ Extract a field from register word(s) read from the FPGA (scalar or array) """
+    k = INDEX[name]
+    return (np.asarray(words, dtype=np.uint32) & MASK[k]) >> SHIFT[k]
+
+def encode(name, value, words=0):
+    """ Insert a field value into register word(s), preserving the other bits. Signed values are stored
+    two's complement, truncated to the field width """
+    k = INDEX[name]
+    value = ((np.asarray(value).astype(np.int64) & 0xFFFFFFFF).astype(np.uint32) << SHIFT[k]) & MASK[k]
+    return (np.asarray(words, dtype=np.uint32) & ~MASK[k]) | value
+'''
+
+def compactRecords(map):
+    """ Flatten an FPGAMAP dictionary into one record per field, sorted by register address """
+    peripherals = []
+    records = []
+    for p_name, p in map.items():
+        p_idx = len(peripherals)
+        peripherals.append((p_name, p['start'], p['step'], int((p['stop'] - p['start'])/p['step']) if p['step'] else 1))
+        for s_name, s in p['slaves'].items():
+            s_count = int((s['stop'] - s['start'])/s['step']) if s['step'] else 1
+            for f_name, f in s['fields'].items():
+                width = f['width']
+                shift = f['bit_offset']
+                if width is None or width >= 32 or shift is None or shift >= 32:
+                    shift = 0
+                    mask = 0xFFFFFFFF
+                else:
+                    mask = (((1 << width) - 1) << shift) & 0xFFFFFFFF
+                records.append({'name':'{}.{}.{}'.format(p_name, s_name, f_name), 'periph':p_idx,
+                                'address':p['start'] + s['start'] + f['start'], 'length':f['stop'] - f['start'],
+                                'slave_step':s['step'], 'slave_count':s_count, 'shift':shift, 'mask':mask,
+                                'width':width if width is not None else 32, 'access':ACCESS_MODES.index(f['access_mode']),
+                                'default':f['default'] or 0})
+    records.sort(key=lambda r: (r['address'], r['name']))
+    return peripherals, records
+
+def genCompactPython(fpga, fpgaName):
+    """ Generate fpgamap_compact.py: the same information as FPGAMAP held in flat numpy arrays
+        (one element per field) with precomputed word address, shift and mask, plus a name to
+        index table, so M&C clients can resolve and encode fields without walking nested dicts
+    """
+    map, _build = buildMap(fpga, fpgaName)
+    peripherals, records = compactRecords(map)
+
+    def array(key, dtype):
+        return "np.array({}, dtype=np.{})".format([r[key] for r in records], dtype)
+
+    lines = ["# Compact M&C Python client include file for {} FPGA".format(fpgaName),
+             "# Note that this file uses register (not AXI byte) addresses and offsets",
+             "# Element k of each array describes field NAMES[k]. ADDRESS is for peripheral 0, slave 0, element 0.",
+             "import numpy as np",
+             "",
+             "BUILD = {}".format("0x{:08x}".format(_build) if _build else None),
+             "ACCESS_MODES = {}".format(tuple(ACCESS_MODES)),
+             "PERIPHERALS = {}".format(tuple(p[0] for p in peripherals)),
+             "PERIPH_START = np.array({}, dtype=np.uint32)".format([p[1] for p in peripherals]),
+             "PERIPH_STEP = np.array({}, dtype=np.uint32)".format([p[2] for p in peripherals]),
+             "PERIPH_COUNT = np.array({}, dtype=np.uint32)".format([p[3] for p in peripherals]),
+             "NAMES = {}".format(tuple(r['name'] for r in records)),
+             "PERIPH = " + array('periph', 'uint16'),
+             "ADDRESS = " + array('address', 'uint32'),
+             "LENGTH = " + array('length', 'uint32'),
+             "SLAVE_STEP = " + array('slave_step', 'uint32'),
+             "SLAVE_COUNT = " + array('slave_count', 'uint16'),
+             "SHIFT = " + array('shift', 'uint8'),
+             "MASK = " + array('mask', 'uint32'),
+             "WIDTH = " + array('width', 'uint8'),
+             "ACCESS = " + array('access', 'uint8'),
+             "DEFAULT = " + array('default', 'uint32')]
+
+    fname = 'fpgamap_compact.py'
+    if _build:
+        fname = "fpgamap_compact_{:08x}.py".format(_build)
+    out_dir = outputDir(fpgaName)
+    with open(os.path.join(out_dir, fname),'wt') as file:
+        file.write("\n".join(lines) + "\n")
+        file.write(COMPACT_HELPERS)
+    print("Wrote {} fields to {}".format(len(records), os.path.join(out_dir, fname)))
+
 if __name__ == '__main__':
 
     parser = ArgumentParser(description='ARGS tool script to generate fpgamap.py M&C Python client include file')
     parser.add_argument('-f','--fpga', required=True, help='ARGS fpga_name')
     parser.add_argument('-r','--readable', action='store_true', help='Generate human readable map file')
+    parser.add_argument('-c','--compact', action='store_true', help='Also generate the compact (flat array) map file')
     fpgaName = parser.parse_args().fpga
     readable = parser.parse_args().readable
+    compact = parser.parse_args().compact
 
     libRootDir = os.path.expandvars('$RADIOHDL')
 
@@ -139,4 +259,6 @@ if __name__ == '__main__':
     fpga = FPGALibrary(root_dir=libRootDir).library[fpgaName]
 
     genPython(fpga, fpgaName, readable)
+    if compact:
+        genCompactPython(fpga, fpgaName)
 
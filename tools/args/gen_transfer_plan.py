@@ -0,0 +1,268 @@
+#! /usr/bin/env python3
+###############################################################################
+#
+# Copyright (C) 2026
+# CSIRO (Commonwealth Scientific and Industrial Research Organization) <http://www.csiro.au/>
+# GPO Box 1700, Canberra, ACT 2601, Australia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#   Author           Date      Version comments
+#   Low CBF          Oct 2026  Original
+#
+###############################################################################
+
+"""
+    Generate a bulk transfer plan for the RAM, FIFO and register slaves of an fpga.
+
+    The plan (<fpga_name>_transfer_plan.yaml in $HDL_BUILD_DIR/ARGS/<fpga_name>/) lists one
+    region per block of contiguous memory that the host can move in a single transaction :
+     - RAM        : RAM slaves (e.g. corr_ct1 polynomial_ram), AXI4 full
+     - FIFO       : FIFO slaves, AXI4 full, fixed address
+     - DistrRAM   : fields with number_of_fields > 1 inside a register slave (e.g. corr_ct2 vc_demap), AXI4 lite
+     - REG        : all single word fields of a register slave instance, AXI4 lite
+    Each region has byte address, byte length, alignment, beat size, maximum AXI burst and, where
+    the table is declared double_buffered in its peripheral.yaml, the byte ranges of the two halves. Pairs of fields named
+    <name>table0 / <name>table1 are listed as double buffer pairs.
+
+    coalesce_writes() uses the plan to turn a dict of field writes into the fewest contiguous
+    transactions, e.g. a full 1024 VC reconfiguration of vc_demap becomes one 16 kByte write.
+
+    All addresses in FPGAMAP are register (32 bit word) addresses; the plan uses byte addresses.
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+import numpy as np
+import yaml
+from py_args_lib import FPGALibrary
+from gen_fpgamap_py import buildMap, compactRecords, ACCESS_MODES
+
+WORD_BYTES = 4
+AXI_MAX_BEATS = 256       # AXI4 INCR burst length limit
+AXI_BOUNDARY = 4096       # AXI4 bursts may not cross a 4 kByte boundary
+READ_ONLY_ACCESS = ('RO', 'SP', 'FR')   # access modes coalesce_writes() refuses to write
+
+def _double_buffer_halves(double_buffered, byte_address, byte_length):
+    """ RAM tables declared double_buffered hold table 0 in the first half, table 1 in the second """
+    if double_buffered and byte_length >= 2*WORD_BYTES:
+        half = byte_length // 2
+        return [[byte_address, half], [byte_address + half, half]]
+    return None
+
+def _region(name, kind, interface, byte_address, byte_length, alignment, access, double_buffered=False):
+    region = {'name':name, 'kind':kind, 'interface':interface, 'byte_address':int(byte_address),
+              'byte_length':int(byte_length), 'alignment':int(alignment), 'beat_bytes':WORD_BYTES,
+              'max_burst_bytes':AXI_MAX_BEATS*WORD_BYTES if interface == 'FULL' else WORD_BYTES,
+              'access':access}
+    halves = _double_buffer_halves(double_buffered, region['byte_address'], region['byte_length'])
+    if halves is not None:
+        region['double_buffer'] = halves
+    return region
+
+def _alignment(byte_address, byte_length):
+    """ largest power of 2 that divides the byte address. Address 0 divides by anything, so use the
+        region length rounded up to a power of 2, which is what the address map aligns the slave to """
+    return byte_address & -byte_address if byte_address else 1 << max(byte_length - 1, 0).bit_length()
+
+def build_plan(fpga, fpga_name):
+    """
+    Build the transfer plan for an fpga
+        fpga: fpga entry of FPGALibrary().library
+        fpga_name: name of the fpga
+    returns a dict with 'regions', 'fields' and 'double_buffer_pairs'
+    """
+    map, _build = buildMap(fpga, fpga_name)
+    regions = []
+    for p_name, p in map.items():
+        p_count = int((p['stop'] - p['start'])/p['step']) if p['step'] else 1
+        for p_num in range(p_count):
+            p_base = p['start'] + p_num*p['step']
+            p_label = p_name if p_count == 1 else '{}[{}]'.format(p_name, p_num)
+            for s_name, s in p['slaves'].items():
+                s_count = int((s['stop'] - s['start'])/s['step']) if s['step'] else 1
+                for s_num in range(s_count):
+                    s_base = p_base + s['start'] + s_num*s['step']
+                    s_label = s_name if s_count == 1 else '{}[{}]'.format(s_name, s_num)
+                    reg_fields = []
+                    for f_name, f in s['fields'].items():
+                        label = '{}.{}.{}'.format(p_label, s_label, f_name)
+                        addr = (s_base + f['start'])*WORD_BYTES
+                        length = (f['stop'] - f['start'])*WORD_BYTES
+                        if s['type'] == 'RAM':
+                            regions.append(_region(label, 'RAM', 'FULL', addr, length, _alignment(addr, length),
+                                                   f['access_mode'], f.get('double_buffered', False)))
+                        elif s['type'] == 'FIFO':
+                            # FIFO data port is a single address, every beat goes to the same word
+                            region = _region(label, 'FIFO', 'FULL', addr, WORD_BYTES, _alignment(addr, WORD_BYTES),
+                                             f['access_mode'])
+                            region['depth'] = f['depth']
+                            regions.append(region)
+                        elif f['stop'] - f['start'] > 1:
+                            regions.append(_region(label, 'DistrRAM', 'LITE', addr, length, _alignment(addr, length),
+                                                   f['access_mode'], f.get('double_buffered', False)))
+                        else:
+                            reg_fields.append(addr)
+                    if reg_fields:
+                        lo = min(reg_fields)
+                        hi = max(reg_fields) + WORD_BYTES
+                        regions.append(_region('{}.{}'.format(p_label, s_label), 'REG', 'LITE', lo, hi - lo,
+                                               _alignment(lo, hi - lo), 'RW'))
+    regions.sort(key=lambda r: r['byte_address'])
+
+    _, records = compactRecords(map)
+    fields = [{'name':r['name'], 'word_address':r['address'], 'length':r['length'], 'shift':r['shift'],
+               'mask':r['mask'], 'access':ACCESS_MODES[r['access']]} for r in records]
+
+    pairs = []
+    names = set(r['name'] for r in records)
+    for name in sorted(names):
+        if name.endswith('table0') and (name[:-1] + '1') in names:
+            pairs.append([name, name[:-1] + '1'])
+
+    return {'fpga':fpga_name, 'build':_build, 'regions':regions, 'fields':fields, 'double_buffer_pairs':pairs}
+
+def gen_transfer_plan(fpga, fpga_name, out_dir):
+    """
+    Write <fpga_name>_transfer_plan.yaml
+        fpga: all fpga.yaml files found in system
+        fpga_name: the particular fpga we're interested in
+        out_dir: the directory in which output should be written
+    """
+    plan = build_plan(fpga, fpga_name)
+    output_filename = out_dir + fpga_name + '_transfer_plan.yaml'
+    if (not os.path.exists(out_dir)):
+        print("directory " + out_dir + " does not exist, creating it")
+        os.mkdir(out_dir)
+    with open(output_filename, 'w') as out_file:
+        out_file.write("# Bulk transfer plan for {} FPGA, byte addresses\n".format(fpga_name))
+        yaml.safe_dump(plan, out_file, sort_keys=False, width=300)
+    print("Found {} transfer regions in FPGA '{}'".format(len(plan['regions']), fpga_name))
+    print('Wrote: {}'.format(output_filename))
+
+def load_plan(filename):
+    """ Read a transfer plan written by gen_transfer_plan() """
+    with open(filename) as f:
+        return yaml.safe_load(f)
+
+def coalesce_writes(plan, writes, burst=False):
+    """
+    Coalesce field writes into the fewest contiguous transactions.
+        plan: transfer plan from build_plan() or load_plan()
+        writes: dict of {field name: value} or {(field name, first element): values}. Values may be a
+                scalar or a sequence/numpy array written to consecutive elements of the field.
+                Field names are 'peripheral.slave.field' as in the compact fpgamap.
+        burst: if True also split transactions at the AXI maximum burst length and 4 kByte boundaries,
+               otherwise a transaction runs to the end of the contiguous data within one region.
+    returns a list of dicts {'region', 'byte_address', 'words' (uint32 array), 'mask' (uint32 array or None)}.
+    'mask' is only present when some words are not completely covered by the fields written,
+    in which case the caller must read-modify-write those words.
+    Raises ValueError for a write to a read only field, or when two writes cover the same bits of a word.
+    """
+    fields = {f['name']:f for f in plan['fields']}
+
+    addr_list = []
+    value_list = []
+    mask_list = []
+    key_list = []
+    for key, value in writes.items():
+        name, element = key if isinstance(key, tuple) else (key, 0)
+        f = fields[name]
+        if f['access'] in READ_ONLY_ACCESS:
+            raise ValueError("{} has access mode {}, it can't be written".format(name, f['access']))
+        value = np.atleast_1d(np.asarray(value, dtype=np.int64)).astype(np.uint32)
+        if element + value.size > f['length']:
+            raise ValueError("write to {} elements {}..{} is beyond field length {}".format(
+                name, element, element + value.size - 1, f['length']))
+        addr_list.append(f['word_address'] + element + np.arange(value.size, dtype=np.int64))
+        value_list.append((value << np.uint32(f['shift'])) & np.uint32(f['mask']))
+        mask_list.append(np.full(value.size, f['mask'], dtype=np.uint32))
+        key_list.append(np.full(value.size, len(key_list), dtype=np.int64))
+    if not addr_list:
+        return []
+    addr = np.concatenate(addr_list)
+    value = np.concatenate(value_list)
+    mask = np.concatenate(mask_list)
+
+    # merge bit fields that share a word, the masks of a word only add up to their OR when no bits overlap
+    addr, inverse = np.unique(addr, return_inverse=True)
+    words = np.zeros(addr.size, dtype=np.uint32)
+    masks = np.zeros(addr.size, dtype=np.uint32)
+    mask_sum = np.zeros(addr.size, dtype=np.uint64)
+    np.bitwise_or.at(words, inverse, value)
+    np.bitwise_or.at(masks, inverse, mask)
+    np.add.at(mask_sum, inverse, mask.astype(np.uint64))
+    overlap = np.flatnonzero(mask_sum != masks)
+    if overlap.size:
+        keys = list(writes)
+        clash = np.unique(np.concatenate(key_list)[inverse == overlap[0]])
+        raise ValueError("writes {} overlap in register address 0x{:X}".format(
+            ', '.join(repr(keys[k]) for k in clash), int(addr[overlap[0]])))
+
+    # region each word belongs to
+    region_start = np.array([r['byte_address'] for r in plan['regions']], dtype=np.int64)
+    region_end = region_start + np.array([r['byte_length'] for r in plan['regions']], dtype=np.int64)
+    region_index = np.searchsorted(region_start, addr*WORD_BYTES, side='right') - 1
+    # A register slave's REG region can span a DistrRAM, so fall back to a search for the misses
+    for k in np.flatnonzero(addr*WORD_BYTES >= region_end[region_index]):
+        inside = np.flatnonzero((region_start <= addr[k]*WORD_BYTES) & (addr[k]*WORD_BYTES < region_end))
+        if inside.size == 0:
+            raise ValueError("register address 0x{:X} is not in any transfer region".format(int(addr[k])))
+        region_index[k] = inside[-1]
+
+    # break wherever the address is not consecutive or the region changes
+    breaks = np.flatnonzero((np.diff(addr) != 1) | (np.diff(region_index) != 0)) + 1
+    if burst:
+        byte_addr = addr*WORD_BYTES
+        extra = []
+        for r_idx in np.unique(region_index):
+            r = plan['regions'][r_idx]
+            limit = min(r['max_burst_bytes'], AXI_BOUNDARY)
+            sel = np.flatnonzero(region_index == r_idx)
+            extra.append(sel[(byte_addr[sel] % limit == 0)])
+        breaks = np.union1d(breaks, np.concatenate(extra))
+        breaks = breaks[breaks > 0]
+
+    transactions = []
+    for lo, hi in zip(np.concatenate(([0], breaks)), np.concatenate((breaks, [addr.size]))):
+        region = plan['regions'][region_index[lo]]
+        if region['kind'] == 'FIFO':
+            raise ValueError("FIFO {} can't be written through coalesce_writes".format(region['name']))
+        t = {'region':region['name'], 'byte_address':int(addr[lo])*WORD_BYTES, 'words':words[lo:hi]}
+        t['mask'] = masks[lo:hi] if np.any(masks[lo:hi] != 0xFFFFFFFF) else None
+        transactions.append(t)
+    return transactions
+
+
+if __name__ == '__main__':
+
+    parser = ArgumentParser(
+        description='ARGS tool script to generate the bulk RAM/register transfer plan')
+    parser.add_argument('-f', '--fpga', required=True, help='ARGS fpga_name')
+    fpga_name = parser.parse_args().fpga
+
+    # Find and parse all *.fpga.yaml YAML files under root directory for RADIOHDL
+    libRootDir = os.path.expandvars('$RADIOHDL')
+    fpga = FPGALibrary(root_dir=libRootDir).library[fpga_name]
+
+    # Check that the output directory exists
+    out_dir = os.path.expandvars('$HDL_BUILD_DIR/ARGS/{}/'.format(fpga_name))
+    try:
+        os.stat(out_dir)
+    except:
+        print("Error output directory '{}' does not exist".format(out_dir))
+        sys.exit()
+
+    gen_transfer_plan(fpga, fpga_name, out_dir)
@@ -32,6 +32,7 @@ import yaml
 import time
 import collections
 import common as cm
+from common_dict_file import find_all_files
 from py_args_lib import *
 from peripheral_lib import *
 import numpy as np
@@ -338,27 +339,25 @@ class FPGALibrary(object):
         self.nof_peripherals = 0
         tic = time.time()
         if root_dir is not None:
-            for root, dirs, files in os.walk(self.root_dir, topdown = True):
+            for root, name in find_all_files(self.root_dir, suffix=self.file_extension):
                 if 'tools' not in root:
-                    for name in files:
-                        if self.file_extension in name:
-                            try :
-                                library_config = yaml.load(open(os.path.join(root,name),'r'),yaml.FullLoader)
-                            except:
-                                logger.error('Failed parsing YAML in {}. Check file for YAML syntax errors'.format(name))
-                                print('ERROR:\n' + sys.exc_info()[1])
-                                sys.exit()
-                            if not isinstance(library_config, dict):
-                                logger.warning('File {} is not readable as a dictionary, it will not be'
-                                ' included in the FPGA library of peripherals'.format(name))
-                                continue
-                            lib_name = name.replace(self.file_extension, '')
-                            logger.info("Found fpga.yaml file {}".format(lib_name))
-                            if lib_name in self.library:
-                                logger.warning("{} library already exists in FPGALibrary, being overwritten".format(lib_name))
-                            self.library[lib_name] = {'file_path':root, 'file_path_name':os.path.join(root,name), 'peripherals':{}}
+                    try :
+                        library_config = yaml.load(open(os.path.join(root,name),'r'),yaml.FullLoader)
+                    except:
+                        logger.error('Failed parsing YAML in {}. Check file for YAML syntax errors'.format(name))
+                        print('ERROR:\n' + sys.exc_info()[1])
+                        sys.exit()
+                    if not isinstance(library_config, dict):
+                        logger.warning('File {} is not readable as a dictionary, it will not be'
+                        ' included in the FPGA library of peripherals'.format(name))
+                        continue
+                    lib_name = name.replace(self.file_extension, '')
+                    logger.info("Found fpga.yaml file {}".format(lib_name))
+                    if lib_name in self.library:
+                        logger.warning("{} library already exists in FPGALibrary, being overwritten".format(lib_name))
+                    self.library[lib_name] = {'file_path':root, 'file_path_name':os.path.join(root,name), 'peripherals':{}}
         toc = time.time()
-        logger.debug("FPGALibrary os.walk took %.4f seconds" %(toc-tic))
+        logger.debug("FPGALibrary directory scan took %.4f seconds" %(toc-tic))
         self.read_all_fpga_files()
 
     def read_all_fpga_files(self, file_path_names=None):
@@ -34,6 +34,7 @@ import yaml
 import collections
 import datetime
 from common import c_word_w, c_nof_complex, ceil_pow2, ceil_log2, unique, path_string
+from common_dict_file import find_all_files
 from peripheral_lib import *
 
 logger = logging.getLogger('main.peripheral')
@@ -754,48 +755,43 @@ class PeripheralLibrary(object):
         self.library = collections.OrderedDict()
         self.nof_peripherals = 0 # number of peripherals
 
-        exclude = set([path_string(os.path.expandvars('$HDL_BUILD_DIR')), path_string(os.path.join(os.path.expandvars('$RADIOHDL'),'tools'))])
+        exclude = [os.path.join(os.path.expandvars('$RADIOHDL'),'tools')]
         if root_dir is not None:
-            for root, dirs, files in os.walk(self.root_dir, topdown=True):#topdown=False):
-                #logger.debug("root is {}".format(root))
-                #logger.debug("dirs is {}".format(dirs))
-                dirs[:] = [d for d in dirs if path_string(root+d) not in exclude and '.svn' not in d]
-                for name in files:
-                    #print("loop through files, name is {}".format(name))
-                    #if self.file_extension in name and name[0]!='.':
-                    if name.endswith(self.file_extension) and name[0]!='.':
-                        #logger.debug("*** PARSING {} ****".format(os.path.join(root,name)))
-                        try :
-                            library_config = yaml.load(open(os.path.join(root,name), 'r'), yaml.FullLoader)
-                            #print(library_config)
-                        except :
-                            logger.error('Failed parsing YAML in {}. Check file for YAML syntax errors'.format(name))
-                            print('\nERROR:\n')
-                            print(sys.exc_info()[1])
-                            sys.exit()
-                        if not isinstance(library_config, dict):
-                            logger.warning('File {} is not readable as a dictionary, it will not be'
-                            ' included in the RadioHDL library of ARGS peripherals'.format(name))
+            # $HDL_BUILD_DIR and .svn/.git directories are excluded by the shared directory index
+            for root, name in find_all_files(self.root_dir, suffix=self.file_extension, exclude=exclude):
+                if name[0]!='.':
+                    #logger.debug("*** PARSING {} ****".format(os.path.join(root,name)))
+                    try :
+                        library_config = yaml.load(open(os.path.join(root,name), 'r'), yaml.FullLoader)
+                        #print(library_config)
+                    except :
+                        logger.error('Failed parsing YAML in {}. Check file for YAML syntax errors'.format(name))
+                        print('\nERROR:\n')
+                        print(sys.exc_info()[1])
+                        sys.exit()
+                    if not isinstance(library_config, dict):
+                        logger.warning('File {} is not readable as a dictionary, it will not be'
+                        ' included in the RadioHDL library of ARGS peripherals'.format(name))
+                        continue
+                    else:
+                        try:
+                            library_config['schema_type']
+                            library_config['peripherals']
+                            library_config['hdl_library_name']
+                        except KeyError:
+                            logger.warning('File {0} will not be included in the RadioHDL library. '
+                            '{0} is missing schema_type and/or peripherals and/or hdl_library_name key'.format(name))
                             continue
-                        else:
-                            try:
-                                library_config['schema_type']
-                                library_config['peripherals']
-                                library_config['hdl_library_name']
-                            except KeyError:
-                                logger.warning('File {0} will not be included in the RadioHDL library. '
-                                '{0} is missing schema_type and/or peripherals and/or hdl_library_name key'.format(name))
-                                continue
-                        lib_name = library_config['hdl_library_name']#name.replace(file_extension, '')
-                        if lib_name != name.split('.')[0]:
-                            logger.error("File {} has mismatching filename \'{}\' and hdl_library_name \'{}\'".format(os.path.join(root,name), name.split('.')[0], lib_name))
-                            sys.exit()
-                        if self.library.get(lib_name, None) is None: # check peripheral library name is unique
-                            self.library.update({lib_name: {'file_path':root,'file_path_name':os.path.join(root,name), 'peripherals':collections.OrderedDict(), 'description':library_config.get('hdl_library_description', "") }})
-                        else :
-                            logger.error("More than one instance of args peripheral library '{}' found under {}".format(lib_name, root_dir))
-                            logger.error("\nConflicting files:\n\t{}\n\t{}".format(self.library[lib_name]['file_path_name'], os.path.join(root,name)))
-                            sys.exit()
+                    lib_name = library_config['hdl_library_name']#name.replace(file_extension, '')
+                    if lib_name != name.split('.')[0]:
+                        logger.error("File {} has mismatching filename \'{}\' and hdl_library_name \'{}\'".format(os.path.join(root,name), name.split('.')[0], lib_name))
+                        sys.exit()
+                    if self.library.get(lib_name, None) is None: # check peripheral library name is unique
+                        self.library.update({lib_name: {'file_path':root,'file_path_name':os.path.join(root,name), 'peripherals':collections.OrderedDict(), 'description':library_config.get('hdl_library_description', "") }})
+                    else :
+                        logger.error("More than one instance of args peripheral library '{}' found under {}".format(lib_name, root_dir))
+                        logger.error("\nConflicting files:\n\t{}\n\t{}".format(self.library[lib_name]['file_path_name'], os.path.join(root,name)))
+                        sys.exit()
 
             # list of peripheral configurations that are read from the available peripheral files
             self.read_all_peripheral_files()
@@ -11,7 +11,7 @@ from common import c_word_w, c_byte_w
 VALID_ACCESS_MODES = ['RO', 'WO', 'RW', 'FR', 'FW', 'CS', 'CW', 'SP']
 VALID_SIDE_EFFECTS = ['CLR', 'PR', 'PW']
 VALID_SLAVE_TYPES  = ['REG', 'RAM', 'FIFO', 'REG_IP']
-VALID_FIELD_KEYS = ['width', 'bit_offset', 'side_effect', 'number_of_fields', 'interface', 'address_offset', 'access_mode', 'reset_value', 'radix', 'field_description','user_width','software_value']
+VALID_FIELD_KEYS = ['width', 'bit_offset', 'side_effect', 'number_of_fields', 'interface', 'address_offset', 'access_mode', 'reset_value', 'radix', 'field_description','user_width','software_value','double_buffered']
 VALID_DEFAULT_KEYS = ['width', 'address_offset', 'access_mode', 'reset_value', 'field_description', 'number_of_fields', 'reset_value', 'side_effect', 'interface']
 VALID_RADIXS       = ['UNSIGNED', 'SIGNED', 'HEXADECIMAL']
 
@@ -34,6 +34,8 @@ DEFAULT_RADIX            = 'signed'
 DEFAULT_DESCRIPTION      = 'none'
 # interface applies to rams, and is full (for full axi4 interface) or simple (for simple memory interface with addr, wr_data, rd_data, we) 
 DEFAULT_INTERFACE        = 'full'
+# double_buffered applies to rams, true if the first and second half of the ram hold two copies of the same table
+DEFAULT_DOUBLE_BUFFERED  = False
 DATA_WIDTH               = 32
 
 DEFAULT_ADDRESS_LENGTH   = 1
@@ -45,7 +45,7 @@ class Field(BaseObject):
         # self._valid_keys = ['width', 'bit_offset', 'access_mode', 'side_effect', 'address_offset', 'number_of_fields',
                             # 'reset_value', 'software_value', 'radix', 'field_description', 'field_name', 'default', 'user_width']
         self._valid_dict = {'width':{'max':32, 'min':1}, 'bit_offset':{'max':UNASSIGNED_BIT,'min':0}, 'access_mode':{}, 'interface':{}, 'side_effect':{},'address_offset': {'max':16384,'min':0, 'word_aligned':True},
-                            'number_of_fields':{'max':262144,'min':'1'},'reset_value':{'max':131071},'software_value':{},'radix':{},'field_description':{},'field_name':{},'user_width':{'max':2048,'min':32}}
+                            'number_of_fields':{'max':262144,'min':'1'},'reset_value':{'max':131071},'software_value':{},'radix':{},'field_description':{},'field_name':{},'user_width':{'max':2048,'min':32},'double_buffered':{}}
         self._args.update({'width'            : DEFAULT_WIDTH,
                            'bit_offset'       : DEFAULT_BIT_OFFSET,
                            'access_mode'      : DEFAULT_ACCESS_MODE,
@@ -57,6 +57,7 @@ class Field(BaseObject):
                            'radix'            : DEFAULT_RADIX,
                            'field_description': DEFAULT_DESCRIPTION,
                            'interface'        : DEFAULT_INTERFACE,
+                           'double_buffered'  : DEFAULT_DOUBLE_BUFFERED,
                            'group_name'       : None})
 
         if settings is not None:
@@ -212,6 +213,13 @@ class Field(BaseObject):
             return
         return self._as_str('interface')
 
+    def double_buffered(self, val=None):
+        """ set/get double_buffered, for rams holding two copies of a table in the first and second half """
+        if val is not None:
+            self.set_kv('double_buffered', val)
+            return
+        return str(self._args['double_buffered']).lower() in ('true', '1')
+
     def base_address(self, val = None):
         if val is not None:
             if mod(val, WIDTH_IN_BYTES):  # don't need check here if tool calcs are correct
@@ -31,10 +31,12 @@ import math
 import operator
 import inspect
 import itertools
+import collections
 import os
 import os.path
 import posixpath
 import re
+import numpy as np
 
 ################################################################################
 # Constants
@@ -233,6 +235,75 @@ def int_requantize(inp, inp_w, outp_w, lsb_w=0, lsb_round=False, msb_clip=False,
     return outp
 
 
+################################################################################
+# Vectorised fixed point functions
+#
+# The np_int_* functions have the same semantics as the int_* functions above, but operate element wise on
+# numpy arrays (or anything np.asarray accepts) and return np.int64 arrays. The division in int_round is done as
+# floor division, like in the original Python 2 code. The np_int_round also supports direction = "HALF_EVEN",
+# round half to even so +0.5 --> 0, +1.5 --> 2, -0.5 --> 0 (convergent rounding). The values must fit in 63 bits.
+
+def np_int_clip(inp, w):
+    """Clip the values of inp to w bits, output range -2**(w-1) to +2**(w-1)-1, like int_clip()."""
+    inp = np.asarray(inp, dtype=np.int64)
+    if w<=0:
+        return np.zeros_like(inp)
+    return np.clip(inp, -2**(w-1), 2**(w-1)-1)
+
+def np_int_wrap(inp, w):
+    """Wrap the values of inp to w bits by removing the MSbits, output range -2**(w-1) to +2**(w-1)-1, like int_wrap()."""
+    inp = np.asarray(inp, dtype=np.int64)
+    if w<=0:
+        return np.zeros_like(inp)
+    if w>=64:
+        return inp
+    wrap_sign = np.int64(2**(w-1))
+    return ((inp + wrap_sign) & np.int64(2**w-1)) - wrap_sign
+
+def np_int_round(inp, w, direction="HALF_AWAY"):
+    """Round the w LSbits of the values of inp, like int_round(), direction = "HALF_AWAY", "HALF_UP" or "HALF_EVEN"."""
+    inp = np.asarray(inp, dtype=np.int64)
+    if w<=0:
+        return inp
+    round_p = np.int64(2**(w-1))
+    if direction == "HALF_UP":
+        return (inp + round_p) >> w
+    if direction == "HALF_AWAY":
+        return np.where(inp >= 0, inp + round_p, inp + round_p - 1) >> w
+    if direction == "HALF_EVEN":
+        # add half - 1, plus 1 when the integer part is odd
+        return (inp + round_p - 1 + ((inp >> w) & 1)) >> w
+    raise ValueError('np_int_round: unknown direction %s' % direction)
+
+def np_int_truncate(inp, w):
+    """Truncate the w LSbits of the values of inp towards zero, like int_truncate()."""
+    inp = np.asarray(inp, dtype=np.int64)
+    if w<=0:
+        return inp
+    return np.where(inp >= 0, inp >> w, -((-inp) >> w))
+
+def np_int_requantize(inp, inp_w, outp_w, lsb_w=0, lsb_round=False, msb_clip=False, gain_w=0, direction="HALF_AWAY"):
+    """Requantize the values of inp similar as common_requantize.vhd, like int_requantize().
+
+       First round (using direction) or truncate the lsb_w LSbits, then clip or wrap the MSbits to outp_w and then apply
+       the optional output gain.
+    """
+    # Input width
+    r = np_int_wrap(inp, inp_w)
+    # Remove LSBits using ROUND or TRUNCATE
+    if lsb_round:
+        r = np_int_round(r, lsb_w, direction)
+    else:
+        r = np_int_truncate(r, lsb_w)
+    # Remove MSBits using CLIP or WRAP
+    if msb_clip:
+        r = np_int_clip(r, outp_w)
+    else:
+        r = np_int_wrap(r, outp_w)
+    # Output gain
+    return np_int_wrap(r << gain_w, outp_w)
+
+
 def flatten(x):
     """
     Flatten lists of lists of any depth. Preserves tuples.
@@ -597,6 +668,46 @@ def reinterleave(input_streams, nof_out, block_size_in=1, block_size_out=1):
          inter_out_arr.append(interleave(inter_in_arr[out_no], block_size_out))
     return inter_out_arr
 
+def np_deinterleave(input_stream, nof_out, block_size=1):
+    """
+    Deinterleave the last axis of array input_stream into nof_out output streams based on block_size.
+    Returns an array with shape input_stream.shape[:-1] + (nof_out, n/nof_out), so leading axes (e.g. frames)
+    are processed in one go.
+    >> np_deinterleave( np.arange(1,17), 4, 2 )
+    >> array([[ 1,  2,  9, 10], [ 3,  4, 11, 12], [ 5,  6, 13, 14], [ 7,  8, 15, 16]])
+    Note: This method behaves exactly like deinterleave() and common_deinterleave.vhd.
+    """
+    input_stream = np.asarray(input_stream)
+    lead, n = input_stream.shape[:-1], input_stream.shape[-1]
+    if n % (nof_out*block_size) != 0:
+        raise ValueError('np_deinterleave: length %d should be a multiple of nof_out*block_size = %d' % (n, nof_out*block_size))
+    blocks = input_stream.reshape(lead + (n//(nof_out*block_size), nof_out, block_size))
+    return blocks.swapaxes(-3, -2).reshape(lead + (nof_out, n//nof_out))
+
+def np_interleave(input_streams, block_size=1):
+    """
+    Interleave the input streams on the second last axis of array input_streams into one stream based on block size.
+    Returns an array with shape input_streams.shape[:-2] + (nof_in*n,).
+    Note: This method behaves exactly like interleave() and common_interleave.vhd.
+    """
+    input_streams = np.asarray(input_streams)
+    lead, nof_in, n = input_streams.shape[:-2], input_streams.shape[-2], input_streams.shape[-1]
+    if n % block_size != 0:
+        raise ValueError('np_interleave: stream length %d should be a multiple of block_size = %d' % (n, block_size))
+    blocks = input_streams.reshape(lead + (nof_in, n//block_size, block_size))
+    return blocks.swapaxes(-3, -2).reshape(lead + (nof_in*n,))
+
+def np_reinterleave(input_streams, nof_out, block_size_in=1, block_size_out=1):
+    """
+    Re-interleave the input streams on the second last axis of array input_streams across nof_out output streams.
+    The input streams are first deinterleaved with block_size_in, then nof_out interleaved streams are made with
+    block_size_out. Returns an array with shape input_streams.shape[:-2] + (nof_out, nof_in*n/nof_out).
+    Note: This method behaves exactly like reinterleave() and common_reinterleave.vhd.
+    """
+    # [..][nof_in][nof_out][n/nof_out] deinterleaved streams --> [..][nof_out][nof_in][n/nof_out] interleaver inputs
+    deint_arr = np_deinterleave(input_streams, nof_out, block_size_in)
+    return np_interleave(deint_arr.swapaxes(-3, -2), block_size_out)
+
 def transpose(matrix):
     """
     Transpose by using zip()
@@ -1057,3 +1168,121 @@ class CommonWords64(CommonSymbols):
         CommonSymbols.__init__(self, data, 64, datasymbols)
 
 
+
+
+class BitFields:
+    """
+    Vectorised bit field codec for numpy arrays of packed words, for bulk decoding where CommonBits
+    would be used per word.
+
+    A record consists of nof_words words of word_w bits, word 0 holds record bits word_w-1:0, word 1 holds
+    record bits 2*word_w-1:word_w, etc. The fields are defined by (name, msb, lsb) or (name, msb, lsb, signed)
+    tuples in record bit positions, or by a dict name : (msb, lsb) or (msb, lsb, signed) or 'msb:lsb'. A field
+    may span words and must be at most 63 bits wide.
+
+    >> demap = BitFields([('valid', 31, 31), ('sky_freq_idx', 28, 20), ('station', 19, 8), ('sb_id', 7, 0)])
+    >> demap.decode(np.array([0x8012_3456]))['station']
+    array([564])
+    >> sb = BitFields({'stations': '15:0', 'coarse_start': '31:16', 'hbm_base': '127:96'}, nof_words=4)
+    """
+
+    def __init__(self, fields, nof_words=1, word_w=32):
+        self.nof_words = nof_words
+        self.word_w = word_w
+        if isinstance(fields, dict):
+            fields = [(name,) + (tuple(int(b) for b in spec.split(':')) if isinstance(spec, str) else tuple(spec)) for name, spec in fields.items()]
+        self.fields = collections.OrderedDict()
+        for field in fields:
+            name, msb, lsb = field[0], int(field[1]), int(field[2])
+            signed = bool(field[3]) if len(field)>3 else False
+            if lsb<0 or msb<lsb or msb>=nof_words*word_w or msb-lsb>=63:
+                raise ValueError('BitFields: invalid bit range %d:%d for field %s' % (msb, lsb, name))
+            self.fields[name] = (msb, lsb, signed)
+
+    @classmethod
+    def from_args(cls, fields, word_w=32):
+        """
+        Create the BitFields from ARGS field objects (py_args_lib Field) of one register or of consecutive
+        registers, using their address_offset (in bytes), bit_offset, width and radix ('SIGNED').
+        """
+        base = min(f.address_offset() or 0 for f in fields)
+        specs = []
+        for f in fields:
+            word = ((f.address_offset() or 0) - base) // (word_w//c_byte_w)
+            lsb = word*word_w + f.bit_offset()
+            specs.append((f.name(), lsb + f.width() - 1, lsb, str(f.get_kv('radix')).upper()=='SIGNED'))
+        nof_words = max(msb for _, msb, _, _ in specs)//word_w + 1
+        return cls(specs, nof_words, word_w)
+
+    def names(self):
+        return list(self.fields.keys())
+
+    def width(self, name):
+        msb, lsb, _ = self.fields[name]
+        return msb - lsb + 1
+
+    def _records(self, words):
+        """Return words as uint64 array with shape (..., nof_words), a 1-dimensional words array is a flat sequence of records."""
+        words = np.asarray(words).astype(np.uint64)
+        if self.nof_words>1 and (words.ndim<=1 or words.shape[-1]!=self.nof_words):
+            words = words.reshape(-1, self.nof_words)
+        elif self.nof_words==1:
+            words = words[..., np.newaxis]
+        return words
+
+    def decode_field(self, words, name):
+        """Return the values of field name of the records in words as np.int64 array."""
+        return self._decode(self._records(words), name)
+
+    def _decode(self, records, name):
+        msb, lsb, signed = self.fields[name]
+        w = self.word_w
+        value = np.zeros(records.shape[:-1], dtype=np.uint64)
+        for k in range(lsb//w, msb//w+1):
+            lo = max(lsb, k*w)
+            hi = min(msb, k*w+w-1)
+            part = (records[..., k] >> np.uint64(lo-k*w)) & np.uint64(2**(hi-lo+1)-1)
+            value |= part << np.uint64(lo-lsb)
+        value = value.astype(np.int64)
+        if signed:
+            width = msb - lsb + 1
+            value = np.where(value >= 2**(width-1), value - 2**width, value)
+        return value
+
+    def decode(self, words, names=None):
+        """Return OrderedDict name : np.int64 array with the field values of the records in words."""
+        records = self._records(words)
+        if names is None:
+            names = self.names()
+        return collections.OrderedDict((name, self._decode(records, name)) for name in names)
+
+    def decode_records(self, words):
+        """Return the field values of the records in words as numpy record array with one np.int64 column per field."""
+        values = self.decode(words)
+        return np.rec.fromarrays([np.ravel(v) for v in values.values()], names=list(values.keys()))
+
+    def encode(self, values, words=None):
+        """
+        Pack the field values (dict name : array or scalar, broadcast against each other) into records. The fields
+        that are not in values keep their bits from words (default 0). Return np.uint64 array with shape
+        (..., nof_words), or (...) when nof_words = 1.
+        """
+        shape = np.broadcast(*[np.asarray(v) for v in values.values()]).shape if values else ()
+        if words is None:
+            records = np.zeros(shape + (self.nof_words,), dtype=np.uint64)
+        else:
+            records = self._records(words).copy()
+        w = self.word_w
+        word_mask = np.uint64(2**w-1)
+        for name, value in values.items():
+            msb, lsb, _ = self.fields[name]
+            value = np.asarray(value).astype(np.int64).astype(np.uint64) & np.uint64(2**(msb-lsb+1)-1)   # two's complement
+            for k in range(lsb//w, msb//w+1):
+                lo = max(lsb, k*w)
+                hi = min(msb, k*w+w-1)
+                mask = np.uint64(((2**(hi-lo+1)-1) << (lo-k*w)) & (2**w-1))
+                part = ((value >> np.uint64(lo-lsb)) << np.uint64(lo-k*w)) & mask
+                records[..., k] = (records[..., k] & (word_mask ^ mask)) | part
+        if self.nof_words==1:
+            return records[..., 0]
+        return records
@@ -114,6 +114,176 @@ import os
 import os.path
 import collections
 import re
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+################################################################################
+# Shared directory scan
+#
+# CommonDictFile, PeripheralLibrary and FPGALibrary all search the $RADIOHDL tree. The
+# DirectoryIndex scans a root directory once per process with os.scandir in a thread pool
+# and keeps, per directory, the subdirectories and the files with one of INDEX_SUFFIXES.
+# The index is also written to $HDL_BUILD_DIR/.radiohdl_dir_index_<hash>.json together
+# with the directory mtimes. A directory whose mtime has not changed since it was indexed
+# is not listed again (only stat'ed), so a later run only re-lists changed subtrees.
+#
+# Excluded from the scan are $HDL_BUILD_DIR, directory names containing '.git' or '.svn'
+# and the directories in $RADIOHDL_SCAN_EXCLUDE (os.pathsep separated, absolute or
+# relative to the root directory), e.g. RADIOHDL_SCAN_EXCLUDE=sim:raw
+
+INDEX_SUFFIXES = ('.cfg', '.yaml')
+INDEX_VERSION = 1
+SCAN_THREADS = 16
+MTIME_GUARD_NS = 2*10**9   # don't trust mtimes this close to the scan time (coarse filesystem timestamps)
+
+def scan_exclude_dirs(rootDir):
+    """Absolute normalised paths of the directories that are not scanned below rootDir."""
+    exclude = []
+    if os.environ.get('HDL_BUILD_DIR'):
+        exclude.append(os.path.expandvars('$HDL_BUILD_DIR'))
+    for d in os.environ.get('RADIOHDL_SCAN_EXCLUDE', '').split(os.pathsep):
+        if d.strip():
+            exclude.append(os.path.join(rootDir, os.path.expandvars(d.strip())))
+    return set(os.path.normcase(os.path.abspath(d)) for d in exclude)
+
+class DirectoryIndex:
+
+    def __init__(self, rootDir, suffixes=INDEX_SUFFIXES, cacheFile=None):
+        """Index of the subdirectories and files ending with one of the suffixes in the rootDir tree.
+
+           cacheFile = None uses $HDL_BUILD_DIR/.radiohdl_dir_index_<hash of rootDir>.json when HDL_BUILD_DIR is set,
+           '' does not use a cache file.
+        """
+        self.rootDir = os.path.abspath(os.path.expandvars(rootDir))
+        self.suffixes = tuple(suffixes)
+        self.exclude = scan_exclude_dirs(self.rootDir)
+        if cacheFile is None and os.environ.get('HDL_BUILD_DIR'):
+            tag = hashlib.sha1(('%s|%s' % (self.rootDir, ' '.join(self.suffixes))).encode()).hexdigest()[:12]
+            cacheFile = os.path.join(os.path.expandvars('$HDL_BUILD_DIR'), '.radiohdl_dir_index_%s.json' % tag)
+        self.cacheFile = cacheFile
+        self.dirs = {}            # directory path : (mtime_ns, [subdir names], [file names])
+        self.nof_listed = 0       # number of directories that were listed (not taken from the cache)
+        self.scan()
+
+    def _excluded(self, path, name):
+        return '.git' in name or '.svn' in name or os.path.normcase(path) in self.exclude
+
+    def _scan_dir(self, path, cached):
+        """Return (mtime_ns, subdirs, files) for path, reusing the cached entry when the directory is unchanged."""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        if cached is not None and cached[0] == mtime and mtime >= 0:
+            return cached
+        subdirs = []
+        files = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not self._excluded(entry.path, entry.name):
+                                subdirs.append(entry.name)
+                        elif entry.name.endswith(self.suffixes):
+                            files.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        with self._lock:
+            self.nof_listed += 1
+        if time.time_ns() - mtime < MTIME_GUARD_NS:
+            mtime = -1            # recently modified, list it again next time
+        return (mtime, sorted(subdirs), sorted(files))
+
+    def scan(self):
+        """(Re)scan the tree, breadth first, one thread pool task per directory."""
+        cached = self.read_cache()
+        self._lock = threading.Lock()
+        self.nof_listed = 0
+        self.dirs = {}
+        level = [self.rootDir]
+        with ThreadPoolExecutor(max_workers=SCAN_THREADS) as pool:
+            while level:
+                results = pool.map(lambda d: self._scan_dir(d, cached.get(d)), level)
+                next_level = []
+                for d, result in zip(level, results):
+                    if result is None:
+                        continue
+                    self.dirs[d] = result
+                    next_level.extend(os.path.join(d, sub) for sub in result[1])
+                level = next_level
+        if self.nof_listed > 0 or len(cached) != len(self.dirs):
+            self.write_cache()
+
+    def read_cache(self):
+        if not self.cacheFile or not os.path.isfile(self.cacheFile):
+            return {}
+        try:
+            with open(self.cacheFile, 'r') as fp:
+                cache = json.load(fp)
+        except (OSError, ValueError):
+            return {}
+        if cache.get('version') != INDEX_VERSION or cache.get('root') != self.rootDir or \
+           cache.get('exclude') != sorted(self.exclude) or tuple(cache.get('suffixes', ())) != self.suffixes:
+            return {}
+        return dict((d, tuple(v)) for d, v in cache['dirs'].items())
+
+    def write_cache(self):
+        if not self.cacheFile:
+            return
+        cache = {'version':INDEX_VERSION, 'root':self.rootDir, 'exclude':sorted(self.exclude), 'suffixes':list(self.suffixes), 'dirs':self.dirs}
+        try:
+            cm.mkdir(os.path.dirname(self.cacheFile))
+            tmpFile = self.cacheFile + '.%d.tmp' % os.getpid()
+            with open(tmpFile, 'w') as fp:
+                json.dump(cache, fp)
+            os.replace(tmpFile, self.cacheFile)
+        except OSError:
+            pass                  # the cache is only an optimisation
+
+    def find(self, fileName=None, suffix=None, rootDir=None, exclude=()):
+        """Return the sorted list of (directory path, file name) for files named fileName or ending with suffix,
+           found in the rootDir subtree (default the whole index) and not below one of the exclude directories."""
+        rootDir = self.rootDir if rootDir is None else os.path.abspath(os.path.expandvars(rootDir))
+        exclude = [os.path.normcase(os.path.abspath(d)) + os.sep for d in exclude]
+        found = []
+        for d in sorted(self.dirs):
+            if not (d == rootDir or d.startswith(rootDir.rstrip(os.sep) + os.sep)):
+                continue
+            if any((os.path.normcase(d) + os.sep).startswith(e) for e in exclude):
+                continue
+            for f in self.dirs[d][2]:
+                if (fileName is not None and f == fileName) or (suffix is not None and f.endswith(suffix)):
+                    found.append((d, f))
+        return found
+
+_directory_indexes = {}
+
+def get_directory_index(rootDir):
+    """Get the shared DirectoryIndex that covers rootDir, scanning rootDir if no index covers it yet."""
+    rootDir = os.path.abspath(os.path.expandvars(rootDir))
+    for indexRoot, index in _directory_indexes.items():
+        if rootDir == indexRoot or rootDir.startswith(indexRoot.rstrip(os.sep) + os.sep):
+            if not any((os.path.normcase(rootDir) + os.sep).startswith(e + os.sep) for e in index.exclude):
+                return index
+    _directory_indexes[rootDir] = DirectoryIndex(rootDir)
+    return _directory_indexes[rootDir]
+
+def find_all_files(rootDir, fileName=None, suffix=None, exclude=()):
+    """Find all files named fileName, or ending with suffix, in the rootDir tree using the shared directory index.
+       Returns a sorted list of (directory path, file name)."""
+    pattern = fileName if fileName is not None else suffix
+    if not pattern.endswith(INDEX_SUFFIXES):
+        # not kept in the shared index, scan once for this pattern only
+        return DirectoryIndex(rootDir, suffixes=(pattern,), cacheFile='').find(fileName, suffix, exclude=exclude)
+    return get_directory_index(rootDir).find(fileName, suffix, rootDir, exclude)
+
+################################################################################
 
 class CommonDictFile:
 
@@ -155,15 +325,9 @@ class CommonDictFile:
         self.nof_dicts = 1
 
     def find_all_dict_file_paths(self, rootDir=None):
-        """Recursively search the rootDir tree to find the paths to all fileName files."""
+        """Search the rootDir tree to find the paths to all fileName files, using the shared directory index."""
         if rootDir==None: rootDir=self.rootDir
-        paths = []
-        exclude = set([cm.path_string(os.path.expandvars('$HDL_BUILD_DIR'))])
-        for root, dirs, files in os.walk(rootDir, topdown=True):
-            dirs[:] = [d for d in dirs if cm.path_string(root+d) not in exclude and '.git' not in d and '.svn' not in d]
-            if self.fileName in files:
-                paths.append(root)
-        return paths
+        return [path for path, _ in find_all_files(rootDir, fileName=self.fileName)]
 
     def read_all_dict_files(self, filePathNames=None):
         """Read the dictionary information from all files that were found in the rootDir tree."""
@@ -0,0 +1,296 @@
+#! /usr/bin/env python
+###############################################################################
+#
+# Copyright (C) 2026
+# CSIRO (Commonwealth Scientific and Industrial Research Organization) <http://www.csiro.au/>
+# GPO Box 1700, Canberra, ACT 2601, Australia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#   Author           Date      Version comments
+#   Low CBF          Oct 2026  Original
+#
+###############################################################################
+
+"""Content addressed store of the expected data of the reference models.
+
+   The checkers of the simulation dumps (vis_check.py, ct1_test.py) compute
+   their expected data from the test configuration with a numpy model. The
+   expected arrays of one unit of work (e.g. one output channel of one
+   integration) are saved compressed in an .npz file, named by the hash of:
+
+   . kind    : name of the expected data, e.g. 'vis' or 'ct1_fine_delay'
+   . version : model version, by default the hash of the model source files, see source_version()
+   . fields  : the parsed configuration and the integration range of the unit of work
+
+   so a re-run with the same configuration and model only reads the files. A
+   change of the configuration or of the model source gives a new hash; the
+   old entries are removed by the least recently used (LRU) size cap.
+
+   The store directory is $GOLDEN_STORE_DIR, else $HDL_BUILD_DIR/golden_store,
+   else ~/.cache/golden_store. The size cap is $GOLDEN_STORE_MAX_MB (default
+   MAX_MB). Each entry is <dir>/<kind>/<hash>.npz with a <hash>.json next to
+   it that holds the fields, for listing. The file mtime is the LRU time.
+
+   The store is a cache, so put() is best effort: when the store directory
+   is not writable the checker warns once and continues without saving. The
+   size cap is checked against a running estimate of the store size, so the
+   store is only scanned (with stat, the .json files are only read by list)
+   at the first put() and when the estimate exceeds the cap. Temporary files
+   of a put() that crashed before the rename are removed by these scans once
+   they are TMP_MAX_AGE_S old.
+
+   Usage:
+   > python $RADIOHDL/tools/radiohdl/base/golden_store.py -h
+   > python $RADIOHDL/tools/radiohdl/base/golden_store.py list
+   > python $RADIOHDL/tools/radiohdl/base/golden_store.py prune --max_mb 500
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+MAX_MB = 4096
+PRUNE_FRACTION = 0.9         # put() prunes to this fraction of the size cap, so the next puts need no scan
+TMP_MAX_AGE_S = 3600         # a temporary file this old is left over from a crashed put()
+
+
+def default_dir():
+    """Store directory from the environment, see module docstring."""
+    if os.environ.get('GOLDEN_STORE_DIR'):
+        return os.path.expandvars(os.environ['GOLDEN_STORE_DIR'])
+    if os.environ.get('HDL_BUILD_DIR'):
+        return os.path.join(os.path.expandvars('$HDL_BUILD_DIR'), 'golden_store')
+    return os.path.join(os.path.expanduser('~'), '.cache', 'golden_store')
+
+
+def _jsonable(value):
+    """Convert numpy values and other objects in the key fields to json types."""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (bytes, bytearray)):
+        return hashlib.sha1(value).hexdigest()
+    return repr(value)
+
+
+def source_version(*file_names):
+    """Hash of the contents of the model source files, as model version."""
+    h = hashlib.sha1()
+    for file_name in file_names:
+        with open(file_name, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def entry_key(kind, version, **fields):
+    """Return the hash of kind, model version and key fields."""
+    text = json.dumps({'kind': kind, 'version': version, 'fields': fields}, sort_keys=True, default=_jsonable)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def array_digest(*arrays):
+    """Hash of the contents of numpy arrays, for input data that is part of the key."""
+    h = hashlib.sha1()
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        h.update(('%s%s' % (a.dtype.str, a.shape)).encode())
+        h.update(a.data)
+    return h.hexdigest()
+
+
+class GoldenStore:
+
+    def __init__(self, store_dir=None, max_mb=None, enabled=True):
+        """Store in store_dir (None = default_dir()), capped at max_mb (None = $GOLDEN_STORE_MAX_MB or MAX_MB).
+
+           With enabled=False get() always misses and put() does nothing, so the callers need no special case.
+        """
+        self.store_dir = default_dir() if store_dir is None else store_dir
+        if max_mb is None:
+            max_mb = float(os.environ.get('GOLDEN_STORE_MAX_MB', MAX_MB))
+        self.max_bytes = int(max_mb * 2**20)
+        self.enabled = enabled
+        self.writable = True     # False after a put() failed
+        self.nof_bytes = None    # running estimate of the store size, None = not scanned yet
+        self.nof_hits = 0
+        self.nof_misses = 0
+
+    def _path(self, kind, key):
+        return os.path.join(self.store_dir, kind, key + '.npz')
+
+    def get(self, kind, key):
+        """Return the dict of arrays of the entry, or None when it is not in the store."""
+        if not self.enabled:
+            return None
+        path = self._path(kind, key)
+        try:
+            with np.load(path) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+        except (OSError, ValueError, EOFError):
+            self.nof_misses += 1
+            return None
+        try:
+            os.utime(path)     # LRU time
+        except OSError:
+            pass
+        self.nof_hits += 1
+        return arrays
+
+    def put(self, kind, key, arrays, version='', **fields):
+        """Save the dict of arrays as entry key, with the version and fields in the .json for listing.
+
+           When the entry cannot be written, warn and do not write to the store anymore.
+        """
+        if not self.enabled or not self.writable:
+            return
+        path = self._path(kind, key)
+        tmp = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file and rename, so parallel checkers never read a partial entry
+            fd, tmp = tempfile.mkstemp(suffix='.npz', dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(tmp, path)
+            tmp = None
+            with open(path[:-4] + '.json', 'w') as f:
+                json.dump({'kind': kind, 'version': version, 'fields': fields, 'created': time.time()}, f,
+                          sort_keys=True, default=_jsonable)
+            nof_bytes = os.path.getsize(path)
+        except OSError as e:
+            self.writable = False
+            print('WARNING: golden store %s is not written: %s' % (self.store_dir, e))
+            return
+        finally:
+            if tmp is not None:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+        if self.nof_bytes is None:
+            self.nof_bytes = sum(e['bytes'] for e in self.entries(read_meta=False, remove_stale=True))
+        else:
+            self.nof_bytes += nof_bytes
+        if self.nof_bytes > self.max_bytes:
+            self.prune(int(self.max_bytes * PRUNE_FRACTION))
+
+    def cached(self, kind, version, compute, **fields):
+        """Return the entry of (kind, version, fields), calling compute() for the dict of arrays on a miss."""
+        key = entry_key(kind, version, **fields)
+        arrays = self.get(kind, key)
+        if arrays is None:
+            arrays = compute()
+            self.put(kind, key, arrays, version, **fields)
+        return arrays
+
+    def entries(self, read_meta=True, remove_stale=False):
+        """Return list of dicts kind, key, bytes, mtime, version, fields, sorted least recently used first.
+
+           With read_meta=False the .json files are not read, so version and fields are empty. With remove_stale=True
+           the temporary files older than TMP_MAX_AGE_S are removed.
+        """
+        result = []
+        if not os.path.isdir(self.store_dir):
+            return result
+        now = time.time()
+        for kind in sorted(os.listdir(self.store_dir)):
+            kind_dir = os.path.join(self.store_dir, kind)
+            if not os.path.isdir(kind_dir):
+                continue
+            with os.scandir(kind_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith('.npz'):
+                        continue
+                    try:
+                        st = entry.stat()
+                        if entry.name.startswith('tmp'):
+                            if remove_stale and now - st.st_mtime > TMP_MAX_AGE_S:
+                                os.remove(entry.path)
+                            continue
+                    except OSError:
+                        continue          # removed by a parallel checker
+                    meta = {}
+                    if read_meta:
+                        try:
+                            with open(entry.path[:-4] + '.json') as f:
+                                meta = json.load(f)
+                        except (OSError, ValueError):
+                            pass
+                    result.append({'kind': kind, 'key': entry.name[:-4], 'path': entry.path,
+                                   'bytes': st.st_size, 'mtime': st.st_mtime,
+                                   'version': meta.get('version', ''), 'fields': meta.get('fields', {})})
+        return sorted(result, key=lambda e: e['mtime'])
+
+    def remove(self, entry):
+        for path in (entry['path'], entry['path'][:-4] + '.json'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def prune(self, max_bytes=None, kind=None):
+        """Remove the least recently used entries (of kind, None = all) until the store is at most max_bytes.
+           Return the number of removed entries."""
+        entries = self.entries(read_meta=False, remove_stale=True)
+        total = sum(e['bytes'] for e in entries)
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        nof_removed = 0
+        for e in entries:
+            if total <= max_bytes:
+                break
+            if kind is not None and e['kind'] != kind:
+                continue
+            self.remove(e)
+            total -= e['bytes']
+            nof_removed += 1
+        self.nof_bytes = total
+        return nof_removed
+
+    def summary(self):
+        """Return the hits and misses line for the checker logs."""
+        return 'golden store %s: %d hits, %d misses' % (self.store_dir, self.nof_hits, self.nof_misses)
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='List or prune the store of expected reference model data')
+    argparser.add_argument('command', choices=['list', 'prune', 'clear'], help='list the entries, prune to the size cap, or remove all entries')
+    argparser.add_argument('-d', '--dir', default=None, help='store directory (default: %s)' % default_dir())
+    argparser.add_argument('-k', '--kind', default=None, help='only entries of this kind')
+    argparser.add_argument('--max_mb', type=float, default=None, help='size cap in MB for prune (default: $GOLDEN_STORE_MAX_MB or %d)' % MAX_MB)
+    argparser.add_argument('-v', '--verbose', action='store_true', default=False, help='list the key fields of each entry')
+    args = argparser.parse_args()
+
+    store = GoldenStore(args.dir, args.max_mb)
+    if args.command == 'list':
+        entries = [e for e in store.entries() if args.kind is None or e['kind'] == args.kind]
+        for e in reversed(entries):
+            print('%-16s %s %10d  %s  version %s' % (e['kind'], e['key'][:16], e['bytes'],
+                  time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(e['mtime'])), e['version']))
+            if args.verbose:
+                print('    %s' % json.dumps(e['fields'], sort_keys=True))
+        print('%d entries, %.1f MB in %s' % (len(entries), sum(e['bytes'] for e in entries) / 2**20, store.store_dir))
+    elif args.command == 'prune':
+        print('removed %d entries' % store.prune(kind=args.kind))
+    else:
+        print('removed %d entries' % store.prune(0, kind=args.kind))
+    sys.exit(0)
@@ -56,6 +56,7 @@ import shutil
 from distutils.dir_util import copy_tree
 import argparse
 import collections
+import heapq
 import yaml
 import logging
 sys.path.append('../../args/')
@@ -65,6 +66,7 @@ import gen_bus
 import gen_doc
 import gen_fpgamap_py
 import gen_c_config
+import gen_transfer_plan
 import datetime
 
 
@@ -340,74 +342,128 @@ class HdlConfig:
         return use_libs, include_ip_libs
 
 
+    def get_dependency_graph(self):
+        """Get the HDL library dependency graph as a dict of lib_name : list of directly used lib_names.
+
+           The graph is built once from all hdllib.cfg dicts, using the 'hdl_lib_uses_synth', 'hdl_lib_uses_ip' and
+           'hdl_lib_uses_sim' keys (like get_used_libs() with build_type ''), and cached together with the derived
+           use lists and library orders. The cache is rebuilt when the list of libraries or removed libraries changes,
+           because get_used_libs() adds disclosed but not included IP libraries to self.removed_lib_names.
+        """
+        generation = (len(self.lib_names), len(self.removed_lib_names))
+        if getattr(self, '_dep_generation', None) != generation:
+            self._dep_generation = generation
+            self._dep_graph = collections.OrderedDict()
+            removed = set(self.removed_lib_names)
+            for lib_name, lib_dict in zip(self.lib_names, self.libs.dicts):
+                use_libs = []
+                for key in ['hdl_lib_uses_synth', 'hdl_lib_uses_ip', 'hdl_lib_uses_sim']:
+                    if key in lib_dict:
+                        use_libs += lib_dict[key].split()
+                self._dep_graph[lib_name] = [use_lib for use_lib in collections.OrderedDict.fromkeys(use_libs) if use_lib not in removed]
+            self._dep_all_use_libs = {}
+            self._dep_lib_order = {}
+        return self._dep_graph
+
+
+    def clear_dependency_cache(self):
+        """Force get_dependency_graph() to rebuild the graph, e.g. after editing the lib dicts."""
+        self._dep_generation = None
+
+
     def derive_all_use_libs(self, build_type, lib_name, arg_include_ip_libs=[]):
-        """Recursively derive a complete list of all HDL libraries that the specified HDL lib_name library depends on, so from this
+        """Derive a complete list of all HDL libraries that the specified HDL lib_name library depends on, so from this
            HDL library down the entire hierachy.
 
            The hdl_lib_uses_* key only needs to contain all libraries that are declared at the VHDL LIBRARY clauses of the
-           source files in this VHDL library. This derive_all_use_libs() will recursively find all deeper level VHDL libraries as well.
+           source files in this VHDL library. This derive_all_use_libs() will find all deeper level VHDL libraries as well.
+           The list starts with lib_name and then has the used libraries in depth first order of first appearance.
 
-           The arg_include_ip_libs selects the IP library to keep from 'hdl_lib_uses_ip'. The include_ip_libs is passed on
-           through the recursion hierarchy via arg_include_ip_libs to ensure that the from the top level library down all
-           multiple choice IP libraries in 'hdl_lib_uses_ip' that need to be included are indeed included. The multiple choice IP
-           libraries in 'hdl_lib_uses_ip' that are not in include_ip_libs are excluded.
+           The arg_include_ip_libs selects the IP library to keep from 'hdl_lib_uses_ip'. Disclosed IP libraries that are not
+           included from the top level lib_name are added to self.removed_lib_names by get_used_libs(). Lower levels can only
+           add more include_ip_libs, so this is fully determined by the top level and the transitive closure of each library
+           is derived once from the cached dependency graph and then reused (per build_type and library).
 
            Note:
            . Only the generic HDL libraries and the technology specific libraries that match self.technologyNames are used,
              because the other technology libraries have been removed from self.libs.dicts already at __init__() and from the
              library dependency lists in get_used_libs()
         """
-        # use list() to take local copy, to avoid next that default empty list argument arg_include_ip_libs=[] gets disturbed
-        include_ip_libs = list(arg_include_ip_libs)
-
-        if lib_name in self.lib_names:
-            all_use_libs = [lib_name]
-            lib_dict = self.libs.dicts[self.lib_names.index(lib_name)]
-            use_libs, include_ip_libs = self.get_used_libs(build_type, lib_dict, include_ip_libs)
-
-            for use_lib in use_libs:
-                if use_lib not in all_use_libs:
-                    all_use_libs.append(use_lib)
-                    # use recursion to include all used libs
-                    all_use_libs += self.derive_all_use_libs(build_type, use_lib, include_ip_libs)
-            # remove all duplicates from the list
-            return cm.unique(all_use_libs)
-        else:
-
+        if lib_name not in self.lib_names:
             print(self.lib_names)
-
             sys.exit('Error : Unknown HDL library name %s in %s()' % (lib_name, cm.method_name()))
 
+        # Update self.removed_lib_names for this build_type and top level include_ip_libs
+        lib_dict = self.libs.dicts[self.lib_names.index(lib_name)]
+        self.get_used_libs(build_type, lib_dict, list(arg_include_ip_libs))
+
+        graph = self.get_dependency_graph()
+        cache = self._dep_all_use_libs.setdefault(build_type, {})
+        busy = []   # libraries on the current path, to report dependency cycles
+
+        def closure(name):
+            if name in cache:
+                return cache[name]
+            if name not in graph:
+                print(self.lib_names)
+                sys.exit('Error : Unknown HDL library name %s in %s()' % (name, 'derive_all_use_libs'))
+            if name in busy:
+                sys.exit('Error : HDL library dependency cycle %s' % ' -> '.join(busy[busy.index(name):] + [name]))
+            busy.append(name)
+            all_use_libs = collections.OrderedDict([(name, None)])
+            for use_lib in graph[name]:
+                if use_lib not in all_use_libs:
+                    all_use_libs.update((l, None) for l in closure(use_lib))
+            busy.pop()
+            cache[name] = list(all_use_libs)
+            return cache[name]
 
-
-
-
-
+        # return a copy, so the caller can not modify the cached list
+        return list(closure(lib_name))
 
 
     def derive_lib_order(self, build_type, lib_name, lib_names=None):
         """Derive the dependency order for all HDL libraries in lib_names that HDL library lib_name depends on.
+
+           Used libraries come before the libraries that use them, so lib_name is last. The order is a topological sort
+           (Kahn's algorithm) of the dependency graph restricted to lib_names, where of the libraries that are ready the one
+           that comes first in lib_names is taken first. A dependency cycle is reported as an error.
         """
+        key = (build_type, lib_name)
         if lib_names==None:
             # At first entry derive the list of all HDL libraries that lib_name depends on
             lib_names = self.derive_all_use_libs(build_type, lib_name)
-
-        # Derive the order of all HDL libraries that lib_name depends on, start with the order of lib_names
-        lib_dicts = self.libs.get_dicts('hdl_lib_name', values=lib_names)
-        # use list() to take local copy to avoid modifying list order of self.lib_names which matches self.libs.dicts list order
-        lib_order = list(lib_names)
-
-        for lib_dict in cm.listify(lib_dicts):
-            lib_name = lib_dict['hdl_lib_name']
-            use_libs, _ = self.get_used_libs('', lib_dict, [])
-            for use_lib in use_libs:
-                if use_lib in lib_names:
-                    if lib_order.index(use_lib) > lib_order.index(lib_name):
-                        lib_order.remove(use_lib)
-                        lib_order.insert(lib_order.index(lib_name), use_lib)  # move used lib to just before this lib
-        # use recursion to keep on reordering the lib_order until it is stable
-        if lib_names != lib_order:
-            lib_order = self.derive_lib_order(build_type, lib_name, lib_order)
+            if key in self._dep_lib_order:
+                return list(self._dep_lib_order[key])
+        else:
+            key = None
+
+        graph = self.get_dependency_graph()
+        position = dict((name, k) for k, name in enumerate(lib_names))
+        nof_uses = dict((name, 0) for name in lib_names)
+        users = dict((name, []) for name in lib_names)
+        for name in lib_names:
+            for use_lib in graph.get(name, []):
+                if use_lib in position and use_lib != name:
+                    nof_uses[name] += 1
+                    users[use_lib].append(name)
+
+        ready = [position[name] for name in lib_names if nof_uses[name]==0]
+        heapq.heapify(ready)
+        lib_order = []
+        while ready:
+            name = lib_names[heapq.heappop(ready)]
+            lib_order.append(name)
+            for user in users[name]:
+                nof_uses[user] -= 1
+                if nof_uses[user]==0:
+                    heapq.heappush(ready, position[user])
+
+        if len(lib_order) != len(lib_names):
+            cycle_libs = [name for name in lib_names if nof_uses[name] > 0]
+            sys.exit('Error : HDL library dependency cycle between %s in %s()' % (' '.join(cycle_libs), cm.method_name()))
+        if key is not None:
+            self._dep_lib_order[key] = list(lib_order)
         return lib_order
 
 
@@ -595,8 +651,10 @@ class HdlConfig:
         if is_fpga:
             fpga_bus = gen_bus.Bus(self.fpga_libs[args_lib_name]['fpga'])
             gen_fpgamap_py.genPython(self.fpga_libs[args_lib_name], args_lib_name, True)
+            gen_fpgamap_py.genCompactPython(self.fpga_libs[args_lib_name], args_lib_name)
             out_dir = os.path.expandvars('$HDL_BUILD_DIR/ARGS/{}/'.format(args_lib_name))
             gen_c_config.gen_c_config(self.fpga_libs[args_lib_name], args_lib_name, out_dir)
+            gen_transfer_plan.gen_transfer_plan(self.fpga_libs[args_lib_name], args_lib_name, out_dir)
             output_files.extend(fpga_bus.gen_firmware())
 
         for component_name, peripheral in peripherals.items():
@@ -674,6 +732,7 @@ class HdlParseArgs:
         argparser.add_argument('-ip', required=False, action='store_true', default=False, help='Generate simulation files for technology libraries')
         argparser.add_argument('-v','--verbosity', required=False, type=int, default=0, help='verbosity >= 0 for more info')
         argparser.add_argument('-a','--args', required=False, action='store_true', default=False, help='Run ARGS code generation only (do not create a new project)')
+        argparser.add_argument('-j','--jobs', required=False, type=int, default=1, help='number of simulations or runs to execute in parallel (default: 1)')
         args = vars(argparser.parse_args())
 
         # Keep the argparser for external access of e.g. print_help
@@ -691,6 +750,7 @@ class HdlParseArgs:
         self.argsOnly = args['args']
         self.project = args['project']
         self.ip = args['ip']
+        self.jobs = max(1, args['jobs'])
 
         if self.toolset not in toolsetSelect:
             print("Toolset {} is not supported".format(self.toolset))
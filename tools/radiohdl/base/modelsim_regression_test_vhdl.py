@@ -43,10 +43,32 @@
    directory of the HDL library. From the log files the regression test also
    reports a pass/fail result summary in modelsim_regression_test_vhdl.log.
 
+   --jobs:
+   With --jobs N > 1 up to N test benches are simulated in parallel. First all
+   libraries are compiled one after another using a <lib_name>_mk_all.do file,
+   then the test bench do files are run without 'mk all'. The test benches of
+   a library that did not compile are reported as failed without simulating
+   them. Each test bench writes its transcript and vsim.wlf to its own
+   <mpf_path>/regression_test_vhdl/<tb_name> directory. The test benches of
+   one library share the project (mpf and work library), so they are still
+   simulated one after another, only test benches of different libraries run
+   in parallel. The test benches are started longest first, using the
+   durations of the previous run. The report.html rows are written as the
+   test benches finish.
+
+   Timing history:
+   The wall time, simulated time, peak RSS and transcript size of every test
+   bench are appended to $HDL_BUILD_DIR/Reports/tb_history.jsonl. The report
+   and the log list the test benches that became slower than the median of
+   their last regression_history.NOF_RUNS passed runs with the same --jobs
+   (see regression_history.py).
+
 """
 
 import common as cm
 import hdl_config
+import regression_history
+import modelsim_transcript
 import modelsim_config
 import sys
 import subprocess
@@ -57,6 +79,8 @@ import time
 import datetime
 import platform
 import shutil
+import io
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 ###############################################################################
 # Parse command line arguments
@@ -144,22 +168,39 @@ for lib_dict in cm.listify(test_dicts):
     cm.mkdir(do_path)                                                     # mkdir <mpf_path>/regression_test_vhdl, if it does not exist yet
     for rm in glob.glob(os.path.join(do_path, '*.do')): os.remove(rm)     # rm <mpf_path>/regression_test_vhdl/*.do
     for rm in glob.glob(os.path.join(do_path, '*.log')): os.remove(rm)    # rm <mpf_path>/regression_test_vhdl/*.log
+    if hdl_args.jobs>1:
+        # Compile the library once before the test benches are simulated in parallel
+        with open(os.path.join(do_path, lib_name + '_mk_all.do'), 'w') as fp:
+            fp.write('# Created by modelsim_regression_test_vhdl.py\n')
+            fp.write('do $env(RADIOHDL)/tools/modelsim/commands.do\n')
+            fp.write('echo ">>> PROJECT LOAD %s"\n' % lib_name)
+            fp.write('lp %s\n' % lib_name)
+            fp.write('echo ">>> PROJECT MAKE %s"\n' % lib_name)
+            # Exit with an error code when the compilation fails, so the test benches of this library are not simulated
+            fp.write('onerror {quit -code 1}\n')
+            fp.write('mk all\n')
+            fp.write('quit\n')
     test_bench_files = lib_dict['regression_test_vhdl'].split()
     for tbf in test_bench_files:
         tbf_name = os.path.basename(tbf)
         tb_name = os.path.splitext(tbf_name)[0]
         do_name = tb_name + '.do'
         doPathName = os.path.join(do_path, do_name)
+        work_path = os.path.join(do_path, tb_name)
+        cm.mkdir(work_path)                                               # mkdir <mpf_path>/regression_test_vhdl/<tb_name> for the transcript and wlf
         # Write separate do file for each test bench in the VHDL regression test of this library
         with open(doPathName, 'w') as fp:
             fp.write('# Created by modelsim_regression_test_vhdl.py\n')
             fp.write('do $env(RADIOHDL)/tools/modelsim/commands.do\n')
             fp.write('echo ">>> PROJECT LOAD %s"\n' % lib_name)
             fp.write('lp %s\n' % lib_name)
-            fp.write('echo ">>> PROJECT MAKE %s"\n' % lib_name)
-            fp.write('mk all\n')
+            # lp opens the project, which moves the transcript to the project directory, so put it back in the tb work directory
+            fp.write('transcript file %s\n' % os.path.join(work_path, 'transcript').replace('\\', '/'))
+            if hdl_args.jobs==1:
+                fp.write('echo ">>> PROJECT MAKE %s"\n' % lib_name)
+                fp.write('mk all\n')
             fp.write('echo ">>> SIMULATION LOAD %s"\n' % tb_name)
-            fp.write('vsim ')
+            fp.write('vsim -wlf %s ' % os.path.join(work_path, 'vsim.wlf').replace('\\', '/'))
             for other_arg in project_sim_p_otherargs:
                 fp.write('%s ' % other_arg)
             for search_lib in project_sim_p_search_libraries:
@@ -191,9 +232,9 @@ for lib_dict in cm.listify(test_dicts):
 # Remarks on subprocess:
 # . Use shell=True to be able to pass on the entire CLI command and have environment variable and wildcard expansion.
 # . Use call to run the CLI command and capture the exit code and avoid that Python breaks with CalledProcessError on exit code > 0.
-# . Exit code 0 is ok, exit code > 0 is some error, but for 'egrep' exit 1 means that no match was found for the expression.
-# . If 'egrep' has exit 0 then a match was found for the expression and then check_output can be used to capture the match.
-# . An alternative scheme is to use try-except subprocess.CalledProcessError to handle exit code > 0.
+# . Exit code 0 is ok, exit code > 0 is some error.
+# . The transcript is not checked with egrep/findstr subprocesses, but scanned once in Python by modelsim_transcript.py, which
+#   also archives it. This avoids reading large transcripts several times and avoids the platform specific commands.
 
 # Remarks using tb_end <='1' to end a simulation
 # . The tb_end is or-ed with the clocks, so tb_end <='1' stops all toggling and this ends the tb (see any tb, e.g. tb_dp_split.vhd)
@@ -239,6 +280,86 @@ for lib_dict in cm.listify(test_dicts):
 #           --   the memory and CPU times used in simulation
 #           -- Other STATUS values are interpreted as 0.
 
+def tb_key(lib_name, tb_name):
+    return lib_name + '.' + tb_name
+
+def run_test(test):
+    """Simulate the do file of one tb, return the vsim exit code, the wall time in seconds and the resource usage.
+
+       The resource usage is obtained with os.wait4, so it covers the shell and vsim of this tb only. It is None
+       on platforms without os.wait4.
+    """
+    print(test['vsim_cmd'])
+    tic = time.time()
+    if hasattr(os, 'wait4'):
+        proc = subprocess.Popen(test['vsim_cmd'], shell=True)
+        _, wait_status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = call_status = os.waitstatus_to_exitcode(wait_status)
+    else:
+        call_status = subprocess.call(test['vsim_cmd'], shell=True)
+        rusage = None
+    return call_status, time.time()-tic, rusage
+
+def check_test(test, call_status, rp):
+    """Check the transcript of a tb that has finished, keep the log text in test['log'] and write the result to the report.
+
+       The transcript is scanned once by modelsim_transcript.scan_transcript(), which also archives it gzip compressed
+       as <lib_name>.<tb_name>.log.gz in the report directory. Return 1 when the tb failed, else 0. The result cell in
+       the report is left open when the tb failed.
+    """
+    lib_name = test['lib_name']
+    fp = io.StringIO()
+    f=0
+
+    if test.get('mk_failed'):
+        fp.write('> Error occured while compiling library %s, see %s.mk_all.stdout.log\n' % (lib_name, lib_name))
+        rp.write('<td class="failed">LIB did not compile')
+        f=1
+    elif call_status==0:
+        # Keep the transcript file compressed in the report directory and check it in the same pass
+        result = modelsim_transcript.scan_transcript(test['transcriptPathName'], test['doLogPathName'] + '.gz')
+        test['log_bytes'] = result.nof_bytes if result.found else None
+        # Check that the library compiled and the simulation ran
+        if not result.finished():
+            fp.write('Error occured while running vcom or -label for %s\n' % lib_name)
+            rp.write('<td class="failed">TB did not finish')
+            f=1
+        else:
+            # Log the simulation run time
+            fp.write('%s' % result.sim_end_text())
+            test['sim_ns'] = regression_history.parse_sim_time(result.sim_end[-1])
+            # Log the simulation Errors if they occured
+            if len(result.errors)>0:
+                sim_msg = result.errors_text()
+                fp.write('\n\nERRORS and WARNINGS:\n' )
+                fp.write('%s\n' % sim_msg)
+                rp.write('<td class="failed"><span title="%s">assert: ERROR</span>' % sim_msg)
+                f=1
+            # Log the simulation Failures if they occured
+            if len(result.failures)>0:
+                if f==1:
+                    rp.write('<br/>')
+                else:
+                    rp.write('<td class="failed">')
+                fp.write('\nFAILURE MESSAGES:\n' )
+                sim_msg = result.failures_text()
+                fp.write('%s\n\n' % sim_msg)
+                rp.write('<span title="%s">assert: FAILURE</span>' % sim_msg)
+                f=1
+            # Log where the asserts occured
+            if f==1 and len(result.asserts)>0:
+                fp.write('ASSERT LOCATIONS:\n')
+                fp.write('%s\n' % result.asserts_text())
+    else:
+        fp.write('> Error occured while calling: %s\n' % test['vsim_cmd'])
+        if test.get('error'):
+            fp.write('> %s\n' % test['error'])
+        rp.write('<td class="failed">VSIM did not run')
+        f=1
+    test['log'] = fp.getvalue()
+    return f
+
+
 if hdl_args.run:
 
     #Report Summary Directory:
@@ -256,7 +377,6 @@ if hdl_args.run:
         quit()
 
     start_time = time.time()
-    prev_time = start_time;
     # Put modelsim_regression_test_vhdl.log file in tool build dir
     build_main_dir, build_toolset_dir, build_tool_dir = msim.get_tool_build_dir('sim')
     logFileName='modelsim_regression_test_vhdl.log'
@@ -265,10 +385,71 @@ if hdl_args.run:
     reportFileNamePath=os.path.join(myReportPath, reportFileName)
     summaryFileName='summary.html'
     summaryFileNamePath=os.path.join(summaryPath, summaryFileName)
+    historyFileNamePath=os.path.join(summaryPath, regression_history.HISTORY_FILE_NAME)
     totalNofTb = 0           # total number of tb in regression test
     totalNofFailed = 0       # total number of tb in regression test that failed
     failList = ""
 
+    # Derive the do file names from the HDL library 'regression_test_vhdl' key
+    lib_tests = []           # per HDL library: (lib_name, mpf_path, do_path, list of tb test dicts)
+    tests = []               # all tb test dicts in regression test
+    for lib_dict in cm.listify(test_dicts):
+        lib_name = lib_dict['hdl_lib_name']
+        mpf_path = msim.get_lib_build_dirs('sim', lib_dicts=lib_dict)
+        do_path = os.path.join(mpf_path, do_subdir)
+        lib_tb = []
+        test_bench_files = lib_dict['regression_test_vhdl'].split()
+        for tbf in test_bench_files:
+            tbf_name = os.path.basename(tbf)
+            tb_name = os.path.splitext(tbf_name)[0]
+            doPathName = os.path.join(do_path, tb_name + '.do')
+            work_path = os.path.join(do_path, tb_name)
+            stdout_name = lib_name+'.'+tb_name+'.'+'stdout.log'
+            stdout_path = os.path.join(myReportPath, stdout_name)
+            # Simulate the do file with Modelsim in the tb work directory, so the transcript is kept per tb
+            if platform.system().lower() == "windows":
+                 vsim_cmd = 'cd %s & run_modelsim.cmd %s %s > %s' % (work_path, hdl_args.toolset, doPathName, stdout_path)
+            else:
+                 vsim_cmd = 'cd %s; vsim -c -do %s > %s' % (work_path, doPathName, stdout_path)
+            test = {'key': tb_key(lib_name, tb_name),
+                    'lib_name': lib_name,
+                    'tb_name': tb_name,
+                    'mpf_path': mpf_path,
+                    'vsim_cmd': vsim_cmd,
+                    'transcriptPathName': os.path.join(work_path, 'transcript'),
+                    'doLogPathName': os.path.join(myReportPath, lib_name + '.' + tb_name + '.log'),
+                    'stdout_name': stdout_name,
+                    'log': '',
+                    'run_time': 0.0,
+                    'sim_ns': None,
+                    'peak_rss_kb': None,
+                    'log_bytes': None}
+            lib_tb.append(test)
+            tests.append(test)
+        lib_tests.append((lib_name, mpf_path, do_path, lib_tb))
+
+    # With parallel simulation first compile each library once, to avoid that the tb do files compile the same library concurrently
+    if hdl_args.jobs>1:
+        for lib_name, mpf_path, do_path, lib_tb in lib_tests:
+            if len(lib_tb)>0:
+                mkPathName = os.path.join(do_path, lib_name + '_mk_all.do')
+                mk_stdout_path = os.path.join(myReportPath, lib_name + '.mk_all.stdout.log')
+                if platform.system().lower() == "windows":
+                    mk_cmd = 'cd %s & run_modelsim.cmd %s %s > %s' % (mpf_path, hdl_args.toolset, mkPathName, mk_stdout_path)
+                else:
+                    mk_cmd = 'cd %s; vsim -c -do %s > %s' % (mpf_path, mkPathName, mk_stdout_path)
+                print(mk_cmd)
+                if subprocess.call(mk_cmd, shell=True)!=0:
+                    print('> Error occured while compiling library %s, its test benches are not simulated' % lib_name)
+                    for test in lib_tb:
+                        test['mk_failed'] = True
+
+    # Start the longest tb first, using the durations of previous runs. A tb without known duration is assumed to be long.
+    tbHistory = regression_history.read_history(historyFileNamePath)
+    tbDurations = regression_history.last_durations(tbHistory)
+    if hdl_args.jobs>1:
+        tests.sort(key=lambda test: -tbDurations.get(test['key'], float('inf')))
+
     # Open the log file and run the test bench do files
     with open(logFileNamePath, 'w') as fp:
         with open(reportFileNamePath, 'w') as rp:
@@ -280,119 +461,92 @@ if hdl_args.run:
             rp.write('<body><center>\n')
             rp.write('<h1>Regression Test - %s </h1>\n' % myTime)
             rp.write('<table border=1>\n<tr><th>LIB</th><th>MODULE</th><th>RESULT</th><th>OUTPUT</th></tr>\n')
-            for lb, lib_dict in enumerate(cm.listify(test_dicts)):
-                # Derive the do file names from the HDL library 'regression_test_vhdl' key
-                lib_name = lib_dict['hdl_lib_name']
-                fp.write('# %d: %s\n' % (lb, lib_name))
-                nofTb = 0           # number of tb in regression test for this HDL library
-                mpf_path = msim.get_lib_build_dirs('sim', lib_dicts=lib_dict)
-                transcriptPathName = os.path.join(mpf_path, 'transcript')
-                do_path = os.path.join(mpf_path, do_subdir)
-                test_bench_files = lib_dict['regression_test_vhdl'].split()
-                for tbf in test_bench_files:
-                    tbf_name = os.path.basename(tbf)
-                    tb_name = os.path.splitext(tbf_name)[0]
-                    doName = tb_name + '.do'
-                    doPathName = os.path.join(do_path, doName)
-                    doLogName = lib_name + '.' + tb_name + '.log'
-                    doLogPathName = os.path.join(myReportPath, doLogName)
-                    stdout_name = os.path.join(lib_name+'.'+tb_name+'.'+'stdout.log')
-                    stdout_path = os.path.join(myReportPath, stdout_name)
-
-
-                    rp.write('<tr>')
-                    rp.write('<td>%s</td>' % lib_name)
-                    rp.write('<td><span title="%s">%s</span></td>' % (mpf_path, tb_name))
-
-                    # Simulate the do file with Modelsim
-                    if platform.system().lower() == "windows":
-                         vsim_cmd = 'cd %s & run_modelsim.cmd %s %s > %s' % (mpf_path, hdl_args.toolset, doPathName, stdout_path)
-                    else:
-                         vsim_cmd = 'cd %s; vsim -c -do %s > %s' % (mpf_path, doPathName, stdout_path)
-
-                    print(vsim_cmd)
-
-                    call_status = subprocess.call(vsim_cmd, shell=True)
-                    nofTb += 1
-                    f=0
-
-                    if call_status==0:
-                        # Keep the transcript file in the library build directory
-                        if platform.system().lower() == "windows":
-                            subprocess.call("copy %s %s" % (transcriptPathName, doLogPathName), shell=True)
-                        else:
-                            subprocess.call("cp %s %s" % (transcriptPathName, doLogPathName), shell=True)
-                        # Check that the library compiled and the simulation ran (use try-except to handle exit code > 0)
-                        try:
-                            if platform.system().lower() == "windows":
-                                sim_end = subprocess.check_output("findstr /C:\">>> SIMULATION END\" %s" % transcriptPathName, shell=True)
-                            else:
-                                sim_end = subprocess.check_output("egrep '>>> SIMULATION END' %s" % transcriptPathName, shell=True)
-                        except subprocess.CalledProcessError:
-                            fp.write('Error occured while running vcom or -label for %s\n' % lib_name)
-                            rp.write('<td class="failed">TB did not finish')
-                            f=1
+            for lib_name, mpf_path, do_path, lib_tb in lib_tests:
+                if len(lib_tb)==0:
+                    rp.write('<tr><td class="grey">%s</td><td class="grey">---</td><td class="grey">no tb</td><td class="grey"></td></tr>\n' % lib_name)
+            rp.flush()
+
+            # Run up to hdl_args.jobs tb at a time and report each tb as soon as it has finished. The tb of one library
+            # share the project, so at most one tb per library is running. The tb of a library that did not compile are
+            # reported right away.
+            pending = [test for test in tests if not test.get('mk_failed')]
+            finished = [(test, None) for test in tests if test.get('mk_failed')]
+            running = {}             # future : test
+            with ThreadPoolExecutor(max_workers=hdl_args.jobs) as pool:
+                while pending or running or finished:
+                    busy_libs = set(test['lib_name'] for test in running.values())
+                    for test in list(pending):
+                        if len(running)>=hdl_args.jobs:
+                            break
+                        if test['lib_name'] not in busy_libs:
+                            pending.remove(test)
+                            busy_libs.add(test['lib_name'])
+                            running[pool.submit(run_test, test)] = test
+                    if running and not finished:
+                        done, _ = wait(running, return_when=FIRST_COMPLETED)
+                        finished = [(running.pop(future), future) for future in done]
+
+                    for test, future in finished:
+                        call_status, rusage = None, None
+                        if future is not None:
+                            try:
+                                call_status, test['run_time'], rusage = future.result()
+                            except Exception as e:
+                                test['error'] = 'Exception while simulating %s: %s' % (test['key'], e)
+                                print('> %s' % test['error'])
+                        test['peak_rss_kb'] = regression_history.peak_rss_kbytes(rusage)
+
+                        rp.write('<tr>')
+                        rp.write('<td>%s</td>' % test['lib_name'])
+                        rp.write('<td><span title="%s">%s</span></td>' % (test['mpf_path'], test['tb_name']))
+                        f = check_test(test, call_status, rp)
+                        totalNofFailed += f
+
+                        if f==1:
+                            rp.write('</td>')
+                            failList += test['lib_name'] + ": " + test['tb_name'] + "\n"
                         else:
-                            # Log the simulation run time
-                            fp.write('%s' % str(sim_end, 'utf-8'))
-                            # Log the simulation Errors if they occured (use subprocess.call-subprocess.check_output to handle exit code > 0)
-
-                            if platform.system().lower() == "windows":
-                                grep_cmd = "findstr /V /C:\"Errors: 0,\" %s | findstr /V /C:\"Expected Error\" | findstr /C:\"Error\"" % transcriptPathName
-                            else:
-                                grep_cmd = "grep -v 'Errors: 0,' %s | grep -v 'Expected Error' | egrep 'Error'" % transcriptPathName
-
-                            grep_status = subprocess.call(grep_cmd, shell=True)
-                            if grep_status==0:
-                                sim_msg = subprocess.check_output(grep_cmd, shell=True)
-                                fp.write('\n\nERRORS and WARNINGS:\n' )
-                                fp.write('%s\n' % str(sim_msg, 'utf-8'))
-                                rp.write('<td class="failed"><span title="%s">assert: ERROR</span>' % str(sim_msg, 'utf-8'))
-                                f=1
-                            # Log the simulation Failures if they occured (use subprocess.call-subprocess.check_output to handle exit code > 0)
-
-                            if platform.system().lower() == "windows":
-                                grep_cmd = "findstr /V /C:\"Expected Error\" %s | findstr \"Failure\"" % transcriptPathName
-                            else:
-                                grep_cmd = "grep -v 'Expected Error' %s | egrep -A2 'Failure'" % transcriptPathName
-
-                            grep_status = subprocess.call(grep_cmd, shell=True)
-                            if grep_status==0:
-                                if f==1:
-                                    rp.write('<br/>')
-                                else:
-                                    rp.write('<td class="failed">')
-                                fp.write('\nFAILURE MESSAGES:\n' )
-                                sim_msg = subprocess.check_output(grep_cmd, shell=True)
-                                fp.write('%s\n\n' % str(sim_msg, 'utf-8'))
-                                rp.write('<span title="%s">assert: FAILURE</span>' % str(sim_msg, 'utf-8'))
-                                f=1
-                    else:
-                        fp.write('> Error occured while calling: %s\n' % vsim_cmd)
-                        rp.write('<td class="failed">VSIM did not run')
-                        f=1
-                    totalNofFailed += f
-
-                    if f==1:
-                        rp.write('</td>')
-                        failList += lib_name + ": " + tb_name + "\n"
-                    else:
-                        rp.write('<td class="passed">PASSED</td>')
-                    rp.write('<td><a href="./%s">stdout.log</a></td></tr>\n' % stdout_name)
+                            rp.write('<td class="passed">PASSED</td>')
+                        rp.write('<td><a href="./%s">stdout.log</a></td></tr>\n' % test['stdout_name'])
+                        rp.flush()
+                        test['passed'] = f==0
+                    finished = []
+
+            # Keep the tb timing in the history and compare it with the previous runs
+            tbRecords = [{'run': myTime,
+                          'lib': test['lib_name'],
+                          'tb': test['tb_name'],
+                          'passed': test['passed'],
+                          'jobs': hdl_args.jobs,
+                          'wall_s': round(test['run_time'], 1),
+                          'sim_ns': test['sim_ns'],
+                          'peak_rss_kb': test['peak_rss_kb'],
+                          'log_bytes': test['log_bytes']} for lib_name, mpf_path, do_path, lib_tb in lib_tests for test in lib_tb]
+            regression_history.append_history(historyFileNamePath, tbRecords)
+            tbReport = regression_history.slowdown_report(tbHistory + tbRecords, run=myTime)
+
+            # Log the results per HDL library in regression test order
+            for lb, (lib_name, mpf_path, do_path, lib_tb) in enumerate(lib_tests):
+                fp.write('# %d: %s\n' % (lb, lib_name))
+                for test in lib_tb:
+                    fp.write(test['log'])
                 # Maintain count of total number of test benches
+                nofTb = len(lib_tb)
                 totalNofTb += nofTb
-                # Measure regression test time for this HDL library
-                cur_time = time.time()
-                run_time = cur_time-prev_time
-                prev_time = cur_time;
                 if nofTb==0:
-                    rp.write('<tr><td class="grey">%s</td><td class="grey">---</td><td class="grey">no tb</td><td class="grey"></td></tr>\n' % lib_name)
                     fp.write('# HDL library %s has zero testbenches for regression test.\n' % lib_name)
                     fp.write('#\n')
                 else:
+                    # Sum of the tb simulation times for this HDL library
+                    run_time = sum([test['run_time'] for test in lib_tb])
                     fp.write('# Test duration for library %s: %.1f seconds\n' % (lib_name, run_time))
                     fp.write('#\n')
 
+            # Log the tb timing versus the median of the previous runs
+            for line in regression_history.format_report(tbReport):
+                fp.write('# %s\n' % line)
+            fp.write('#\n')
+
             fp.write('# Regression test summary:\n')
 
             end_time = time.time()
@@ -410,10 +564,26 @@ if hdl_args.run:
                 mySummaryLine = ('<tr><td><a href="%s">%s</a></td><td>%s</td><td class="failed"><span title="%s">%d / %d FAILED</span></td><td><a href="%s">%s</a></td></tr>\n' % (os.path.join(myTime, reportFileName), myTime, datetime.timedelta(seconds=run_time), failList, totalNofFailed, totalNofTb, os.path.join(myTime, logFileName), logFileName))
 
             rp.write('</table>\n')
+            rp.write('<h2>Test bench timing versus median of last %d runs</h2>\n' % regression_history.NOF_RUNS)
+            rp.write('<table border=1>\n<tr><th>LIB</th><th>MODULE</th><th>WALL [s]</th><th>MEDIAN [s]</th><th>RATIO</th><th>SIM TIME [ns]</th><th>PEAK RSS [MB]</th><th>LOG [kB]</th></tr>\n')
+            for lib_name, entries in tbReport.items():
+                for e in entries:
+                    rp.write('<tr><td>%s</td><td>%s</td><td>%s</td><td>%s</td><td class="%s">%s</td><td>%s</td><td>%s</td><td>%s</td></tr>\n' % (lib_name, e['tb'],
+                             regression_history.format_value(e['wall_s'], '%.1f'),
+                             regression_history.format_value(e['median_s'], '%.1f'),
+                             'failed' if e['slow'] else 'passed',
+                             regression_history.format_value(e['ratio'], '%.2f'),
+                             regression_history.format_value(e['sim_ns'], '%.0f'),
+                             regression_history.format_value(e['peak_rss_kb'] and e['peak_rss_kb'] / 1024.0, '%.0f'),
+                             regression_history.format_value(e['log_bytes'] and e['log_bytes'] / 1024.0, '%.0f')))
+            rp.write('</table>\n')
             rp.write('</center>\n</body>\n</html>\n\n\n')
 
             # Log total test time
             fp.write('# Email MESSAGE: Total regression test duration in days,h:m:s = %s\n' % datetime.timedelta(seconds=run_time))
+            slowList = regression_history.slow_test_benches(tbReport)
+            if len(slowList)>0:
+                fp.write('# Email MESSAGE: %d VHDL test benches became slower: %s\n' % (len(slowList), ', '.join(slowList)))
             fp.write('# Email LOG: %s\n' % logFileNamePath)
 
 
@@ -0,0 +1,201 @@
+#! /usr/bin/env python
+###############################################################################
+#
+# Copyright (C) 2026
+# CSIRO (Commonwealth Scientific and Industrial Research Organization) <http://www.csiro.au/>
+# GPO Box 1700, Canberra, ACT 2601, Australia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#   Author           Date      Version comments
+#   Low CBF          Oct 2026  Original
+#
+###############################################################################
+
+"""Single pass scanner for Modelsim simulation transcripts.
+
+   The scan_transcript() reads a transcript once and collects what the VHDL
+   regression test checks, equivalent to the previous grep commands:
+
+   . sim_end  : lines with '>>> SIMULATION END'
+                (egrep '>>> SIMULATION END')
+   . errors   : lines with 'Error', except 'Errors: 0,' and 'Expected Error' lines
+                (grep -v 'Errors: 0,' | grep -v 'Expected Error' | egrep 'Error')
+   . failures : lines with 'Failure' and the 2 lines after it, groups separated by '--',
+                except 'Expected Error' lines
+                (grep -v 'Expected Error' | egrep -A2 'Failure')
+   . asserts  : the Modelsim '** Error', '** Failure' and '** Fatal' reports with their
+                simulation time, process or instance and source file and line
+
+   While reading, the transcript can also be written to a gzip compressed
+   archive file, so copying the transcript does not need another pass.
+
+   Usage:
+   > python $RADIOHDL/tools/radiohdl/base/modelsim_transcript.py transcript
+"""
+
+import argparse
+import gzip
+import re
+import sys
+
+CHUNK_SIZE = 1024*1024
+GZIP_LEVEL = 1               # fast, transcripts compress well even at the lowest level
+FAILURE_CONTEXT = 2          # number of lines after a Failure line, like egrep -A2
+
+KEYS = (b'Error', b'Failure', b'Fatal', b'>>> ')
+
+RE_ASSERT = re.compile(r'\*\* (Error|Failure|Fatal)(?: \(suppressible\))?: ?(.*)')
+RE_TIME = re.compile(r'Time: (.+?)\s+Iteration: (\d+)(?:\s+(?:Process|Instance|Region): (\S+))?(?:\s+File: (\S+))?(?:\s+Line: (\d+))?')
+RE_BREAK = re.compile(r'(?:Break|Stopped) in \S+ \S+ at (\S+) line (\d+)')
+
+
+class TranscriptResult:
+    """Structured result of scan_transcript()"""
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.found = False      # False when the transcript file does not exist
+        self.nof_lines = 0
+        self.nof_bytes = 0
+        self.sim_end = []       # '>>> SIMULATION END' lines
+        self.errors = []        # 'Error' lines
+        self.failures = []      # 'Failure' lines with context
+        self.asserts = []       # dicts with 'severity', 'message', 'time', 'iteration', 'scope', 'file', 'line'
+
+    def finished(self):
+        return len(self.sim_end) > 0
+
+    def sim_end_text(self):
+        return ''.join(line + '\n' for line in self.sim_end)
+
+    def errors_text(self):
+        return ''.join(line + '\n' for line in self.errors)
+
+    def failures_text(self):
+        return ''.join(line + '\n' for line in self.failures)
+
+    def asserts_text(self):
+        lines = []
+        for a in self.asserts:
+            location = a['scope'] or ''
+            if a['file'] is not None:
+                location += ' (%s line %s)' % (a['file'], a['line'] if a['line'] is not None else '?')
+            lines.append(('%s at %s: %s %s' % (a['severity'], a['time'] or '?', a['message'], location)).rstrip() + '\n')
+        return ''.join(lines)
+
+
+def read_blocks(fp, archive=None):
+    """Yield blocks of whole lines of binary file fp, read in chunks and copied to archive when it is not None."""
+    rest = b''
+    while True:
+        chunk = fp.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        if archive is not None:
+            archive.write(chunk)
+        block = rest + chunk
+        end = block.rfind(b'\n') + 1
+        rest = block[end:]
+        if end > 0:
+            yield block[:end]
+    if rest:
+        yield rest + b'\n'
+
+
+def scan_transcript(fileName, archiveFileName=None):
+    """Scan the transcript file in one pass and return a TranscriptResult.
+
+       When archiveFileName is given, then the transcript is also written gzip compressed to archiveFileName.
+    """
+    result = TranscriptResult(fileName)
+    try:
+        fp = open(fileName, 'rb')
+    except IOError:
+        return result
+    result.found = True
+    archive = gzip.open(archiveFileName, 'wb', compresslevel=GZIP_LEVEL) if archiveFileName is not None else None
+    try:
+        context = 0             # remaining number of Failure context lines
+        last_failure = -1       # index of the last line that was added to failures
+        index = -1              # index of line in the lines without 'Expected Error'
+        pending = None          # last assert that has no location yet
+        for block in read_blocks(fp, archive):
+            nof_lines = block.count(b'\n')
+            result.nof_lines += nof_lines
+            if context == 0 and pending is None and not any(key in block for key in KEYS):
+                # Most blocks have no lines of interest, so skip them without splitting into lines
+                index += nof_lines
+                continue
+            for raw in block[:-1].split(b'\n'):
+                if context == 0 and pending is None and not any(key in raw for key in KEYS):
+                    index += 1
+                    continue
+                line = raw.decode('utf-8', errors='replace').rstrip('\r')
+                if '>>> SIMULATION END' in line:
+                    result.sim_end.append(line)
+                if 'Expected Error' in line:
+                    continue
+                index += 1
+                if 'Error' in line and 'Errors: 0,' not in line:
+                    result.errors.append(line)
+                if 'Failure' in line:
+                    if last_failure >= 0 and index > last_failure + 1:
+                        result.failures.append('--')
+                    result.failures.append(line)
+                    last_failure = index
+                    context = FAILURE_CONTEXT
+                elif context > 0:
+                    result.failures.append(line)
+                    last_failure = index
+                    context -= 1
+                mo = RE_ASSERT.search(line)
+                if mo is not None:
+                    pending = {'severity': mo.group(1), 'message': mo.group(2).strip(), 'time': None, 'iteration': None, 'scope': None, 'file': None, 'line': None}
+                    result.asserts.append(pending)
+                elif pending is not None:
+                    mo = RE_TIME.search(line)
+                    if mo is not None:
+                        pending['time'], pending['iteration'], pending['scope'], pending['file'], pending['line'] = mo.groups()
+                        if pending['file'] is not None and pending['line'] is not None:
+                            pending = None
+                        continue
+                    mo = RE_BREAK.search(line)
+                    if mo is not None:
+                        pending['file'], pending['line'] = mo.groups()
+                    pending = None
+        # The bytes read, the blocks have an extra newline when the transcript does not end with one
+        result.nof_bytes = fp.tell()
+    finally:
+        fp.close()
+        if archive is not None:
+            archive.close()
+    return result
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Scan a Modelsim transcript for the regression test markers, errors and failures')
+    argparser.add_argument('transcript', help='transcript file name')
+    argparser.add_argument('-a', '--archive', default=None, help='also write the transcript gzip compressed to this file')
+    args = argparser.parse_args()
+
+    result = scan_transcript(args.transcript, args.archive)
+    if not result.found:
+        sys.exit('Error : transcript %s not found' % args.transcript)
+    print('Transcript %s: %d lines, %d bytes' % (args.transcript, result.nof_lines, result.nof_bytes))
+    print('\nSIMULATION END:\n%s' % result.sim_end_text())
+    print('ERRORS:\n%s' % result.errors_text())
+    print('FAILURES:\n%s' % result.failures_text())
+    print('ASSERTS:\n%s' % result.asserts_text())
+    sys.exit(0 if result.finished() and len(result.errors) == 0 and len(result.failures) == 0 else 1)
@@ -0,0 +1,197 @@
+#! /usr/bin/env python
+###############################################################################
+#
+# Copyright (C) 2026
+# CSIRO (Commonwealth Scientific and Industrial Research Organization) <http://www.csiro.au/>
+# GPO Box 1700, Canberra, ACT 2601, Australia
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#   Author           Date      Version comments
+#   Low CBF          Oct 2026  Original
+#
+###############################################################################
+
+"""Test bench timing history of the VHDL regression test.
+
+   Each run of modelsim_regression_test_vhdl.py appends one JSON line per test
+   bench to $HDL_BUILD_DIR/Reports/tb_history.jsonl with:
+
+   . run         : run timestamp, equal to the report subdirectory name
+   . lib, tb     : HDL library name and test bench name
+   . passed      : True when the test bench passed
+   . jobs        : number of test benches simulated in parallel (--jobs)
+   . wall_s      : wall time of the vsim run in seconds
+   . sim_ns      : simulated time in ns, from '(Now = ...)' in the '>>> SIMULATION END' line
+   . peak_rss_kb : peak resident set size of vsim in kByte
+   . log_bytes   : size of the transcript in bytes
+
+   The slowdown report compares each test bench of a run with the median of the
+   same test bench in the last nof_runs earlier runs that passed with the same
+   number of jobs. Failed or aborted runs and runs that shared the machine with
+   a different number of other test benches are not comparable. Records
+   without jobs are from runs with --jobs 1.
+
+   Usage:
+   > python $RADIOHDL/tools/radiohdl/base/regression_history.py -h
+"""
+
+import argparse
+import collections
+import json
+import os.path
+import re
+import statistics
+import sys
+
+HISTORY_FILE_NAME = 'tb_history.jsonl'
+NOF_RUNS = 10                # number of earlier runs for the median
+SLOWDOWN_FACTOR = 1.2        # report a tb when wall_s >= SLOWDOWN_FACTOR * median
+SLOWDOWN_MIN_S = 5.0         # and when it is at least SLOWDOWN_MIN_S seconds slower, to ignore jitter of short tb
+
+TIME_UNIT_NS = {'fs': 1e-6, 'ps': 1e-3, 'ns': 1.0, 'us': 1e3, 'ms': 1e6, 'sec': 1e9, 's': 1e9}
+
+
+def parse_sim_time(line):
+    """Return the simulated time in ns from a '>>> SIMULATION END  <tb> (Now = <time> <unit>)' line, or None."""
+    mo = re.search(r'Now\s*=\s*\{?\s*([0-9.]+)\s*([a-z]+)', line)
+    if mo is None or mo.group(2) not in TIME_UNIT_NS:
+        return None
+    return float(mo.group(1)) * TIME_UNIT_NS[mo.group(2)]
+
+
+def peak_rss_kbytes(rusage):
+    """Return the ru_maxrss of a resource usage in kByte, ru_maxrss is in bytes on macOS and in kByte elsewhere."""
+    if rusage is None:
+        return None
+    if sys.platform == 'darwin':
+        return rusage.ru_maxrss // 1024
+    return rusage.ru_maxrss
+
+
+def read_history(fileNamePath):
+    """Read the list of test bench records from the JSON lines history file, skip lines that cannot be parsed."""
+    history = []
+    if os.path.isfile(fileNamePath):
+        with open(fileNamePath, 'r') as fp:
+            for line in fp:
+                try:
+                    history.append(json.loads(line))
+                except ValueError:
+                    pass
+    return history
+
+
+def append_history(fileNamePath, records):
+    """Append the test bench records of a run to the JSON lines history file."""
+    with open(fileNamePath, 'a') as fp:
+        for record in records:
+            fp.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+def last_durations(history):
+    """Return dict of the most recent wall time per '<lib>.<tb>' in the history."""
+    durations = {}
+    for record in history:
+        if record.get('wall_s') is not None:
+            durations[record['lib'] + '.' + record['tb']] = record['wall_s']
+    return durations
+
+
+def median_of(values):
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
+
+
+def slowdown_report(history, run=None, nof_runs=NOF_RUNS, factor=SLOWDOWN_FACTOR, min_s=SLOWDOWN_MIN_S):
+    """Compare the test benches of run (default the last run in history) with the median of their last nof_runs earlier
+       runs that passed with the same number of jobs.
+
+       Return OrderedDict lib : list of dicts with the tb record values, the medians, the wall time ratio and 'slow'.
+    """
+    if run is None:
+        if len(history) == 0:
+            return collections.OrderedDict()
+        run = history[-1]['run']
+    earlier = collections.defaultdict(list)
+    for record in history:
+        if record['run'] == run:
+            break
+        if record.get('passed'):
+            earlier[(record['lib'], record['tb'], record.get('jobs', 1))].append(record)
+    report = collections.OrderedDict()
+    for record in history:
+        if record['run'] != run:
+            continue
+        previous = earlier[(record['lib'], record['tb'], record.get('jobs', 1))][-nof_runs:]
+        median_s = median_of([r.get('wall_s') for r in previous])
+        wall_s = record.get('wall_s')
+        ratio = wall_s / median_s if wall_s is not None and median_s else None
+        entry = dict(record)
+        entry['nof_runs'] = len(previous)
+        entry['median_s'] = median_s
+        entry['median_sim_ns'] = median_of([r.get('sim_ns') for r in previous])
+        entry['median_peak_rss_kb'] = median_of([r.get('peak_rss_kb') for r in previous])
+        entry['ratio'] = ratio
+        entry['slow'] = ratio is not None and ratio >= factor and wall_s - median_s >= min_s
+        report.setdefault(record['lib'], []).append(entry)
+    return report
+
+
+def format_value(value, fmt):
+    return '-' if value is None else fmt % value
+
+
+def format_report(report, nof_runs=NOF_RUNS):
+    """Return the slowdown report as list of text lines, one line per test bench, grouped per library."""
+    lines = ['Test bench wall time versus median of last %d passed runs with the same --jobs:' % nof_runs]
+    lines.append('%-24s %-32s %10s %10s %7s %14s %12s %12s' % ('LIB', 'TB', 'WALL [s]', 'MEDIAN [s]', 'RATIO', 'SIM TIME [ns]', 'PEAK RSS [MB]', 'LOG [kB]'))
+    for lib, entries in report.items():
+        for e in entries:
+            lines.append('%-24s %-32s %10s %10s %7s %14s %12s %12s%s' % (lib, e['tb'],
+                         format_value(e.get('wall_s'), '%.1f'),
+                         format_value(e['median_s'], '%.1f'),
+                         format_value(e['ratio'], '%.2f'),
+                         format_value(e.get('sim_ns'), '%.0f'),
+                         format_value(e.get('peak_rss_kb') and e['peak_rss_kb'] / 1024.0, '%.0f'),
+                         format_value(e.get('log_bytes') and e['log_bytes'] / 1024.0, '%.0f'),
+                         '   SLOWER' if e['slow'] else ''))
+    return lines
+
+
+def slow_test_benches(report):
+    """Return list of '<lib>: <tb>' for the test benches that are marked slow in the report."""
+    return ['%s: %s' % (lib, e['tb']) for lib, entries in report.items() for e in entries if e['slow']]
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Report test bench slowdowns from the VHDL regression test history')
+    argparser.add_argument('-f', '--file', default=os.path.join(os.path.expandvars('$HDL_BUILD_DIR'), 'Reports', HISTORY_FILE_NAME), help='history file (default: %(default)s)')
+    argparser.add_argument('-r', '--run', default=None, help='run timestamp to report (default: last run)')
+    argparser.add_argument('-n', '--nof_runs', type=int, default=NOF_RUNS, help='number of earlier runs for the median (default: %(default)s)')
+    argparser.add_argument('--factor', type=float, default=SLOWDOWN_FACTOR, help='slowdown ratio to report (default: %(default)s)')
+    argparser.add_argument('-l', '--lib', default=None, help='library names separated by commas (default: all)')
+    argparser.add_argument('-s', '--slow', action='store_true', default=False, help='only list the slower test benches')
+    args = argparser.parse_args()
+
+    report = slowdown_report(read_history(args.file), run=args.run, nof_runs=args.nof_runs, factor=args.factor)
+    if args.lib is not None:
+        libs = args.lib.split(',')
+        report = collections.OrderedDict((lib, entries) for lib, entries in report.items() if lib in libs)
+    if args.slow:
+        report = collections.OrderedDict((lib, [e for e in entries if e['slow']]) for lib, entries in report.items())
+    for line in format_report(report, args.nof_runs):
+        print(line)
+    # Exit code 1 when a test bench got slower, for use in scripts
+    sys.exit(1 if slow_test_benches(report) else 0)